@@ -1,19 +1,21 @@
 """Provides deconvolution implementations, especially for 2D Richardson-Lucy."""
 import numpy as np
 import scipy
+import scipy.fft
 import scipy.ndimage
-from tqdm import tqdm_notebook
 
 import xarray as xr
 from arpes.fits.fit_models.functional_forms import gaussian
 from arpes.provenance import update_provenance
 from arpes.typing import DataType
 from arpes.utilities import normalize_to_spectrum
+from arpes.utilities.jupyter import wrap_tqdm
 
 __all__ = (
     "deconvolve_ice",
     "deconvolve_rl",
     "make_psf1d",
+    "make_psf",
 )
 
 
@@ -60,142 +62,189 @@ def deconvolve_ice(data: DataType, psf, n_iterations=5, deg=None) -> DataType:
     return result
 
 
+# the np.pad modes which extend data as the scipy.ndimage boundary modes do
+BOUNDARY_PAD_MODES = {
+    "reflect": "symmetric",
+    "mirror": "reflect",
+    "nearest": "edge",
+    "wrap": "wrap",
+    "constant": "constant",
+}
+
+
+def _trim_kernel(kernel: np.ndarray, axes) -> np.ndarray:
+    """Drops the negligible tails of a kernel along `axes`, keeping its origin.
+
+    The origin of a kernel of length K is at K // 2, so equally many entries are dropped
+    from either end.
+    """
+    negligible = np.abs(kernel) <= np.finfo(np.float64).eps * np.abs(kernel).max()
+    trim = []
+    for axis in axes:
+        other_axes = tuple(a for a in range(kernel.ndim) if a != axis)
+        profile = np.all(negligible, axis=other_axes)
+        n_tail = min(np.argmin(profile), np.argmin(profile[::-1]))
+        trim.append(slice(n_tail, kernel.shape[axis] - n_tail))
+
+    selection = [slice(None)] * kernel.ndim
+    for axis, s in zip(axes, trim):
+        selection[axis] = s
+
+    return kernel[tuple(selection)]
+
+
+class _FFTConvolution:
+    """Convolves arrays of one shape with a fixed kernel along some of their axes, by FFT.
+
+    Gives the same result as `scipy.ndimage.convolve`, with the arrays extended at the
+    boundaries according to `mode` by as much as the kernel reaches. The transform of the
+    kernel is computed only once.
+    """
+
+    def __init__(self, kernel: np.ndarray, shape, axes, mode="reflect"):
+        """Prepares to convolve arrays of `shape` with `kernel` along `axes`."""
+        if mode not in BOUNDARY_PAD_MODES:
+            raise ValueError(
+                "Unsupported mode {}, use one of {}".format(mode, list(BOUNDARY_PAD_MODES))
+            )
+
+        self.axes = tuple(axes)
+        self.mode = BOUNDARY_PAD_MODES[mode]
+        kernel = _trim_kernel(np.asarray(kernel, dtype=np.float64), self.axes)
+
+        self.pad = [(0, 0)] * len(shape)
+        self.crop = [slice(None)] * len(shape)
+        self.padded_shape = []
+        for a in self.axes:
+            size = kernel.shape[a]
+            padded_size = scipy.fft.next_fast_len(shape[a] + size - 1, real=True)
+            self.pad[a] = (size - 1 - size // 2, padded_size - shape[a] - (size - 1 - size // 2))
+            self.crop[a] = slice(size - 1, size - 1 + shape[a])
+            self.padded_shape.append(padded_size)
+
+        self.crop = tuple(self.crop)
+        self.kernel_transform = scipy.fft.rfftn(kernel, s=self.padded_shape, axes=self.axes)
+
+    def __call__(self, arr: np.ndarray) -> np.ndarray:
+        """Convolves `arr` with the kernel."""
+        padded = np.pad(arr, self.pad, mode=self.mode)
+        transform = scipy.fft.rfftn(padded, axes=self.axes, workers=-1)
+        transform *= self.kernel_transform
+        return scipy.fft.irfftn(transform, s=self.padded_shape, axes=self.axes, workers=-1)[
+            self.crop
+        ]
+
+
+def _richardson_lucy(
+    arr: np.ndarray, psf: np.ndarray, axes, n_iterations, mode, tol=None, progress=False
+) -> np.ndarray:
+    """Richardson-Lucy iterations for `arr`, with `psf` broadcasting against it along `axes`.
+
+    Only the current estimate is kept, and iterations stop early once the relative change of
+    the estimate in an iteration is below `tol`.
+    """
+    convolve = _FFTConvolution(psf, arr.shape, axes, mode)
+    correlate = _FFTConvolution(np.flip(psf, axes), arr.shape, axes, mode)
+
+    estimate = np.asarray(arr, dtype=np.float64)
+    for _ in wrap_tqdm(range(n_iterations), interactive=progress, desc="Deconvolving"):
+        blurred = convolve(estimate)
+        ratio = np.divide(arr, blurred, out=np.zeros_like(blurred), where=blurred != 0)
+        updated = estimate * correlate(ratio)
+
+        if tol is not None:
+            change = np.linalg.norm(updated - estimate) / np.linalg.norm(estimate)
+            estimate = updated
+            if change < tol:
+                break
+        else:
+            estimate = updated
+
+    return estimate
+
+
 @update_provenance("Lucy Richardson Deconvolution")
 def deconvolve_rl(
-    data: DataType, psf=None, n_iterations=10, axis=None, sigma=None, mode="reflect", progress=True
+    data: DataType,
+    psf=None,
+    n_iterations=10,
+    axis=None,
+    sigma=None,
+    mode="reflect",
+    progress=True,
+    tol=None,
 ) -> DataType:
     """Deconvolves data by a given point spread function using the Richardson-Lucy method.
 
+    Convolutions are performed by FFT, with the data extended at the boundaries as
+    `scipy.ndimage.convolve` would for `mode`. A point spread function along only some of
+    the dimensions of the data, such as one made by `make_psf1d`, deconvolves every cut along
+    these dimensions at once. One along all of the dimensions, such as the separable
+    Gaussians made by `make_psf`, deconvolves the data as a whole.
+
     Args:
-        data
-        axis
-        sigma
-        mode
-        progress
-        psf: for 1d, if not specified, must specify axis and sigma
-        n_iterations: the number of convolutions to use for the fit
+        data: The data to deconvolve.
+        psf: The point spread function, as a DataArray with a subset of the dimensions of the
+          data, or as an array with the dimensions of the data. A one dimensional array is
+          taken to be along `axis`. If not specified, it is made from `sigma`.
+        n_iterations: The maximum number of iterations.
+        axis: The dimension to deconvolve along with a one dimensional PSF.
+        sigma: The width of a Gaussian PSF along `axis`, or a dictionary of the widths along
+          several dimensions for a separable Gaussian PSF.
+        mode: The boundary mode, as for `scipy.ndimage.convolve`.
+        progress: Whether to show the progress of the iterations for multidimensional data.
+        tol: If specified, iterations stop once the relative change of the estimate in an
+          iteration is below `tol`.
 
     Returns:
         The Richardson-Lucy deconvolved data.
     """
     arr = normalize_to_spectrum(data)
 
-    if psf is None and axis is not None and sigma is not None:
-        # if no psf is provided and we have the information to make a 1d one
-        # note: this assumes gaussian psf
-        psf = make_psf1d(data=arr, dim=axis, sigma=sigma)
-
-    if len(data.dims) > 1:
-        if axis is not None:
-            # perform one-dimensional deconvolution of multidimensional data
-
-            # support for progress bars
-            wrap_progress = lambda x, *args, **kwargs: x
-            if progress:
-                wrap_progress = tqdm_notebook
-
-            # dimensions over which to iterate
-            other_dim = list(data.dims)
-            other_dim.remove(axis)
-
-            if len(other_dim) == 1:
-                # two-dimensional data
-                other_dim = other_dim[0]
-                result = arr.copy(deep=True).transpose(
-                    other_dim, axis
-                )  # not sure why the dims only seems to work in this order. seems like I should be able to swap it to (axis,other_dim) and also change the data collection to result[x_ind,y_ind], but this gave different results
-
-                for i, (od, iteration) in wrap_progress(
-                    enumerate(arr.G.iterate_axis(other_dim)),
-                    desc="Iterating " + other_dim,
-                    total=len(arr[other_dim]),
-                ):  # TODO tidy this gross-looking loop
-                    # indices of data being deconvolved
-                    x_ind = xr.DataArray(list(range(len(arr[axis]))), dims=[axis])
-                    y_ind = xr.DataArray([i] * len(x_ind), dims=[other_dim])
-                    # perform deconvolution on this one-dimensional piece
-                    deconv = deconvolve_rl(
-                        data=iteration, psf=psf, n_iterations=n_iterations, axis=None, mode=mode
-                    )
-                    # build results out of these pieces
-                    result[y_ind, x_ind] = deconv.values
-            elif len(other_dim) == 2:
-                # three-dimensional data
-                result = arr.copy(deep=True).transpose(
-                    *other_dim, axis
-                )  # not sure why the dims only seems to work in this order. seems like I should be able to swap it to (axis,*other_dim) and also change the data collection to result[x_ind,y_ind,z_ind], but this gave different results
-                for i, (od0, iteration0) in wrap_progress(
-                    enumerate(arr.G.iterate_axis(other_dim[0])),
-                    desc="Iterating " + other_dim[0],
-                    total=len(arr[other_dim[0]]),
-                ):  # TODO tidy this gross-looking loop
-                    for j, (od1, iteration1) in wrap_progress(
-                        enumerate(iteration0.G.iterate_axis(other_dim[1])),
-                        desc="Iterating " + other_dim[1],
-                        total=len(arr[other_dim[1]]),
-                        leave=False,
-                    ):  # TODO tidy this gross-looking loop
-                        # indices of data being deconvolved
-                        x_ind = xr.DataArray(list(range(len(arr[axis]))), dims=[axis])
-                        y_ind = xr.DataArray([i] * len(x_ind), dims=[other_dim[0]])
-                        z_ind = xr.DataArray([j] * len(x_ind), dims=[other_dim[1]])
-                        # perform deconvolution on this one-dimensional piece
-                        deconv = deconvolve_rl(
-                            data=iteration1,
-                            psf=psf,
-                            n_iterations=n_iterations,
-                            axis=None,
-                            mode=mode,
-                        )
-                        # build results out of these pieces
-                        result[y_ind, z_ind, x_ind] = deconv.values
-            elif len(other_dim) >= 3:
-                # four- or higher-dimensional data
-                # TODO find way to compactify the different dimensionalities rather than having separate code
-                raise NotImplementedError("high-dimensional data not yet supported")
-
-        elif axis is None:
-            # crude attempt to perform multidimensional deconvolution. not clear if this is currently working
-            # TODO may be able to do this as a sequence of one-dimensional deconvolutions, assuming that the psf is separable (which I think it should be, if we assume it is a multivariate gaussian with principle axes aligned with the dimensions)
-            raise NotImplementedError("multi-dimensional convolutions not yet supported")
-
-            if not isinstance(arr, np.ndarray):
-                arr = arr.values
-
-            u = [arr]
-
-            for i in range(n_iterations):
-                c = scipy.ndimage.convolve(u[-1], psf, mode=mode)
-                u.append(
-                    u[-1] * scipy.ndimage.convolve(arr / c, np.flip(psf, None), mode=mode)
-                )  # careful about which axis (axes) to flip here...! need to explicitly specify for some versions of numpy
-
-            result = u[-1]
-    else:
-        if type(arr) is not np.ndarray:
-            arr = arr.values
+    if psf is None:
+        if isinstance(sigma, dict):
+            psf = make_psf(data=arr, sigmas=sigma)
+        elif axis is not None and sigma is not None:
+            # if no psf is provided and we have the information to make a 1d one
+            # note: this assumes gaussian psf
+            psf = make_psf1d(data=arr, dim=axis, sigma=sigma)
+        else:
+            raise ValueError("Specify a psf, or an axis and sigma to make a Gaussian psf.")
 
-        u = [arr]
+    if isinstance(psf, xr.DataArray):
+        psf_dims = list(psf.dims)
+        psf = psf.values
+    else:
+        psf = np.asarray(psf)
+        if psf.ndim == 1 and axis is not None:
+            psf_dims = [axis]
+        elif psf.ndim == len(arr.dims):
+            psf_dims = list(arr.dims)
+        else:
+            raise ValueError("An array psf must be one dimensional along axis, or match the data.")
 
-        for i in range(n_iterations):
-            c = scipy.ndimage.convolve(u[-1], psf, mode=mode)
-            u.append(
-                u[-1] * scipy.ndimage.convolve(arr / c, np.flip(psf, 0), mode=mode)
-            )  # not yet tested to ensure flip correct for asymmetric psf
-            # note: need to explicitly specify axis number in np.flip in lower versions of numpy
+    if axis is not None and psf_dims != [axis]:
+        raise ValueError("The psf for deconvolution along {} must be along it only.".format(axis))
 
-        if type(data) is np.ndarray:
-            result = u[-1].copy()
-        else:
-            result = normalize_to_spectrum(data).copy(deep=True)
-            result.values = u[-1]
+    # broadcast the psf against the data, with length one along the other dimensions
+    psf = np.moveaxis(
+        psf.reshape(psf.shape + (1,) * (len(arr.dims) - len(psf_dims))),
+        list(range(len(arr.dims))),
+        [arr.dims.index(d) for d in psf_dims]
+        + [i for i, d in enumerate(arr.dims) if d not in psf_dims],
+    )
 
-    try:
-        result = result.transpose(*arr.dims)
-    except:
-        pass
+    deconvolved = _richardson_lucy(
+        arr.values,
+        psf,
+        axes=[arr.dims.index(d) for d in psf_dims],
+        n_iterations=n_iterations,
+        mode=mode,
+        tol=tol,
+        progress=progress and len(arr.dims) > 1,
+    )
 
-    return result
+    return arr.copy(data=deconvolved)
 
 
 @update_provenance("Make 1D-Point Spread Function")
@@ -228,38 +277,32 @@ def make_psf1d(data: DataType, dim, sigma):
 
 @update_provenance("Make Point Spread Function")
 def make_psf(data: DataType, sigmas):
-    """Not yet operational; produces an n-dimensional gaussian point spread function for use in deconvolve_rl.
+    """Produces a separable n-dimensional gaussian point spread function for use in deconvolve_rl.
+
+    The point spread function is the product of one dimensional gaussians along each of the
+    dimensions in `sigmas`, as made by `make_psf1d`. A width of zero gives no broadening
+    along that dimension.
 
     Args:
         data
-        dim
-        sigma
+        sigmas: The width of the gaussian along each dimension
 
     Returns:
-        The PSF to use.
+        The PSF to use, along the dimensions in `sigmas`.
     """
-    raise NotImplementedError
-
     arr = normalize_to_spectrum(data)
-    dims = arr.dims
-
-    psf = arr.copy(deep=True) * 0 + 1
+    dims = [d for d in arr.dims if d in sigmas]
 
+    psf = 1
     for dim in dims:
-        other_dims = list(arr.dims)
-        other_dims.remove(dim)
-
-        psf1d = arr.copy(deep=True) * 0 + 1
-        for od in other_dims:
-            psf1d = psf1d[{od: 0}]
-
         if sigmas[dim] == 0:
-            # TODO may need to do subpixel correction for when the dimension has an even length
-            psf1d = psf1d * 0
-            # psf1d[{dim:np.mean(psf1d.coords[dim])}] = 1
-            psf1d[{dim: len(psf1d.coords[dim]) / 2}] = 1
+            psf1d = xr.DataArray(
+                np.zeros(len(arr.coords[dim])), coords={dim: arr.coords[dim]}, dims=[dim]
+            )
+            psf1d[{dim: len(psf1d.coords[dim]) // 2}] = 1
         else:
-            psf1d = psf1d * gaussian(psf1d.coords[dim], np.mean(psf1d.coords[dim]), sigmas[dim])
+            psf1d = make_psf1d(arr, dim, sigmas[dim])
 
         psf = psf * psf1d
-    return psf
+
+    return psf.transpose(*dims)
@@ -1,8 +1,7 @@
 """Some general purpose analysis routines otherwise defying categorization."""
-import itertools
-from collections import defaultdict
-
+import numba
 import numpy as np
+from scipy import sparse
 
 import arpes.constants
 import arpes.models.band
@@ -14,6 +13,12 @@ from arpes.fits import GStepBModel, broadcast_model
 from arpes.provenance import update_provenance
 from arpes.typing import DataType
 from arpes.utilities import normalize_to_spectrum
+from arpes.utilities.binning import (
+    apply_axis_weights,
+    element_offsets,
+    interpolation_weights,
+    overlap_weights,
+)
 from arpes.utilities.math import fermi_distribution
 
 from .filters import gaussian_filter_arr
@@ -159,6 +164,128 @@ def condense(data: xr.DataArray):
     return data
 
 
+# the number of input points rebinned at once, so that lazily loaded data is read in slabs
+DESIRED_SLAB_SIZE = 1000 * 1000 * 20
+
+
+def _reduction_edges(n_old: int, factor: int) -> np.ndarray:
+    """The edges, in old bins, of bins of `factor` old bins covering an axis of length `n_old`.
+
+    Where `factor` does not divide `n_old`, the last bin holds only the remaining old bins.
+    """
+    return np.append(np.arange(0, n_old, factor), n_old)
+
+
+def _rebin_axis(n_old: int, edges: np.ndarray, interpolate=False):
+    """How one axis of length `n_old` is rebinned to the bins with `edges`, in old bins.
+
+    This is an integer reduction factor if the new bins are each made of the same whole
+    number of old bins, and otherwise a sparse weight matrix. For integration, old bins
+    contribute in proportion to their overlap with the new bins and the result is their
+    weighted mean. For interpolation, the data is interpolated linearly at the start of each
+    new bin.
+    """
+    n_new = len(edges) - 1
+    if interpolate:
+        return interpolation_weights(np.minimum(edges[:-1], n_old - 1), n_old)
+
+    if n_old % n_new == 0 and np.array_equal(edges, np.arange(0, n_old + 1, n_old // n_new)):
+        return n_old // n_new
+
+    weights = overlap_weights(np.arange(n_old + 1), edges)
+    return sparse.csr_matrix(weights.multiply(1 / weights.sum(axis=1)))
+
+
+def _rebin_coord(coord: np.ndarray, edges: np.ndarray):
+    """The coordinates at the start of each of the bins with `edges`, in old bins."""
+    if np.array_equal(edges, np.round(edges)):
+        return coord[edges[:-1].astype(np.int64)]
+
+    return np.interp(edges[:-1], np.arange(len(coord)), coord)
+
+
+@numba.njit(parallel=True, cache=True)
+def _block_means(flat, bases, step, offsets, out):
+    """The mean of each block of elements of `flat`, for a row of blocks from each of `bases`.
+
+    The blocks of a row start `step` elements apart, and have elements at `offsets` from
+    their start.
+    """
+    scale = 1.0 / len(offsets)
+    for k in numba.prange(len(bases)):
+        for i in range(out.shape[1]):
+            start = bases[k] + i * step
+            total = 0.0
+            for j in range(len(offsets)):
+                total += flat[start + offsets[j]]
+
+            out[k, i] = total * scale
+
+
+def _rebin_values(values: np.ndarray, axis_rebinning) -> np.ndarray:
+    """Rebins `values` by the integer factor or weights of each axis, or None to leave it.
+
+    Axes reduced by integer factors are reduced together in a single pass over the data,
+    indexing it in place by its strides, before weights are applied to the remaining axes one
+    at a time.
+    """
+    factors = [r if isinstance(r, int) else 1 for r in axis_rebinning]
+    if any(f > 1 for f in factors):
+        if not (values.flags.c_contiguous or values.flags.f_contiguous):
+            values = np.ascontiguousarray(values)
+
+        strides = np.array(values.strides) // values.itemsize
+        shape = [n // f for n, f in zip(values.shape, factors)]
+        bases = element_offsets(strides[:-1] * factors[:-1], shape[:-1])
+        offsets = element_offsets(strides, factors)
+
+        dtype = values.dtype if np.issubdtype(values.dtype, np.floating) else np.float64
+        reduced = np.empty((len(bases), shape[-1]), dtype=dtype)
+        _block_means(values.ravel(order="K"), bases, strides[-1] * factors[-1], offsets, reduced)
+        values = reduced.reshape(shape)
+
+    for axis, weights in enumerate(axis_rebinning):
+        if sparse.issparse(weights):
+            values = apply_axis_weights(values, weights, axis)
+
+    return values
+
+
+def _rebin_slabs(data: xr.DataArray, axis_rebinning) -> np.ndarray:
+    """Rebins `data` in slabs along its first axis, reading only one slab at a time."""
+    first, rest = axis_rebinning[0], axis_rebinning[1:]
+    n_old = data.shape[0]
+    if first is None:
+        n_new, per_new = n_old, 1
+    elif isinstance(first, int):
+        n_new, per_new = n_old // first, first
+    else:
+        n_new, per_new = first.shape[0], int(np.ceil(n_old / first.shape[0])) + 1
+
+    new_per_slab = max(DESIRED_SLAB_SIZE // max(int(np.prod(data.shape[1:])) * per_new, 1), 1)
+
+    rebinned = None
+    for low in range(0, n_new, new_per_slab):
+        high = min(low + new_per_slab, n_new)
+        if first is None:
+            window, slab_rebinning = slice(low, high), None
+        elif isinstance(first, int):
+            window, slab_rebinning = slice(low * first, high * first), first
+        else:
+            rows = first[low:high]
+            window = slice(int(rows.indices.min()), int(rows.indices.max()) + 1)
+            slab_rebinning = sparse.csr_matrix(rows[:, window])
+
+        slab = _rebin_values(
+            np.asarray(data[{data.dims[0]: window}].values), [slab_rebinning] + rest
+        )
+        if rebinned is None:
+            rebinned = np.empty((n_new,) + slab.shape[1:], dtype=slab.dtype)
+        rebinned[low:high] = slab
+
+    return rebinned
+
+
 @update_provenance("Rebinned array")
 def rebin(
     data: DataType,
@@ -178,6 +305,17 @@ def rebin(
     Dimensions corresponding to missing entries in ``shape`` or ``reduction`` will not
     be changed.
 
+    A ``reduction`` makes bins of exactly ``reduction`` old bins, and where it does not divide
+    the dimension, a last bin of the remaining old bins. A ``shape`` makes bins which evenly
+    divide the whole dimension, and where they do not contain a whole number of old bins, old
+    bins contribute to each new bin in proportion to their overlap with it, so that the
+    integrated intensity is conserved. The coordinates of the new bins are those at their
+    start. Data which is loaded lazily is read in slabs along its
+    first dimension.
+
+    Datasets are rebinned with the same bins for all of their data variables, which are
+    computed only once.
+
     Args:
         data
         interpolate: Use interpolation instead of integration
@@ -187,27 +325,12 @@ def rebin(
     Returns:
         The rebinned data.
     """
-    if isinstance(data, xr.Dataset):
-        new_vars = {
-            datavar: rebin(
-                data[datavar], shape=shape, reduction=reduction, interpolate=interpolate, **kwargs
-            )
-            for datavar in data.data_vars
-        }
-        new_coords = {}
-
-        for var in new_vars.values():
-            new_coords.update(var.coords)
-        return xr.Dataset(data_vars=new_vars, coords=new_coords, attrs=data.attrs)
-
-    data = arpes.utilities.normalize_to_spectrum(data)
+    if not isinstance(data, xr.Dataset):
+        data = arpes.utilities.normalize_to_spectrum(data)
 
     if any(d in kwargs for d in data.dims):
         reduction = kwargs
 
-    if interpolate:
-        raise NotImplementedError("The interpolation option has not been implemented")
-
     assert shape is None or reduction is None
 
     if isinstance(reduction, int):
@@ -216,38 +339,39 @@ def rebin(
     if reduction is None:
         reduction = {}
 
-    # we standardize by computing reduction from shape is shape was supplied.
-    if shape is not None:
-        reduction = {k: len(data.coords[k]) // v for k, v in shape.items()}
-
-    # since we are not interpolating, we need to clip each dimension so that the reduction
-    # factor evenly divides the real shape of the input data.
-    slices = defaultdict(lambda: slice(None))
+    # we standardize by computing the edges of the new bins, in units of old bins
+    if shape is None:
+        edges = {k: _reduction_edges(data.sizes[k], v) for k, v in reduction.items() if v > 1}
+    else:
+        edges = {
+            k: np.linspace(0, data.sizes[k], v + 1) for k, v in shape.items() if v != data.sizes[k]
+        }
 
-    if not data.dims:
+    if not data.dims or not edges:
         return data
 
-    for dim, reduction_factor in reduction.items():
-        remainder = len(data.coords[dim]) % reduction_factor
-        if remainder != 0:
-            slices[dim] = slice(None, -remainder)
-
-    trimmed_data = data.data[tuple(slices[d] for d in data.dims)]
-    trimmed_coords = {d: coord[slices[d]] for d, coord in data.indexes.items()}
+    rebinning = {d: _rebin_axis(data.sizes[d], e, interpolate) for d, e in edges.items()}
+    new_coords = {
+        k: xr.Variable((k,), _rebin_coord(c.values, edges[k]), c.attrs)
+        if k in edges
+        else c.variable
+        for k, c in data.coords.items()
+        if k in edges or not set(c.dims) & set(edges)
+    }
 
-    temp_shape = [
-        [trimmed_data.shape[i] // reduction.get(d, 1), reduction.get(d, 1)]
-        for i, d in enumerate(data.dims)
-    ]
-    temp_shape = itertools.chain(*temp_shape)
-    reduced_data = trimmed_data.reshape(*temp_shape)
+    def rebin_array(arr: xr.DataArray) -> xr.DataArray:
+        if not set(arr.dims) & set(edges):
+            return arr
 
-    for i in range(len(data.dims)):
-        reduced_data = reduced_data.mean(i + 1)
+        values = _rebin_slabs(arr, [rebinning.get(d) for d in arr.dims])
+        coords = {k: c for k, c in new_coords.items() if set(c.dims) <= set(arr.dims)}
+        return xr.DataArray(values, coords, arr.dims, attrs=arr.attrs)
 
-    reduced_coords = {d: coord[:: reduction.get(d, 1)] for d, coord in trimmed_coords.items()}
-    reduced_coords.update(
-        {c: data.coords[c] for c in data.coords.keys() if c not in trimmed_coords}
-    )
+    if isinstance(data, xr.Dataset):
+        return xr.Dataset(
+            data_vars={k: rebin_array(v) for k, v in data.data_vars.items()},
+            coords=new_coords,
+            attrs=data.attrs,
+        )
 
-    return xr.DataArray(reduced_data, reduced_coords, data.dims, attrs=data.attrs)
+    return rebin_array(data)
@@ -1,4 +1,14 @@
-"""Utilities for applying masks to data."""
+"""Utilities for applying masks to data.
+
+Masks are defined by polygons in coordinate units, and are specialized to the pixels of
+particular data by `polys_to_mask`. Polygons are rasterized scanline by scanline within their
+bounding boxes, with the same inclusion rule as `matplotlib.path.Path.contains_points`, and
+the specialized masks are cached, since interactive tools apply the same mask repeatedly.
+"""
+from collections import OrderedDict
+from typing import Hashable
+
+import numba
 import numpy as np
 from matplotlib.path import Path
 
@@ -14,6 +24,11 @@ __all__ = (
     "apply_mask_to_coords",
 )
 
+# the most recently used specialized masks are kept, up to this many
+MASK_CACHE_SIZE = 32
+
+_masks: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+
 
 def raw_poly_to_mask(poly):
     """Converts a polygon into a mask definition.
@@ -37,6 +52,83 @@ def raw_poly_to_mask(poly):
     }
 
 
+@numba.njit(cache=True)
+def _crosses(x0, y0, x1, y1, tx, ty, yflag1):
+    """Whether a ray from (tx, ty) along +x crosses the edge, as decided by matplotlib."""
+    return ((y1 - ty) * (x0 - x1) >= (x1 - tx) * (y0 - y1)) == yflag1
+
+
+@numba.njit(parallel=True, cache=True)
+def _rasterize_polygon(vertices, i_start, i_stop, j_start, j_stop, mask):
+    """Sets the pixels `mask[i, j]` inside the polygon, for `i, j` within a bounding box.
+
+    Pixels are inside by the even-odd rule, taking the first axis as x and the second as y.
+    Each scanline of constant y only tests the edges which straddle it.
+    """
+    n_vertices = len(vertices)
+    for j in numba.prange(j_start, j_stop):
+        ty = float(j)
+        inside = np.zeros(i_stop - i_start, dtype=np.bool_)
+        for e in range(n_vertices):
+            x0, y0 = vertices[e - 1, 0], vertices[e - 1, 1]
+            x1, y1 = vertices[e, 0], vertices[e, 1]
+            yflag1 = y1 >= ty
+            if (y0 >= ty) == yflag1:
+                continue
+
+            for i in range(i_start, i_stop):
+                if _crosses(x0, y0, x1, y1, float(i), ty, yflag1):
+                    inside[i - i_start] = not inside[i - i_start]
+
+        for i in range(i_start, i_stop):
+            if inside[i - i_start]:
+                mask[i, j] = True
+
+
+@numba.njit(parallel=True, cache=True)
+def _points_in_polygon(x, y, vertices, inside):
+    """Whether each of the points `(x, y)` is inside the polygon, by the even-odd rule."""
+    low_x, high_x = vertices[:, 0].min(), vertices[:, 0].max()
+    low_y, high_y = vertices[:, 1].min(), vertices[:, 1].max()
+    for p in numba.prange(len(x)):
+        tx, ty = x[p], y[p]
+        result = False
+        if tx >= low_x and tx <= high_x and ty >= low_y and ty <= high_y:
+            for e in range(len(vertices)):
+                x0, y0 = vertices[e - 1, 0], vertices[e - 1, 1]
+                x1, y1 = vertices[e, 0], vertices[e, 1]
+                yflag1 = y1 >= ty
+                if (y0 >= ty) != yflag1 and _crosses(x0, y0, x1, y1, tx, ty, yflag1):
+                    result = not result
+
+        inside[p] = result
+
+
+def _bounding_box(vertices: np.ndarray, shape, margin=0.0):
+    """The index ranges of the pixels within the bounding box of `vertices`."""
+    low = np.maximum(np.ceil(vertices.min(axis=0) - margin), 0).astype(int)
+    high = np.minimum(np.floor(vertices.max(axis=0) + margin) + 1, shape).astype(int)
+    return low, np.maximum(high, low)
+
+
+def _mask_key(mask_dict, coords, shape, radius, invert) -> Hashable:
+    """Everything which determines a specialized mask, or None if it is not hashable."""
+    dims = tuple(mask_dict["dims"])
+    try:
+        polys = tuple(
+            tuple(tuple(float(c) for c in p) for p in poly) for poly in mask_dict["polys"]
+        )
+    except (TypeError, ValueError):
+        return None
+
+    coords_key = []
+    for d in dims:
+        values = np.ascontiguousarray(coords[d])
+        coords_key.append((values.dtype.str, values.shape, values.tobytes()))
+
+    return (dims, polys, tuple(coords_key), tuple(shape), radius, invert)
+
+
 def polys_to_mask(mask_dict, coords, shape, radius=None, invert=False):
     """Converts a mask definition in terms of the underlying polygon to a True/False mask array.
 
@@ -47,6 +139,10 @@ def polys_to_mask(mask_dict, coords, shape, radius=None, invert=False):
     polygon definitions are general to any data with appropriate dimensions, because
     waypoints are given in unitful values rather than index values.
 
+    Only the pixels within the bounding box of each polygon are tested. Specialized masks
+    are cached by the mask definition and the coordinates, keeping the most recently used
+    `MASK_CACHE_SIZE`, and are returned read-only.
+
     Args:
         mask_dict
         coords
@@ -57,32 +153,46 @@ def polys_to_mask(mask_dict, coords, shape, radius=None, invert=False):
     Returns:
         The mask.
     """
+    key = _mask_key(mask_dict, coords, shape, radius, invert)
+    if key is not None and key in _masks:
+        _masks.move_to_end(key)
+        return _masks[key]
+
     dims = mask_dict["dims"]
     polys = mask_dict["polys"]
 
     polys = [
-        [[np.searchsorted(coords[dims[i]], coord) for i, coord in enumerate(p)] for p in poly]
+        np.array(
+            [[np.searchsorted(coords[dims[i]], coord) for i, coord in enumerate(p)] for p in poly],
+            dtype=np.float64,
+        )
         for poly in polys
     ]
 
-    mask_grids = np.meshgrid(*[np.arange(s) for s in shape])
-    mask_grids = tuple(k.flatten() for k in mask_grids)
-
-    points = np.vstack(mask_grids).T
-
-    mask = None
+    mask = np.zeros(shape, dtype=bool)
     for poly in polys:
-        grid = Path(poly).contains_points(points, radius=radius or 0)
-        grid = grid.reshape(list(shape)[::-1]).T
-
-        if mask is None:
-            mask = grid
-        else:
-            mask = np.logical_or(mask, grid)
+        if not radius:
+            low, high = _bounding_box(poly, shape)
+            _rasterize_polygon(poly, low[0], high[0], low[1], high[1], mask)
+            continue
+
+        # grown or shrunk polygons are tested by matplotlib, but still only in the bounding box,
+        # which grows with the miter joins at sharp corners up to the miter limit of four
+        low, high = _bounding_box(poly, shape, margin=4 * abs(radius))
+        grids = np.meshgrid(*[np.arange(l, h) for l, h in zip(low, high)], indexing="ij")
+        points = np.stack([g.ravel() for g in grids], axis=-1)
+        inside = Path(poly).contains_points(points, radius=radius)
+        mask[tuple(slice(l, h) for l, h in zip(low, high))] |= inside.reshape(grids[0].shape)
 
     if invert:
         mask = np.logical_not(mask)
 
+    if key is not None:
+        mask.flags.writeable = False
+        _masks[key] = mask
+        if len(_masks) > MASK_CACHE_SIZE:
+            _masks.popitem(last=False)
+
     return mask
 
 
@@ -98,14 +208,14 @@ def apply_mask_to_coords(data: xr.Dataset, mask, dims, invert=True):
     Returns:
         The masked data.
     """
-    p = Path(mask["poly"])
+    x, y = [np.asarray(data.data_vars[d].values, dtype=np.float64) for d in dims]
+    dest_shape = np.broadcast_shapes(x.shape, y.shape)
+    x, y = [np.broadcast_to(c, dest_shape).ravel() for c in (x, y)]
 
-    as_array = np.stack([data.data_vars[d].values for d in dims], axis=-1)
-    shape = as_array.shape
-    dest_shape = shape[:-1]
-    new_shape = [np.prod(dest_shape), len(dims)]
+    inside = np.empty(len(x), dtype=bool)
+    _points_in_polygon(x, y, np.asarray(mask["poly"], dtype=np.float64), inside)
 
-    mask = p.contains_points(as_array.reshape(new_shape)).reshape(dest_shape)
+    mask = inside.reshape(dest_shape)
     if invert:
         mask = np.logical_not(mask)
 
@@ -142,21 +252,27 @@ def apply_mask(data: DataType, mask, replace=np.nan, radius=None, invert=False):
         Data with values masked out.
     """
     data = normalize_to_spectrum(data)
-    fermi = mask.get("fermi")
+    fermi = None
+    dims = data.dims
 
     if isinstance(mask, dict):
+        fermi = mask.get("fermi")
         dims = mask.get("dims", data.dims)
         mask = polys_to_mask(
             mask,
             data.coords,
-            [s for i, s in enumerate(data.shape) if data.dims[i] in dims],
+            [data.sizes[d] for d in dims],
             radius=radius,
             invert=invert,
         )
 
-    masked_data = data.copy(deep=True)
-    masked_data.values = masked_data.values * 1.0
-    masked_data.values[mask] = replace
+    masked_data = data.copy(deep=True, data=data.values.astype(np.result_type(data.dtype, 1.0)))
+
+    # the masked dimensions are moved first in a view, in the order of the mask, so the mask is
+    # applied along the others without broadcasting it to the full shape of the data
+    masked_axes = [data.dims.index(d) for d in dims]
+    values = np.moveaxis(masked_data.values, masked_axes, list(range(len(masked_axes))))
+    values[mask] = replace
 
     if fermi is not None:
         return masked_data.sel(eV=slice(None, fermi + 0.2))
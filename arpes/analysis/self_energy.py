@@ -5,6 +5,7 @@ import numpy as np
 
 from arpes.constants import METERS_PER_SECOND_PER_EV_ANGSTROM, HBAR_PER_EV
 
+from arpes.fits.result_array import FitResultView
 from arpes.fits.utilities import broadcast_model
 from arpes.fits.fit_models import AffineBackgroundModel, LorentzianModel, LinearModel
 
@@ -42,7 +43,7 @@ def get_peak_parameter(data: xr.DataArray, parameter_name: str) -> xr.DataArray:
         lf.models.PseudoVoigtModel,
     )
 
-    if isinstance(first_item, lf.model.ModelResult):
+    if isinstance(first_item, (lf.model.ModelResult, FitResultView)):
         if isinstance(first_item.model, lf.model.CompositeModel):
             peak_like_components = [
                 c for c in first_item.model.components if isinstance(c, peak_like)
@@ -1,6 +1,7 @@
 """Contains routines for calculating and removing the classic Shirley background."""
 import warnings
 
+import numba
 import numpy as np
 import xarray as xr
 
@@ -32,53 +33,92 @@ def remove_shirley_background(xps: DataType, **kwargs) -> DataType:
     return xps - calculate_shirley_background(xps, **kwargs)
 
 
-def _calculate_shirley_background_full_range(
-    xps: np.ndarray, eps=1e-7, max_iters=50, n_samples=5
-) -> np.ndarray:
-    """Core routine for calculating a Shirley background on np.ndarray data."""
-    background = np.copy(xps)
-    cumulative_xps = np.cumsum(xps, axis=0)
-    total_xps = np.sum(xps, axis=0)
+@numba.njit(cache=True)
+def _shirley_spectrum(xps, eps, max_iters, n_samples, background):
+    """Iterates the Shirley background of one spectrum until it converges.
+
+    Returns:
+        The number of iterations made and the final relative error.
+    """
+    n = len(xps)
+    cumulative_xps = np.cumsum(xps)
+    total_xps = cumulative_xps[-1]
+
+    i_left = np.mean(xps[:n_samples])
+    i_right = np.mean(xps[n - n_samples :])
+    k = i_left - i_right
 
+    background[:] = xps
     rel_error = np.inf
+    for iter_count in range(max_iters):
+        cumulative_background = np.cumsum(background)
+        total_background = cumulative_background[-1]
 
-    i_left = np.mean(xps[:n_samples], axis=0)
-    i_right = np.mean(xps[-n_samples:], axis=0)
+        scale = k / (total_xps - total_background + 1e-5)
+        for i in range(n):
+            background[i] = i_right + scale * (
+                total_xps - cumulative_xps[i] - (total_background - cumulative_background[i])
+            )
 
-    iter_count = 0
+        rel_error = np.abs(np.sum(background) - total_background) / total_background
+        if rel_error < eps:
+            return iter_count + 1, rel_error
 
-    k = i_left - i_right
-    for iter_count in range(max_iters):
-        cumulative_background = np.cumsum(background, axis=0)
-        total_background = np.sum(background, axis=0)
+    return max_iters, rel_error
 
-        new_bkg = np.copy(background)
 
-        for i in range(len(new_bkg)):
-            new_bkg[i] = i_right + k * (
-                (total_xps - cumulative_xps[i] - (total_background - cumulative_background[i]))
-                / (total_xps - total_background + 1e-5)
-            )
+@numba.njit(cache=True)
+def _shirley_spectra(spectra, eps, max_iters, n_samples, background, iterations, errors):
+    for s in range(len(spectra)):
+        iterations[s], errors[s] = _shirley_spectrum(
+            spectra[s], eps, max_iters, n_samples, background[s]
+        )
+
+
+@numba.njit(parallel=True, cache=True)
+def _shirley_spectra_parallel(spectra, eps, max_iters, n_samples, background, iterations, errors):
+    for s in numba.prange(len(spectra)):
+        iterations[s], errors[s] = _shirley_spectrum(
+            spectra[s], eps, max_iters, n_samples, background[s]
+        )
+
+
+def _calculate_shirley_background_full_range(
+    xps: np.ndarray, eps=1e-7, max_iters=50, n_samples=5, parallel=True
+) -> np.ndarray:
+    """Core routine for calculating a Shirley background on np.ndarray data.
 
-        rel_error = np.abs(np.sum(new_bkg, axis=0) - total_background) / (total_background)
+    The energy axis is the first axis of `xps`, and a background is calculated for every
+    spectrum along it. Each spectrum is iterated until it has itself converged.
+    """
+    xps = np.asarray(xps)
+    spectra = np.ascontiguousarray(xps.reshape(len(xps), -1).T, dtype=np.float64)
 
-        background = new_bkg
+    background = np.empty_like(spectra)
+    iterations = np.empty(len(spectra), dtype=np.int64)
+    errors = np.empty(len(spectra), dtype=np.float64)
 
-        if np.any(rel_error < eps):
-            break
+    kernel = _shirley_spectra_parallel if parallel else _shirley_spectra
+    kernel(spectra, float(eps), int(max_iters), int(n_samples), background, iterations, errors)
 
-    if (iter_count + 1) == max_iters:
+    unconverged = ~(errors < eps)
+    if np.any(unconverged):
         warnings.warn(
-            "Shirley background calculation did not converge "
-            + "after {} steps with relative error {}!".format(max_iters, rel_error)
+            "Shirley background calculation did not converge for {} of {} spectra ".format(
+                np.sum(unconverged), len(spectra)
+            )
+            + "after {} steps with relative error up to {}!".format(
+                max_iters, np.nanmax(np.where(unconverged, errors, -np.inf))
+            )
         )
 
-    return background
+    dtype = xps.dtype if np.issubdtype(xps.dtype, np.floating) else np.float64
+    return background.T.reshape(xps.shape).astype(dtype, copy=False)
 
 
 @update_provenance("Calculate full range Shirley background")
 def calculate_shirley_background_full_range(
-    xps: DataType, eps=1e-7, max_iters=50, n_samples=5
+    xps: DataType, eps=1e-7, max_iters=50, n_samples=5, parallel=True
 ) -> DataType:
     """Calculates a shirley background.
 
@@ -98,11 +138,15 @@ def calculate_shirley_background_full_range(
     In practice, what we can do is to calculate the cumulative sum of the data along the energy axis of
     both the data and the current estimate of the background
 
+    For multidimensional data, a background is calculated for every spectrum along "eV" in a
+    single call, and each is iterated until it has itself converged.
+
     Args:
         xps: The input data.
         eps: Convergence parameter.
         max_iters: The maximum number of iterations to allow before convengence.
         n_samples: The number of samples to use at the boundaries of the input data.
+        parallel: Whether to calculate the backgrounds of different spectra in parallel.
 
     Returns:
         A monotonic Shirley backgruond over the entire energy range.
@@ -116,7 +160,8 @@ def calculate_shirley_background_full_range(
         eps,
         max_iters,
         n_samples,
-        input_core_dims=[core_dims, [], [], []],
+        parallel,
+        input_core_dims=[core_dims, [], [], [], []],
         output_core_dims=[core_dims],
         exclude_dims=set(core_dims),
         vectorize=False,
@@ -125,7 +170,7 @@ def calculate_shirley_background_full_range(
 
 @update_provenance("Calculate limited range Shirley background")
 def calculate_shirley_background(
-    xps: DataType, energy_range: slice = None, eps=1e-7, max_iters=50, n_samples=5
+    xps: DataType, energy_range: slice = None, eps=1e-7, max_iters=50, n_samples=5, parallel=True
 ) -> DataType:
     """Calculates a shirley background iteratively over the full energy range `energy_range`.
 
@@ -140,6 +185,7 @@ def calculate_shirley_background(
         eps: Convergence parameter.
         max_iters: The maximum number of iterations to allow before convengence.
         n_samples: The number of samples to use at the boundaries of the input data.
+        parallel: Whether to calculate the backgrounds of different spectra in parallel.
 
     Returns:
         A monotonic Shirley backgruond over the entire energy range.
@@ -150,15 +196,13 @@ def calculate_shirley_background(
     xps = normalize_to_spectrum(xps)
     xps_for_calc = xps.sel(eV=energy_range)
 
-    bkg = calculate_shirley_background_full_range(xps_for_calc, eps, max_iters, n_samples)
+    bkg = calculate_shirley_background_full_range(xps_for_calc, eps, max_iters, n_samples, parallel)
     bkg = bkg.transpose(*xps.dims)
     full_bkg = xps * 0
 
     left_idx = np.searchsorted(full_bkg.eV.values, bkg.eV.values[0], side="left")
-    right_idx = left_idx + len(bkg)
+    in_range_idx = np.clip(np.arange(len(full_bkg.eV)) - left_idx, 0, len(bkg.eV) - 1)
 
-    full_bkg.values[:left_idx] = bkg.values[0]
-    full_bkg.values[left_idx:right_idx] = bkg.values
-    full_bkg.values[right_idx:] = bkg.values[-1]
+    full_bkg.values[...] = np.take(bkg.values, in_range_idx, axis=xps.dims.index("eV"))
 
     return full_bkg
@@ -9,26 +9,38 @@ arrivals are counted, but even here you must be aware of tricky aspects of
 the experiment: ToF-ARPES analyzers are not perfect, their efficiency can vary dramatically
 across the detector due to MCP burn-in, and electron aberration and focusing
 must be considered.
+
+Bootstraps are computed in streaming fashion. Samples are drawn in batches of bounded size,
+each from its own random stream spawned from a single seed, and are reduced to their mean and
+variance with Welford's algorithm, and optionally to quantiles with the P² algorithm, before
+the next batch is drawn. Batches can be drawn in a pool of worker processes, and because each
+batch has its own random stream, the result for a given seed does not depend on the number of
+workers.
 """
 
 import copy
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from multiprocessing import get_context
 
 import functools
 import random
 
+import numba
 import scipy.stats
-from typing import Any, Callable, Dict, List, Optional, Set, Union
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Union
 import numpy as np
-from tqdm import tqdm_notebook
 
 import xarray as xr
 from arpes.analysis.sarpes import to_intensity_polarization
 from arpes.provenance import update_provenance
 from arpes.typing import DataType
 from arpes.utilities import lift_dataarray_to_generic
+from arpes.utilities.jupyter import wrap_tqdm
 from arpes.utilities.normalize import normalize_to_spectrum
 from arpes.utilities.region import normalize_region
+from arpes.utilities.workers import default_start_method, initialize_worker
 
 __all__ = (
     "bootstrap",
@@ -38,8 +50,13 @@ __all__ = (
     "bootstrap_intensity_polarization",
     "Normal",
     "propagate_errors",
+    "OnlineMoments",
+    "OnlineQuantiles",
 )
 
+# the number of sampled values drawn at once, which bounds the memory used by a bootstrap
+DESIRED_BATCH_SIZE = 1000 * 1000 * 4
+
 
 @update_provenance("Estimate prior")
 def estimate_prior_adjustment(data: DataType, region: Union[Dict[str, Any], str] = None) -> float:
@@ -79,18 +96,24 @@ def estimate_prior_adjustment(data: DataType, region: Union[Dict[str, Any], str]
 
 @update_provenance("Resample cycle dimension")
 @lift_dataarray_to_generic
-def resample_cycle(data: xr.DataArray, **kwargs) -> xr.DataArray:
+def resample_cycle(
+    data: xr.DataArray, rng: Optional[np.random.Generator] = None, **kwargs
+) -> xr.DataArray:
     """Perform a non-parametric bootstrap using a cycle coordinate for statistically independent observations.
 
     Args:
         data: The input data.
+        rng: The random generator to draw with. Defaults to the `random` module.
         kwargs: Unused
 
     Returns:
         Resampled data with selections from the cycle axis.
     """
     n_cycles = len(data.cycle)
-    which = [random.randint(0, n_cycles - 1) for _ in range(n_cycles)]
+    if rng is None:
+        which = [random.randint(0, n_cycles - 1) for _ in range(n_cycles)]
+    else:
+        which = rng.integers(0, n_cycles, n_cycles)
 
     resampled = data.isel(cycle=which).sum("cycle", keep_attrs=True)
 
@@ -102,9 +125,12 @@ def resample_cycle(data: xr.DataArray, **kwargs) -> xr.DataArray:
 
 @update_provenance("Resample with prior adjustment")
 @lift_dataarray_to_generic
-def resample(data: xr.DataArray, prior_adjustment=1, **kwargs):
+def resample(
+    data: xr.DataArray, prior_adjustment=1, rng: Optional[np.random.Generator] = None, **kwargs
+):
+    rng = np.random if rng is None else rng
     resampled = xr.DataArray(
-        np.random.poisson(lam=data.values * prior_adjustment, size=data.values.shape),
+        rng.poisson(lam=data.values * prior_adjustment, size=data.values.shape),
         coords=data.coords,
         dims=data.dims,
         attrs=data.attrs,
@@ -118,18 +144,22 @@ def resample(data: xr.DataArray, prior_adjustment=1, **kwargs):
 
 @update_provenance("Resample electron-counted data")
 @lift_dataarray_to_generic
-def resample_true_counts(data: xr.DataArray) -> xr.DataArray:
+def resample_true_counts(
+    data: xr.DataArray, rng: Optional[np.random.Generator] = None
+) -> xr.DataArray:
     """Resamples histogrammed data where each count represents an actual electron.
 
     Args:
         data: Input data representing actual electron counts from a time of flight
               system or delay line.
+        rng: The random generator to draw with. Defaults to `np.random`.
 
     Returns:
         Poisson resampled data.
     """
+    rng = np.random if rng is None else rng
     resampled = xr.DataArray(
-        np.random.poisson(lam=data.values, size=data.values.shape),
+        rng.poisson(lam=data.values, size=data.values.shape),
         coords=data.coords,
         dims=data.dims,
         attrs=data.attrs,
@@ -141,9 +171,322 @@ def resample_true_counts(data: xr.DataArray) -> xr.DataArray:
     return resampled
 
 
+class OnlineMoments:
+    """The mean and variance of samples, accumulated batch by batch without keeping them.
+
+    Batches are combined with the pairwise form of Welford's algorithm (Chan et al.), which is
+    numerically stable, and which merges the moments of independent batches exactly, in any
+    order.
+
+    Attributes:
+        count: The number of samples seen.
+        mean: The mean of the samples.
+        m2: The sum of the squared deviations of the samples from their mean.
+    """
+
+    def __init__(self, count: int = 0, mean=0.0, m2=0.0):
+        """Starts from the moments of `count` samples, by default no samples."""
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def from_samples(cls, samples: np.ndarray) -> "OnlineMoments":
+        """The moments of a batch of samples, stacked along the first axis."""
+        samples = np.asarray(samples, dtype=np.float64)
+        mean = samples.mean(axis=0)
+        return cls(len(samples), mean, ((samples - mean) ** 2).sum(axis=0))
+
+    def merge(self, other: "OnlineMoments") -> "OnlineMoments":
+        """Includes the samples of `other` in these moments."""
+        if other.count == 0:
+            return self
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / count)
+        self.m2 = self.m2 + other.m2 + delta**2 * (self.count * other.count / count)
+        self.count = count
+        return self
+
+    def update(self, samples: np.ndarray) -> "OnlineMoments":
+        """Includes a batch of samples, stacked along the first axis, in these moments."""
+        return self.merge(OnlineMoments.from_samples(samples))
+
+    @property
+    def variance(self) -> np.ndarray:
+        """The variance of the samples, normalized by their number as for `np.var`."""
+        return self.m2 / self.count
+
+    @property
+    def std(self) -> np.ndarray:
+        """The standard deviation of the samples, as for `np.std`."""
+        return np.sqrt(self.variance)
+
+
+@numba.njit(parallel=True, cache=True)
+def _p2_update(samples, p, n_seen, heights, positions):
+    """Updates the P² markers of quantile `p` of each column of `samples` with its values.
+
+    `heights` and `positions` hold the five markers of each column, whose positions are
+    indices into the sorted samples seen so far, of which there are `n_seen`.
+    """
+    increments = np.array([0.0, p / 2, p, (1 + p) / 2, 1.0])
+    for e in numba.prange(samples.shape[1]):
+        q = heights[e]
+        n = positions[e]
+        for s in range(samples.shape[0]):
+            x = samples[s, e]
+            if x < q[0]:
+                q[0] = x
+                k = 0
+            elif x > q[4]:
+                q[4] = x
+                k = 3
+            else:
+                k = 0
+                while k < 3 and x >= q[k + 1]:
+                    k += 1
+
+            for i in range(k + 1, 5):
+                n[i] += 1
+
+            last = n_seen + s
+            for i in range(1, 4):
+                d = last * increments[i] - n[i]
+                if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                    d = 1.0 if d > 0 else -1.0
+                    parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                        (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                        + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                    )
+                    if q[i - 1] < parabolic < q[i + 1]:
+                        q[i] = parabolic
+                    else:
+                        j = i + int(d)
+                        q[i] = q[i] + d * (q[j] - q[i]) / (n[j] - n[i])
+                    n[i] += d
+
+
+class OnlineQuantiles:
+    """Estimates of quantiles of samples, accumulated without keeping the samples.
+
+    Uses the P² algorithm of Jain and Chlamtac, which tracks five markers per quantile for
+    each element of the samples, so that the memory used is independent of the number of
+    samples. Until five samples have been seen, the quantiles are exact.
+    """
+
+    def __init__(self, quantiles: Sequence[float]):
+        """Prepares to estimate each of `quantiles`, which are between zero and one."""
+        self.quantiles = np.asarray(quantiles, dtype=np.float64)
+        self.count = 0
+        self.first = []
+        self.heights = None
+        self.positions = None
+
+    def update(self, samples: np.ndarray) -> "OnlineQuantiles":
+        """Includes a batch of samples, stacked along the first axis."""
+        samples = np.asarray(samples, dtype=np.float64).reshape(len(samples), -1)
+        if self.heights is None:
+            n_first = min(5 - self.count, len(samples))
+            self.first.append(samples[:n_first])
+            self.count += n_first
+            samples = samples[n_first:]
+            if self.count < 5:
+                return self
+
+            first = np.sort(np.concatenate(self.first), axis=0).T
+            self.heights = np.repeat(first[None], len(self.quantiles), axis=0)
+            self.positions = np.broadcast_to(np.arange(5.0), self.heights.shape).copy()
+            self.first = []
+
+        if len(samples):
+            samples = np.ascontiguousarray(samples)
+            for i, p in enumerate(self.quantiles):
+                _p2_update(samples, p, self.count, self.heights[i], self.positions[i])
+            self.count += len(samples)
+
+        return self
+
+    @property
+    def values(self) -> np.ndarray:
+        """The estimates of the quantiles, along the first axis, for each flattened element."""
+        if self.heights is None:
+            return np.quantile(np.concatenate(self.first), self.quantiles, axis=0)
+
+        return self.heights[:, :, 2]
+
+
+def _flatten_run(run) -> np.ndarray:
+    """The values of one sample of a bootstrapped function, as a flat array."""
+    if isinstance(run, xr.Dataset):
+        return np.concatenate([np.ravel(v.values) for v in run.data_vars.values()])
+    if isinstance(run, xr.DataArray):
+        return np.ravel(run.values)
+
+    return np.ravel(run)
+
+
+def _draw_counts(counts: np.ndarray, rng: np.random.Generator, n_samples: int) -> np.ndarray:
+    """Poisson resamples the flattened `counts` `n_samples` times at once."""
+    return rng.poisson(counts.ravel(), size=(n_samples, counts.size))
+
+
+def _draw_runs(
+    fn,
+    args,
+    kwargs,
+    resample_indices,
+    resample_kwargs,
+    resample_fn,
+    prior_adjustment,
+    rng,
+    n_samples,
+) -> List[Any]:
+    """Evaluates `fn` on `n_samples` resamplings of the arguments it is bootstrapped over."""
+    runs = []
+    for _ in range(n_samples):
+        new_args = list(args)
+        new_kwargs = copy.copy(kwargs)
+        for i in resample_indices:
+            new_args[i] = resample_fn(args[i], prior_adjustment=prior_adjustment, rng=rng)
+        for k in resample_kwargs:
+            new_kwargs[k] = resample_fn(kwargs[k], prior_adjustment=prior_adjustment, rng=rng)
+
+        runs.append(fn(*new_args, **new_kwargs))
+
+    return runs
+
+
+def _run_batch(draw: Callable, seed: np.random.SeedSequence, n_samples: int, reduce, quantiles):
+    """Draws a batch of samples from its own random stream, and reduces it if requested.
+
+    Batches which are reduced are returned as their moments, together with the samples
+    if quantiles are estimated, and one sample which shows the structure of the others.
+    """
+    runs = draw(np.random.default_rng(seed), n_samples)
+    if not reduce:
+        return runs
+
+    samples = runs if isinstance(runs, np.ndarray) else np.stack([_flatten_run(r) for r in runs])
+    return (
+        OnlineMoments.from_samples(samples),
+        samples if quantiles is not None else None,
+        None if isinstance(runs, np.ndarray) else runs[0],
+    )
+
+
+def _iterate_batches(
+    draw: Callable,
+    N: int,
+    batch_size: int,
+    seed=None,
+    workers: Optional[int] = None,
+    reduce=True,
+    quantiles=None,
+    progress=True,
+    desc="Resampling...",
+) -> Iterator[Any]:
+    """Draws `N` samples in batches of at most `batch_size`, yielding the batches in order.
+
+    With `workers`, batches are drawn in a pool of processes, with at most two batches per
+    worker in flight, so that memory stays bounded.
+    """
+    sizes = [min(batch_size, N - start) for start in range(0, N, batch_size)]
+    if seed is None:
+        # draw the entropy from the global state, so that `np.random.seed` is respected
+        seed = np.random.randint(2**63)
+
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(draw, s, n, reduce, quantiles) for s, n in zip(seeds, sizes)]
+
+    if workers is None or workers <= 1:
+        results = (_run_batch(*task) for task in tasks)
+    else:
+        results = _run_in_pool(tasks, workers)
+
+    yield from wrap_tqdm(results, interactive=progress, desc=desc, total=len(sizes))
+
+
+def _run_in_pool(tasks, workers: int):
+    """Runs batches in worker processes, yielding their results in order.
+
+    As for parallel curve fits, workers are not forked where it can be avoided, since forking
+    after numba has started its threads is unsafe, and they use a single thread each.
+    """
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context(default_start_method()),
+        initializer=initialize_worker,
+        initargs=(None, 1),
+    ) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(_run_batch, *task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def _reduce_batches(batches, quantiles=None):
+    """The moments, quantile estimates, and a sample of the structure of reduced batches."""
+    moments = OnlineMoments()
+    estimates = None if quantiles is None else OnlineQuantiles(quantiles)
+    template = None
+    for batch_moments, samples, batch_template in batches:
+        moments.merge(batch_moments)
+        if estimates is not None:
+            estimates.update(samples)
+        if template is None:
+            template = batch_template
+
+    return moments, estimates, template
+
+
+def _statistics_dataset(template, moments, estimates=None, quantiles=None) -> xr.Dataset:
+    """The mean and standard deviation of bootstrapped values, as for `mean_and_deviation`.
+
+    Each variable `name` of `template` has variables `{name}` and `{name}_std`, and
+    `{name}_quantiles` along a "quantile" dimension if quantiles were estimated.
+    """
+    if isinstance(template, xr.Dataset):
+        arrays = dict(template.data_vars)
+    else:
+        if not isinstance(template, xr.DataArray):
+            template = xr.DataArray(np.asarray(template))
+        arrays = {template.name if template.name is not None else "data": template}
+
+    data_vars = {}
+    offset = 0
+    for name, arr in arrays.items():
+        flat = slice(offset, offset + arr.size)
+        offset += arr.size
+        data_vars[name] = arr.copy(data=moments.mean[flat].reshape(arr.shape))
+        data_vars[name + "_std"] = arr.copy(data=moments.std[flat].reshape(arr.shape))
+        if estimates is not None:
+            data_vars[name + "_quantiles"] = xr.DataArray(
+                estimates.values[:, flat].reshape((len(quantiles),) + arr.shape),
+                coords=dict(arr.coords, quantile=np.asarray(quantiles)),
+                dims=("quantile",) + arr.dims,
+            )
+
+    return xr.Dataset(data_vars=data_vars, attrs=template.attrs)
+
+
 @update_provenance("Bootstrap true electron counts")
 @lift_dataarray_to_generic
-def bootstrap_counts(data: DataType, N=1000, name=None) -> xr.Dataset:
+def bootstrap_counts(
+    data: DataType,
+    N=1000,
+    name=None,
+    seed=None,
+    batch_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    quantiles: Optional[Sequence[float]] = None,
+    progress=True,
+) -> xr.Dataset:
     """Performs a parametric bootstrap assuming recorded data are electron counts.
 
     Parametric bootstrap for the number of counts in each detector channel for a
@@ -152,36 +495,49 @@ def bootstrap_counts(data: DataType, N=1000, name=None) -> xr.Dataset:
     This function also introspects the data passed to determine whether there is a
     spin degree of freedom, and will bootstrap appropriately.
 
-    Currently we build all the samples at once instead of using a rolling algorithm.
+    Samples are drawn in batches and accumulated into their mean and standard deviation,
+    so that only one batch is in memory at a time.
 
     Arguments:
         data: The input spectrum.
         N: The number of samples to draw.
         name: The name of the subarray which represents counts to resample. E.g. "up_spectrum"
+        seed: The seed of the random streams the samples are drawn from. Defaults to a seed
+          drawn from the global numpy random state, as set by `np.random.seed`.
+        batch_size: The number of samples drawn at once. By default, batches of about
+          `DESIRED_BATCH_SIZE` values are drawn.
+        workers: The number of processes to draw samples in. Defaults to drawing them in
+          this process.
+        quantiles: Quantiles of the samples to estimate, between zero and one.
+        progress: Whether to show the progress of the resampling.
 
     Returns:
-        A `xr.Dataset` which has the mean and standard error for the resampled named array.
+        A `xr.Dataset` which has the mean and standard error for the resampled named array,
+        and its quantiles along a "quantile" dimension if requested.
     """
     assert data.name is not None or name is not None
     name = data.name if data.name is not None else name
 
     desc_fragment = " {}".format(name)
 
-    resampled_sets = []
-    for _ in tqdm_notebook(range(N), desc="Resampling{}...".format(desc_fragment)):
-        resampled_sets.append(resample_true_counts(data))
-
-    resampled_arr = np.stack([s.values for s in resampled_sets], axis=0)
-    std = np.std(resampled_arr, axis=0)
-    std = xr.DataArray(std, data.coords, data.dims)
-    mean = np.mean(resampled_arr, axis=0)
-    mean = xr.DataArray(mean, data.coords, data.dims)
-
-    data_vars = {}
-    data_vars[name] = mean
-    data_vars[name + "_std"] = std
+    if batch_size is None:
+        batch_size = max(DESIRED_BATCH_SIZE // max(data.size, 1), 1)
+
+    batches = _iterate_batches(
+        functools.partial(_draw_counts, data.values),
+        N,
+        batch_size,
+        seed=seed,
+        workers=workers,
+        quantiles=quantiles,
+        progress=progress,
+        desc="Resampling{}...".format(desc_fragment),
+    )
+    moments, estimates, _ = _reduce_batches(batches, quantiles)
 
-    return xr.Dataset(data_vars=data_vars, coords=data.coords, attrs=data.attrs.copy())
+    template = xr.DataArray(data.values, data.coords, data.dims, name=name)
+    bootstrapped = _statistics_dataset(template, moments, estimates, quantiles)
+    return bootstrapped.assign_attrs(data.attrs.copy())
 
 
 class Distribution:
@@ -258,7 +614,7 @@ def propagate_errors(f) -> Callable:
 
 
 @update_provenance("Bootstrap spin detector polarization and intensity")
-def bootstrap_intensity_polarization(data: xr.Dataset, N: int = 100) -> xr.Dataset:
+def bootstrap_intensity_polarization(data: xr.Dataset, N: int = 100, **kwargs) -> xr.Dataset:
     """Builds an estimate of the intensity and polarization from spin-data.
 
     Uses the parametric bootstrap to get uncertainties on the intensity and polarization of ToF-SARPES data.
@@ -266,12 +622,15 @@ def bootstrap_intensity_polarization(data: xr.Dataset, N: int = 100) -> xr.Datas
     Args:
         data: Input spectrum for resampling.
         N: The number of samples to draw.
+        kwargs: Passed to the bootstrapped function, see `bootstrap`. Pass `reduce=True` to
+          get the mean and standard deviation of the intensity and polarization without
+          keeping every sample in memory.
 
     Returns:
         Resampled data after conversion to intensity and polarization.
     """
     bootstrapped_polarization = bootstrap(to_intensity_polarization)
-    return bootstrapped_polarization(data, N=N)
+    return bootstrapped_polarization(data, N=N, **kwargs)
 
 
 def bootstrap(
@@ -284,6 +643,21 @@ def bootstrap(
     This is a functor which takes a function operating on plain data and produces one which
     internally bootstraps over counts on the input data.
 
+    The bootstrapped function takes the keyword arguments
+
+    - `N`: The number of samples to draw. Defaults to 20.
+    - `prior_adjustment`: Scales the data before it is Poisson resampled.
+    - `reduce`: Whether to return the mean and standard deviation of the samples, as
+      `mean_and_deviation` would, accumulating them as the samples are drawn instead of
+      keeping every sample. Defaults to False.
+    - `quantiles`: With `reduce`, quantiles of the samples to estimate as well.
+    - `seed`: The seed of the random streams the samples are drawn from. Defaults to a seed
+      drawn from the global numpy random state, as set by `np.random.seed`.
+    - `batch_size`: The number of samples drawn at once.
+    - `workers`: The number of processes to draw samples in, which requires `fn` and its
+      arguments to be picklable. Defaults to drawing them in this process.
+    - `progress`: Whether to show the progress of the resampling.
+
     Args:
         fn: The function to be bootstrapped.
         skip: Which arguments to leave alone. Defaults to None.
@@ -302,16 +676,24 @@ def bootstrap(
     elif resample_method == "cycle":
         resample_fn = resample_cycle
 
-    def bootstrapped(*args, N=20, prior_adjustment=1, **kwargs):
+    def bootstrapped(
+        *args,
+        N=20,
+        prior_adjustment=1,
+        reduce=False,
+        quantiles=None,
+        seed=None,
+        batch_size=None,
+        workers=None,
+        progress=True,
+        **kwargs
+    ):
         # examine args to determine which to resample
         resample_indices = [
             i
             for i, arg in enumerate(args)
             if isinstance(arg, (xr.DataArray, xr.Dataset)) and i not in skip
         ]
-        data_is_arraylike = False
-
-        runs = []
 
         def get_label(i):
             if isinstance(args[i], xr.Dataset):
@@ -339,23 +721,41 @@ def bootstrap(
             "Fair warning 2: Ensure that the data to resample is in a DataArray and not a Dataset"
         )
 
-        for _ in tqdm_notebook(range(N), desc="Resampling..."):
-            new_args = list(args)
-            new_kwargs = copy.copy(kwargs)
-            for i in resample_indices:
-                new_args[i] = resample_fn(args[i], prior_adjustment=prior_adjustment)
-            for k in resample_kwargs:
-                new_kwargs[k] = resample_fn(kwargs[k], prior_adjustment=prior_adjustment)
-
-            run = fn(*new_args, **new_kwargs)
-            if isinstance(run, (xr.DataArray, xr.Dataset)):
-                data_is_arraylike = True
-            runs.append(run)
+        if batch_size is None:
+            resampled = [args[i] for i in resample_indices] + [kwargs[k] for k in resample_kwargs]
+            resampled_size = sum(
+                sum(v.size for v in r.data_vars.values()) if isinstance(r, xr.Dataset) else r.size
+                for r in resampled
+            )
+            batch_size = max(DESIRED_BATCH_SIZE // max(resampled_size, 1), 1)
+
+        draw = functools.partial(
+            _draw_runs,
+            fn,
+            args,
+            kwargs,
+            resample_indices,
+            resample_kwargs,
+            resample_fn,
+            prior_adjustment,
+        )
+        batches = _iterate_batches(
+            draw,
+            N,
+            batch_size,
+            seed=seed,
+            workers=workers,
+            reduce=reduce,
+            quantiles=quantiles,
+            progress=progress,
+        )
 
-        if data_is_arraylike:
-            for i, run in enumerate(runs):
-                run = run.assign_coords(bootstrap=i)
+        if reduce:
+            moments, estimates, template = _reduce_batches(batches, quantiles)
+            return _statistics_dataset(template, moments, estimates, quantiles)
 
+        runs = [run for batch in batches for run in batch]
+        if any(isinstance(run, (xr.DataArray, xr.Dataset)) for run in runs):
             return xr.concat(runs, dim="bootstrap")
 
         return runs
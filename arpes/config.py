@@ -37,6 +37,16 @@ SETTINGS = {
     },
     "xarray_repr_mod": False,
     "use_tex": False,
+    "frame_workers": 4,
+    "load_cache": {
+        "enabled": False,
+        "path": None,
+        "max_size": 20 * 1024**3,
+    },
+    "file_index": {
+        "enabled": True,
+        "path": None,
+    },
 }
 
 # these are all set by ``update_configuration``
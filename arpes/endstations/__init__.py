@@ -9,16 +9,20 @@ import xarray as xr
 from astropy.io import fits
 
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 import copy
+from concurrent.futures import ThreadPoolExecutor
 import arpes.config
 import arpes.constants
 import os.path
 
 from arpes.load_pxt import read_single_pxt, find_ses_files_associated
 from arpes.utilities.dict import case_insensitive_get, rename_dataarray_attrs
+from arpes.utilities.xarray import concat_preallocated
 from arpes.provenance import provenance_from_file
+from arpes.endstations.fits_reader import read_fits_table
 from arpes.endstations.fits_utils import find_clean_coords
+from arpes.endstations.hdf5_utils import read_hdf5_dataset
 from arpes.endstations.igor_utils import shim_wave_note
 from arpes.repair import negate_energy
 
@@ -140,6 +144,92 @@ class EndstationBase:
             f for f in os.listdir(directory) if os.path.splitext(f)[1] in cls._TOLERATED_EXTENSIONS
         ]
 
+    @classmethod
+    def match_file(cls, files: List[str], file, allow_soft_match=False) -> Optional[str]:
+        """Finds the file among `files` associated to the scan `file`, or None if there is none.
+
+        Filenames are matched against `._SEARCH_PATTERNS`, or compared literally if `._USE_REGEX`
+        is not set.
+        """
+        if cls._USE_REGEX:
+            # another plugin related option here is we can restrict the number of regexes by allowing plugins
+            # to install regexes for particular endstations, if this is needed in the future it might be a good way
+            # of preventing clashes where there is ambiguity in file naming scheme across endstations
+            patterns = [re.compile(m.format(file)) for m in cls._SEARCH_PATTERNS]
+            for p in patterns:
+                for f in files:
+                    m = p.match(os.path.splitext(f)[0])
+                    if m is not None:
+                        if m.string == os.path.splitext(f)[0]:
+                            return f
+        else:
+            for f in files:
+                if os.path.splitext(file)[0] == os.path.splitext(f)[0]:
+                    return f
+                if allow_soft_match:
+                    matcher = os.path.splitext(f)[0].split("_")[-1]
+                    try:
+                        if int(matcher) == int(file):
+                            return f  # soft match
+                    except ValueError:
+                        pass
+
+        return None
+
+    @classmethod
+    def scan_files(cls, files: List[str]) -> Optional[Dict[str, str]]:
+        """Maps each scan number to the file among `files` which `.match_file` finds for it.
+
+        This lets an index of a directory answer lookups without matching every file each
+        time. Each filename is parsed once: every run of digits in it which could be the scan
+        number is tested against the parts of `._SEARCH_PATTERNS` before and after the scan.
+        As in `.match_file`, earlier patterns take precedence, then earlier files.
+
+        Returns:
+            The file for each scan number which has one, or None if the plugin does not match
+            files by regex, or matches them in a way which cannot be parsed ahead of time.
+        """
+        if not cls._USE_REGEX or cls.match_file.__func__ is not EndstationBase.match_file.__func__:
+            return None
+
+        split_patterns = []
+        for pattern in cls._SEARCH_PATTERNS:
+            parts = pattern.split("{}")
+            if len(parts) != 2:
+                return None
+
+            try:
+                split_patterns.append((re.compile(parts[0]), re.compile(parts[1])))
+            except re.error:
+                return None
+
+        found: Dict[str, Tuple[int, int]] = {}
+        for file_index, f in enumerate(files):
+            stem = os.path.splitext(f)[0]
+            runs = [(run.start(), run.end()) for run in re.finditer(r"[0-9]+", stem)]
+
+            for pattern_index, (before, after) in enumerate(split_patterns):
+                for run_start, run_end in runs:
+                    ends = [e for e in range(run_start + 1, run_end + 1) if after.match(stem, e)]
+                    if not ends:
+                        continue
+
+                    for start in range(run_start, run_end):
+                        if not before.fullmatch(stem, 0, start):
+                            continue
+
+                        for end in ends:
+                            scan = stem[start:end]
+                            # scan numbers are written without leading zeros
+                            if end <= start or (scan[0] == "0" and len(scan) > 1):
+                                continue
+
+                            rank = (pattern_index, file_index)
+                            if rank < found.get(scan, (len(split_patterns), len(files))):
+                                found[scan] = rank
+
+        return {scan: files[file_index] for scan, (_, file_index) in found.items()}
+
     @classmethod
     def find_first_file(cls, file, scan_desc, allow_soft_match=False):
         """Attempts to find a file associated to the scan given the user provided path or scan number.
@@ -151,6 +241,10 @@ class EndstationBase:
         * `._SEARCH_PATTERNS`: Defining acceptable filenames
         * `._USE_REGEX`: Controlling literal or regex filename checking
         * `._TOLERATED_EXTENSIONS`: Controlling whether files should be rejected based on their extension.
+
+        Directory listings and the results of lookups are kept in a persistent index of each
+        directory, see `arpes.endstations.file_index`, so that repeated lookups do not list
+        the search directories again unless their contents change.
         """
         workspace = arpes.config.CONFIG["WORKSPACE"]
         workspace_path = os.path.join(workspace["path"], "data")
@@ -159,34 +253,24 @@ class EndstationBase:
         base_dir = workspace_path or os.path.join(arpes.config.DATA_PATH, workspace)
         dir_options = [os.path.join(base_dir, option) for option in cls._SEARCH_DIRECTORIES]
 
-        # another plugin related option here is we can restrict the number of regexes by allowing plugins
-        # to install regexes for particular endstations, if this is needed in the future it might be a good way
-        # of preventing clashes where there is ambiguity in file naming scheme across endstations
-
-        patterns = [re.compile(m.format(file)) for m in cls._SEARCH_PATTERNS]
+        use_index = arpes.config.SETTINGS["file_index"]["enabled"]
+        if use_index:
+            from arpes.endstations.file_index import DirectoryIndex
 
         for dir in dir_options:
             try:
-                files = cls.files_for_search(dir)
-
-                if cls._USE_REGEX:
-                    for p in patterns:
-                        for f in files:
-                            m = p.match(os.path.splitext(f)[0])
-                            if m is not None:
-                                if m.string == os.path.splitext(f)[0]:
-                                    return os.path.join(dir, f)
+                if use_index:
+                    found = DirectoryIndex.for_directory(dir).find(
+                        cls,
+                        file,
+                        allow_soft_match,
+                        lambda files: cls.match_file(files, file, allow_soft_match),
+                    )
                 else:
-                    for f in files:
-                        if os.path.splitext(file)[0] == os.path.splitext(f)[0]:
-                            return os.path.join(dir, f)
-                        if allow_soft_match:
-                            matcher = os.path.splitext(f)[0].split("_")[-1]
-                            try:
-                                if int(matcher) == int(file):
-                                    return os.path.join(dir, f)  # soft match
-                            except ValueError:
-                                pass
+                    found = cls.match_file(cls.files_for_search(dir), file, allow_soft_match)
+
+                if found is not None:
+                    return os.path.join(dir, found)
             except FileNotFoundError:
                 pass
 
@@ -224,7 +308,7 @@ class EndstationBase:
             f.coords[scan_coord] = f.attrs[scan_coord]
 
         frames.sort(key=lambda x: x.coords[scan_coord])
-        return xr.concat(frames, scan_coord)
+        return concat_preallocated(frames, scan_coord)
 
     def resolve_frame_locations(self, scan_desc: dict = None) -> List[str]:
         """Determine all files and frames associated to this piece of data.
@@ -363,12 +447,14 @@ class EndstationBase:
             }
         )
 
-    def load(self, scan_desc: dict = None, **kwargs) -> xr.Dataset:
+    def load(
+        self, scan_desc: dict = None, frame_workers: Optional[int] = None, **kwargs
+    ) -> xr.Dataset:
         """Loads a scan from a single file or a sequence of files.
 
         This defines the contract and structure for standard data loading plugins:
         1. Search for files (`.resolve_frame_locations`)
-        2. Load them sequentially (`.load_single_frame`)
+        2. Load them (`.load_single_frame`), concurrently for scans with several frames
         3. Apply cleaning code to each frame (`.postprocess`)
         4. Concatenate these loaded files  (`.concatenate_frames`)
         5. Apply postprocessing code to the concatenated dataset
@@ -376,6 +462,13 @@ class EndstationBase:
         You can read more about the plugin system in the detailed documentation,
         but for the most part loaders just specializing one or more of these different steps
         as appropriate for a beamline.
+
+        Args:
+            scan_desc: Information identifying the scan
+            frame_workers: The number of threads loading and postprocessing frames. Defaults to
+              `arpes.config.SETTINGS["frame_workers"]`, at most the number of CPUs. Scans
+              with a single frame, or `frame_workers=1`, are loaded sequentially.
+            kwargs: Passed to `.load_single_frame`
         """
         self.trace("Resolving frame locations")
         resolved_frame_locations = self.resolve_frame_locations(scan_desc)
@@ -383,10 +476,21 @@ class EndstationBase:
             f if isinstance(f, str) else str(f) for f in resolved_frame_locations
         ]
         self.trace(f"Found frames: {resolved_frame_locations}")
-        frames = [
-            self.load_single_frame(fpath, scan_desc, **kwargs) for fpath in resolved_frame_locations
-        ]
-        frames = [self.postprocess(f) for f in frames]
+
+        def load_frame(fpath: str) -> xr.Dataset:
+            return self.postprocess(self.load_single_frame(fpath, scan_desc, **kwargs))
+
+        # a few threads hide file latency, more mostly contend for the filesystem
+        if frame_workers is None:
+            frame_workers = min(arpes.config.SETTINGS["frame_workers"], os.cpu_count() or 1)
+        frame_workers = max(min(frame_workers, len(resolved_frame_locations)), 1)
+
+        if frame_workers == 1:
+            frames = [load_frame(fpath) for fpath in resolved_frame_locations]
+        else:
+            with ThreadPoolExecutor(max_workers=frame_workers) as executor:
+                frames = list(executor.map(load_frame, resolved_frame_locations))
+
         concatted = self.concatenate_frames(frames, scan_desc)
         concatted = self.postprocess_final(concatted, scan_desc)
 
@@ -460,7 +564,9 @@ class SESEndstation(EndstationBase):
         frame = super().postprocess(frame)
         return frame.assign_attrs(frame.S.spectrum.attrs)
 
-    def load_SES_nc(self, scan_desc: dict = None, robust_dimension_labels=False, **kwargs):
+    def load_SES_nc(
+        self, scan_desc: dict = None, robust_dimension_labels=False, lazy=False, **kwargs
+    ):
         """Imports an hdf5 dataset exported from Igor that was originally generated in SESb format.
 
         In order to understand the structure of these files have a look at Conrad's saveSESDataset in
@@ -470,6 +576,8 @@ class SESEndstation(EndstationBase):
             scan_desc: Dictionary with extra information to attach to the xr.Dataset, must contain the location
               of the file
             robust_dimension_labels: safety control, used to load despite possibly malformed dimension names
+            lazy: Whether to defer reading the data until it is used, so that only the selections which
+              are used are read from disk. The file is kept open while the data is in use.
 
         Returns:
             Loaded data.
@@ -507,7 +615,9 @@ class SESEndstation(EndstationBase):
                 print(dimension_labels)
 
         scaling = f["/" + primary_dataset_name].attrs["IGORWaveScaling"][-len(dimension_labels) :]
-        raw_data = f["/" + primary_dataset_name][:]
+        raw_data = read_hdf5_dataset(f["/" + primary_dataset_name], lazy=lazy)
+        if not lazy:
+            f.close()
 
         scaling = [
             np.linspace(scale[1], scale[1] + scale[0] * raw_data.shape[i], raw_data.shape[i])
@@ -621,24 +731,14 @@ class FITSEndstation(EndstationBase):
 
         return [original_data_loc]
 
-    def load_single_frame(self, frame_path: str = None, scan_desc: dict = None, **kwargs):
-        """Loads a scan from a single .fits file.
-
-        This assumes the DAQ storage convention set by E. Rotenberg (possibly earlier authors)
-        for the storage of ARPES data in FITS tables.
+    def read_fits_with_astropy(self, frame_path: str):
+        """Reads a FITS file which `read_fits_table` cannot, repairing it with astropy.
 
-        This involves several complications:
-
-        1. Hydrating/extracting coordinates from start/delta/n formats
-        2. Extracting multiple scan regions
-        3. Gracefully handling missing values
-        4. Unwinding different scan conventions to common formats
-        5. Handling early scan termination
+        Returns:
+            The primary header and the binary table HDU.
         """
-        # Use dimension labels instead of
         self.trace("Opening FITS HDU list.")
         hdulist = fits.open(frame_path, ignore_missing_end=True)
-        primary_dataset_name = None
 
         # Clean the header because sometimes out LabView produces improper FITS files
         for i in range(len(hdulist)):
@@ -660,11 +760,33 @@ class FITSEndstation(EndstationBase):
             # This actually requires substantially more work because it is lossy to information
             # on the unit that was encoded
 
-        hdu = hdulist[1]
+        return dict(hdulist[0].header), hdulist[1]
+
+    def load_single_frame(self, frame_path: str = None, scan_desc: dict = None, **kwargs):
+        """Loads a scan from a single .fits file.
+
+        This assumes the DAQ storage convention set by E. Rotenberg (possibly earlier authors)
+        for the storage of ARPES data in FITS tables.
+
+        This involves several complications:
+
+        1. Hydrating/extracting coordinates from start/delta/n formats
+        2. Extracting multiple scan regions
+        3. Gracefully handling missing values
+        4. Unwinding different scan conventions to common formats
+        5. Handling early scan termination
+        """
+        try:
+            primary_header, hdu = read_fits_table(frame_path)
+            self.trace("Read FITS file directly.")
+        except ValueError as e:
+            self.trace(f"Could not read FITS file directly ({e}), falling back to astropy.")
+            primary_header, hdu = self.read_fits_with_astropy(frame_path)
 
+        primary_dataset_name = None
         scan_desc = copy.deepcopy(scan_desc)
         attrs = scan_desc.pop("note", scan_desc)
-        attrs.update(dict(hdulist[0].header))
+        attrs.update(primary_header)
 
         drop_attrs = ["COMMENT", "HISTORY", "EXTEND", "SIMPLE", "SCANPAR", "SFKE_0"]
         for dropped_attr in drop_attrs:
@@ -747,17 +869,17 @@ class FITSEndstation(EndstationBase):
             # If we are confident in our parsing code above, we can handle this case and take a subset of the coords
             # so that the data matches
             try:
-                resized_data = hdu.data.columns[column_name].array.reshape(column_shape)
+                resized_data = hdu.data.field(column_name).reshape(column_shape)
             except ValueError:
                 # if we could not resize appropriately, we will try to reify the shapes together
                 rest_column_shape = column_shape[1:]
                 n_per_slice = int(np.prod(rest_column_shape))
-                total_shape = hdu.data.columns[column_name].array.shape
+                total_shape = hdu.data.field(column_name).shape
                 total_n = np.prod(total_shape)
 
                 n_slices = total_n // n_per_slice
                 # if this isn't true, we can't recover
-                data_for_resize = hdu.data.columns[column_name].array
+                data_for_resize = hdu.data.field(column_name)
                 if total_n // n_per_slice != total_n / n_per_slice:
                     # the last slice was in the middle of writing when something hit the fan
                     # we need to infer how much of the data to read, and then repeat the above
@@ -927,7 +1049,13 @@ def resolve_endstation(retry=True, **kwargs) -> type:
 
 
 @traceable
-def load_scan(scan_desc: Dict[str, str], retry=True, trace=None, **kwargs: Any) -> xr.Dataset:
+def load_scan(
+    scan_desc: Dict[str, str],
+    retry=True,
+    trace=None,
+    cache: Optional[bool] = None,
+    **kwargs: Any,
+) -> xr.Dataset:
     """Resolves a plugin and delegates loading a scan.
 
     This is used interally by `load_data` and should not be invoked directly
@@ -941,6 +1069,8 @@ def load_scan(scan_desc: Dict[str, str], retry=True, trace=None, **kwargs: Any)
         scan_desc: Information identifying the scan, typically a scan number or full path.
         retry: Used to attempt a reload of plugins and subsequent data load attempt.
         trace: Trace instance for debugging, pass True or False (default) to control this parameter
+        cache: Whether to use the on-disk cache of loaded scans, see `arpes.endstations.cache`.
+          Defaults to `arpes.config.SETTINGS["load_cache"]["enabled"]`.
         kwargs:
 
     Returns:
@@ -967,4 +1097,28 @@ def load_scan(scan_desc: Dict[str, str], retry=True, trace=None, **kwargs: Any)
     trace(f"Loading {scan_desc}")
     endstation = endstation_cls()
     endstation.trace = trace
-    return endstation.load(scan_desc, trace=trace, **kwargs)
+
+    if cache is None:
+        cache = arpes.config.SETTINGS["load_cache"]["enabled"]
+
+    # writing lazily loaded scans to the cache would read them in full
+    cached_as = None
+    if cache and not kwargs.get("lazy", False):
+        from arpes.endstations.cache import cache_key, read_cached_scan, write_cached_scan
+
+        try:
+            files = [str(f) for f in endstation.resolve_frame_locations(scan_desc)]
+        except Exception:  # pylint: disable=broad-except
+            files = [str(file)]
+
+        cached_as = cache_key(endstation_cls, files, scan_desc, kwargs)
+        cached = read_cached_scan(cached_as) if cached_as is not None else None
+        if cached is not None:
+            trace(f"Loaded from cache {cached_as}")
+            return cached
+
+    loaded = endstation.load(scan_desc, trace=trace, **kwargs)
+    if cached_as is not None:
+        write_cached_scan(cached_as, loaded)
+
+    return loaded
@@ -0,0 +1,261 @@
+"""A persistent on-disk cache of loaded scans.
+
+Loading raw data means parsing and repairing headers, rebuilding coordinates, and reading
+every frame of a scan. When the same scans are loaded again in a later session, none of
+this work needs to be repeated: the normalized data produced by a plugin is stored in a
+compressed NetCDF4 file and read back directly.
+
+Entries are keyed by the path, modification time, and size of every file making up a scan,
+together with the plugin, the PyARPES version, and the arguments used to load the scan, so
+that changes to any of these are never served stale data. The cache is bounded in size,
+evicting the least recently used scans first.
+
+The cache is used when `load_data` is called with `cache=True`, or by default when
+`arpes.config.SETTINGS["load_cache"]["enabled"]` is set.
+"""
+
+import base64
+import datetime
+import hashlib
+import json
+import os
+import warnings
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import xarray as xr
+
+import arpes
+import arpes.config
+
+__all__ = (
+    "cache_key",
+    "clear_load_cache",
+    "load_cache_path",
+    "user_cache_directory",
+    "read_cached_scan",
+    "write_cached_scan",
+)
+
+# the attribute holding the serialized attributes of each variable and the dataset
+ATTRS_KEY = "_arpes_attrs"
+
+CACHE_SUFFIX = ".nc"
+
+
+def user_cache_directory() -> Path:
+    """The directory in the user's cache directory for PyARPES."""
+    root = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(root) / "arpes"
+
+
+def load_cache_path() -> Path:
+    """The directory holding cached scans.
+
+    This is `SETTINGS["load_cache"]["path"]` if set, otherwise a directory in the user's
+    cache directory.
+    """
+    path = arpes.config.SETTINGS["load_cache"]["path"]
+    if path is None:
+        path = user_cache_directory() / "scans"
+
+    return Path(path)
+
+
+def _fingerprint(path: str) -> Dict[str, Any]:
+    stat = os.stat(path)
+    return {
+        "path": str(Path(path).resolve()),
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+    }
+
+
+def cache_key(
+    endstation_cls: type, files: List[str], scan_desc: Dict[str, Any], kwargs: Dict[str, Any]
+) -> Optional[str]:
+    """A key identifying a scan, the plugin and the arguments used to load it.
+
+    Args:
+        endstation_cls: The plugin loading the scan
+        files: The files making up the scan
+        scan_desc: The description of the scan
+        kwargs: Additional arguments used to load the scan
+
+    Returns:
+        The key, or None if the scan cannot be cached, because its files do not
+        exist or its arguments have no stable representation.
+    """
+    description = {
+        "plugin": "{}.{}".format(endstation_cls.__module__, endstation_cls.__qualname__),
+        "version": arpes.VERSION,
+        "files": [],
+        "scan_desc": sorted((str(k), repr(v)) for k, v in scan_desc.items()),
+        "kwargs": sorted((str(k), repr(v)) for k, v in kwargs.items()),
+    }
+
+    # object reprs include memory addresses and change between sessions
+    if any(" at 0x" in v for _, v in description["scan_desc"] + description["kwargs"]):
+        return None
+
+    try:
+        description["files"] = [_fingerprint(f) for f in files]
+    except (OSError, TypeError):
+        return None
+
+    return hashlib.sha256(repr(description).encode()).hexdigest()
+
+
+def _to_json(value: Any) -> Any:
+    """Converts an attribute value into plain JSON types.
+
+    Values which JSON cannot represent (tuples, numpy scalars and arrays, dates, bytes,
+    dictionaries with keys other than strings) are tagged so that `_from_json` restores them.
+
+    Raises:
+        TypeError: If the value cannot be stored.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+
+    if isinstance(value, dict):
+        if all(isinstance(k, str) for k in value):
+            return {k: _to_json(v) for k, v in value.items()}
+
+        return {"__items__": [[_to_json(k), _to_json(v)] for k, v in value.items()]}
+
+    if isinstance(value, (list, tuple)):
+        items = [_to_json(v) for v in value]
+        return items if isinstance(value, list) else {"__tuple__": items}
+
+    if isinstance(value, np.ndarray):
+        items = value.astype(str) if value.dtype.kind in "mM" else value
+        return {"__ndarray__": _to_json(items.tolist()), "dtype": value.dtype.str}
+
+    if isinstance(value, np.generic):
+        item = str(value) if value.dtype.kind in "mM" else value.item()
+        return {"__numpy__": _to_json(item), "dtype": value.dtype.str}
+
+    # subclasses, such as pandas timestamps, are restored as the standard library type
+    for kind in (datetime.datetime, datetime.date, datetime.time):
+        if isinstance(value, kind):
+            return {"__datetime__": value.isoformat(), "type": kind.__name__}
+
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+
+    raise TypeError("Attributes of type {} cannot be cached.".format(type(value).__name__))
+
+
+def _from_json(value: Dict[str, Any]) -> Any:
+    """Restores a value tagged by `_to_json`, used as the `object_hook` when decoding."""
+    if "__items__" in value:
+        return dict(value["__items__"])
+
+    if "__tuple__" in value:
+        return tuple(value["__tuple__"])
+
+    if "__ndarray__" in value:
+        return np.array(value["__ndarray__"], dtype=np.dtype(value["dtype"]))
+
+    if "__numpy__" in value:
+        return np.array(value["__numpy__"], dtype=np.dtype(value["dtype"]))[()]
+
+    if "__datetime__" in value:
+        return getattr(datetime, value["type"]).fromisoformat(value["__datetime__"])
+
+    if "__bytes__" in value:
+        return base64.b64decode(value["__bytes__"])
+
+    return value
+
+
+def _encode_attrs(attrs: Dict[str, Any]) -> str:
+    return json.dumps(_to_json(dict(attrs)))
+
+
+def _decode_attrs(encoded: str) -> Dict[str, Any]:
+    return json.loads(encoded, object_hook=_from_json)
+
+
+def read_cached_scan(key: str) -> Optional[xr.Dataset]:
+    """Reads a scan from the cache, or returns None if it has not been cached."""
+    path = load_cache_path() / (key + CACHE_SUFFIX)
+    if not path.exists():
+        return None
+
+    # entries which cannot be read, including those written in an older format, are discarded
+    try:
+        with xr.open_dataset(path, engine="netcdf4") as stored:
+            data = stored.load()
+
+        for variable in list(data.variables.values()) + [data]:
+            variable.attrs = (
+                _decode_attrs(variable.attrs[ATTRS_KEY]) if ATTRS_KEY in variable.attrs else {}
+            )
+    except Exception:  # pylint: disable=broad-except
+        path.unlink(missing_ok=True)
+        return None
+
+    # mark the entry as recently used, for eviction
+    os.utime(path)
+    return data
+
+
+def write_cached_scan(key: str, data: xr.Dataset) -> None:
+    """Stores a scan in the cache, and evicts old scans if the cache is too large.
+
+    Scans which cannot be stored are not cached, with a warning.
+    """
+    directory = load_cache_path()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / (key + CACHE_SUFFIX)
+    partial = directory / (key + ".partial")
+
+    try:
+        # attributes are stored as one JSON attribute per variable, because NetCDF cannot
+        # hold the nested and non-string values they typically contain
+        stored = data.copy()
+        for variable in list(stored.variables.values()) + [stored]:
+            variable.attrs = {ATTRS_KEY: _encode_attrs(variable.attrs)}
+            variable.encoding = {}
+
+        encoding = {
+            name: {"zlib": True, "complevel": 1}
+            for name, variable in stored.variables.items()
+            if variable.dtype.kind in "iuf" and variable.ndim > 0
+        }
+
+        stored.to_netcdf(partial, engine="netcdf4", encoding=encoding)
+        os.replace(partial, path)
+    except Exception as e:  # pylint: disable=broad-except
+        partial.unlink(missing_ok=True)
+        warnings.warn("Could not cache scan: {}".format(e))
+        return
+
+    evict(arpes.config.SETTINGS["load_cache"]["max_size"])
+
+
+def evict(max_size: int) -> None:
+    """Removes the least recently used scans until the cache is at most `max_size` bytes."""
+    entries = []
+    for path in load_cache_path().glob("*" + CACHE_SUFFIX):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def clear_load_cache() -> None:
+    """Removes all cached scans."""
+    evict(0)
@@ -0,0 +1,257 @@
+"""Event mode data from delay line detectors, recorded as a list of electrons.
+
+Instead of an image accumulated by the DAQ, event mode files record every detected electron,
+as columns of its detector position ("x", "y"), time of flight ("t"), and, where available,
+spin channel ("spin") and acquisition cycle ("cycle"). The columns are stored in an HDF5
+entry "EVENTS", which is either a compound dataset with one field per column or a group
+with one dataset per column.
+
+Event lists can be far larger than memory, so they are read in chunks by
+`iterate_event_chunks`, and histogrammed chunk by chunk by `histogram_events`. Each chunk can
+be transformed to physical coordinates, for instance (phi, eV) or (kx, ky, eV), before it is
+binned, so that the histogram is made directly in the coordinates of interest. Since the
+events are kept, they can be histogrammed again with different bins at any time. Fine
+histograms can also be rebinned, conserving counts, with `rebin_histogram`.
+"""
+
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import h5py
+import numba
+import numpy as np
+import xarray as xr
+
+from arpes.utilities.binning import apply_axis_weights, bin_edges, overlap_weights
+
+__all__ = (
+    "EVENT_COLUMNS",
+    "event_columns",
+    "iterate_event_chunks",
+    "histogram_events",
+    "read_event_histogram",
+    "rebin_histogram",
+)
+
+EVENT_COLUMNS = ("x", "y", "t", "spin", "cycle")
+DEFAULT_CHUNK_SIZE = 2**22
+
+# the 512 x 512 pixel images recorded by the DAQ
+DETECTOR_PIXEL_BINS = (-0.5, 511.5, 512)
+SPIN_BINS = (-0.5, 1.5, 2)
+
+EventChunk = Dict[str, np.ndarray]
+Bins = Union[np.ndarray, Tuple[float, float, int]]
+
+
+def event_columns(source: Union[h5py.Dataset, h5py.Group]) -> List[str]:
+    """The names of the columns of an event list."""
+    if isinstance(source, h5py.Dataset):
+        return list(source.dtype.names or [])
+
+    return [name for name in source if isinstance(source[name], h5py.Dataset)]
+
+
+def iterate_event_chunks(
+    source: Union[h5py.Dataset, h5py.Group],
+    columns: Optional[Sequence[str]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[EventChunk]:
+    """Reads the columns of an event list in chunks of `chunk_size` events.
+
+    Args:
+        source: A compound dataset, or a group of one dimensional datasets, of events
+        columns: The columns to read. Defaults to all of `EVENT_COLUMNS` which are present.
+        chunk_size: The number of events in each chunk
+
+    Yields:
+        Dictionaries from column names to the values of each column for a chunk of events.
+    """
+    available = event_columns(source)
+    if isinstance(source, h5py.Dataset):
+        n_events = len(source)
+    else:
+        n_events = min(len(source[name]) for name in available)
+
+    if columns is None:
+        columns = [c for c in EVENT_COLUMNS if c in available]
+
+    missing = set(columns).difference(available)
+    if missing:
+        raise ValueError(f"Event list has no columns {sorted(missing)}, only {available}")
+
+    for start in range(0, n_events, chunk_size):
+        stop = min(start + chunk_size, n_events)
+        if isinstance(source, h5py.Dataset):
+            rows = source.fields(list(columns))[start:stop]
+            yield {c: rows[c] for c in columns}
+        else:
+            yield {c: source[c][start:stop] for c in columns}
+
+
+def _normalize_bins(bins: Bins) -> np.ndarray:
+    if isinstance(bins, tuple):
+        start, stop, n_bins = bins
+        return np.linspace(start, stop, int(n_bins) + 1)
+
+    return np.asarray(bins, dtype=np.float64)
+
+
+@numba.njit(parallel=True, cache=True)
+def _flat_bin_indices(coordinates, edges, edge_offsets, uniform, strides, indices):
+    """Finds the flattened histogram bin of each event, or -1 for events outside of the bins.
+
+    As for `np.histogramdd`, bins include their lower edge, and the last bin its upper edge.
+    """
+    n_dims = coordinates.shape[0]
+    for i in numba.prange(coordinates.shape[1]):
+        flat = 0
+        for d in range(n_dims):
+            dim_edges = edges[edge_offsets[d] : edge_offsets[d + 1]]
+            n_bins = len(dim_edges) - 1
+            low, high = dim_edges[0], dim_edges[-1]
+            x = coordinates[d, i]
+            if not (x >= low and x <= high):
+                flat = -1
+                break
+
+            if uniform[d]:
+                b = int((x - low) / (high - low) * n_bins)
+            else:
+                b = np.searchsorted(dim_edges, x, side="right") - 1
+
+            b = min(max(b, 0), n_bins - 1)
+            flat += b * strides[d]
+
+        indices[i] = flat
+
+
+def histogram_events(
+    chunks: Iterable[EventChunk],
+    bins: Dict[str, Bins],
+    transform: Optional[Callable[[EventChunk], EventChunk]] = None,
+) -> xr.DataArray:
+    """Histograms events, accumulating counts chunk by chunk.
+
+    The bins of each event are found in parallel over the events of a chunk, so that only
+    one chunk of events is in memory at a time.
+
+    Example:
+        Binning in kinetic energy and detector position, with `time_to_kinetic_energy`
+        converting times of flight::
+
+            histogram_events(
+                iterate_event_chunks(f["EVENTS"]),
+                bins={"x_pixels": (-0.5, 511.5, 512), "eV": (1, 10, 900)},
+                transform=lambda e: {"x_pixels": e["x"], "eV": time_to_kinetic_energy(e["t"])},
+            )
+
+    Args:
+        chunks: The chunks of events, as given by `iterate_event_chunks`
+        bins: For each dimension of the histogram, the bin edges or a tuple of
+          (start, stop, number of bins). Each dimension is binned on the column of the same
+          name of the (transformed) events.
+        transform: Converts a chunk of events to the coordinates which are binned, such as
+          angles and energies
+
+    Returns:
+        The counts in each bin, with the bin centers as coordinates.
+    """
+    dims = list(bins)
+    edges = [_normalize_bins(bins[d]) for d in dims]
+    shape = tuple(len(e) - 1 for e in edges)
+
+    edge_offsets = np.cumsum([0] + [len(e) for e in edges]).astype(np.int64)
+    uniform = np.array([np.allclose(np.diff(e), e[1] - e[0]) for e in edges])
+    strides = np.cumprod((shape[1:] + (1,))[::-1])[::-1].astype(np.int64)
+    flat_edges = np.concatenate(edges)
+
+    counts = np.zeros(int(np.prod(shape)), dtype=np.int64)
+    for chunk in chunks:
+        if transform is not None:
+            chunk = transform(chunk)
+
+        coordinates = np.stack([np.asarray(chunk[d], dtype=np.float64) for d in dims])
+        indices = np.empty(coordinates.shape[1], dtype=np.int64)
+        _flat_bin_indices(coordinates, flat_edges, edge_offsets, uniform, strides, indices)
+        counts += np.bincount(indices[indices >= 0], minlength=len(counts))
+
+    return xr.DataArray(
+        counts.reshape(shape),
+        coords={d: (e[1:] + e[:-1]) / 2 for d, e in zip(dims, edges)},
+        dims=dims,
+    )
+
+
+def read_event_histogram(
+    source: Union[h5py.Dataset, h5py.Group],
+    bins: Optional[Dict[str, Bins]] = None,
+    transform: Optional[Callable[[EventChunk], EventChunk]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> xr.DataArray:
+    """Histograms an event list from a delay line detector file.
+
+    By default, events are binned by detector pixel, giving the same image with dimensions
+    ("x_pixels", "t_pixels") as the DAQ records, with the timing axis reversed as when
+    images are loaded, and the spin channel as a further dimension if it was recorded.
+
+    Args:
+        source: The event list
+        bins: The bins of the histogram, see `histogram_events`. Defaults to the detector
+          pixels.
+        transform: Converts events to the binned coordinates, see `histogram_events`
+        chunk_size: The number of events read and binned at once
+
+    Returns:
+        The histogram of the events.
+    """
+    columns = None
+    if bins is None:
+        columns = [c for c in ("x", "t", "spin") if c in event_columns(source)]
+        bins = {"x_pixels": DETECTOR_PIXEL_BINS, "t_pixels": DETECTOR_PIXEL_BINS}
+        if "spin" in columns:
+            bins["spin"] = SPIN_BINS
+
+        def to_pixels(events: EventChunk) -> EventChunk:
+            pixels = {
+                "x_pixels": events["x"],
+                "t_pixels": DETECTOR_PIXEL_BINS[2] - 1 - np.asarray(events["t"], dtype=np.float64),
+            }
+            if "spin" in events:
+                pixels["spin"] = events["spin"]
+            return pixels
+
+        transform = to_pixels
+
+    return histogram_events(iterate_event_chunks(source, columns, chunk_size), bins, transform)
+
+
+def rebin_histogram(histogram: xr.DataArray, **bins: Bins) -> xr.DataArray:
+    """Rebins a histogram to new bins along some of its dimensions, conserving counts.
+
+    Counts are split between overlapping new bins in proportion to the overlap, so that
+    histograms can be made finely once and rebinned to any coarser resolution afterwards.
+    The edges of the old bins are taken halfway between their centers.
+
+    Args:
+        histogram: The histogram to rebin
+        bins: For each rebinned dimension, the new bin edges or a tuple of
+          (start, stop, number of bins)
+
+    Returns:
+        The rebinned histogram, with the new bin centers as coordinates.
+    """
+    values = histogram.values
+    coords = dict(histogram.coords)
+    for dim, dim_bins in bins.items():
+        old_centers = histogram.coords[dim].values
+        new_edges = _normalize_bins(dim_bins)
+        flipped = old_centers[0] > old_centers[-1]
+        old_edges = bin_edges(old_centers[::-1] if flipped else old_centers)
+
+        axis = histogram.dims.index(dim)
+        if flipped:
+            values = np.flip(values, axis)
+        values = apply_axis_weights(values, overlap_weights(old_edges, new_edges), axis)
+        coords[dim] = (new_edges[1:] + new_edges[:-1]) / 2
+
+    return xr.DataArray(values, coords=coords, dims=histogram.dims, attrs=histogram.attrs)
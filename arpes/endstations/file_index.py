@@ -0,0 +1,259 @@
+"""An index of data directories, used to find scans by number without listing directories.
+
+Finding the file for a scan number means listing every search directory of a plugin and
+matching every file against the plugin's filename patterns. On network storage with tens
+of thousands of files this takes seconds, and it is repeated for every plugin tried when
+the location of the data is not given, and for every scan loaded.
+
+Instead, the listing of each directory is kept in a `DirectoryIndex`, together with a map
+from scan numbers to files which is parsed from the listing once, see
+`EndstationBase.scan_files`. Indices are held in memory and persisted to the user's cache
+directory whenever a listing is built, so that later sessions can reuse them. An index is
+invalidated by polling: it records the modification times of the directory and of its
+immediate subdirectories, which change whenever entries are added, removed, or renamed,
+and is rebuilt when they no longer match. Checking an index costs one `stat` per directory
+instead of a listing, and looking up a scan number is a dictionary access. Other lookups,
+for plugins whose filenames cannot be parsed ahead of time, are matched against the listing
+and remembered.
+
+The index is controlled by `arpes.config.SETTINGS["file_index"]`: "enabled" turns it on or
+off, and "path" sets where indices are persisted.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import arpes.config
+from arpes.endstations.cache import user_cache_directory
+
+__all__ = (
+    "DirectoryIndex",
+    "clear_file_index",
+    "file_index_path",
+)
+
+# directories modified more recently than this many seconds ago may still be changing
+# within the resolution of their modification time, so their indices are not reused
+SETTLE_TIME = 2.0
+
+_indices: Dict[str, "DirectoryIndex"] = {}
+
+
+def file_index_path() -> Path:
+    """The directory holding persisted indices.
+
+    This is `SETTINGS["file_index"]["path"]` if set, otherwise a directory in the user's
+    cache directory.
+    """
+    path = arpes.config.SETTINGS["file_index"]["path"]
+    if path is None:
+        path = user_cache_directory() / "file_index"
+
+    return Path(path)
+
+
+def _plugin_key(endstation_cls: type) -> str:
+    return "{}.{}".format(endstation_cls.__module__, endstation_cls.__qualname__)
+
+
+class DirectoryIndex:
+    """The listing of a directory and the scans found in it by each plugin.
+
+    Use `DirectoryIndex.for_directory` to get an up to date index for a directory.
+
+    Args:
+        directory: The indexed directory
+        fingerprint: The modification times of the directory and its subdirectories
+        subdirectories: The names of the subdirectories of the directory
+        listings: The candidate files for each plugin, as given by `.files_for_search`
+        scan_files: For each plugin, the file for each scan number as given by `.scan_files`,
+          or None if the plugin's filenames cannot be parsed ahead of time
+        scans: For each plugin and requested scan which is not a scan number in `scan_files`,
+          the file found, or None
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        fingerprint: List[int],
+        subdirectories: List[str],
+        listings: Optional[Dict[str, List[str]]] = None,
+        scan_files: Optional[Dict[str, Optional[Dict[str, str]]]] = None,
+        scans: Optional[Dict[str, Optional[str]]] = None,
+    ):
+        """Records the index of `directory`."""
+        self.directory = directory
+        self.fingerprint = fingerprint
+        self.subdirectories = subdirectories
+        self.listings = listings or {}
+        self.scan_files = scan_files or {}
+        self.scans = scans or {}
+
+    @staticmethod
+    def _stat_fingerprint(directory: str, subdirectories: List[str]) -> List[int]:
+        """The current modification times of `directory` and `subdirectories`.
+
+        Raises:
+            FileNotFoundError: If `directory` does not exist or is not a directory.
+        """
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(directory)
+
+        fingerprint = [os.stat(directory).st_mtime_ns]
+        for subdirectory in subdirectories:
+            try:
+                fingerprint.append(os.stat(os.path.join(directory, subdirectory)).st_mtime_ns)
+            except OSError:
+                fingerprint.append(-1)
+
+        return fingerprint
+
+    @property
+    def is_settled(self) -> bool:
+        """Whether the directory was last modified long enough ago to trust the index."""
+        return time.time() - max(self.fingerprint) / 1e9 > SETTLE_TIME
+
+    @property
+    def persisted_path(self) -> Path:
+        """Where this index is persisted."""
+        digest = hashlib.sha256(os.path.abspath(self.directory).encode()).hexdigest()
+        return file_index_path() / "{}.json".format(digest[:32])
+
+    @classmethod
+    def build(cls, directory: str) -> "DirectoryIndex":
+        """Indexes `directory` from scratch.
+
+        Raises:
+            FileNotFoundError: If `directory` does not exist or is not a directory.
+        """
+        with os.scandir(directory) as entries:
+            subdirectories = sorted(e.name for e in entries if e.is_dir())
+
+        return cls(directory, cls._stat_fingerprint(directory, subdirectories), subdirectories)
+
+    @classmethod
+    def _read(cls, directory: str) -> Optional["DirectoryIndex"]:
+        index = cls(directory, [], [])
+        try:
+            with open(index.persisted_path, "r") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if stored.get("directory") != os.path.abspath(directory) or "scan_files" not in stored:
+            return None
+
+        return cls(
+            directory,
+            stored["fingerprint"],
+            stored["subdirectories"],
+            stored["listings"],
+            stored["scan_files"],
+            stored["scans"],
+        )
+
+    def save(self) -> None:
+        """Persists the index, if the directory has settled. Failures are ignored."""
+        if not self.is_settled:
+            return
+
+        path = self.persisted_path
+        partial = path.with_suffix(".partial")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(partial, "w") as f:
+                json.dump(
+                    {
+                        "directory": os.path.abspath(self.directory),
+                        "fingerprint": self.fingerprint,
+                        "subdirectories": self.subdirectories,
+                        "listings": self.listings,
+                        "scan_files": self.scan_files,
+                        "scans": self.scans,
+                    },
+                    f,
+                )
+            os.replace(partial, path)
+        except OSError:
+            pass
+
+    @classmethod
+    def for_directory(cls, directory: str) -> "DirectoryIndex":
+        """An up to date index of `directory`, reusing the index in memory or on disk if valid.
+
+        Raises:
+            FileNotFoundError: If `directory` does not exist or is not a directory.
+        """
+        index = _indices.get(directory)
+        if index is None:
+            index = cls._read(directory)
+
+        if index is not None:
+            current = cls._stat_fingerprint(directory, index.subdirectories)
+            if current != index.fingerprint or not index.is_settled:
+                index = None
+
+        if index is None:
+            index = cls.build(directory)
+
+        _indices[directory] = index
+        return index
+
+    def files_for(self, endstation_cls: type) -> List[str]:
+        """The candidate files for `endstation_cls`, see `EndstationBase.files_for_search`.
+
+        The first time a plugin lists the directory, its filenames are parsed into scan
+        numbers and the index is persisted.
+        """
+        key = _plugin_key(endstation_cls)
+        if key not in self.listings:
+            self.listings[key] = list(endstation_cls.files_for_search(self.directory))
+            self.scan_files[key] = endstation_cls.scan_files(self.listings[key])
+            self.save()
+
+        return self.listings[key]
+
+    def find(
+        self,
+        endstation_cls: type,
+        file: Any,
+        allow_soft_match: bool,
+        match: Callable[[List[str]], Optional[str]],
+    ) -> Optional[str]:
+        """The file in the directory for the scan `file`, as found by `match`, or None.
+
+        Scan numbers are looked up in the parsed filenames. Other scans are found with
+        `match`, and remembered in memory.
+
+        Args:
+            endstation_cls: The plugin looking for the scan
+            file: The requested scan
+            allow_soft_match: Whether the plugin allows soft matches
+            match: Finds the file for the scan among the candidate files of the plugin
+
+        Returns:
+            The name of the file relative to the directory, or None if there is none.
+        """
+        files = self.files_for(endstation_cls)
+        scan_files = self.scan_files[_plugin_key(endstation_cls)]
+
+        scan = str(file)
+        if scan_files is not None and scan.isdecimal() and scan == str(int(scan)):
+            return scan_files.get(scan)
+
+        key = "{}|{}|{}".format(_plugin_key(endstation_cls), file, allow_soft_match)
+        if key not in self.scans:
+            self.scans[key] = match(files)
+
+        return self.scans[key]
+
+
+def clear_file_index() -> None:
+    """Forgets all indices, in memory and on disk."""
+    _indices.clear()
+    for path in file_index_path().glob("*.json"):
+        path.unlink(missing_ok=True)
@@ -0,0 +1,252 @@
+"""A direct reader for the FITS files written by the MAESTRO and Lanzara group LabView DAQs.
+
+These files hold the scan metadata in the primary header and all of the recorded data in a
+single binary table, one row per scan point. Opening them with astropy is slow: the headers
+are not quite standard, so they have to be repaired and verified card by card, and every
+header card and table column is decoded separately.
+
+Instead, `read_fits_table` parses the header cards directly from the file, repairing the
+known bad cards in place, and maps the binary table into memory as one structured array,
+whose columns are views onto the file. Files using FITS features these DAQs do not write,
+such as scaled or variable length columns, are rejected with a `ValueError`, so that they
+can be read with astropy instead.
+"""
+
+import re
+from collections import namedtuple
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union
+
+import numpy as np
+
+__all__ = (
+    "FITSTable",
+    "read_fits_table",
+)
+
+BLOCK_SIZE = 2880
+CARD_SIZE = 80
+
+COMMENTARY_KEYWORDS = {"", "COMMENT", "HISTORY"}
+
+# binary table column types, see Table 18 of the FITS standard
+BINTABLE_TYPES = {
+    "B": "u1",
+    "I": ">i2",
+    "J": ">i4",
+    "K": ">i8",
+    "E": ">f4",
+    "D": ">f8",
+    "C": ">c8",
+    "M": ">c16",
+}
+
+TFORM_PATTERN = re.compile(r"^\s*(\d*)([A-Z])")
+INT_PATTERN = re.compile(r"^[+-]?\d+$")
+FLOAT_PATTERN = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)([DE][+-]?\d+)?$")
+STRING_PATTERN = re.compile(r"^\s*'((?:[^']|'')*)'")
+
+Columns = namedtuple("Columns", ["names"])
+
+
+class FITSTable:
+    """A binary table HDU read by `read_fits_table`.
+
+    This provides the parts of the interface of astropy's `BinTableHDU` which are used to
+    load data, so that it can be passed to `find_clean_coords`.
+
+    Args:
+        header: The header cards of the table
+        data: The rows of the table
+    """
+
+    def __init__(self, header: Dict[str, Any], data: np.ndarray):
+        """Wraps the rows `data` of a table with `header`."""
+        self.header = header
+        self.data = data.view(np.recarray)
+        self.columns = Columns(list(data.dtype.names))
+
+
+def _card(keyword: str, value: str) -> bytes:
+    return "{:<8}= '{}'".format(keyword, value).ljust(CARD_SIZE).encode("ascii")
+
+
+def _parse_value(card: bytes) -> Any:
+    """The value of a header card, decoded as astropy would after fixing the card.
+
+    Values which are not valid FITS, such as the unquoted "Inf" and "NaN" written by LabView,
+    are kept as strings.
+    """
+    value_field = card[10:].decode("ascii", errors="replace")
+
+    string_match = STRING_PATTERN.match(value_field)
+    if string_match:
+        return string_match.group(1).replace("''", "'").rstrip()
+
+    value = value_field.split("/", 1)[0].strip()
+    if value in ("T", "F"):
+        return value == "T"
+    if INT_PATTERN.match(value):
+        return int(value)
+    if FLOAT_PATTERN.match(value):
+        return float(value.replace("D", "E"))
+
+    return value
+
+
+def _read_header(buffer: np.ndarray, offset: int) -> Tuple[List[bytes], int]:
+    """The cards of the header starting at `offset`, and the offset of its data."""
+    cards = []
+    position = offset
+    while position + BLOCK_SIZE <= len(buffer):
+        block = bytes(buffer[position : position + BLOCK_SIZE])
+        position += BLOCK_SIZE
+
+        for start in range(0, BLOCK_SIZE, CARD_SIZE):
+            card = block[start : start + CARD_SIZE]
+            if card.startswith(b"END     ") or card.rstrip() == b"END":
+                return cards, position
+
+            cards.append(card)
+
+    raise ValueError("FITS header has no END card")
+
+
+def _repair_cards(cards: List[bytes]) -> List[bytes]:
+    """Replaces header cards the LabView DAQs are known to write improperly.
+
+    The units of the first scan loop (UN_0_0) are frequently malformed and are cleared.
+    Main chamber delay scans record their delays in picoseconds without saying so.
+    """
+    keywords = [c[:8].rstrip() for c in cards]
+    repaired = [
+        _card("UN_0_0", "") if keyword == b"UN_0_0" else card
+        for keyword, card in zip(keywords, cards)
+    ]
+    if b"UN_0_0" not in keywords:
+        repaired.append(_card("UN_0_0", ""))
+
+    if b"TTYPE2" in keywords and _parse_value(cards[keywords.index(b"TTYPE2")]) == "Delay":
+        repaired = [c for c in repaired if c[:8].rstrip() != b"TUNIT2"]
+        repaired.append(_card("TUNIT2", "ps"))
+
+    return repaired
+
+
+def _decode_cards(cards: List[bytes]) -> Dict[str, Any]:
+    """Decodes cards to a dictionary, keeping the first value of repeated keywords.
+
+    Commentary cards are dropped and long strings continued over several cards are joined.
+    """
+    header = {}
+    last_keyword = None
+    for card in cards:
+        keyword = card[:8].decode("ascii", errors="replace").rstrip()
+        if keyword == "CONTINUE" and isinstance(header.get(last_keyword), str):
+            if header[last_keyword].endswith("&"):
+                header[last_keyword] = header[last_keyword][:-1] + _parse_value(
+                    card[:8] + b"= " + card[10:]
+                )
+            continue
+
+        if keyword in COMMENTARY_KEYWORDS or card[8:10] != b"= ":
+            continue
+
+        if keyword not in header:
+            header[keyword] = _parse_value(card)
+            last_keyword = keyword
+
+    return header
+
+
+def _data_size(header: Dict[str, Any]) -> int:
+    """The number of bytes of data following a header, including padding."""
+    n_axes = header.get("NAXIS", 0)
+    if not n_axes:
+        return 0
+
+    n_values = int(np.prod([header[f"NAXIS{i + 1}"] for i in range(n_axes)]))
+    n_values = header.get("GCOUNT", 1) * (n_values + header.get("PCOUNT", 0))
+    size = abs(header["BITPIX"]) // 8 * n_values
+    return -(-size // BLOCK_SIZE) * BLOCK_SIZE
+
+
+def _table_dtype(header: Dict[str, Any]) -> np.dtype:
+    """The structured dtype of the rows of a binary table.
+
+    Raises:
+        ValueError: If the table uses features which are not supported.
+    """
+    if header.get("PCOUNT", 0) or header.get("THEAP"):
+        raise ValueError("Variable length columns are not supported")
+
+    names, formats, offsets = [], [], []
+    offset = 0
+    for i in range(1, header["TFIELDS"] + 1):
+        if f"TSCAL{i}" in header or f"TZERO{i}" in header:
+            raise ValueError("Scaled columns are not supported")
+
+        match = TFORM_PATTERN.match(header[f"TFORM{i}"])
+        if match is None:
+            raise ValueError("Invalid column format {}".format(header[f"TFORM{i}"]))
+
+        repeat, code = int(match.group(1) or 1), match.group(2)
+        if code == "A":
+            dtype, shape = np.dtype(f"S{repeat}"), ()
+        elif code in BINTABLE_TYPES:
+            dtype, shape = np.dtype(BINTABLE_TYPES[code]), (repeat,)
+            if f"TDIM{i}" in header:
+                dims = header[f"TDIM{i}"].strip("() ").split(",")
+                shape = tuple(int(d) for d in dims[::-1])
+            elif repeat == 1:
+                shape = ()
+        else:
+            raise ValueError(f"Column type {code} is not supported")
+
+        names.append(header[f"TTYPE{i}"])
+        formats.append((dtype, shape) if shape else dtype)
+        offsets.append(offset)
+        offset += dtype.itemsize * int(np.prod(shape))
+
+    if offset != header["NAXIS1"]:
+        raise ValueError("Column sizes do not match the row size of the table")
+
+    return np.dtype(
+        {"names": names, "formats": formats, "offsets": offsets, "itemsize": header["NAXIS1"]}
+    )
+
+
+def read_fits_table(path: Union[Path, str]) -> Tuple[Dict[str, Any], FITSTable]:
+    """Reads the primary header and the first binary table of a FITS file from a LabView DAQ.
+
+    The file is mapped into memory copy-on-write, and the columns of the table are views
+    onto it in the big-endian byte order of FITS.
+
+    Args:
+        path: The path to the FITS file
+
+    Returns:
+        The primary header, without commentary cards, and the binary table.
+
+    Raises:
+        ValueError: If the file does not follow the conventions of the LabView DAQs, for
+          instance if it has no binary table, uses unsupported column types, or is truncated.
+    """
+    buffer = np.memmap(path, dtype=np.uint8, mode="c")
+
+    primary_cards, offset = _read_header(buffer, 0)
+    primary_header = _decode_cards(_repair_cards(primary_cards))
+    offset += _data_size(primary_header)
+
+    table_cards, offset = _read_header(buffer, offset)
+    table_header = _decode_cards(_repair_cards(table_cards))
+    if table_header.get("XTENSION") != "BINTABLE":
+        raise ValueError("The first extension is not a binary table")
+
+    dtype = _table_dtype(table_header)
+    n_rows = table_header["NAXIS2"]
+    if offset + dtype.itemsize * n_rows > len(buffer):
+        raise ValueError("The binary table is truncated")
+
+    rows = np.frombuffer(buffer, dtype, n_rows, offset)
+    return primary_header, FITSTable(table_header, rows)
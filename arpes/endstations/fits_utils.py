@@ -126,7 +126,7 @@ def extract_coords(
 
                 trace(f"Loop (name, n_regions, size) = {(name, n_regions, n)}")
 
-                coord = np.array(())
+                region_coords = [np.array(())]
                 for region in range(n_regions):
                     start, end, n = (
                         attrs[f"ST_{loop}_{region}"],
@@ -137,7 +137,9 @@ def extract_coords(
                         f"Reading coordinate {region} from loop. (start, end, n) = {(start, end, n)}"
                     )
 
-                    coord = np.concatenate((coord, np.linspace(start, end, n, endpoint=True)))
+                    region_coords.append(np.linspace(start, end, n, endpoint=True))
+
+                coord = np.concatenate(region_coords)
 
                 scan_dimension.append(name)
                 scan_shape.append(len(coord))
@@ -195,7 +197,7 @@ def find_clean_coords(
         trace(f"Renaming swept scan coordinate to cycle and extracting. This is hack.")
         idx = scan_dimension.index("cycle")
 
-        real_data_for_cycle = hdu.data.columns["null"].array
+        real_data_for_cycle = hdu.data.field("null")
 
         scan_coords["cycle"] = real_data_for_cycle
         scan_shape[idx] = len(real_data_for_cycle)
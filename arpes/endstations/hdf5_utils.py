@@ -0,0 +1,58 @@
+"""Utilities for reading HDF5 datasets, eagerly or lazily."""
+import h5py
+import numpy as np
+from xarray.backends.common import BackendArray
+from xarray.core import indexing
+
+__all__ = ("read_hdf5_dataset",)
+
+
+class LazyHDF5Array(BackendArray):
+    """An HDF5 dataset which is only read where it is indexed.
+
+    Selections are decomposed by xarray into those h5py supports, so that only the
+    requested region is read from disk. Values are converted to native byte order as they
+    are read.
+    """
+
+    def __init__(self, dataset: h5py.Dataset):
+        """Wraps `dataset`, whose file must be kept open while the array is in use."""
+        self.dataset = dataset
+        self.shape = dataset.shape
+        self.dtype = dataset.dtype.newbyteorder("=")
+
+    def __getitem__(self, key):
+        """Reads the region of the dataset selected by the explicit indexer `key`."""
+        return indexing.explicit_indexing_adapter(
+            key, self.shape, indexing.IndexingSupport.OUTER_1VECTOR, self._getitem
+        )
+
+    def _getitem(self, key):
+        return np.asarray(self.dataset[key], dtype=self.dtype)
+
+
+def read_hdf5_dataset(dataset: h5py.Dataset, lazy: bool = False):
+    """Reads an HDF5 dataset in native byte order, optionally lazily.
+
+    Lazily read datasets keep their file open until they are garbage collected. If dask is
+    installed they are dask arrays with one chunk per chunk of the dataset on disk,
+    otherwise they are read by xarray on indexing or when their values are requested.
+
+    Args:
+        dataset: The dataset to read
+        lazy: Whether to defer reading until the values are used
+
+    Returns:
+        An array which can be passed to `xr.DataArray`.
+    """
+    if not lazy:
+        values = dataset[()]
+        return values.astype(values.dtype.newbyteorder("="), copy=False)
+
+    try:
+        import dask.array as da
+    except ImportError:
+        return indexing.LazilyIndexedArray(LazyHDF5Array(dataset))
+
+    array = da.from_array(dataset, chunks=dataset.chunks or "auto")
+    return array.astype(dataset.dtype.newbyteorder("="))
@@ -13,6 +13,7 @@ from astropy.io import fits
 import arpes.config
 import xarray as xr
 from arpes.endstations import EndstationBase, find_clean_coords
+from arpes.endstations.events import DEFAULT_CHUNK_SIZE, read_event_histogram
 from arpes.provenance import provenance_from_file
 from arpes.utilities import rename_keys
 
@@ -72,12 +73,27 @@ class SpinToFEndstation(EndstationBase):
         "Phi": "phi",
     }
 
-    def load_SToF_hdf5(self, scan_desc: dict = None, **kwargs) -> xr.Dataset:
-        """Imports a FITS file that contains ToF spectra.
+    def load_SToF_hdf5(
+        self,
+        scan_desc: dict = None,
+        bins=None,
+        transform=None,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        lazy=False,
+        **kwargs
+    ) -> xr.Dataset:
+        """Imports an HDF5 file that contains ToF spectra, as images or as event lists.
 
         Args:
             scan_desc: Dictionary with extra information to attach to the xr.Dataset, must contain the location
               of the file
+            bins: For event mode files, the bins to histogram the events in, see
+              `arpes.endstations.events.histogram_events`. Defaults to the detector pixels,
+              and the spin channel if it was recorded.
+            transform: For event mode files, converts events to the binned coordinates
+            chunk_size: For event mode files, the number of events read and binned at once
+            lazy: Not supported for event mode files, which are histogrammed as they are read.
+              Other files are read in full.
 
         Returns:
             The loaded data.
@@ -92,14 +108,31 @@ class SpinToFEndstation(EndstationBase):
         f = h5py.File(data_loc, "r")
 
         dataset_contents = dict()
-        raw_data = f["/PRIMARY/DATA"][:]
-        raw_data = raw_data[:, ::-1]  # Reverse the timing axis
-        dataset_contents["raw"] = xr.DataArray(
-            raw_data,
-            coords={"x_pixels": np.linspace(0, 511, 512), "t_pixels": np.linspace(0, 511, 512)},
-            dims=("x_pixels", "t_pixels"),
-            attrs=f["/PRIMARY"].attrs.items(),
-        )
+        if "EVENTS" in f:
+            if lazy:
+                f.close()
+                raise ValueError(
+                    "Event mode data is histogrammed as it is read, and cannot be loaded lazily."
+                )
+
+            dataset_contents["raw"] = read_event_histogram(
+                f["EVENTS"], bins=bins, transform=transform, chunk_size=chunk_size
+            )
+            if "PRIMARY" in f:
+                dataset_contents["raw"].attrs.update(f["/PRIMARY"].attrs.items())
+        else:
+            raw_data = f["/PRIMARY/DATA"][:]
+            raw_data = raw_data[:, ::-1]  # Reverse the timing axis
+            dataset_contents["raw"] = xr.DataArray(
+                raw_data,
+                coords={
+                    "x_pixels": np.linspace(0, 511, 512),
+                    "t_pixels": np.linspace(0, 511, 512),
+                },
+                dims=("x_pixels", "t_pixels"),
+                attrs=f["/PRIMARY"].attrs.items(),
+            )
+        f.close()
 
         provenance_from_file(
             dataset_contents["raw"],
@@ -278,4 +311,4 @@ class SpinToFEndstation(EndstationBase):
         if os.path.splitext(data_loc)[1] == ".fits":
             return self.load_SToF_fits(scan_desc)
 
-        return self.load_SToF_hdf5(scan_desc)
+        return self.load_SToF_hdf5(scan_desc, **kwargs)
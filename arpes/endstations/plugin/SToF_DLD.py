@@ -9,6 +9,8 @@ import numpy as np
 import arpes.config
 import xarray as xr
 from arpes.endstations import EndstationBase
+from arpes.endstations.events import DEFAULT_CHUNK_SIZE, read_event_histogram
+from arpes.endstations.hdf5_utils import read_hdf5_dataset
 from arpes.provenance import provenance_from_file
 
 __all__ = ("SToFDLDEndstation",)
@@ -19,12 +21,27 @@ class SToFDLDEndstation(EndstationBase):
 
     PRINCIPAL_NAME = "ALG-SToF-DLD"
 
-    def load(self, scan_desc: dict = None, **kwargs):
+    def load(
+        self,
+        scan_desc: dict = None,
+        lazy=False,
+        bins=None,
+        transform=None,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        **kwargs
+    ):
         """Load a FITS file containing run data from Ping and Anton's delay line detector ARToF.
 
         Params:
             scan_desc: Dictionary with extra information to attach to the xarray.Dataset, must contain the location
               of the file
+            lazy: Whether to defer reading the data until it is used, so that only the selections which
+              are used are read from disk. The file is kept open while the data is in use. Event mode
+              files are histogrammed as they are read, and cannot be loaded lazily.
+            bins: For event mode files, the bins to histogram the events in, see
+              `arpes.endstations.events.histogram_events`. Defaults to the detector pixels.
+            transform: For event mode files, converts events to the binned coordinates
+            chunk_size: For event mode files, the number of events read and binned at once
 
         Returns:
             The loaded spectrum.
@@ -41,16 +58,42 @@ class SToFDLDEndstation(EndstationBase):
         )
 
         f = h5py.File(data_loc, "r")
-
         dataset_contents = dict()
-        raw_data = f["/PRIMARY/DATA"][:]
-        raw_data = raw_data[:, ::-1]  # Reverse the timing axis
-        dataset_contents["raw"] = xr.DataArray(
-            raw_data,
-            coords={"x_pixels": np.linspace(0, 511, 512), "t_pixels": np.linspace(0, 511, 512)},
-            dims=("x_pixels", "t_pixels"),
-            attrs=f["/PRIMARY"].attrs.items(),
-        )
+        if "EVENTS" in f:
+            if lazy:
+                f.close()
+                raise ValueError(
+                    "Event mode data is histogrammed as it is read, and cannot be loaded lazily."
+                )
+
+            # event mode data is histogrammed, with the timing axis already reversed
+            with f:
+                attrs = dict(f["/PRIMARY"].attrs.items()) if "PRIMARY" in f else {}
+                dataset_contents["raw"] = read_event_histogram(
+                    f["EVENTS"], bins=bins, transform=transform, chunk_size=chunk_size
+                )
+                dataset_contents["raw"].attrs.update(attrs)
+        else:
+            attrs = dict(f["/PRIMARY"].attrs.items())
+            raw_data = read_hdf5_dataset(f["/PRIMARY/DATA"], lazy=lazy)
+            if not lazy:
+                f.close()
+
+            dataset_contents["raw"] = xr.DataArray(
+                raw_data,
+                coords={
+                    "x_pixels": np.linspace(0, 511, 512),
+                    "t_pixels": np.linspace(0, 511, 512),
+                },
+                dims=("x_pixels", "t_pixels"),
+                attrs=attrs,
+            )
+            # Reverse the timing axis
+            dataset_contents["raw"] = (
+                dataset_contents["raw"]
+                .isel(t_pixels=slice(None, None, -1))
+                .assign_coords(t_pixels=np.linspace(0, 511, 512))
+            )
 
         provenance_from_file(
             dataset_contents["raw"],
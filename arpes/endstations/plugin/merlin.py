@@ -7,6 +7,7 @@ import numpy as np
 import typing
 import xarray as xr
 from arpes.endstations import HemisphericalEndstation, SESEndstation, SynchrotronEndstation
+from arpes.utilities.xarray import concat_preallocated
 
 __all__ = ["BL403ARPESEndstation"]
 
@@ -137,7 +138,7 @@ class BL403ARPESEndstation(SynchrotronEndstation, HemisphericalEndstation, SESEn
                                 if c not in l.coords:
                                     l.coords[c] = l.attrs[c]
 
-                    return xr.concat(frames, axis_name, coords="different")
+                    return concat_preallocated(frames, axis_name)
                 except Exception:
                     pass
         else:
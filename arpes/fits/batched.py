@@ -0,0 +1,441 @@
+"""A vectorized Levenberg-Marquardt engine for solving many independent 1D fits at once.
+
+`broadcast_model` historically ran a separate `lmfit` minimization for every coordinate
+of the broadcast dimensions. For large maps (MDC or Fermi edge maps with 10^4-10^5 fits)
+this is dominated by per-fit Python overhead rather than by the arithmetic of the fits
+themselves.
+
+Because all of the fits in a broadcast share a model and an independent axis, we can instead
+stack them into one problem of shape `[n_fits, n_points]`. Models which can be evaluated with
+parameter columns of shape `[n_fits, 1]` (see `XModelMixin.batchable`) are then solved
+simultaneously: residuals, finite difference Jacobians, and the damped normal equations are
+all computed as array operations over the whole stack, with convergence tracked per fit.
+
+Parameter bounds are handled with the same MINUIT style internal transformation that
+`lmfit` uses, so that bounded parameters behave as they do in the serial fitting path.
+"""
+
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import lmfit as lf
+import numpy as np
+from asteval import Interpreter
+
+from .result_array import FitResultArray
+
+__all__ = (
+    "supports_batching",
+    "batched_eval",
+    "fit_batched",
+)
+
+# fits per block are chosen so that the Jacobian stays around this many elements
+JACOBIAN_BLOCK_ELEMENTS = 1 << 23
+
+
+def _iter_leaves(model: lf.Model):
+    if isinstance(model, lf.CompositeModel):
+        yield from _iter_leaves(model.left)
+        yield from _iter_leaves(model.right)
+    else:
+        yield model
+
+
+def supports_batching(model: lf.Model, params: Optional[Dict[str, Any]] = None) -> bool:
+    """Determines whether a compiled model can be solved with the batched engine.
+
+    This requires that every component of the model be batchable, that the model is one
+    dimensional, and that no varying parameter is constrained by an expression.
+
+    Args:
+        model: The compiled model
+        params: Parameter hints, as passed to `broadcast_model`
+
+    Returns:
+        True if `fit_batched` can be used for this model and parameter specification.
+    """
+    if getattr(model, "n_dims", 1) != 1:
+        return False
+
+    if not all(getattr(leaf, "batchable", False) for leaf in _iter_leaves(model)):
+        return False
+
+    if params is not None and not isinstance(params, dict):
+        return False
+
+    for hint in (params or {}).values():
+        if isinstance(hint, dict) and hint.get("expr") is not None:
+            return False
+
+    base_params = model.make_params()
+    return not any(p.vary and p.expr is not None for p in base_params.values())
+
+
+def batched_eval(model: lf.Model, values: Dict[str, np.ndarray], x: np.ndarray) -> np.ndarray:
+    """Evaluates a (possibly composite) model for many parameter sets at once.
+
+    Args:
+        model: The compiled model
+        values: Parameter values keyed by full (prefixed) parameter name. Each should be
+          a column of shape `[n_fits, 1]` or a scalar.
+        x: The shared independent axis, of shape `[n_points]`
+
+    Returns:
+        The model evaluated for every parameter set, with shape `[n_fits, n_points]`.
+    """
+    if isinstance(model, lf.CompositeModel):
+        return model.op(batched_eval(model.left, values, x), batched_eval(model.right, values, x))
+
+    columns = {k: SimpleNamespace(value=v) for k, v in values.items()}
+    funcargs = model.make_funcargs(columns, {model.independent_vars[0]: x})
+    func = getattr(model, "batched_func", None) or model.func
+    return func(**funcargs)
+
+
+def _to_internal(v, lo, hi):
+    v = np.clip(v, lo, hi)
+    out = np.array(v, dtype=np.float64)
+
+    both = np.isfinite(lo) & np.isfinite(hi)
+    only_lo = np.isfinite(lo) & ~np.isfinite(hi)
+    only_hi = ~np.isfinite(lo) & np.isfinite(hi)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = np.where(both, np.arcsin(np.clip(2 * (v - lo) / (hi - lo) - 1, -1, 1)), out)
+        out = np.where(only_lo, np.sqrt((v - lo + 1) ** 2 - 1), out)
+        out = np.where(only_hi, np.sqrt((hi - v + 1) ** 2 - 1), out)
+
+    return out
+
+
+def _to_external(p, lo, hi):
+    both = np.isfinite(lo) & np.isfinite(hi)
+    only_lo = np.isfinite(lo) & ~np.isfinite(hi)
+    only_hi = ~np.isfinite(lo) & np.isfinite(hi)
+
+    with np.errstate(invalid="ignore"):
+        out = np.where(both, lo + (np.sin(p) + 1) * (hi - lo) / 2, p)
+        out = np.where(only_lo, lo - 1 + np.sqrt(p * p + 1), out)
+        out = np.where(only_hi, hi + 1 - np.sqrt(p * p + 1), out)
+
+    return out
+
+
+def _evaluate_expressions(
+    params: lf.Parameters, names: List[str], values: Dict[str, np.ndarray]
+) -> np.ndarray:
+    """Evaluates derived (expression) parameters over all fits at once.
+
+    Expressions are evaluated in order so that derived parameters may refer to one another.
+    The builtins `max` and `min` are replaced by their elementwise numpy counterparts because
+    `lmfit` uses them in the expressions for lineshape `fwhm` and `height` parameters.
+
+    Raises:
+        ValueError: If an expression cannot be evaluated for an array of fits.
+    """
+    interpreter = Interpreter(use_numpy=True)
+    interpreter.symtable["max"] = np.fmax
+    interpreter.symtable["min"] = np.fmin
+    interpreter.symtable.update(values)
+
+    n_fits = len(next(iter(values.values())))
+    derived = np.empty((n_fits, len(names)))
+    for i, name in enumerate(names):
+        expr = params[name].expr
+        value = interpreter.eval(expr, show_errors=False)
+        if interpreter.error or value is None:
+            raise ValueError(
+                f"Could not evaluate the expression `{expr}` for the derived parameter {name} "
+                "across a batch of fits. Fit this model with `batched=False` instead."
+            )
+
+        derived[:, i] = np.broadcast_to(np.asarray(value, dtype=np.float64), (n_fits,))
+        interpreter.symtable[name] = derived[:, i]
+
+    return derived
+
+
+def _solve_block(model, x, y, w, p0, lo, hi, fixed, var_names, max_nfev, ftol, xtol):
+    """Runs damped Gauss-Newton iterations on a block of fits until each has converged."""
+    n_fits, n_vars = p0.shape
+
+    def residual(idx, p_int):
+        values = {k: v[idx] for k, v in fixed.items()}
+        ext = _to_external(p_int, lo, hi)
+        values.update({name: ext[:, [i]] for i, name in enumerate(var_names)})
+        with np.errstate(all="ignore"):
+            r = (batched_eval(model, values, x) - y[idx]) * w[idx]
+        return np.where(w[idx] == 0, 0, r)
+
+    def cost_of(r):
+        c = np.einsum("ij,ij->i", r, r)
+        return np.where(np.isfinite(c), c, np.inf)
+
+    def jacobian(idx, p_int, r):
+        jac = np.empty(r.shape + (n_vars,))
+        for i in range(n_vars):
+            h = np.sqrt(np.finfo(np.float64).eps) * np.maximum(np.abs(p_int[:, i]), 1.0)
+            stepped = p_int.copy()
+            stepped[:, i] += h
+            jac[:, :, i] = (residual(idx, stepped) - r) / h[:, None]
+        return np.nan_to_num(jac, nan=0.0, posinf=0.0, neginf=0.0)
+
+    everything = np.arange(n_fits)
+    p = _to_internal(p0, lo, hi)
+    r = residual(everything, p)
+    cost = cost_of(r)
+    nfev = np.ones(n_fits, dtype=int)
+    lam = np.full(n_fits, 1e-3)
+    active = np.full(n_fits, n_vars > 0)
+    converged = np.full(n_fits, n_vars == 0)
+
+    while np.any(active):
+        idx = np.where(active)[0]
+        pa, ra = p[idx], r[idx]
+
+        jac = jacobian(idx, pa, ra)
+        jtj = np.einsum("ijk,ijl->ikl", jac, jac)
+        grad = np.einsum("ijk,ij->ik", jac, ra)
+        diag = np.einsum("ikk->ik", jtj)
+        diag = np.where(diag > 0, diag, 1.0)
+
+        damped = jtj + (lam[idx, None] * diag)[:, :, None] * np.eye(n_vars)[None]
+        try:
+            delta = -np.linalg.solve(damped, grad[:, :, None])[:, :, 0]
+        except np.linalg.LinAlgError:
+            delta = -np.einsum("ikl,il->ik", np.linalg.pinv(damped), grad)
+
+        trial = pa + delta
+        trial_r = residual(idx, trial)
+        trial_cost = cost_of(trial_r)
+        nfev[idx] += n_vars + 1
+
+        improved = trial_cost < cost[idx]
+        better = idx[improved]
+        worse = idx[~improved]
+
+        relative_decrease = (cost[better] - trial_cost[improved]) / np.maximum(cost[better], 1e-300)
+        small_step = np.all(np.abs(delta[improved]) <= xtol * (np.abs(pa[improved]) + xtol), axis=1)
+
+        p[better], r[better], cost[better] = (
+            trial[improved],
+            trial_r[improved],
+            trial_cost[improved],
+        )
+        lam[better] = np.maximum(lam[better] / 10, 1e-12)
+        lam[worse] *= 10
+
+        done = better[(relative_decrease <= ftol) | small_step]
+        converged[done] = True
+        active[done] = False
+
+        # no step, however small, reduces the cost: we are at a minimum to machine precision
+        stalled = worse[lam[worse] > 1e12]
+        converged[stalled] = np.isfinite(cost[stalled])
+        active[stalled] = False
+        active[nfev >= max_nfev] = False
+
+    return p, cost, nfev, converged
+
+
+def fit_batched(
+    model: lf.Model,
+    data: np.ndarray,
+    x: np.ndarray,
+    params: Optional[Dict[str, Any]] = None,
+    weights: Optional[np.ndarray] = None,
+    guess: bool = True,
+    max_nfev: Optional[int] = None,
+    ftol: float = 1.5e-8,
+    xtol: float = 1.5e-8,
+) -> FitResultArray:
+    """Solves a stack of independent 1D curve fits sharing a model and independent axis.
+
+    Args:
+        model: A compiled, batchable model (see `supports_batching`)
+        data: The data to fit, with shape `[n_fits, n_points]`. NaN values are masked out.
+        x: The independent axis, with shape `[n_points]`
+        params: Parameter hints keyed by full parameter name. Each hint is a dict which
+          may contain "value", "min", "max", and "vary". A "value" can either be a scalar
+          or an array of length `n_fits` giving a separate initial value for every fit.
+        weights: Optional weights with the same shape as `data`
+        guess: Whether to use the model's `guess_batched` to determine initial values
+        max_nfev: Maximum number of function evaluations for each fit, following `lmfit`
+          the default is `2000 * (n_vars + 1)`
+        ftol: Relative tolerance on the decrease in the sum of squares for convergence
+        xtol: Relative tolerance on the step size for convergence
+
+    Returns:
+        A `FitResultArray` containing the fit values, standard errors and diagnostics.
+    """
+    if params is None:
+        params = {}
+
+    data = np.asarray(data, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    n_fits, n_points = data.shape
+
+    mask = np.isfinite(data)
+    if weights is None:
+        weights = np.ones_like(data)
+    weights = np.where(mask, np.broadcast_to(np.asarray(weights, dtype=np.float64), data.shape), 0)
+    filled_data = np.where(mask, data, 0)
+
+    base_params = model.make_params()
+    param_names = [name for name, p in base_params.items() if p.expr is None]
+
+    initial = {
+        name: np.full(n_fits, base_params[name].value, dtype=np.float64) for name in param_names
+    }
+    if guess:
+        guessed = model.guess_batched(
+            np.where(mask, data, np.nanmean(data, axis=1, keepdims=True)), x=x
+        )
+        for name, value in guessed.items():
+            if name in initial:
+                initial[name] = np.broadcast_to(
+                    np.asarray(value, dtype=np.float64), (n_fits,)
+                ).copy()
+
+    lower = {name: base_params[name].min for name in param_names}
+    upper = {name: base_params[name].max for name in param_names}
+    vary = {name: base_params[name].vary for name in param_names}
+
+    for name, hint in params.items():
+        if name not in initial:
+            continue
+
+        if not isinstance(hint, dict):
+            hint = {"value": hint}
+
+        if "value" in hint:
+            initial[name] = np.broadcast_to(
+                np.asarray(hint["value"], dtype=np.float64), (n_fits,)
+            ).copy()
+        lower[name] = hint.get("min", lower[name])
+        upper[name] = hint.get("max", upper[name])
+        vary[name] = hint.get("vary", vary[name])
+
+    var_names = [name for name in param_names if vary[name]]
+    fixed_names = [name for name in param_names if not vary[name]]
+    n_vars = len(var_names)
+
+    if max_nfev is None:
+        max_nfev = 2000 * (n_vars + 1)
+
+    lo = np.array(
+        [lower[n] if lower[n] is not None else -np.inf for n in var_names], dtype=np.float64
+    )
+    hi = np.array(
+        [upper[n] if upper[n] is not None else np.inf for n in var_names], dtype=np.float64
+    )
+
+    values = np.full((n_fits, len(param_names)), np.nan)
+    init_values = np.stack([initial[n] for n in param_names], axis=-1)
+    stderr = np.full((n_fits, len(param_names)), np.nan)
+    covar = np.full((n_fits, n_vars, n_vars), np.nan)
+    chisqr = np.full(n_fits, np.nan)
+    redchi = np.full(n_fits, np.nan)
+    success = np.zeros(n_fits, dtype=bool)
+    nfev = np.zeros(n_fits, dtype=int)
+    residual = np.full((n_fits, n_points), np.nan)
+    best_fit = np.full((n_fits, n_points), np.nan)
+
+    block_size = max(1, JACOBIAN_BLOCK_ELEMENTS // max(1, n_points * (n_vars + 1)))
+    for start in range(0, n_fits, block_size):
+        block = slice(start, min(n_fits, start + block_size))
+        y, w = filled_data[block], weights[block]
+        fixed = {name: initial[name][block, None] for name in fixed_names}
+        p0 = np.stack([initial[n][block] for n in var_names], axis=-1).reshape(y.shape[0], n_vars)
+
+        p, cost, block_nfev, converged = _solve_block(
+            model, x, y, w, p0, lo, hi, fixed, var_names, max_nfev, ftol, xtol
+        )
+
+        ext = _to_external(p, lo, hi)
+        fit_values = dict(fixed)
+        fit_values.update({name: ext[:, [i]] for i, name in enumerate(var_names)})
+        block_best_fit = batched_eval(model, fit_values, x) * np.ones_like(y)
+
+        # covariance in external coordinates, following lmfit's default `scale_covar=True`
+        n_free = np.maximum(np.count_nonzero(w, axis=1) - n_vars, 1)
+        block_redchi = cost / n_free
+        jac = np.empty(y.shape + (n_vars,))
+        for i, name in enumerate(var_names):
+            h = np.sqrt(np.finfo(np.float64).eps) * np.maximum(np.abs(ext[:, i]), 1.0)
+            stepped = dict(fit_values)
+            stepped[name] = (ext[:, i] + h)[:, None]
+            with np.errstate(all="ignore"):
+                jac[:, :, i] = (batched_eval(model, stepped, x) - block_best_fit) * w / h[:, None]
+        jtj = np.einsum("ijk,ijl->ikl", np.nan_to_num(jac), np.nan_to_num(jac))
+        block_covar = np.linalg.pinv(jtj) * block_redchi[:, None, None]
+
+        var_stderr = np.sqrt(np.abs(np.einsum("ikk->ik", block_covar)))
+        singular = np.linalg.matrix_rank(jtj) < n_vars if n_vars else np.zeros(len(y), dtype=bool)
+        var_stderr[singular] = np.nan
+
+        # as in lmfit, fixed parameters have zero uncertainty when errorbars could be
+        # estimated and no uncertainty (`None`, stored here as NaN) otherwise
+        has_errorbars = np.all(np.isfinite(var_stderr), axis=-1)
+        for j, name in enumerate(param_names):
+            if name in var_names:
+                i = var_names.index(name)
+                values[block, j] = ext[:, i]
+                stderr[block, j] = var_stderr[:, i]
+            else:
+                values[block, j] = initial[name][block]
+                stderr[block, j] = np.where(has_errorbars, 0, np.nan)
+
+        covar[block] = block_covar
+        chisqr[block] = cost
+        redchi[block] = block_redchi
+        success[block] = converged
+        nfev[block] = block_nfev
+        residual[block] = np.where(mask[block], (block_best_fit - y) * w, np.nan)
+        best_fit[block] = block_best_fit
+
+    derived_names = [name for name, p in base_params.items() if p.expr is not None]
+    if derived_names:
+        columns = {name: values[:, j] for j, name in enumerate(param_names)}
+        derived = _evaluate_expressions(base_params, derived_names, columns)
+
+        # propagate uncertainty to the derived parameters through the covariance matrix
+        gradient = np.zeros((n_fits, len(derived_names), n_vars))
+        for i, name in enumerate(var_names):
+            h = np.sqrt(np.finfo(np.float64).eps) * np.maximum(np.abs(columns[name]), 1.0)
+            stepped = dict(columns)
+            stepped[name] = columns[name] + h
+            shifted = _evaluate_expressions(base_params, derived_names, stepped)
+            gradient[:, :, i] = (shifted - derived) / h[:, None]
+
+        derived_stderr = np.sqrt(
+            np.abs(np.einsum("idk,ikl,idl->id", gradient, np.nan_to_num(covar), gradient))
+        )
+        derived_stderr[~np.all(np.isfinite(stderr), axis=-1)] = np.nan
+
+        values = np.concatenate([values, derived], axis=-1)
+        init_values = np.concatenate(
+            [init_values, np.full((n_fits, len(derived_names)), np.nan)], axis=-1
+        )
+        stderr = np.concatenate([stderr, derived_stderr], axis=-1)
+        param_names = param_names + derived_names
+
+    return FitResultArray(
+        model=model,
+        x=x,
+        param_names=param_names,
+        var_names=var_names,
+        values=values,
+        stderr=stderr,
+        init_values=init_values,
+        covar=covar,
+        redchi=redchi,
+        chisqr=chisqr,
+        success=success,
+        nfev=nfev,
+        residual=residual,
+        best_fit=best_fit,
+        data=data,
+        weights=weights,
+    )
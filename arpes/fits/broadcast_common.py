@@ -1,5 +1,6 @@
 """Utilities used in broadcast fitting."""
-from typing import Dict, Union
+import copy
+from typing import Any, Dict, Union
 import lmfit
 import xarray as xr
 import operator
@@ -7,6 +8,9 @@ import warnings
 import functools
 from string import ascii_lowercase
 
+from .fit_models import XModelMixin
+from .kernels import fuse_model
+
 
 def unwrap_params(params, iter_coordinate):
     """Inspects array-like parameters and extracts the appropriate value to use for the current fit."""
@@ -23,6 +27,28 @@ def unwrap_params(params, iter_coordinate):
     return {k: transform_or_walk(v) for k, v in params.items()}
 
 
+def unwrap_params_batched(params, template: xr.DataArray):
+    """Like `unwrap_params` but extracts the values for every fit in `template` at once.
+
+    Array valued hints are selected at the nearest coordinate to each fit and flattened
+    in the order of `template`, scalar hints are passed through.
+    """
+
+    def transform_or_walk(v):
+        if isinstance(v, dict):
+            return unwrap_params_batched(v, template)
+
+        if isinstance(v, xr.DataArray):
+            selected = v.sel(
+                {d: template.coords[d] for d in v.dims if d in template.dims}, method="nearest"
+            )
+            return selected.broadcast_like(template).transpose(*template.dims).values.ravel()
+
+        return v
+
+    return {k: transform_or_walk(v) for k, v in params.items()}
+
+
 def apply_window(data: xr.DataArray, cut_coords: Dict[str, Union[float, slice]], window):
     """Cuts data inside a specified window.
 
@@ -87,15 +113,29 @@ def reduce_model_with_operators(model):
         return left / right
 
 
-def compile_model(model, params=None, prefixes=None):
-    """Generates an lmfit model instance from specification.
+# compiled models are cached by specification, keeping at most this many
+MODEL_CACHE_SIZE = 64
 
-    Takes a model sequence, i.e. a Model class, a list of such classes, or a list
-    of such classes with operators and instantiates an appropriate model.
+_compiled_models: Dict[Any, lmfit.Model] = {}
+
+
+def _spec_key(spec):
+    """A hashable key for a model specification, parameter hints, or prefixes.
+
+    Raises:
+        TypeError: If the specification contains unhashable values.
     """
-    if params is None:
-        params = {}
+    if isinstance(spec, (list, tuple)):
+        return (type(spec).__name__,) + tuple(_spec_key(s) for s in spec)
+
+    if isinstance(spec, dict):
+        return ("dict",) + tuple(sorted((k, _spec_key(v)) for k, v in spec.items()))
+
+    hash(spec)
+    return spec
 
+
+def _build_model(model, params, prefixes):
     prefix_compile = "{}"
     if prefixes is None:
         prefixes = ascii_lowercase
@@ -125,3 +165,36 @@ def compile_model(model, params=None, prefixes=None):
         built = reduce_model_with_operators(_parens_to_nested(model))
 
     return built
+
+
+def compile_model(model, params=None, prefixes=None):
+    """Generates an lmfit model instance from specification.
+
+    Takes a model sequence, i.e. a Model class, a list of such classes, or a list
+    of such classes with operators and instantiates an appropriate model.
+
+    Compiled models are cached by their specification (as produced by `parse_model`), and
+    each call returns a copy of the cached model. Where every component has a compiled
+    kernel, the model is given a fused kernel which evaluates the model and its analytic
+    Jacobian in one pass, see `arpes.fits.kernels`.
+    """
+    if params is None:
+        params = {}
+
+    try:
+        key = _spec_key((model, params if isinstance(params, (list, tuple)) else None, prefixes))
+    except TypeError:
+        key = None
+
+    built = _compiled_models.get(key) if key is not None else None
+    if built is None:
+        built = _build_model(model, params, prefixes)
+        if isinstance(built, XModelMixin):
+            built.kernel = fuse_model(built)
+
+        if key is not None:
+            if len(_compiled_models) >= MODEL_CACHE_SIZE:
+                _compiled_models.pop(next(iter(_compiled_models)))
+            _compiled_models[key] = built
+
+    return copy.deepcopy(built)
@@ -0,0 +1,294 @@
+"""Pluggable executors for running broadcast curve fits.
+
+`broadcast_model` can run its fits serially, on a pool of processes, on a pool of threads
+(useful for models whose evaluation releases the GIL), or on a `loky` pool which is safe to
+use with the "spawn" start method. All of these present the same small interface,
+`FitExecutor`, so that the fitting code does not need to know where its tasks are run.
+
+Executors also decide how many fits to send in each task. With the default chunk size of
+one, dispatch overhead dominates for cheap fits, so `FitExecutor.chunk_size` sizes tasks
+from the measured cost of a single fit.
+"""
+
+import math
+import os
+from multiprocessing import get_context
+from multiprocessing.pool import Pool, ThreadPool
+from typing import Callable, Iterable, Iterator, Optional, Sequence, Union
+
+from arpes.utilities.workers import default_start_method, initialize_worker
+
+__all__ = (
+    "FitExecutor",
+    "SerialExecutor",
+    "ProcessExecutor",
+    "ThreadExecutor",
+    "LokyExecutor",
+    "resolve_executor",
+    "available_cpus",
+)
+
+# each task should take about this long, long enough to amortize the dispatch overhead
+TARGET_TASK_SECONDS = 0.2
+
+# but there should still be this many tasks per worker so that workers finish together
+TASKS_PER_WORKER = 4
+
+
+def available_cpus() -> int:
+    """The number of CPUs this process may run on, respecting affinity masks where supported."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1
+
+
+class FitExecutor:
+    """Runs curve fitting tasks, possibly in parallel.
+
+    Subclasses provide `n_workers` and `imap`. Tasks may complete in any order, so task
+    functions should return enough information to place their results.
+    """
+
+    n_workers: int = 1
+
+    # whether tasks and their results cross a process boundary, and so should be serialized
+    crosses_processes: bool = False
+
+    def imap(self, fn: Callable, tasks: Iterable, chunksize: int = 1) -> Iterator:
+        """Applies `fn` to each of `tasks`, yielding results as they complete."""
+        raise NotImplementedError
+
+    @property
+    def is_parallel(self) -> bool:
+        return self.n_workers > 1
+
+    def chunk_size(self, n_tasks: int, seconds_per_task: Optional[float] = None) -> int:
+        """Chooses how many tasks to send to a worker at once.
+
+        Args:
+            n_tasks: The total number of tasks
+            seconds_per_task: The measured cost of a single task, if known
+
+        Returns:
+            The largest chunk size which keeps each chunk near `TARGET_TASK_SECONDS`, while
+            leaving `TASKS_PER_WORKER` chunks per worker for load balancing.
+        """
+        balanced = math.ceil(n_tasks / (TASKS_PER_WORKER * self.n_workers))
+        if seconds_per_task is None or seconds_per_task <= 0:
+            return max(1, balanced)
+
+        by_cost = math.ceil(TARGET_TASK_SECONDS / seconds_per_task)
+        return max(1, min(by_cost, balanced))
+
+    def shutdown(self, wait: bool = True):
+        """Releases any workers held by the executor."""
+        pass
+
+    def __enter__(self) -> "FitExecutor":
+        return self
+
+    def __exit__(self, *_):
+        self.shutdown()
+
+
+class SerialExecutor(FitExecutor):
+    """Runs every task in the calling thread."""
+
+    def imap(self, fn: Callable, tasks: Iterable, chunksize: int = 1) -> Iterator:
+        """Applies `fn` to each of `tasks` in order."""
+        return map(fn, tasks)
+
+
+class ProcessExecutor(FitExecutor):
+    """Runs tasks on a lazily started `multiprocessing` pool.
+
+    The pool is kept alive between uses, because starting workers is slow due to the heavy
+    analysis imports. Workers are pinned to `affinity` if provided and limited to
+    `threads_per_worker` threads in numba and the BLAS to avoid oversubscription.
+
+    Args:
+        processes: The number of worker processes, by default one per available CPU
+        context: The `multiprocessing` start method, i.e. "fork", "spawn", or "forkserver".
+          Defaults to "forkserver" where it is available, because processes forked after
+          numba has started its TBB worker threads can deadlock.
+        affinity: CPUs the workers may run on
+        threads_per_worker: Threads allowed for numerical libraries in each worker, or None
+          to leave these unconfigured
+    """
+
+    crosses_processes = True
+
+    def __init__(
+        self,
+        processes: Optional[int] = None,
+        context: Optional[str] = None,
+        affinity: Optional[Sequence[int]] = None,
+        threads_per_worker: Optional[int] = 1,
+    ):
+        """Records the pool configuration, the pool itself is started on first use."""
+        self.processes = processes
+        self.context = context
+        self.affinity = None if affinity is None else sorted(set(affinity))
+        self.threads_per_worker = threads_per_worker
+        self._pool: Optional[Pool] = None
+
+    @property
+    def n_workers(self) -> int:
+        if self.processes is not None:
+            return self.processes
+
+        if self.affinity is not None:
+            return len(self.affinity)
+
+        return available_cpus()
+
+    @property
+    def pool(self) -> Pool:
+        """The underlying pool, started if necessary."""
+        if self._pool is None:
+            self._pool = get_context(self.context or default_start_method()).Pool(
+                self.n_workers,
+                initializer=initialize_worker,
+                initargs=(self.affinity, self.threads_per_worker),
+            )
+
+        return self._pool
+
+    def imap(self, fn: Callable, tasks: Iterable, chunksize: int = 1) -> Iterator:
+        """Applies `fn` to each of `tasks` on the pool, yielding results as they complete."""
+        return self.pool.imap_unordered(fn, tasks, chunksize=chunksize)
+
+    def resize(self, processes: int):
+        """Changes the number of workers, restarting the pool on next use if it is running."""
+        if processes != self.processes:
+            self.shutdown()
+            self.processes = processes
+
+    def shutdown(self, wait: bool = True):
+        """Stops the pool, by default letting in-flight tasks finish."""
+        if self._pool is None:
+            return
+
+        if wait:
+            self._pool.close()
+            self._pool.join()
+        else:
+            self._pool.terminate()
+
+        self._pool = None
+
+
+class ThreadExecutor(FitExecutor):
+    """Runs tasks on a pool of threads.
+
+    This only provides a speedup for models which spend their time in code releasing the
+    GIL, such as batched or numba compiled models, but it avoids all serialization.
+    """
+
+    def __init__(self, threads: Optional[int] = None):
+        """Records the number of threads, the pool itself is started on first use."""
+        self.threads = threads
+        self._pool: Optional[ThreadPool] = None
+
+    @property
+    def n_workers(self) -> int:
+        return self.threads or available_cpus()
+
+    def imap(self, fn: Callable, tasks: Iterable, chunksize: int = 1) -> Iterator:
+        """Applies `fn` to each of `tasks` on the threads, yielding results as they complete."""
+        if self._pool is None:
+            self._pool = ThreadPool(self.n_workers)
+
+        return self._pool.imap_unordered(fn, tasks, chunksize=chunksize)
+
+    def shutdown(self, wait: bool = True):
+        """Stops the threads."""
+        if self._pool is None:
+            return
+
+        self._pool.close()
+        if wait:
+            self._pool.join()
+
+        self._pool = None
+
+
+class LokyExecutor(FitExecutor):
+    """Runs tasks on a reusable `loky` process pool.
+
+    `loky` workers are started with a clean interpreter, which is robust on platforms
+    where forking is unavailable or unsafe. Requires the optional `loky` package.
+    """
+
+    crosses_processes = True
+
+    def __init__(self, processes: Optional[int] = None, timeout: int = 300):
+        """Records the pool configuration, the pool itself is started on first use."""
+        self.processes = processes
+        self.timeout = timeout
+        self._pool = None
+
+    @property
+    def n_workers(self) -> int:
+        return self.processes or available_cpus()
+
+    @property
+    def executor(self):
+        try:
+            from loky import get_reusable_executor
+        except ImportError as e:
+            raise ImportError("You need to install `loky` in order to use `LokyExecutor`.") from e
+
+        return get_reusable_executor(max_workers=self.n_workers, timeout=self.timeout)
+
+    def imap(self, fn: Callable, tasks: Iterable, chunksize: int = 1) -> Iterator:
+        """Applies `fn` to each of `tasks` on the pool, yielding results in order."""
+        self._pool = self.executor
+        return self._pool.map(fn, tasks, chunksize=chunksize)
+
+    def shutdown(self, wait: bool = True):
+        """Stops the reusable pool, if this executor started one."""
+        if self._pool is None:
+            return
+
+        self._pool.shutdown(wait=wait)
+        self._pool = None
+
+
+def resolve_executor(executor: Union[None, str, FitExecutor], parallelize: bool) -> FitExecutor:
+    """Determines the executor to use for a broadcast fit.
+
+    Args:
+        executor: An executor instance, the name of an executor ("serial", "process",
+          "thread", or "loky"), or None to choose based on `parallelize`
+        parallelize: Whether to fit in parallel when no executor is specified. Parallel fits
+          use the keep-alive process pool in `arpes.fits.hot_pool`.
+
+    Returns:
+        The executor to use.
+    """
+    if isinstance(executor, FitExecutor):
+        return executor
+
+    if executor is None:
+        executor = "process" if parallelize else "serial"
+
+    if executor == "process":
+        from .hot_pool import hot_pool
+
+        return hot_pool.executor
+
+    named = {
+        "serial": SerialExecutor,
+        "thread": ThreadExecutor,
+        "loky": LokyExecutor,
+    }
+    if executor not in named:
+        raise ValueError(
+            "Unknown executor {}, expected one of {}.".format(
+                executor, ", ".join(["process"] + list(named))
+            )
+        )
+
+    return named[executor]()
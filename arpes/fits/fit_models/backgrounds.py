@@ -12,6 +12,8 @@ __all__ = ["AffineBackgroundModel"]
 class AffineBackgroundModel(XModelMixin):
     """A model for an affine background."""
 
+    batchable = True
+
     def __init__(self, independent_vars=("x",), prefix="", missing="raise", name=None, **kwargs):
         """Defer to lmfit for initialization."""
         kwargs.update({"prefix": prefix, "missing": missing, "independent_vars": independent_vars})
@@ -28,3 +30,10 @@ class AffineBackgroundModel(XModelMixin):
         pars["%sconst_bkg" % self.prefix].set(value=0)
 
         return update_param_vals(pars, self.prefix, **kwargs)
+
+    def guess_batched(self, data, x=None, **kwargs):
+        """Vectorized version of `guess`."""
+        return {
+            "%slin_bkg" % self.prefix: np.percentile(data, 10, axis=-1),
+            "%sconst_bkg" % self.prefix: np.zeros(len(data)),
+        }
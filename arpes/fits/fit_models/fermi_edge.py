@@ -5,6 +5,7 @@ from scipy import stats
 import numpy as np
 import lmfit as lf
 from scipy.ndimage import gaussian_filter
+from scipy.signal import fftconvolve
 
 from .x_model_mixin import XModelMixin
 from .functional_forms import (
@@ -37,6 +38,8 @@ __all__ = [
 class AffineBroadenedFD(XModelMixin):
     """A model for fitting an affine density of states with resolution broadened Fermi-Dirac occupation."""
 
+    batchable = True
+
     @staticmethod
     def affine_broadened_fd(
         x, fd_center=0, fd_width=0.003, conv_width=0.02, const_bkg=1, lin_bkg=0, offset=0
@@ -60,6 +63,39 @@ class AffineBroadenedFD(XModelMixin):
             + offset
         )
 
+    @staticmethod
+    def batched_func(
+        x, fd_center=0, fd_width=0.003, conv_width=0.02, const_bkg=1, lin_bkg=0, offset=0
+    ):
+        """Broadcasting version of `affine_broadened_fd` where parameters are `[n_fits, 1]` columns.
+
+        `scipy.ndimage.gaussian_filter` only accepts a scalar width, so here each fit gets its
+        own Gaussian kernel, truncated and normalized exactly as `gaussian_filter` truncates it
+        for that fit's width. The kernels are applied with a single FFT convolution against
+        data reflected at the boundaries as `gaussian_filter` does.
+
+        Kernel radii are capped at the number of points, so that a runaway `conv_width` during
+        a fit costs no more than a kernel spanning the whole axis.
+        """
+        dx = x - fd_center
+        x_scaling = x[1] - x[0]
+        fermi = 1 / (np.exp(dx / fd_width) + 1)
+        unbroadened = np.atleast_2d((const_bkg + lin_bkg * dx) * fermi)
+        sigma = np.abs(np.atleast_2d(conv_width / x_scaling).astype(np.float64))
+        n_fits, n_points = np.broadcast_shapes(unbroadened.shape, sigma.shape)
+        unbroadened = np.broadcast_to(unbroadened, (n_fits, n_points))
+        sigma = np.broadcast_to(sigma, (n_fits, 1))
+        sigma = np.maximum(np.nan_to_num(sigma, nan=0.0, posinf=n_points), 1e-12)
+        radii = np.minimum(4 * sigma + 0.5, n_points).astype(np.int64)
+        max_radius = int(radii.max())
+
+        offsets = np.arange(-max_radius, max_radius + 1)[None, :]
+        kernels = np.where(np.abs(offsets) <= radii, np.exp(-0.5 * (offsets / sigma) ** 2), 0)
+        kernels /= kernels.sum(axis=-1, keepdims=True)
+
+        padded = np.pad(unbroadened, ((0, 0), (max_radius, max_radius)), mode="symmetric")
+        return fftconvolve(padded, kernels, mode="valid", axes=-1) + offset
+
     def __init__(self, independent_vars=("x",), prefix="", missing="raise", name=None, **kwargs):
         """Defer to lmfit for initialization."""
         kwargs.update({"prefix": prefix, "missing": missing, "independent_vars": independent_vars})
@@ -87,6 +123,18 @@ class AffineBroadenedFD(XModelMixin):
 
         return update_param_vals(pars, self.prefix, **kwargs)
 
+    def guess_batched(self, data, x=None, **kwargs):
+        """Vectorized version of `guess`."""
+        n_fits = len(data)
+        return {
+            "%sfd_center" % self.prefix: np.zeros(n_fits),
+            "%slin_bkg" % self.prefix: np.zeros(n_fits),
+            "%sconst_bkg" % self.prefix: data.mean(axis=-1) * 2,
+            "%soffset" % self.prefix: data.min(axis=-1),
+            "%sfd_width" % self.prefix: np.full(n_fits, 0.005),
+            "%sconv_width" % self.prefix: np.full(n_fits, 0.02),
+        }
+
     __init__.doc = lf.models.COMMON_INIT_DOC
     guess.__doc__ = lf.models.COMMON_GUESS_DOC
 
@@ -94,6 +142,8 @@ class AffineBroadenedFD(XModelMixin):
 class FermiLorentzianModel(XModelMixin):
     """A Lorentzian multiplied by a gstepb background."""
 
+    batchable = True
+
     @staticmethod
     def gstepb_mult_lorentzian(
         x, center=0, width=1, erf_amp=1, lin_bkg=0, const_bkg=0, gamma=1, lorcenter=0
@@ -134,6 +184,8 @@ class FermiLorentzianModel(XModelMixin):
 class FermiDiracModel(XModelMixin):
     """A model for the Fermi Dirac function."""
 
+    batchable = True
+
     def __init__(self, independent_vars=("x",), prefix="", missing="drop", name=None, **kwargs):
         """Defer to lmfit for initialization."""
         kwargs.update({"prefix": prefix, "missing": missing, "independent_vars": independent_vars})
@@ -151,6 +203,15 @@ class FermiDiracModel(XModelMixin):
 
         return update_param_vals(pars, self.prefix, **kwargs)
 
+    def guess_batched(self, data, x=None, **kwargs):
+        """Vectorized version of `guess`."""
+        n_fits = len(data)
+        return {
+            "{}center".format(self.prefix): np.zeros(n_fits),
+            "{}width".format(self.prefix): np.full(n_fits, 0.05),
+            "{}scale".format(self.prefix): data.mean(axis=-1) - data.min(axis=-1),
+        }
+
     __init__.doc = lf.models.COMMON_INIT_DOC
     guess.__doc__ = lf.models.COMMON_GUESS_DOC
 
@@ -158,6 +219,8 @@ class FermiDiracModel(XModelMixin):
 class GStepBModel(XModelMixin):
     """A model for fitting Fermi functions with a linear background."""
 
+    batchable = True
+
     def __init__(self, independent_vars=("x",), prefix="", missing="raise", name=None, **kwargs):
         """Defer to lmfit for initialization."""
         kwargs.update({"prefix": prefix, "missing": missing, "independent_vars": independent_vars})
@@ -180,6 +243,17 @@ class GStepBModel(XModelMixin):
 
         return update_param_vals(pars, self.prefix, **kwargs)
 
+    def guess_batched(self, data, x=None, **kwargs):
+        """Vectorized version of `guess`."""
+        n_fits = len(data)
+        return {
+            "%scenter" % self.prefix: np.zeros(n_fits),
+            "%slin_bkg" % self.prefix: np.zeros(n_fits),
+            "%sconst_bkg" % self.prefix: data.min(axis=-1),
+            "%swidth" % self.prefix: np.full(n_fits, 0.02),
+            "%serf_amp" % self.prefix: data.mean(axis=-1) - data.min(axis=-1),
+        }
+
     __init__.doc = lf.models.COMMON_INIT_DOC
     guess.__doc__ = lf.models.COMMON_GUESS_DOC
 
@@ -243,6 +317,8 @@ class TwoBandEdgeBModel(XModelMixin):
 class BandEdgeBModel(XModelMixin):
     """A model for fitting a Lorentzian and background multiplied into the fermi dirac distribution."""
 
+    batchable = True
+
     def __init__(self, independent_vars=("x",), prefix="", missing="raise", name=None, **kwargs):
         """Defer to lmfit for initialization."""
         kwargs.update(
@@ -397,6 +473,8 @@ class FermiDiracAffGaussModel(XModelMixin):
 class GStepBStdevModel(XModelMixin):
     """A model for fitting Fermi functions with a linear background."""
 
+    batchable = True
+
     @staticmethod
     def gstepb_stdev(x, center=0, sigma=1, erf_amp=1, lin_bkg=0, const_bkg=0):
         """Fermi function convolved with a Gaussian together with affine background.
@@ -410,7 +488,11 @@ class GStepBStdevModel(XModelMixin):
             const_bkg: constant background
         """
         dx = x - center
-        return const_bkg + lin_bkg * np.min(dx, 0) + gstep_stdev(x, center, sigma, erf_amp)
+        return (
+            const_bkg
+            + lin_bkg * np.min(dx, axis=-1, keepdims=True)
+            + gstep_stdev(x, center, sigma, erf_amp)
+        )
 
     def __init__(self, independent_vars=("x",), prefix="", missing="raise", name=None, **kwargs):
         """Defer to lmfit for initialization."""
@@ -441,6 +523,8 @@ class GStepBStdevModel(XModelMixin):
 class GStepBStandardModel(XModelMixin):
     """A model for fitting Fermi functions with a linear background."""
 
+    batchable = True
+
     @staticmethod
     def gstepb_standard(x, center=0, sigma=1, amplitude=1, **kwargs):
         """Specializes paramters in gstepb."""
@@ -70,7 +70,9 @@ def gstepb(x, center=0, width=1, erf_amp=1, lin_bkg=0, const_bkg=0):
         The step edge.
     """
     dx = x - center
-    return const_bkg + lin_bkg * np.min(dx, 0) + gstep(x, center, width, erf_amp)
+    return (
+        const_bkg + lin_bkg * np.min(dx, axis=-1, keepdims=True) + gstep(x, center, width, erf_amp)
+    )
 
 
 def gstep(x, center=0, width=1, erf_amp=1):
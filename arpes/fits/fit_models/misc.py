@@ -16,6 +16,8 @@ __all__ = [
 class QuadraticModel(XModelMixin):
     """A model for fitting a quadratic function."""
 
+    batchable = True
+
     @staticmethod
     def quadratic(x, a=1, b=0, c=0):
         """Quadratic polynomial."""
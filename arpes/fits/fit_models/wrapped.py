@@ -6,6 +6,7 @@ from lmfit.models import guess_from_peak, update_param_vals
 
 from .x_model_mixin import XModelMixin
 
+
 __all__ = [
     "VoigtModel",
     "GaussianModel",
@@ -18,6 +19,33 @@ __all__ = [
     "StepModel",
 ]
 
+tiny = np.finfo(np.float64).eps
+
+
+def _guess_from_peak_batched(model, data, x, ampscale=1.0, sigscale=1.0):
+    """Vectorized version of `lmfit.models.guess_from_peak` over a stack of spectra."""
+    maxy, miny = data.max(axis=-1), data.min(axis=-1)
+    cen = x[np.argmax(data, axis=-1)]
+    amp = (maxy - miny) * 3.0
+    sig = np.full(len(data), (x.max() - x.min()) / 6.0)
+
+    # as in lmfit, the half maximum width is measured on the sorted axis, so that descending
+    # coordinates still produce a positive width
+    above = data > ((maxy + miny) / 2.0)[:, None]
+    n_above = above.sum(axis=-1)
+    x_halfmax_max = np.where(above, x, -np.inf).max(axis=-1)
+    x_halfmax_min = np.where(above, x, np.inf).min(axis=-1)
+
+    wide = n_above > 2
+    sig = np.where(wide, (x_halfmax_max - x_halfmax_min) / 2.0, sig)
+    cen = np.where(wide, (above * x).sum(axis=-1) / np.maximum(n_above, 1), cen)
+
+    return {
+        "%samplitude" % model.prefix: amp * sig * ampscale,
+        "%scenter" % model.prefix: cen,
+        "%ssigma" % model.prefix: sig * sigscale,
+    }
+
 
 class VoigtModel(XModelMixin, lf.models.VoigtModel):
     """Wraps `lf.models.VoigtModel`."""
@@ -28,19 +56,41 @@ class VoigtModel(XModelMixin, lf.models.VoigtModel):
 class GaussianModel(XModelMixin, lf.models.GaussianModel):
     """Wraps `lf.models.GaussianModel`."""
 
-    pass
+    batchable = True
+
+    @staticmethod
+    def batched_func(x, amplitude=1.0, center=0.0, sigma=1.0):
+        """Broadcasting version of `lmfit.lineshapes.gaussian`."""
+        return (amplitude / np.maximum(tiny, np.sqrt(2 * np.pi) * sigma)) * np.exp(
+            -((1.0 * x - center) ** 2) / np.maximum(tiny, 2 * sigma**2)
+        )
+
+    def guess_batched(self, data, x=None, **kwargs):
+        """Vectorized version of `guess`."""
+        return _guess_from_peak_batched(self, data, x)
 
 
 class ConstantModel(XModelMixin, lf.models.ConstantModel):
     """Wraps `lf.models.ConstantModel`."""
 
-    pass
+    batchable = True
 
 
 class LorentzianModel(XModelMixin, lf.models.LorentzianModel):
     """Wraps `lf.models.LorentzianModel`."""
 
-    pass
+    batchable = True
+
+    @staticmethod
+    def batched_func(x, amplitude=1.0, center=0.0, sigma=1.0):
+        """Broadcasting version of `lmfit.lineshapes.lorentzian`."""
+        return (amplitude / (1 + ((1.0 * x - center) / np.maximum(tiny, sigma)) ** 2)) / np.maximum(
+            tiny, np.pi * sigma
+        )
+
+    def guess_batched(self, data, x=None, **kwargs):
+        """Vectorized version of `guess`."""
+        return _guess_from_peak_batched(self, data, x, ampscale=1.25)
 
 
 class SkewedVoigtModel(XModelMixin, lf.models.SkewedVoigtModel):
@@ -71,6 +121,8 @@ class SplitLorentzianModel(XModelMixin, lf.models.SplitLorentzianModel):
 class LinearModel(XModelMixin, lf.models.LinearModel):
     """A linear regression model."""
 
+    batchable = True
+
     def guess(self, data, x=None, **kwargs):
         """Use np.polyfit to get good initial parameters."""
         sval, oval = 0.0, 0.0
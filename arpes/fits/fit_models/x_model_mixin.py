@@ -5,6 +5,7 @@ from lmfit.models import GaussianModel
 import xarray as xr
 import lmfit as lf
 import numpy as np
+from typing import Dict
 
 __all__ = ["XModelMixin", "gaussian_convolve"]
 
@@ -35,10 +36,22 @@ class XModelMixin(lf.Model):
 
     __add__ and __mul__ are also implemented, to ensure that the composite model
     remains an instance of a subclass of this mixin.
+
+    Models which set `batchable = True` promise that their model function broadcasts
+    correctly when each parameter is passed as a column of shape `[n_fits, 1]` against
+    a shared independent axis. These models can be fit by the vectorized engine in
+    `arpes.fits.batched`. If the model function itself does not broadcast, a model can
+    provide a `batched_func` with the same signature which does.
+
+    A model may also carry a `kernel`, a fused compiled kernel generated by
+    `arpes.fits.kernels.fuse_model` (as attached by `compile_model`). It is then used to
+    evaluate the residual and as the analytic Jacobian for `leastsq`.
     """
 
     n_dims = 1
     dimension_order = None
+    batchable = False
+    kernel = None
 
     def guess_fit(
         self,
@@ -137,6 +150,14 @@ class XModelMixin(lf.Model):
 
             guessed_params.update(params)
 
+        if (
+            self.kernel is not None
+            and kwargs.get("method", "leastsq") == "leastsq"
+            and "fit_kws" not in kwargs
+            and self.kernel.supports(guessed_params)
+        ):
+            kwargs["fit_kws"] = {"Dfun": self.kernel.jacobian}
+
         result = None
         try:
             result = super().fit(
@@ -153,6 +174,52 @@ class XModelMixin(lf.Model):
         finally:
             return result
 
+    def _parse_params(self):
+        """Normalizes `independent_vars` to a list before `lmfit` inspects the model function.
+
+        Our models declare their independent variables as tuples, but `lmfit` composes models
+        by concatenating these with the lists used by its own models.
+        """
+        if self.independent_vars is not None:
+            self.independent_vars = list(self.independent_vars)
+
+        super()._parse_params()
+
+    def _residual(self, params, data, weights, **kwargs):
+        """Evaluates the residual with the fused kernel, if there is one."""
+        if self.kernel is None or set(kwargs) != {"x"}:
+            return super()._residual(params, data, weights, **kwargs)
+
+        model = self.kernel.evaluate(params, kwargs["x"])
+        if self.nan_policy == "raise" and not np.all(np.isfinite(model)):
+            # as in `lmfit.Model._residual`, NaNs in the data are handled before fitting
+            raise ValueError(
+                "The model function generated NaN values and the fit aborted! Please check "
+                "your model function and/or set boundaries on parameters where applicable."
+            )
+
+        diff = model - data
+        if weights is not None:
+            diff *= weights
+
+        return np.asarray(diff).ravel()
+
+    def guess_batched(self, data: np.ndarray, x=None, **kwargs) -> Dict[str, np.ndarray]:
+        """Makes initial guesses for a stack of spectra at once.
+
+        The default implementation defers to `guess` for each spectrum, models
+        can override this with a vectorized implementation.
+
+        Args:
+            data: The spectra to guess for, with shape `[n_fits, n_points]`
+            x: The shared independent axis
+
+        Returns:
+            A dictionary of parameter name to an array of guessed values, one per spectrum.
+        """
+        guesses = [self.guess(row, x=x, **kwargs) for row in data]
+        return {k: np.array([g[k].value for g in guesses]) for k in guesses[0]}
+
     def xguess(self, data, **kwargs):
         """Tries to determine a guess for the parameters."""
         x = kwargs.pop("x", None)
@@ -171,6 +238,7 @@ class XModelMixin(lf.Model):
 
         assert self.n_dims == other.n_dims
         comp.n_dims = other.n_dims
+        comp.batchable = self.batchable and other.batchable
 
         return comp
 
@@ -180,10 +248,24 @@ class XModelMixin(lf.Model):
 
         assert self.n_dims == other.n_dims
         comp.n_dims = other.n_dims
+        comp.batchable = self.batchable and other.batchable
 
         return comp
 
 
+def _guess_components_batched(self, data: np.ndarray, x=None, **kwargs) -> Dict[str, np.ndarray]:
+    """Batched guesses for a composite model, shared by the `+` and `*` composites.
+
+    Like `guess` on these composites, this simply merges the batched guesses of each
+    component, so that every component's parameters receive an array of initial values.
+    """
+    guessed = {}
+    for c in self.components:
+        guessed.update(c.guess_batched(data, x=x, **kwargs))
+
+    return guessed
+
+
 class XAdditiveCompositeModel(lf.CompositeModel, XModelMixin):
     """xarray coordinate aware composite model corresponding to the sum of two models."""
 
@@ -198,6 +280,8 @@ class XAdditiveCompositeModel(lf.CompositeModel, XModelMixin):
 
         return pars
 
+    guess_batched = _guess_components_batched
+
 
 class XMultiplicativeCompositeModel(lf.CompositeModel, XModelMixin):
     """xarray coordinate aware composite model corresponding to the sum of two models.
@@ -216,6 +300,8 @@ class XMultiplicativeCompositeModel(lf.CompositeModel, XModelMixin):
 
         return pars
 
+    guess_batched = _guess_components_batched
+
 
 class XConvolutionCompositeModel(lf.CompositeModel, XModelMixin):
     """Work in progress for convolving two ``Model``."""
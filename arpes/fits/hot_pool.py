@@ -2,31 +2,58 @@
 
 We keep a pool alive after one is requested at the cost of memory overhead
 because otherwise pools are too slow due to heavy analysis imports (scipy, etc.).
+
+The pool can be configured (worker count, start method, CPU affinity, threads per worker),
+resized, and shut down. See `arpes.fits.executors.ProcessExecutor` for the options.
 """
 
-from multiprocessing import Pool, pool
+from multiprocessing import pool
+from typing import Any, Dict, Optional
 
-# from pathos.pools import ProcessPool
-from typing import Optional
+from .executors import ProcessExecutor
 
 __all__ = ["hot_pool"]
 
 
 class HotPool:
-    _pool: Optional[pool.Pool] = None
+    _executor: Optional[ProcessExecutor] = None
+    _config: Dict[str, Any] = {}
 
     @property
-    def pool(self) -> pool.Pool:
-        if self._pool is not None:
-            return self._pool
+    def executor(self) -> ProcessExecutor:
+        if self._executor is None:
+            self._executor = ProcessExecutor(**self._config)
+
+        return self._executor
 
-        self._pool = Pool()
-        return self._pool
+    @property
+    def pool(self) -> pool.Pool:
+        return self.executor.pool
+
+    def configure(self, **kwargs):
+        """Sets the options for the pool, restarting it on next use if it is running.
+
+        Args:
+            kwargs: Passed to `ProcessExecutor`, i.e. `processes`, `context`, `affinity`,
+              and `threads_per_worker`.
+        """
+        self.shutdown()
+        self._config = kwargs
+
+    def resize(self, processes: int):
+        """Changes the number of worker processes."""
+        self._config = dict(self._config, processes=processes)
+        if self._executor is not None:
+            self._executor.resize(processes)
+
+    def shutdown(self, wait: bool = True):
+        """Stops the pool, by default letting in-flight tasks finish."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
 
     def __del__(self):
-        if self._pool is not None:
-            self._pool.close()
-            self._pool = None
+        self.shutdown(wait=False)
 
 
 hot_pool = HotPool()
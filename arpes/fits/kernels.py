@@ -0,0 +1,400 @@
+"""Compiled lineshape kernels with analytic derivatives, fused across composite models.
+
+Each evaluation of a composite `lmfit` model walks the composite tree, builds the function
+arguments of every component from the `lmfit.Parameters`, and allocates NumPy temporaries for
+every intermediate result. `leastsq` additionally estimates the Jacobian by finite differences,
+which costs one such evaluation per varying parameter on every iteration.
+
+Here, common lineshapes have scalar numba kernels returning their value together with their
+derivatives with respect to each parameter. `fuse_model` walks a composite model built from
+these lineshapes with `+`, `-`, `*`, and `/`, and generates a single numba kernel which
+evaluates the whole model and its Jacobian in one pass over the independent axis, using the
+sum, product, and quotient rules to combine component derivatives.
+
+`XModelMixin` uses a fused kernel, when one is attached to the model, both to evaluate the
+residual and as the analytic Jacobian (`Dfun`) for `leastsq`.
+"""
+
+import math
+import operator
+from typing import Dict, List, Optional, Tuple
+
+import lmfit as lf
+import numba
+import numpy as np
+
+__all__ = (
+    "FusedKernel",
+    "fuse_model",
+    "register_kernel",
+)
+
+# matches the guards in `lmfit.lineshapes`
+TINY = 1.0e-15
+
+
+@numba.njit(cache=True)
+def affine_bkg_kernel(x, lin_bkg, const_bkg):
+    return lin_bkg * x + const_bkg, x, 1.0
+
+
+@numba.njit(cache=True)
+def linear_kernel(x, slope, intercept):
+    return slope * x + intercept, x, 1.0
+
+
+@numba.njit(cache=True)
+def constant_kernel(x, c):
+    return c, 1.0
+
+
+@numba.njit(cache=True)
+def lorentzian_kernel(x, amplitude, center, sigma):
+    """`lmfit.lineshapes.lorentzian`, parametrized by the half width `sigma`."""
+    d = x - center
+    s = max(TINY, sigma)
+    denominator = d * d + s * s
+    value = amplitude * s / (math.pi * denominator)
+    return (
+        value,
+        s / (math.pi * denominator),
+        2 * value * d / denominator,
+        amplitude * (d * d - s * s) / (math.pi * denominator * denominator),
+    )
+
+
+@numba.njit(cache=True)
+def gaussian_kernel(x, amplitude, center, sigma):
+    """`lmfit.lineshapes.gaussian`."""
+    d = x - center
+    s = max(TINY, sigma)
+    shape = math.exp(-d * d / (2 * s * s)) / (math.sqrt(2 * math.pi) * s)
+    value = amplitude * shape
+    return value, shape, value * d / (s * s), value * (d * d / (s * s * s) - 1 / s)
+
+
+@numba.njit(cache=True)
+def fermi_dirac_kernel(x, center, width, scale):
+    """`functional_forms.fermi_dirac`."""
+    occupation = 1 / (math.exp((x - center) / width) + 1)
+    slope = scale * occupation * (1 - occupation) / width
+    return scale * occupation, slope, slope * (x - center) / width, occupation
+
+
+@numba.njit(cache=True)
+def _arpes_lorentzian(x, gamma, center, amplitude):
+    """`functional_forms.lorentzian`, parametrized by the full width `gamma`."""
+    d = x - center
+    denominator = d * d + 0.25 * gamma * gamma
+    value = amplitude * gamma / (2 * math.pi * denominator)
+    return (
+        value,
+        amplitude * (d * d - 0.25 * gamma * gamma) / (2 * math.pi * denominator * denominator),
+        2 * value * d / denominator,
+        gamma / (2 * math.pi * denominator),
+    )
+
+
+@numba.njit(cache=True)
+def band_edge_bkg_kernel(
+    x, center, width, amplitude, gamma, lor_center, offset, lin_bkg, const_bkg
+):
+    """`functional_forms.band_edge_bkg`."""
+    lor, d_gamma, d_lor_center, d_amplitude = _arpes_lorentzian(x, gamma, lor_center, amplitude)
+    fd, d_center, d_width, _ = fermi_dirac_kernel(x, center, width, 1.0)
+    dos = lor + lin_bkg * x + const_bkg
+    return (
+        dos * fd + offset,
+        dos * d_center,
+        dos * d_width,
+        d_amplitude * fd,
+        d_gamma * fd,
+        d_lor_center * fd,
+        1.0,
+        x * fd,
+        fd,
+    )
+
+
+@numba.njit(cache=True)
+def twolorentzian_kernel(x, gamma, t_gamma, center, t_center, amp, t_amp, lin_bkg, const_bkg):
+    """`functional_forms.twolorentzian`."""
+    first, d_gamma, d_center, d_amp = _arpes_lorentzian(x, gamma, center, amp)
+    second, d_t_gamma, d_t_center, d_t_amp = _arpes_lorentzian(x, t_gamma, t_center, t_amp)
+    return (
+        first + second + lin_bkg * x + const_bkg,
+        d_gamma,
+        d_t_gamma,
+        d_center,
+        d_t_center,
+        d_amp,
+        d_t_amp,
+        x,
+        1.0,
+    )
+
+
+# kernel name -> (kernel, root parameter names in the order the kernel takes them)
+KERNELS: Dict[str, Tuple[object, Tuple[str, ...]]] = {}
+
+# model class -> kernel name. Classes are matched exactly, as subclasses may change the function.
+MODEL_KERNELS: Dict[type, str] = {}
+
+
+def register_kernel(model_cls: type, kernel, param_names: Tuple[str, ...]):
+    """Registers a scalar numba kernel for a model class so that it can take part in fusion.
+
+    Args:
+        model_cls: The model class, matched exactly
+        kernel: A `numba.njit` function taking `x` followed by the model parameters in the
+          order of `param_names`, and returning a tuple of the model value followed by its
+          derivative with respect to each parameter in the same order
+        param_names: The unprefixed parameter names of the model function
+    """
+    name = "{}_{}".format(kernel.__name__, len(KERNELS))
+    KERNELS[name] = (kernel, tuple(param_names))
+    MODEL_KERNELS[model_cls] = name
+
+
+def _register_builtin_kernels():
+    from .fit_models import (
+        AffineBackgroundModel,
+        BandEdgeBModel,
+        ConstantModel,
+        FermiDiracModel,
+        GaussianModel,
+        LinearModel,
+        LorentzianModel,
+        TwoLorModel,
+    )
+
+    register_kernel(AffineBackgroundModel, affine_bkg_kernel, ("lin_bkg", "const_bkg"))
+    register_kernel(LinearModel, linear_kernel, ("slope", "intercept"))
+    register_kernel(ConstantModel, constant_kernel, ("c",))
+    register_kernel(LorentzianModel, lorentzian_kernel, ("amplitude", "center", "sigma"))
+    register_kernel(GaussianModel, gaussian_kernel, ("amplitude", "center", "sigma"))
+    register_kernel(FermiDiracModel, fermi_dirac_kernel, ("center", "width", "scale"))
+    register_kernel(
+        BandEdgeBModel,
+        band_edge_bkg_kernel,
+        (
+            "center",
+            "width",
+            "amplitude",
+            "gamma",
+            "lor_center",
+            "offset",
+            "lin_bkg",
+            "const_bkg",
+        ),
+    )
+    register_kernel(
+        TwoLorModel,
+        twolorentzian_kernel,
+        ("gamma", "t_gamma", "center", "t_center", "amp", "t_amp", "lin_bkg", "const_bkg"),
+    )
+
+
+class _Unsupported(Exception):
+    pass
+
+
+class _Emitter:
+    """Generates the body of a fused kernel from a composite model."""
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.param_names: List[str] = []
+        self.kernels: List[str] = []
+        self._count = 0
+
+    def fresh(self, root: str) -> str:
+        self._count += 1
+        return "{}{}".format(root, self._count)
+
+    def param(self, name: str) -> int:
+        if name not in self.param_names:
+            self.param_names.append(name)
+        return self.param_names.index(name)
+
+    def assign(self, expression: str) -> str:
+        variable = self.fresh("t")
+        self.lines.append("{} = {}".format(variable, expression))
+        return variable
+
+    def emit(self, model: lf.Model) -> Tuple[str, Dict[int, str]]:
+        """Emits code for `model`, returning its value variable and gradient variables."""
+        if isinstance(model, lf.CompositeModel):
+            return self.emit_composite(model)
+
+        kernel_name = MODEL_KERNELS.get(type(model))
+        if kernel_name is None or list(model.independent_vars) != ["x"]:
+            raise _Unsupported(type(model).__name__)
+
+        _, root_names = KERNELS[kernel_name]
+        indices = [self.param(model.prefix + root) for root in root_names]
+
+        value = self.fresh("v")
+        grads = {index: self.fresh("g") for index in indices}
+        if kernel_name not in self.kernels:
+            self.kernels.append(kernel_name)
+
+        self.lines.append(
+            "{} = {}(xi, {})".format(
+                ", ".join([value] + [grads[i] for i in indices]),
+                kernel_name,
+                ", ".join("p[{}]".format(i) for i in indices),
+            )
+        )
+        return value, grads
+
+    def emit_composite(self, model: lf.CompositeModel) -> Tuple[str, Dict[int, str]]:
+        a, grads_a = self.emit(model.left)
+        b, grads_b = self.emit(model.right)
+        op = model.op
+
+        if op is operator.add or op is operator.sub:
+            sign = "+" if op is operator.add else "-"
+            value = self.assign("{} {} {}".format(a, sign, b))
+            grads = dict(grads_a)
+            for index, grad in grads_b.items():
+                if index in grads_a:
+                    grads[index] = self.assign("{} {} {}".format(grads_a[index], sign, grad))
+                else:
+                    grads[index] = grad if sign == "+" else self.assign("-{}".format(grad))
+            return value, grads
+
+        if op is operator.mul:
+            value = self.assign("{} * {}".format(a, b))
+            grads = {}
+            for index in sorted(set(grads_a) | set(grads_b)):
+                terms = []
+                if index in grads_a:
+                    terms.append("{} * {}".format(grads_a[index], b))
+                if index in grads_b:
+                    terms.append("{} * {}".format(a, grads_b[index]))
+                grads[index] = self.assign(" + ".join(terms))
+            return value, grads
+
+        if op is operator.truediv:
+            value = self.assign("{} / {}".format(a, b))
+            grads = {}
+            for index in sorted(set(grads_a) | set(grads_b)):
+                terms = []
+                if index in grads_a:
+                    terms.append("{} / {}".format(grads_a[index], b))
+                if index in grads_b:
+                    terms.append("- {} * {} / ({} * {})".format(a, grads_b[index], b, b))
+                grads[index] = self.assign(" ".join(terms))
+            return value, grads
+
+        raise _Unsupported(str(op))
+
+
+_COMPILED: Dict[str, object] = {}
+
+
+def _compile_source(source: str, kernel_names: List[str]):
+    """Compiles generated source, sharing the result between models with the same structure."""
+    if source not in _COMPILED:
+        namespace = {name: KERNELS[name][0] for name in kernel_names}
+        exec(source, namespace)  # pylint: disable=exec-used
+        _COMPILED[source] = numba.njit(namespace["fused"])
+
+    return _COMPILED[source]
+
+
+class FusedKernel:
+    """A compiled model function and Jacobian for a composite of registered lineshapes.
+
+    Instances are cheap to pickle, the compiled function is rebuilt from its source on first
+    use in another process.
+    """
+
+    def __init__(self, param_names: List[str], source: str, kernel_names: List[str]):
+        """Records the generated source, which is compiled on first use."""
+        self.param_names = param_names
+        self.source = source
+        self.kernel_names = kernel_names
+        self._fused = None
+
+    @property
+    def fused(self):
+        if self._fused is None:
+            self._fused = _compile_source(self.source, self.kernel_names)
+        return self._fused
+
+    def __getstate__(self):
+        """Drops the compiled function, which cannot be pickled."""
+        return dict(self.__dict__, _fused=None)
+
+    def supports(self, params: lf.Parameters) -> bool:
+        """Whether the Jacobian is valid for `params`.
+
+        Parameters of the kernel constrained by expressions depend on other parameters, which
+        the Jacobian does not account for.
+        """
+        return all(params[name].expr is None for name in self.param_names)
+
+    def _run(self, params: lf.Parameters, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        p = np.array([params[name].value for name in self.param_names], dtype=np.float64)
+        x = np.ascontiguousarray(x, dtype=np.float64)
+        value = np.empty(len(x))
+        jacobian = np.empty((len(x), len(p)))
+        self.fused(x, p, value, jacobian)
+        return value, jacobian
+
+    def evaluate(self, params: lf.Parameters, x: np.ndarray) -> np.ndarray:
+        """The value of the model at `x`."""
+        return self._run(params, x)[0]
+
+    def jacobian(
+        self, params: lf.Parameters, data: np.ndarray, weights: Optional[np.ndarray], x=None, **_
+    ) -> np.ndarray:
+        """The Jacobian of the `lmfit` residual with respect to the varying parameters.
+
+        This has the signature `lmfit` expects of `Dfun` for `leastsq`, i.e. it is called with
+        the parameters followed by the arguments of the residual.
+        """
+        _, jacobian = self._run(params, x)
+        columns = [
+            self.param_names.index(name)
+            for name, param in params.items()
+            if param.vary and param.expr is None
+        ]
+        jacobian = jacobian[:, columns]
+        if weights is not None:
+            jacobian *= np.asarray(weights, dtype=np.float64).reshape(-1, 1)
+
+        return jacobian
+
+
+def fuse_model(model: lf.Model) -> Optional[FusedKernel]:
+    """Generates a fused kernel for `model`, or None if some component has no kernel.
+
+    Args:
+        model: A model or composite of models with registered kernels, see `register_kernel`.
+          The composite may only use the `+`, `-`, `*`, and `/` operators.
+
+    Returns:
+        The fused kernel, or None if the model cannot be fused.
+    """
+    if not MODEL_KERNELS:
+        _register_builtin_kernels()
+
+    emitter = _Emitter()
+    try:
+        value, grads = emitter.emit(model)
+    except _Unsupported:
+        return None
+
+    n_params = len(emitter.param_names)
+    body = ["xi = x[i]"] + emitter.lines + ["value[i] = {}".format(value)]
+    body += [
+        "jacobian[i, {}] = {}".format(index, grads.get(index, "0.0")) for index in range(n_params)
+    ]
+    source = "def fused(x, p, value, jacobian):\n    for i in range(x.shape[0]):\n{}\n".format(
+        "\n".join("        " + line for line in body)
+    )
+
+    return FusedKernel(emitter.param_names, source, emitter.kernels)
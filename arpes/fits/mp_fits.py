@@ -2,6 +2,7 @@
 
 Uses dill for IPC due to issues with pickling `lmfit` instances.
 """
+import numpy as np
 import xarray as xr
 from typing import Any, List, Optional
 from .broadcast_common import apply_window, compile_model, unwrap_params
@@ -91,6 +92,10 @@ class MPWorker:
 
         if fit_result is None:
             true_residual = None
+        elif self.window is None and self.safe:
+            # NaN points were not fit, so they have no residual
+            true_residual = np.full(original_cut_data.shape, np.nan)
+            true_residual[~np.isnan(original_cut_data.values)] = fit_result.residual
         elif self.window is None:
             true_residual = fit_result.residual
         else:
@@ -0,0 +1,329 @@
+"""Shared memory transport for process parallel curve fitting.
+
+`MPWorker` closes over the full input `xr.DataArray`, so the data is pickled again for
+every task sent to the pool, and every result is sent back as a `dill` serialized
+`lmfit.model.ModelResult` which must then be deserialized in the parent.
+
+Here instead the input cube, the weights, and all of the dense result arrays of a
+`FitResultArray` live in memory mapped files, in `/dev/shm` where it is available so
+that they are backed by shared memory rather than disk. Workers receive only the paths
+of those arrays together with a range of fit indices, fit their range, and write each
+result directly into the shared arrays. Nothing but the index range travels back to the
+parent.
+
+Memory mapped files are used rather than `multiprocessing.shared_memory` because they
+behave identically in forked, spawned, and threaded workers, and their lifetime is not
+tied to `multiprocessing`'s resource tracker.
+"""
+
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .broadcast_common import compile_model
+from .executors import FitExecutor
+from .result_array import FitResultArray
+from .strategies import WarmStart, grid_neighbors
+
+__all__ = (
+    "SharedArrays",
+    "SharedMPWorker",
+    "fit_on_pool",
+)
+
+
+@dataclass(frozen=True)
+class SharedArraySpec:
+    """Everything needed to attach to an array shared between processes."""
+
+    path: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+
+class SharedArrays:
+    """Owns a collection of named numpy arrays which can be attached from other processes.
+
+    Use as a context manager, on exit the backing files are removed, so any arrays
+    which should outlive the context must be copied out first.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        """Creates a scratch directory for the arrays, by default in `/dev/shm` if possible."""
+        if directory is None and os.path.isdir("/dev/shm"):
+            directory = "/dev/shm"
+
+        self._directory = tempfile.mkdtemp(prefix="arpes-fits-", dir=directory)
+        self.arrays: Dict[str, np.ndarray] = {}
+        self.specs: Dict[str, SharedArraySpec] = {}
+
+    def create(self, key: str, shape: Tuple[int, ...], dtype: Any) -> np.ndarray:
+        """Allocates an uninitialized shared array under `key`."""
+        dtype = np.dtype(dtype)
+        path = os.path.join(self._directory, "{}.npy".format(key))
+
+        self.arrays[key] = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        self.specs[key] = SharedArraySpec(path=path, shape=tuple(shape), dtype=dtype.str)
+        return self.arrays[key]
+
+    def share(self, key: str, array: np.ndarray) -> np.ndarray:
+        """Copies `array` into a shared array under `key`."""
+        shared = self.create(key, array.shape, array.dtype)
+        shared[...] = array
+        return shared
+
+    def close(self):
+        """Releases the arrays and removes their backing files."""
+        self.arrays = {}
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    def __enter__(self) -> "SharedArrays":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def attach(specs: Dict[str, SharedArraySpec]) -> Dict[str, np.ndarray]:
+    """Attaches to arrays created by `SharedArrays`, possibly in another process."""
+    return {key: np.load(spec.path, mmap_mode="r+") for key, spec in specs.items()}
+
+
+def _select_fit(params: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """Picks the hints for a single fit out of hints unwrapped with `unwrap_params_batched`."""
+
+    def transform_or_walk(v):
+        if isinstance(v, dict):
+            return _select_fit(v, index)
+
+        if isinstance(v, np.ndarray):
+            return v[index].item()
+
+        return v
+
+    return {k: transform_or_walk(v) for k, v in params.items()}
+
+
+@dataclass
+class SharedMPWorker:
+    """Worker which fits ranges of a broadcast using data and results in shared memory.
+
+    Like `MPWorker`, this is a closure over the fitting settings, but it holds no data
+    itself, only the `SharedArraySpec`s of the input and output arrays.
+
+    With a `WarmStart` strategy, each task is instead a strip of a path through the
+    broadcast grid, which is fit in order with each fit seeded from its neighbors.
+    """
+
+    specs: Dict[str, SharedArraySpec]
+    uncompiled_model: Any
+    prefixes: Optional[List[str]]
+    params: Any
+    hints: Dict[str, Any]
+    param_names: List[str]
+    var_names: List[str]
+    x: np.ndarray
+
+    safe: bool = False
+
+    # when warm starting, tasks are paths through a grid of this shape rather than ranges
+    strategy: Optional[WarmStart] = None
+    grid_shape: Tuple[int, ...] = ()
+
+    _model: Any = field(init=False, default=None)
+
+    @property
+    def model(self):
+        """Compiles and caches the model used for curve fitting."""
+        if self._model is None:
+            self._model = compile_model(
+                self.uncompiled_model, params=self.params, prefixes=self.prefixes
+            )
+            self._model.make_params()
+
+        return self._model
+
+    def _fit(self, data: np.ndarray, weights: Optional[np.ndarray], index: int, hints):
+        mask = np.isfinite(data[index]) if self.safe else slice(None)
+        weights_for = None if weights is None else weights[index][mask]
+
+        return self.model.guess_fit(
+            data[index][mask], params=hints, weights=weights_for, x=self.x[mask]
+        )
+
+    def _seeded_hints(self, store: FitResultArray, index: int, seed: Optional[int]):
+        """The hints for fit `index`, with varying parameters started from fit `seed`."""
+        hints = _select_fit(self.hints, index)
+        if seed is None:
+            return hints
+
+        # hints replace the guessed parameter, so keep the model's bounds unless overridden
+        base_params = self.model.make_params()
+        for name in self.var_names:
+            hint = hints.get(name)
+            if not isinstance(hint, dict):
+                hint = {"min": base_params[name].min, "max": base_params[name].max}
+
+            hints[name] = dict(hint, value=store.values[seed, store.param_index(name)])
+
+        return hints
+
+    def _fit_warm_started(self, data, weights, store: FitResultArray, path: Sequence[int]):
+        """Fits `path` in order, seeding each fit from the neighbors fit before it."""
+        fitted = set()
+        previous = None
+        for i in path:
+            i = int(i)
+            neighbors = [n for n in grid_neighbors(i, self.grid_shape) if n in fitted]
+            seeds = [s for s in [previous] + neighbors if s is not None and store.success[s]]
+            # the model's own guess is the last resort
+            seeds = list(dict.fromkeys(seeds))
+            seeds = (seeds[: max(1, self.strategy.max_retries)] + [None])[
+                : self.strategy.max_retries + 1
+            ]
+
+            best = None
+            for seed in seeds:
+                fit_result = self._fit(data, weights, i, self._seeded_hints(store, i, seed))
+                if fit_result is None:
+                    continue
+
+                if best is None or fit_result.chisqr < best.chisqr:
+                    best = fit_result
+
+                if fit_result.success and fit_result.errorbars:
+                    break
+
+            try:
+                store.set_result(i, best)
+            except ValueError:
+                # leave this fit marked as failed
+                pass
+
+            fitted.add(i)
+            previous = i
+
+    def __call__(self, task: Union[Tuple[int, int], np.ndarray]):
+        """Fits every index in `[start, stop)`, or along a path of indices when warm starting.
+
+        Results are written to shared memory, and the task is returned to mark completion.
+        """
+        arrays = attach(self.specs)
+        data, weights = arrays.pop("input"), arrays.pop("input_weights", None)
+        store = FitResultArray(
+            model=self.model,
+            x=self.x,
+            param_names=self.param_names,
+            var_names=self.var_names,
+            **arrays,
+        )
+
+        if self.strategy is not None:
+            self._fit_warm_started(data, weights, store, task)
+            return task
+
+        for i in range(*task):
+            fit_result = self._fit(data, weights, i, _select_fit(self.hints, i))
+            try:
+                store.set_result(i, fit_result)
+            except ValueError:
+                # leave this fit marked as failed
+                pass
+
+        return task
+
+
+def _index_ranges(n_fits: int, chunk_size: int) -> List[Tuple[int, int]]:
+    return [(start, min(start + chunk_size, n_fits)) for start in range(0, n_fits, chunk_size)]
+
+
+def fit_on_pool(
+    executor: FitExecutor,
+    uncompiled_model: Any,
+    data: np.ndarray,
+    x: np.ndarray,
+    params: Any,
+    hints: Dict[str, Any],
+    prefixes: Optional[List[str]] = None,
+    weights: Optional[np.ndarray] = None,
+    safe: bool = False,
+    x_dim: str = "x",
+    chunk_size: Optional[int] = None,
+    strategy: Optional[WarmStart] = None,
+    grid_shape: Optional[Tuple[int, ...]] = None,
+    wrap_progress: Callable[..., Iterable] = lambda x, *_, **__: x,
+) -> FitResultArray:
+    """Fits a stack of 1D spectra on an executor through shared memory.
+
+    Args:
+        executor: The executor which runs the fitting tasks, see `arpes.fits.executors`
+        uncompiled_model: The model specification, as passed to `compile_model`
+        data: The spectra to fit with shape `[n_fits, n_points]`
+        x: The shared independent axis
+        params: The parameter specification, as passed to `compile_model`
+        hints: Parameter hints unwrapped to one value per fit with `unwrap_params_batched`
+        prefixes: Model prefixes, as passed to `compile_model`
+        weights: Optional weights with the same shape as `data`
+        safe: Whether to drop NaN values before fitting
+        x_dim: The name of the independent axis
+        chunk_size: The number of fits in each task, by default as chosen by the executor
+        strategy: If provided, fits are warm started along strips of a path through the
+          broadcast grid rather than fit independently, see `arpes.fits.strategies`
+        grid_shape: The shape of the broadcast grid, laid out in C order over the fits.
+          Required when warm starting.
+        wrap_progress: Used to wrap the iterator over completed tasks, i.e. a progress bar
+
+    Returns:
+        The collected results, copied out of shared memory.
+    """
+    n_fits = len(data)
+    model = compile_model(uncompiled_model, params=params, prefixes=prefixes)
+    base_params = model.make_params()
+    for name, hint in hints.items():
+        if isinstance(hint, dict) and name in base_params and "vary" in hint:
+            base_params[name].vary = bool(hint["vary"])
+
+    param_names = list(base_params.keys())
+    var_names = [k for k, p in base_params.items() if p.vary and p.expr is None]
+
+    if chunk_size is None:
+        chunk_size = executor.chunk_size(n_fits)
+
+    with SharedArrays() as shared:
+        store = FitResultArray.allocate(
+            model, x, param_names, var_names, n_fits, x_dim=x_dim, allocator=shared.create
+        )
+        shared.share("input", np.ascontiguousarray(data, dtype=np.float64))
+        if weights is not None:
+            shared.share("input_weights", np.ascontiguousarray(weights, dtype=np.float64))
+
+        worker = SharedMPWorker(
+            specs=shared.specs,
+            uncompiled_model=uncompiled_model,
+            prefixes=prefixes,
+            params=params,
+            hints=hints,
+            param_names=param_names,
+            var_names=var_names,
+            x=np.asarray(x),
+            safe=safe,
+            strategy=strategy,
+            grid_shape=tuple(grid_shape or (n_fits,)),
+        )
+
+        if strategy is None:
+            tasks = _index_ranges(n_fits, chunk_size)
+        else:
+            tasks = strategy.strips(worker.grid_shape, executor.n_workers)
+
+        for _ in wrap_progress(
+            executor.imap(worker, tasks), total=len(tasks), desc="Fitting in parallel..."
+        ):
+            pass
+
+        # copy out of shared memory before it is released
+        return store.take(np.arange(n_fits))
@@ -0,0 +1,494 @@
+"""Columnar storage for the results of a broadcast curve fit.
+
+Historically `broadcast_model` stored one full `lmfit.model.ModelResult` per fit in an object
+array. Each of these carries its own copy of the data, weights, residual, and covariance,
+and collecting a parameter across the fits meant walking the object array in Python.
+
+Here instead, all fits of a broadcast share one `FitResultArray` holding dense arrays of
+shape `[n_fits, ...]`. The "results" array of a broadcast contains lightweight
+`FitResultView` instances which read from the shared store, so that `.F.p` and `.F.s` are
+array views and the results can be written to NetCDF with `FitResultArray.to_dataset`.
+A full `lmfit.model.ModelResult` is only rebuilt when a single fit is inspected. As before,
+fits which raised and so produced no result at all are `None` in the "results" array.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import lmfit as lf
+import numpy as np
+import xarray as xr
+
+from arpes.analysis.band_analysis_utils import ParamType
+
+__all__ = (
+    "FitResultArray",
+    "FitResultView",
+)
+
+
+@dataclass(eq=False)
+class FitResultArray:
+    """Dense results for a collection of 1D fits sharing a model and independent axis.
+
+    Arrays have a leading dimension of length `n_fits`. Parameter arrays have a trailing
+    dimension indexed in the order of `param_names`, the covariance matrix is indexed by
+    the order of `var_names` which is the subset of parameters which were varied.
+
+    Points which did not take part in a fit (masked NaNs, points outside of a window) have
+    NaN `data`, `residual`, and `best_fit` and zero weight.
+    """
+
+    model: lf.Model
+    x: np.ndarray
+    param_names: List[str]
+    var_names: List[str]
+    values: np.ndarray
+    stderr: np.ndarray
+    init_values: np.ndarray
+    covar: np.ndarray
+    redchi: np.ndarray
+    chisqr: np.ndarray
+    success: np.ndarray
+    nfev: np.ndarray
+    residual: np.ndarray
+    best_fit: np.ndarray
+    data: np.ndarray
+    weights: np.ndarray
+    x_dim: str = "x"
+
+    # the object array of views produced by `to_dataarray`, used to recognize an unmodified
+    # results array so that parameters can be read without gathering
+    objects: Optional[np.ndarray] = field(default=None, init=False, repr=False)
+
+    def __len__(self):
+        """The number of fits in the collection."""
+        return len(self.values)
+
+    def param_index(self, param_name: str) -> int:
+        """The column of `values` and `stderr` corresponding to `param_name`."""
+        return self.param_names.index(param_name)
+
+    def param(self, param_name: str) -> np.ndarray:
+        """The fitted values of `param_name` for every fit, NaN if there is no such parameter."""
+        if param_name not in self.param_names:
+            return np.full(len(self), np.nan)
+
+        return self.values[:, self.param_index(param_name)]
+
+    def param_stderr(self, param_name: str) -> np.ndarray:
+        """The standard errors of `param_name` for every fit, NaN where these are unavailable."""
+        if param_name not in self.param_names:
+            return np.full(len(self), np.nan)
+
+        return self.stderr[:, self.param_index(param_name)]
+
+    def mean_square_error(self) -> np.ndarray:
+        """The mean square residual of every fit over the points which were fit."""
+        n_fitted = np.isfinite(self.residual).sum(axis=-1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n_fitted > 0, np.nansum(self.residual**2, axis=-1) / n_fitted, np.nan)
+
+    def result(self, index: int) -> "FitResultView":
+        """A lightweight view of a single fit in the collection."""
+        return FitResultView(self, index)
+
+    def take(self, indices: np.ndarray) -> "FitResultArray":
+        """Selects a subset (or a reordering) of the fits into a new `FitResultArray`."""
+        indices = np.asarray(indices, dtype=np.int64)
+        return FitResultArray(
+            model=self.model,
+            x=self.x,
+            param_names=list(self.param_names),
+            var_names=list(self.var_names),
+            values=self.values[indices],
+            stderr=self.stderr[indices],
+            init_values=self.init_values[indices],
+            covar=self.covar[indices],
+            redchi=self.redchi[indices],
+            chisqr=self.chisqr[indices],
+            success=self.success[indices],
+            nfev=self.nfev[indices],
+            residual=self.residual[indices],
+            best_fit=self.best_fit[indices],
+            data=self.data[indices],
+            weights=self.weights[indices],
+            x_dim=self.x_dim,
+        )
+
+    def to_dataarray(self, template: xr.DataArray) -> xr.DataArray:
+        """Produces the "results" array of views, with the shape and coordinates of `template`.
+
+        Fits are laid out in C order over `template`, as in `broadcast_model`. Fits which were
+        never performed (`nfev == 0`, as for a fit which raised) are `None`.
+        """
+        objects = np.empty(len(self), dtype=object)
+        for i in np.flatnonzero(self.nfev > 0):
+            objects[i] = FitResultView(self, i)
+
+        results = xr.DataArray(
+            objects.reshape(template.shape), coords=template.coords, dims=template.dims
+        )
+        self.objects = results.values
+        return results
+
+    def to_dataset(self, template: xr.DataArray) -> xr.Dataset:
+        """Converts the results into a dataset of plain numeric arrays, suitable for NetCDF.
+
+        Args:
+            template: An array with the broadcast dimensions and coordinates, laid out in the
+              same order as the fits. Typically the "results" array of a broadcast.
+
+        Returns:
+            A dataset with the parameter values and standard errors along a "param" dimension,
+            the covariance along "var" and "var_", the residual, best fit, data, and weights
+            along the independent axis, and the per-fit statistics.
+        """
+        dims = list(template.dims)
+        shape = tuple(template.shape)
+
+        def per_fit(arr):
+            return arr.reshape(shape + arr.shape[1:])
+
+        coords = {d: template.coords[d].values for d in dims if d in template.coords}
+        coords.update(
+            {
+                self.x_dim: self.x,
+                "param": list(self.param_names),
+                "var": list(self.var_names),
+                "var_": list(self.var_names),
+            }
+        )
+
+        return xr.Dataset(
+            {
+                "value": (dims + ["param"], per_fit(self.values)),
+                "stderr": (dims + ["param"], per_fit(self.stderr)),
+                "init_value": (dims + ["param"], per_fit(self.init_values)),
+                "covar": (dims + ["var", "var_"], per_fit(self.covar)),
+                "redchi": (dims, per_fit(self.redchi)),
+                "chisqr": (dims, per_fit(self.chisqr)),
+                "success": (dims, per_fit(self.success)),
+                "nfev": (dims, per_fit(self.nfev)),
+                "residual": (dims + [self.x_dim], per_fit(self.residual)),
+                "best_fit": (dims + [self.x_dim], per_fit(self.best_fit)),
+                "data": (dims + [self.x_dim], per_fit(self.data)),
+                "weights": (dims + [self.x_dim], per_fit(self.weights)),
+            },
+            coords=coords,
+            attrs={"x_dim": self.x_dim},
+        )
+
+    @classmethod
+    def from_dataset(cls, dataset: xr.Dataset, model: lf.Model) -> "FitResultArray":
+        """Restores results written with `to_dataset`.
+
+        The model is not stored in the dataset and must be provided, typically by compiling
+        the same specification passed to `broadcast_model`. The "results" array can then be
+        recovered with `.to_dataarray(dataset.redchi)`.
+        """
+        x_dim = dataset.attrs.get("x_dim", "x")
+        fit_dims = list(dataset.redchi.dims)
+        n_fits = int(np.prod([dataset.dims[d] for d in fit_dims], dtype=np.int64))
+
+        def per_fit(name, *trailing):
+            arr = dataset[name].transpose(*fit_dims, *trailing).values
+            return arr.reshape((n_fits,) + arr.shape[len(fit_dims) :])
+
+        return cls(
+            model=model,
+            x=dataset.coords[x_dim].values,
+            param_names=[str(p) for p in dataset.coords["param"].values],
+            var_names=[str(v) for v in dataset.coords["var"].values],
+            values=per_fit("value", "param"),
+            stderr=per_fit("stderr", "param"),
+            init_values=per_fit("init_value", "param"),
+            covar=per_fit("covar", "var", "var_"),
+            redchi=per_fit("redchi"),
+            chisqr=per_fit("chisqr"),
+            success=per_fit("success").astype(bool),
+            nfev=per_fit("nfev"),
+            residual=per_fit("residual", x_dim),
+            best_fit=per_fit("best_fit", x_dim),
+            data=per_fit("data", x_dim),
+            weights=per_fit("weights", x_dim),
+            x_dim=x_dim,
+        )
+
+    @classmethod
+    def allocate(
+        cls,
+        model: lf.Model,
+        x: np.ndarray,
+        param_names: List[str],
+        var_names: List[str],
+        n_fits: int,
+        x_dim: str = "x",
+        allocator: Optional[Callable[[str, Tuple[int, ...], Any], np.ndarray]] = None,
+    ) -> "FitResultArray":
+        """Allocates storage for `n_fits` fits, initially all marked as failed.
+
+        Args:
+            model: The compiled model
+            x: The shared independent axis
+            param_names: All parameter names, including derived parameters
+            var_names: The names of the varying parameters, which index the covariance
+            n_fits: The number of fits
+            x_dim: The name of the independent axis
+            allocator: Called as `allocator(field_name, shape, dtype)` to provide the memory
+              for each array, for instance in shared memory. Defaults to `np.empty`.
+        """
+        if allocator is None:
+            allocator = lambda _, shape, dtype: np.empty(shape, dtype=dtype)
+
+        n_params, n_vars, n_points = len(param_names), len(var_names), len(x)
+        layout = {
+            "values": ((n_fits, n_params), np.float64, np.nan),
+            "stderr": ((n_fits, n_params), np.float64, np.nan),
+            "init_values": ((n_fits, n_params), np.float64, np.nan),
+            "covar": ((n_fits, n_vars, n_vars), np.float64, np.nan),
+            "redchi": ((n_fits,), np.float64, np.nan),
+            "chisqr": ((n_fits,), np.float64, np.nan),
+            "success": ((n_fits,), np.bool_, False),
+            "nfev": ((n_fits,), np.int64, 0),
+            "residual": ((n_fits, n_points), np.float64, np.nan),
+            "best_fit": ((n_fits, n_points), np.float64, np.nan),
+            "data": ((n_fits, n_points), np.float64, np.nan),
+            "weights": ((n_fits, n_points), np.float64, 0),
+        }
+
+        arrays = {}
+        for name, (shape, dtype, fill) in layout.items():
+            arrays[name] = allocator(name, shape, dtype)
+            arrays[name][...] = fill
+
+        return cls(
+            model=model,
+            x=np.asarray(x),
+            param_names=list(param_names),
+            var_names=list(var_names),
+            x_dim=x_dim,
+            **arrays,
+        )
+
+    def set_result(self, index: int, result: Optional[lf.model.ModelResult]):
+        """Writes a single `lmfit.model.ModelResult` into the storage at `index`.
+
+        The fit must be one dimensional and have been performed on a subset of `x`, as when
+        NaNs are dropped or a window is applied. `None` (a failed fit) is left as allocated.
+
+        Raises:
+            ValueError: If the result cannot be represented against the shared axis `x`.
+        """
+        if result is None:
+            return
+
+        independent = result.userkws.get("x")
+        if (
+            independent is None
+            or np.ndim(independent) != 1
+            or set(result.params.keys()) != set(self.param_names)
+        ):
+            raise ValueError("Only one dimensional fits with a shared model can be collected.")
+
+        fitted_points = np.isin(self.x, independent)
+        if fitted_points.sum() != len(independent) or np.size(result.data) != len(independent):
+            raise ValueError("Fits must be performed on a subset of the shared axis.")
+
+        for j, name in enumerate(self.param_names):
+            param = result.params[name]
+            self.values[index, j] = param.value
+            self.stderr[index, j] = np.nan if param.stderr is None else param.stderr
+            self.init_values[index, j] = result.init_values.get(name, np.nan)
+
+        if result.covar is not None and list(result.var_names) == self.var_names:
+            self.covar[index] = result.covar
+
+        self.redchi[index], self.chisqr[index] = result.redchi, result.chisqr
+        self.nfev[index], self.success[index] = result.nfev, result.success
+        self.data[index, fitted_points] = result.data
+        self.weights[index, fitted_points] = 1 if result.weights is None else result.weights
+        self.residual[index, fitted_points] = result.residual
+        self.best_fit[index, fitted_points] = result.best_fit
+
+    @classmethod
+    def from_model_results(
+        cls,
+        results: Sequence[Optional[lf.model.ModelResult]],
+        x: np.ndarray,
+        x_dim: str = "x",
+    ) -> "FitResultArray":
+        """Collects individual `lmfit.model.ModelResult` instances into dense arrays.
+
+        Failed fits may be `None`, see `set_result` for requirements on the others.
+
+        Raises:
+            ValueError: If the results cannot be represented against the shared axis `x`.
+        """
+        fitted = [r for r in results if r is not None]
+        if not fitted:
+            raise ValueError("There are no successful fits to collect.")
+
+        first = fitted[0]
+        collected = cls.allocate(
+            first.model,
+            x,
+            list(first.params.keys()),
+            list(first.var_names),
+            len(results),
+            x_dim=x_dim,
+        )
+        for i, r in enumerate(results):
+            collected.set_result(i, r)
+
+        return collected
+
+
+@dataclass(eq=False)
+class FitResultView:
+    """A view onto a single fit inside a `FitResultArray`.
+
+    This provides the parts of `lmfit.model.ModelResult` which are used by the `.F`
+    accessors, in particular `.params[name].value` and `.params[name].stderr`, without
+    materializing a full `lmfit` result for each fit.
+
+    Anything else (plotting, `.init_fit`, the `_repr_*_` methods used by the interactive
+    tools, etc.) is forwarded to a real `lmfit.model.ModelResult` which is rebuilt from the
+    stored fit on first access. See `as_model_result`.
+    """
+
+    store: FitResultArray = field(repr=False)
+    index: int
+    _params: Optional[Dict[str, ParamType]] = field(default=None, init=False, repr=False)
+    _model_result: Optional[lf.model.ModelResult] = field(default=None, init=False, repr=False)
+
+    @property
+    def model(self) -> lf.Model:
+        return self.store.model
+
+    @property
+    def params(self) -> Dict[str, ParamType]:
+        if self._params is None:
+            self._params = {
+                name: ParamType(value=value, stderr=None if np.isnan(stderr) else stderr)
+                for name, value, stderr in zip(
+                    self.store.param_names,
+                    self.store.values[self.index],
+                    self.store.stderr[self.index],
+                )
+            }
+        return self._params
+
+    @property
+    def success(self) -> bool:
+        return bool(self.store.success[self.index])
+
+    @property
+    def redchi(self) -> float:
+        return float(self.store.redchi[self.index])
+
+    @property
+    def chisqr(self) -> float:
+        return float(self.store.chisqr[self.index])
+
+    @property
+    def nfev(self) -> int:
+        return int(self.store.nfev[self.index])
+
+    @property
+    def residual(self) -> np.ndarray:
+        residual = self.store.residual[self.index]
+        return residual[np.isfinite(residual)]
+
+    @property
+    def best_fit(self) -> np.ndarray:
+        return self.store.best_fit[self.index]
+
+    @property
+    def data(self) -> np.ndarray:
+        return self.store.data[self.index]
+
+    @property
+    def independent(self) -> Dict[str, np.ndarray]:
+        return {"x": self.store.x}
+
+    @property
+    def userkws(self) -> Dict[str, np.ndarray]:
+        return {"x": self.store.x}
+
+    def eval(self, params=None, x=None, **kwargs) -> np.ndarray:
+        """Evaluates the fitted model, by default at the fitted coordinates."""
+        if x is None:
+            x = self.store.x
+
+        model_params = self.model.make_params()
+        for name, param in self.params.items():
+            model_params[name].value = param.value
+
+        if params is not None:
+            for name, param in params.items():
+                model_params[name].value = getattr(param, "value", param)
+
+        return self.model.eval(model_params, x=np.asarray(x), **kwargs)
+
+    def as_model_result(self) -> lf.model.ModelResult:
+        """Rebuilds a full `lmfit.model.ModelResult` for this fit without refitting.
+
+        The result is cached, so inspecting the same fit repeatedly is cheap.
+        """
+        if self._model_result is not None:
+            return self._model_result
+
+        store, i = self.store, self.index
+        x = store.x
+
+        params = self.model.make_params()
+        init_params = self.model.make_params()
+        for j, name in enumerate(store.param_names):
+            params[name].value = store.values[i, j]
+            stderr = store.stderr[i, j]
+            params[name].stderr = None if np.isnan(stderr) else stderr
+            if params[name].expr is None:
+                init_params[name].value = store.init_values[i, j]
+                params[name].vary = init_params[name].vary = name in store.var_names
+
+        result = lf.model.ModelResult(
+            self.model, params, data=store.data[i], weights=store.weights[i]
+        )
+        result.init_params = init_params
+        result.init_values = {k: p.value for k, p in init_params.items()}
+        result.userkws = {"x": x}
+        result.independent = {"x": x}
+        result.independent_order = None
+        result.best_fit = store.best_fit[i]
+        result.init_fit = self.model.eval(init_params, x=x)
+        result.residual = self.residual
+        result.var_names = list(store.var_names)
+        result.nvarys = len(store.var_names)
+        result.ndata = int(np.count_nonzero(store.weights[i]))
+        result.nfree = result.ndata - result.nvarys
+        result.success = self.success
+        result.chisqr = self.chisqr
+        result.redchi = self.redchi
+        result.nfev = self.nfev
+        result.covar = store.covar[i]
+        result.errorbars = bool(np.all(np.isfinite(store.covar[i])))
+        result.method = "leastsq"
+        result.message = "Restored from a columnar fit result."
+        neg_2_log_likelihood = result.ndata * np.log(max(result.chisqr, 1e-250) / result.ndata)
+        result.aic = neg_2_log_likelihood + 2 * result.nvarys
+        result.bic = neg_2_log_likelihood + np.log(result.ndata) * result.nvarys
+
+        self._model_result = result
+        return result
+
+    def __getattr__(self, item: str) -> Any:
+        """Forwards any other `ModelResult` attribute to a rebuilt `ModelResult`.
+
+        Private names other than the `_repr_*_` display hooks are not forwarded, so that
+        libraries probing objects for protocol attributes do not trigger a rebuild.
+        """
+        if item.startswith("_") and not item.startswith("_repr_"):
+            raise AttributeError(item)
+
+        return getattr(self.as_model_result(), item)
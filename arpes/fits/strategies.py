@@ -0,0 +1,142 @@
+"""Traversal strategies for broadcast curve fits.
+
+By default every fit in a broadcast is seeded independently from the model's `guess`. For
+maps which vary smoothly across the broadcast dimensions, such as dispersions or Fermi edge
+maps, the converged parameters of a neighboring fit are a much better starting point.
+
+`WarmStart` orders the fits along a path through the broadcast grid (raster, boustrophedon,
+or a Hilbert curve) and seeds each fit from the fit before it on that path. Fits which fail
+are retried from alternate seeds: the other neighbors already fit, then the model's guess.
+The path is cut into contiguous strips which are independent of each other, so that they
+can be fit in parallel.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+__all__ = (
+    "WarmStart",
+    "raster_order",
+    "snake_order",
+    "hilbert_order",
+    "grid_neighbors",
+)
+
+
+def raster_order(shape: Tuple[int, ...]) -> np.ndarray:
+    """Visits the grid in C order, jumping back at the end of each row."""
+    return np.arange(int(np.prod(shape, dtype=np.int64)))
+
+
+def snake_order(shape: Tuple[int, ...]) -> np.ndarray:
+    """Visits the grid in boustrophedon order, so that consecutive fits are always adjacent.
+
+    This is the reflected (Gray code) generalization to any number of dimensions: each axis
+    reverses direction whenever the coordinates before it have odd sum.
+    """
+    coords = np.array(list(np.ndindex(*shape)), dtype=np.int64).reshape(-1, len(shape))
+    snake = coords.copy()
+    for axis in range(1, len(shape)):
+        odd = snake[:, :axis].sum(axis=1) % 2 == 1
+        snake[:, axis] = np.where(odd, shape[axis] - 1 - coords[:, axis], coords[:, axis])
+
+    return np.ravel_multi_index(tuple(snake.T), shape)
+
+
+def _hilbert_d2xy(order: int, d: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Converts distances along a Hilbert curve filling a `2**order` square to coordinates."""
+    x = np.zeros_like(d)
+    y = np.zeros_like(d)
+    t = d.copy()
+    s = 1
+    while s < (1 << order):
+        rx = (t // 2) & 1
+        ry = (t ^ rx) & 1
+
+        flip = (ry == 0) & (rx == 1)
+        x = np.where(flip, s - 1 - x, x)
+        y = np.where(flip, s - 1 - y, y)
+        x, y = np.where(ry == 0, y, x), np.where(ry == 0, x, y)
+
+        x += s * rx
+        y += s * ry
+        t //= 4
+        s *= 2
+
+    return x, y
+
+
+def hilbert_order(shape: Tuple[int, ...]) -> np.ndarray:
+    """Visits a two dimensional grid along a Hilbert curve.
+
+    Any contiguous section of the curve covers a compact region of the grid, which keeps
+    strips fit in parallel from becoming long and thin. Grids which are not square with a
+    power of two side use the curve for the enclosing square, skipping points outside the
+    grid. Grids of other dimensionality fall back to `snake_order`.
+    """
+    if len(shape) != 2:
+        return snake_order(shape)
+
+    order = max(0, int(np.ceil(np.log2(max(max(shape), 1)))))
+    x, y = _hilbert_d2xy(order, np.arange(1 << (2 * order), dtype=np.int64))
+    inside = (x < shape[0]) & (y < shape[1])
+    return np.ravel_multi_index((x[inside], y[inside]), shape)
+
+
+PATHS = {
+    "raster": raster_order,
+    "snake": snake_order,
+    "hilbert": hilbert_order,
+}
+
+
+def grid_neighbors(index: int, shape: Tuple[int, ...]) -> List[int]:
+    """The flat indices of the grid points sharing an edge with the point at `index`."""
+    coords = np.unravel_index(index, shape)
+    neighbors = []
+    for axis, size in enumerate(shape):
+        for step in (-1, 1):
+            moved = coords[axis] + step
+            if 0 <= moved < size:
+                shifted = list(coords)
+                shifted[axis] = moved
+                neighbors.append(int(np.ravel_multi_index(shifted, shape)))
+
+    return neighbors
+
+
+@dataclass(frozen=True)
+class WarmStart:
+    """Fits along a path through the broadcast grid, seeding each fit from its neighbor.
+
+    Args:
+        path: The order in which to visit the grid, one of "raster", "snake", or "hilbert"
+        n_strips: The number of independent strips the path is cut into. Defaults to one
+          per worker of the executor.
+        max_retries: How many alternate seeds to try when a fit fails. A fit has failed when
+          `lmfit` reports no success or could not estimate error bars.
+    """
+
+    path: str = "snake"
+    n_strips: Optional[int] = None
+    max_retries: int = 2
+
+    def __post_init__(self):
+        """Validates the path."""
+        if self.path not in PATHS:
+            raise ValueError(
+                "Unknown path {}, expected one of {}.".format(self.path, ", ".join(PATHS))
+            )
+
+    def order(self, shape: Tuple[int, ...]) -> np.ndarray:
+        """The flat indices of the grid in the order they are fit."""
+        return PATHS[self.path](tuple(shape))
+
+    def strips(self, shape: Tuple[int, ...], n_workers: int = 1) -> List[np.ndarray]:
+        """Cuts the path into contiguous strips which can be fit independently."""
+        order = self.order(shape)
+        n_strips = self.n_strips if self.n_strips is not None else n_workers
+        n_strips = int(np.clip(n_strips, 1, max(len(order), 1)))
+        return [strip for strip in np.array_split(order, n_strips) if len(strip)]
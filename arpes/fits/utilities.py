@@ -2,16 +2,16 @@
 
 The core of this module is `broadcast_model` which is a serious workhorse in PyARPES for
 analyses based on curve fitting. This allows simple multidimensional curve fitting by
-iterative fitting across one or many axes. Currently basic strategies are implemented,
-but in the future we would like to provide:
+iterative fitting across one or many axes. Fits can either be seeded independently or warm
+started along a path through the broadcast grid with retries from neighboring fits, see
+`arpes.fits.strategies`. In the future we would like to provide:
 
 1. Passing xr.DataArray values to parameter guesses and bounds, which can be interpolated/selected
    to allow changing conditions throughout the curve fitting session.
-2. A strategy allowing retries with initial guess taken from the previous fit. This is similar
-   to some adaptive curve fitting routines that have been proposed in the literature.
 """
 
-import os
+import dataclasses
+import time
 import dill
 from packaging import version
 
@@ -27,10 +27,18 @@ from arpes.trace import traceable
 from arpes.provenance import update_provenance
 from arpes.typing import DataType
 from arpes.utilities import normalize_to_spectrum
-from . import mp_fits
+from . import mp_fits, mp_shared
+from .batched import fit_batched, supports_batching
+from .broadcast_common import compile_model, unwrap_params_batched
+from .executors import FitExecutor, SerialExecutor, resolve_executor
+from .result_array import FitResultArray
+from .strategies import WarmStart
 
 __all__ = ("broadcast_model", "result_to_hints")
 
+# parallelize fits by default when running them serially is estimated to take longer than this
+PARALLELIZE_ABOVE_SECONDS = 2.0
+
 
 TypeIterable = Union[List[type], Tuple[type]]
 
@@ -117,6 +125,9 @@ def broadcast_model(
     prefixes=None,
     window=None,
     parallelize=None,
+    batched=False,
+    executor: Union[None, str, FitExecutor] = None,
+    strategy: Union[None, str, WarmStart] = None,
     trace: Callable = None,
 ):
     """Perform a fit across a number of dimensions.
@@ -133,14 +144,30 @@ def broadcast_model(
         weights: Weights to apply when curve fitting. Should have the same shape as the input data
         safe: Whether to mask out nan values
         window: A specification of cuts/windows to apply to each curve fit
-        parallelize: Whether to parallelize curve fits, defaults to True if unspecified and more
-          than 20 fits were requested
+        parallelize: Whether to parallelize curve fits. If unspecified, the first fit is timed
+          and fits are parallelized if running them serially would take longer than
+          `PARALLELIZE_ABOVE_SECONDS`. One dimensional fits without a window exchange data and
+          results with the workers through shared memory, see `arpes.fits.mp_shared`.
+        batched: Whether to solve all fits simultaneously with the vectorized engine in
+          `arpes.fits.batched`. Raises a `ValueError` if the model or parameter specification
+          is not supported. Defaults to False.
+        executor: Where to run the fits, as a `FitExecutor` or one of "serial", "process",
+          "thread", or "loky". Defaults to the keep-alive process pool in
+          `arpes.fits.hot_pool` when parallelizing. See `arpes.fits.executors`.
+        strategy: How fits are seeded. By default (None or "independent") each fit starts from
+          the model's guess. With "warm_start" or a `WarmStart` instance, fits proceed along a
+          path through the broadcast grid, each seeded from its converged neighbor and retried
+          from alternate seeds if it fails. The path is cut into strips which are fit in
+          parallel. Requires one dimensional fits without a window.
         trace: Controls whether execution tracing/timestamping is used for performance investigation
 
     Returns:
         An `xr.Dataset` containing the curve fitting results. These are data vars:
 
-        - "results": Containing an `xr.DataArray` of the `lmfit.model.ModelResult` instances
+        - "results": Containing an `xr.DataArray` of the fit results. For one dimensional fits,
+          these are `FitResultView`s backed by a shared columnar `FitResultArray`, which
+          rebuild a full `lmfit.model.ModelResult` when a single fit is inspected. Fits which
+          raised are `None`
         - "residual": The residual array, with the same shape as the input
         - "data": The original data used for fitting
         - "norm_residual": The residual array normalized by the data, i.e. the fractional error
@@ -148,6 +175,15 @@ def broadcast_model(
     if params is None:
         params = {}
 
+    if strategy == "independent":
+        strategy = None
+    elif strategy == "warm_start":
+        strategy = WarmStart()
+    elif strategy is not None and not isinstance(strategy, WarmStart):
+        raise ValueError(
+            "Unknown strategy {}, expected 'independent' or 'warm_start'.".format(strategy)
+        )
+
     if isinstance(broadcast_dims, str):
         broadcast_dims = [broadcast_dims]
 
@@ -160,12 +196,9 @@ def broadcast_model(
 
     other_axes = set(data.dims).difference(set(broadcast_dims))
     template = data.sum(list(other_axes))
-    template.values = np.ndarray(template.shape, dtype=np.object)
+    template.values = np.ndarray(template.shape, dtype=object)
     n_fits = np.prod(np.array(list(template.S.dshape.values())))
 
-    if parallelize is None:
-        parallelize = n_fits > 20
-
     trace("Copying residual")
     residual = data.copy(deep=True)
     residual.values = np.zeros(residual.shape)
@@ -173,67 +206,139 @@ def broadcast_model(
     trace("Parsing model")
     model = parse_model(model_cls)
 
+    fit_dims = [d for d in data.dims if d not in broadcast_dims]
+    flat_dims = [*template.dims, *fit_dims]
+
+    def flatten_fits(arr: xr.DataArray) -> np.ndarray:
+        """Lays out `arr` as `[n_fits, n_points]` in the order of `template`."""
+        return arr.transpose(*flat_dims).values.reshape(n_fits, -1)
+
+    def bundle(results: xr.DataArray) -> xr.Dataset:
+        return xr.Dataset(
+            {
+                "results": results,
+                "data": data,
+                "residual": residual,
+                "norm_residual": residual / data,
+            },
+            residual.coords,
+        )
+
+    def bundle_columnar(store: FitResultArray) -> xr.Dataset:
+        trace("Collating")
+        store.x_dim = fit_dims[0]
+        residual.values = store.residual.reshape([data.sizes[d] for d in flat_dims]).transpose(
+            [flat_dims.index(d) for d in data.dims]
+        )
+
+        trace("Bundling into dataset")
+        return bundle(store.to_dataarray(template))
+
+    flat_weights = None if weights is None else flatten_fits(weights)
+
+    if strategy is not None and (len(fit_dims) != 1 or window is not None or batched):
+        raise ValueError("Warm starting requires one dimensional fits without a window.")
+
+    if batched:
+        compiled_model = compile_model(model, params=params, prefixes=prefixes)
+        if not supports_batching(compiled_model, params) or isinstance(window, xr.DataArray):
+            raise ValueError("This model and parameter specification cannot be fit batched.")
+
+        trace(f"Running fits (nfits={n_fits}) batched")
+        return bundle_columnar(
+            fit_batched(
+                compiled_model,
+                flatten_fits(data),
+                data.coords[fit_dims[0]].values,
+                params=unwrap_params_batched(params, template),
+                weights=flat_weights,
+            )
+        )
+
     wrap_progress = lambda x, *_, **__: x
     if progress:
         wrap_progress = tqdm_notebook
 
-    serialize = parallelize
     fitter = mp_fits.MPWorker(
         data=data,
         uncompiled_model=model,
         prefixes=prefixes,
         params=params,
         safe=safe,
-        serialize=serialize,
         weights=weights,
         window=window,
     )
 
-    if parallelize:
-        trace(f"Running fits (nfits={n_fits}) in parallel (n_threads={os.cpu_count()})")
+    # time a first fit, after compiling the model, to decide on parallelization and task sizes.
+    # This uses a copy of the worker so that the compiled model is not sent to a pool.
+    all_coords = list(template.G.iter_coords())
+    probe = dataclasses.replace(fitter)
+    _ = probe.model
+    start = time.perf_counter()
+    first_result = probe(all_coords[0])
+    seconds_per_fit = time.perf_counter() - start
 
-        print("Running on multiprocessing pool... this may take a while the first time.")
-        from .hot_pool import hot_pool
+    if parallelize is None:
+        parallelize = executor is not None or seconds_per_fit * n_fits > PARALLELIZE_ABOVE_SECONDS
+
+    owns_executor = parallelize and isinstance(executor, str) and executor != "process"
+    executor = resolve_executor(executor, parallelize) if parallelize else SerialExecutor()
+
+    chunk_size = executor.chunk_size(n_fits, seconds_per_fit)
+    try:
+        if strategy is not None or (executor.is_parallel and len(fit_dims) == 1 and window is None):
+            trace(f"Running fits (nfits={n_fits}) through shared memory")
+            return bundle_columnar(
+                mp_shared.fit_on_pool(
+                    executor,
+                    model,
+                    flatten_fits(data),
+                    data.coords[fit_dims[0]].values,
+                    params=params,
+                    hints=unwrap_params_batched(
+                        {} if isinstance(params, (list, tuple)) else params, template
+                    ),
+                    prefixes=prefixes,
+                    weights=flat_weights,
+                    safe=safe,
+                    chunk_size=chunk_size,
+                    strategy=strategy,
+                    grid_shape=template.shape,
+                    wrap_progress=wrap_progress,
+                )
+            )
 
-        pool = hot_pool.pool
+        trace(f"Running fits (nfits={n_fits}) on {type(executor).__name__}")
+        fitter.serialize = executor.crosses_processes
         exe_results = list(
             wrap_progress(
-                pool.imap(fitter, template.G.iter_coords()), total=n_fits, desc="Fitting on pool..."
+                executor.imap(fitter, all_coords[1:], chunksize=chunk_size),
+                total=n_fits - 1,
+                desc="Fitting",
             )
         )
-    else:
-        trace(f"Running fits (nfits={n_fits}) serially")
-        exe_results = []
-        for _, cut_coords in wrap_progress(
-            template.G.enumerate_iter_coords(), desc="Fitting", total=n_fits
-        ):
-            exe_results.append(fitter(cut_coords))
-
-    if serialize:
-        trace("Deserializing...")
-        print("Deserializing...")
+    finally:
+        if owns_executor:
+            executor.shutdown()
 
-        def unwrap(result_data):
-            # using the lmfit deserialization and serialization seems slower than double pickling with dill
-            # result = lmfit.model.ModelResult(compiled_model, compiled_model.make_params())
-            # return result.loads(result_data)
-            return dill.loads(result_data)
-
-        exe_results = [(unwrap(res), residual, cs) for res, residual, cs in exe_results]
-        print("Finished deserializing")
+    if fitter.serialize:
+        trace("Deserializing...")
+        exe_results = [(dill.loads(res), residual, cs) for res, residual, cs in exe_results]
 
     trace(f"Finished running fits Collating")
-    for fit_result, fit_residual, coords in exe_results:
+    for fit_result, fit_residual, coords in [first_result] + exe_results:
         template.loc[coords] = wrap_for_xarray_values_unpacking(fit_result)
         residual.loc[coords] = fit_residual
 
+    if len(fit_dims) == 1:
+        try:
+            trace("Collecting into columnar storage")
+            template = FitResultArray.from_model_results(
+                template.values.ravel(), data.coords[fit_dims[0]].values, x_dim=fit_dims[0]
+            ).to_dataarray(template)
+        except ValueError:
+            # e.g. transposed or multidimensional fits, keep the individual results
+            pass
+
     trace("Bundling into dataset")
-    return xr.Dataset(
-        {
-            "results": template,
-            "data": data,
-            "residual": residual,
-            "norm_residual": residual / data,
-        },
-        residual.coords,
-    )
+    return bundle(template)
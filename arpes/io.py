@@ -36,7 +36,10 @@ __all__ = (
 
 
 def load_data(
-    file: Union[str, Path, int], location: Optional[Union[str, type]] = None, **kwargs
+    file: Union[str, Path, int],
+    location: Optional[Union[str, type]] = None,
+    cache: Optional[bool] = None,
+    **kwargs,
 ) -> xr.Dataset:
     """Loads a piece of data using available plugins. This the user facing API for data loading.
 
@@ -51,7 +54,11 @@ def load_data(
 
           Optionally, you can pass a loading plugin (the class) through this kwarg and directly specify
           the class to be used.
-
+        cache: Whether to keep loaded scans in a persistent on-disk cache, which is used
+          instead of the raw files when the same scan is loaded again with the same arguments.
+          Defaults to `arpes.config.SETTINGS["load_cache"]["enabled"]`, see `arpes.endstations.cache`.
+        kwargs: Passed to the plugin. Plugins reading HDF5 files accept `lazy=True` to defer reading
+          data until it is used, so that only the selections which are used are read from disk.
 
     Returns:
         The loaded data. Ideally, data which is loaded through the plugin system should be highly compliant with
@@ -76,7 +83,7 @@ def load_data(
             )
         )
 
-    return load_scan(desc, **kwargs)
+    return load_scan(desc, cache=cache, **kwargs)
 
 
 DATA_EXAMPLES = {
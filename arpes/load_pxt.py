@@ -4,8 +4,9 @@ import re
 import typing
 import warnings
 
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import List, Optional, Tuple, Union
 
 import numpy as np
 import xarray as xr
@@ -13,116 +14,327 @@ import xarray as xr
 from arpes.utilities.string import safe_decode
 from arpes.typing import DataType
 
-Wave = Any  # really, igor.Wave but we do not assume installation
-
 __all__ = (
+    "IgorWave",
     "read_single_pxt",
     "read_separated_pxt",
     "read_experiment",
+    "read_packed_waves",
+    "read_igor_binary_wave",
     "find_ses_files_associated",
 )
 
-binary_header_bytes = 10
+Buffer = Union[bytes, np.ndarray]
+
+# Headers are declared big-endian (as written by Igor on the Macintosh) and converted with
+# `.newbyteorder` to the byte order found in each file. See Igor Technical Note PTN003 for
+# the binary wave format and PTN009 for packed experiment files.
+packed_record_header_dtype = np.dtype(
+    [
+        ("record_type", ">u2"),
+        ("version", ">i2"),
+        ("n_data_bytes", ">i4"),
+    ]
+)
 
-igor_wave_header_dtype = np.dtype(
+RECORD_TYPE_MASK = 0x7FFF  # the high bit marks superseded records
+MAX_RECORD_TYPE = 0xFF
+WAVE_RECORD = 3
+FOLDER_START_RECORD = 9
+FOLDER_END_RECORD = 10
+
+bin_header_dtypes = {
+    1: np.dtype([("version", ">i2"), ("wfm_size", ">i4"), ("checksum", ">i2")]),
+    2: np.dtype(
+        [
+            ("version", ">i2"),
+            ("wfm_size", ">i4"),
+            ("note_size", ">i4"),
+            ("pict_size", ">i4"),
+            ("checksum", ">i2"),
+        ]
+    ),
+    3: np.dtype(
+        [
+            ("version", ">i2"),
+            ("wfm_size", ">i4"),
+            ("note_size", ">i4"),
+            ("formula_size", ">i4"),
+            ("pict_size", ">i4"),
+            ("checksum", ">i2"),
+        ]
+    ),
+    5: np.dtype(
+        [
+            ("version", ">i2"),
+            ("checksum", ">i2"),
+            ("wfm_size", ">i4"),
+            ("formula_size", ">i4"),
+            ("note_size", ">i4"),
+            ("data_e_units_size", ">i4"),
+            ("dim_e_units_size", ">i4", (4,)),
+            ("dim_labels_size", ">i4", (4,)),
+            ("s_indices_size", ">i4"),
+            ("options_size_1", ">i4"),
+            ("options_size_2", ">i4"),
+        ]
+    ),
+}
+
+# the wave header of versions 1 to 3, without the first 16 bytes of the data which Igor
+# declares as its last member
+wave_header2_dtype = np.dtype(
     [
-        ("next", ">u8"),
-        ("creation_date", ">u8"),
-        ("mod_date", ">u8"),
-        ("type", ">H"),
-        ("d_lock", ">H"),
-        ("wave_header_pad1", "B", (62,)),  # unused
-        ("n_points", ">u8"),
-        ("wave_header_version", ">u4"),
-        ("spacer", ">u8"),
-        ("wave_name", "S", 32),
-        ("wave_header_pad2", "B", (8,)),
-        ("dim_sizes", ">u4", (4,)),
-        ("dim_scales", ">d", (4,)),
-        ("dim_offsets", ">d", (4,)),
-        ("data_units", "b", (4,)),
-        ("dim_units", ("S", 4), (4,)),
-        ("final_spacer", "b", 2 + 8 * 18),
+        ("type", ">i2"),
+        ("next", ">u4"),
+        ("wave_name", "S20"),
+        ("wave_header_version", ">i2"),
+        ("source_folder", ">i2"),
+        ("file_name", ">u4"),
+        ("data_units", "S4"),
+        ("x_units", "S4"),
+        ("n_points", ">i4"),
+        ("a_modified", ">i2"),
+        ("x_scale", ">f8"),
+        ("x_offset", ">f8"),
+        ("pad", "V", 42),  # modification flags, full scales, dependencies, and dates
+        ("note_handle", ">u4"),
     ]
 )
 
+wave_header5_dtype = np.dtype(
+    [
+        ("next", ">u4"),
+        ("creation_date", ">u4"),
+        ("mod_date", ">u4"),
+        ("n_points", ">i4"),
+        ("type", ">i2"),
+        ("d_lock", ">i2"),
+        ("wave_header_pad1", "V", 6),
+        ("wave_header_version", ">i2"),
+        ("wave_name", "S32"),
+        ("wave_header_pad2", ">i4"),
+        ("data_folder", ">u4"),
+        ("dim_sizes", ">i4", (4,)),
+        ("dim_scales", ">f8", (4,)),
+        ("dim_offsets", ">f8", (4,)),
+        ("data_units", "S4"),
+        ("dim_units", "S4", (4,)),
+        ("pad", "V", 152),  # full scales, handles, and flags which are only used in memory
+    ]
+)
 
-def read_igor_binary_wave(raw_bytes: bytes) -> xr.DataArray:
-    """Reads an igor wave from raw binary data using the documented Igor binary format.
+# Igor numeric type codes. The complex and unsigned flags modify the base types.
+IGOR_NUMERIC_TYPES = {2: "f4", 4: "f8", 8: "i1", 0x10: "i2", 0x20: "i4", 0x80: "i8"}
+IGOR_COMPLEX = 0x01
+IGOR_UNSIGNED = 0x40
 
-    Some weirdness here with the byte ordering and the target datatype. Additionally,
-    newer Igor wave formats are very poorly documented. Data loading might not be perfectly
-    correct as a result. For most purposes, you can load from .pxp files anyway.
 
-    Roughly, we first read a header from the bytestream. This header is used to determine the
-    dtype and size of the array which remains to be read from the tail of the bytestream.
+@dataclass
+class IgorWave:
+    """A numeric Igor wave as read from a binary wave or a packed experiment file.
 
-    The header is defined by `igor_wave_header_dtype`.
+    The attributes mirror those of `igor.Wave`, so that either can be passed to
+    `wave_to_xarray`.
 
     Args:
-        raw_bytes: The bytes/buffer to be read.
+        name: The name of the wave
+        data: The values of the wave, a view onto the file in its byte order
+        axis: The coordinates along each dimension
+        axis_units: The units of each dimension, or "" if there are none
+        data_units: The units of the values
+        notes: The wave note, which for SES data contains the scan metadata
+        folder: The data folders containing the wave in a packed experiment
+    """
+
+    name: str
+    data: np.ndarray
+    axis: List[np.ndarray]
+    axis_units: List[str]
+    data_units: str = ""
+    notes: bytes = b""
+    folder: Tuple[str, ...] = field(default_factory=tuple)
+
+
+def _igor_dtype(type_code: int, byte_order: str) -> np.dtype:
+    """The numpy dtype of the values of a wave with Igor type `type_code`."""
+    base = IGOR_NUMERIC_TYPES.get(type_code & ~(IGOR_COMPLEX | IGOR_UNSIGNED))
+    if base is None:
+        raise ValueError(f"Unsupported Igor wave type {type_code}, only numeric waves can be read")
+
+    if type_code & IGOR_COMPLEX:
+        base = {"f4": "c8", "f8": "c16"}[base]
+    if type_code & IGOR_UNSIGNED:
+        base = base.replace("i", "u")
+
+    return np.dtype(byte_order + base)
+
+
+def _decode(raw: bytes) -> str:
+    return safe_decode(bytes(raw).split(b"\0", 1)[0], prefer="ascii")
+
+
+def read_wave_buffer(buffer: Buffer, offset: int = 0) -> IgorWave:
+    """Reads the Igor binary wave starting at `offset` in `buffer`.
+
+    The byte order is found from the version number, which is the first field of every
+    binary wave: Igor versions are small numbers, so the first byte is zero exactly when
+    the wave is big-endian. The values of the wave are not copied, but are a view onto
+    `buffer`.
+
+    Args:
+        buffer: The bytes or memory mapped file containing the wave
+        offset: The position of the wave in `buffer`
 
     Returns:
-        The array read from the bytestream as an `xr.DataArray`.
+        The wave.
     """
-    header = np.fromstring(
-        raw_bytes[: igor_wave_header_dtype.itemsize], dtype=igor_wave_header_dtype
-    ).item()
-
-    point_size = 8
-    n_points = header[6]
-    _ = header[9]  # wave_name
-    dim_sizes, dim_scales, dim_offsets = header[11], header[12], header[13]
-    _ = header[14]  # data_units
-    dim_units = header[15]
-
-    # approximate offsets
-    # >i8 -1
-    # <i8 0
-    # >u8 -1
-    # <u8 0
-    offset = -1
-
-    wave_data = np.fromstring(
-        raw_bytes[
-            igor_wave_header_dtype.itemsize
-            + offset : igor_wave_header_dtype.itemsize
-            + n_points * point_size
-            + offset
+    byte_order = ">" if buffer[offset] == 0 else "<"
+    version = int(np.frombuffer(buffer, np.dtype(byte_order + "i2"), 1, offset)[0])
+    if version not in bin_header_dtypes:
+        raise ValueError(f"Unsupported Igor binary wave version {version}")
+
+    bin_header_dtype = bin_header_dtypes[version].newbyteorder(byte_order)
+    bin_header = np.frombuffer(buffer, bin_header_dtype, 1, offset)[0]
+    header_offset = offset + bin_header_dtype.itemsize
+
+    if version == 5:
+        wave_header = np.frombuffer(
+            buffer, wave_header5_dtype.newbyteorder(byte_order), 1, header_offset
+        )[0]
+        data_offset = header_offset + wave_header5_dtype.itemsize
+        shape = [int(n) for n in wave_header["dim_sizes"] if n] or [0]
+        scales, offsets = wave_header["dim_scales"], wave_header["dim_offsets"]
+
+        # the wave is followed by its formula, note, extended units, and dimension labels
+        position = header_offset + int(bin_header["wfm_size"]) + int(bin_header["formula_size"])
+        note_end = position + int(bin_header["note_size"])
+        notes = bytes(buffer[position:note_end])
+        position = note_end + int(bin_header["data_e_units_size"])
+        axis_units = []
+        for i, size in enumerate(bin_header["dim_e_units_size"][: len(shape)]):
+            extended_units = _decode(buffer[position : position + size])
+            axis_units.append(extended_units or _decode(wave_header["dim_units"][i]))
+            position += size
+    else:
+        wave_header = np.frombuffer(
+            buffer, wave_header2_dtype.newbyteorder(byte_order), 1, header_offset
+        )[0]
+        data_offset = header_offset + wave_header2_dtype.itemsize
+        shape = [int(wave_header["n_points"])]
+        scales, offsets = [wave_header["x_scale"]], [wave_header["x_offset"]]
+        axis_units = [_decode(wave_header["x_units"])]
+        notes = b""
+
+    dtype = _igor_dtype(int(wave_header["type"]), byte_order)
+    n_points = int(np.prod(shape))
+
+    if version in (2, 3):
+        # versions 2 and 3 pad the data with 16 bytes before the note
+        position = data_offset + n_points * dtype.itemsize + 16
+        notes = bytes(buffer[position : position + int(bin_header["note_size"])])
+
+    # Igor stores waves in column-major order
+    data = np.frombuffer(buffer, dtype, n_points, data_offset).reshape(shape, order="F")
+
+    # data in the native byte order stays memory mapped, other data is converted once here
+    if not data.dtype.isnative:
+        data = data.astype(dtype.newbyteorder("="))
+
+    return IgorWave(
+        name=_decode(wave_header["wave_name"]),
+        data=data,
+        axis=[
+            np.linspace(float(b), float(b) + float(a) * (n - 1), n)
+            for a, b, n in zip(scales, offsets, shape)
         ],
-        dtype=">u8",
+        axis_units=axis_units,
+        data_units=_decode(wave_header["data_units"]),
+        notes=notes,
     )
 
-    wave_data = wave_data / np.max(wave_data)
-    wave_data[wave_data == 1] = 0  # some weird bit shifting going on?
-
-    names_from_units = {
-        "eV": "eV",
-        "deg": "phi",
-    }
-
-    dim_sizes = [d for d in dim_sizes if d]
-    n_dims = len(dim_sizes)
-
-    # please pylint forgive me
-    dims = [
-        (
-            names_from_units.get(
-                safe_decode(dim_units[i], prefer="ascii"), safe_decode(dim_units[i], prefer="ascii")
-            ),
-            np.linspace(
-                dim_offsets[i], dim_offsets[i] + (dim_sizes[i] - 1) * dim_scales[i], dim_sizes[i]
-            ),
+
+def _map_file(path: Union[Path, str]) -> np.ndarray:
+    """Maps a file into memory copy-on-write, so that arrays viewing it are writable."""
+    return np.memmap(path, dtype=np.uint8, mode="c")
+
+
+def _packed_byte_order(buffer: Buffer) -> str:
+    """Determines the byte order of a packed experiment from the header of its first record."""
+    for byte_order in (">", "<"):
+        header = np.frombuffer(buffer, packed_record_header_dtype.newbyteorder(byte_order), 1)[0]
+        n_data_bytes = int(header["n_data_bytes"])
+        if (
+            header["record_type"] & RECORD_TYPE_MASK <= MAX_RECORD_TYPE
+            and 0 <= n_data_bytes <= len(buffer) - packed_record_header_dtype.itemsize
+        ):
+            return byte_order
+
+    raise ValueError("Could not determine the byte order of the Igor packed experiment")
+
+
+def read_packed_waves(
+    reference_path: Union[Path, str], byte_order: Optional[str] = None
+) -> List[IgorWave]:
+    """Reads all numeric waves of an Igor packed experiment (.pxp or .pxt) in one pass.
+
+    The file is memory mapped and the values of the waves are views onto it, so only the
+    headers are read until the values are used. Waves of other types, such as text waves,
+    are skipped.
+
+    Args:
+        reference_path: The path to the packed experiment
+        byte_order: The byte order of the record headers, one of "<", ">", "=". Detected
+          from the file if None. Waves always carry their own byte order.
+
+    Returns:
+        The waves, in the order in which they appear in the file, with the data folders
+        containing them.
+    """
+    buffer = _map_file(reference_path)
+    if byte_order is None:
+        byte_order = _packed_byte_order(buffer)
+
+    record_header_dtype = packed_record_header_dtype.newbyteorder(byte_order)
+    record_headers_size = record_header_dtype.itemsize
+
+    waves, folder = [], []
+    position = 0
+    while position + record_headers_size <= len(buffer):
+        header = np.frombuffer(buffer, record_header_dtype, 1, position)[0]
+        record_type = int(header["record_type"]) & RECORD_TYPE_MASK
+        start, position = (
+            position + record_headers_size,
+            position + record_headers_size + int(header["n_data_bytes"]),
         )
-        for i in range(n_dims)
-    ]
-    coords = dict(dims)
 
-    return xr.DataArray(
-        wave_data.reshape(dim_sizes[::-1]),
-        coords=coords,
-        dims=[d[0] for d in dims][::-1],
-    )
+        if record_type == WAVE_RECORD:
+            try:
+                wave = read_wave_buffer(buffer, start)
+            except ValueError as e:
+                warnings.warn(f"Skipping wave in {reference_path}: {e}")
+                continue
+
+            wave.folder = tuple(folder)
+            waves.append(wave)
+        elif record_type == FOLDER_START_RECORD:
+            folder.append(_decode(buffer[start : start + 32]))
+        elif record_type == FOLDER_END_RECORD and folder:
+            folder.pop()
+
+    return waves
+
+
+def read_igor_binary_wave(raw_bytes: Buffer) -> xr.DataArray:
+    """Reads an Igor wave from raw binary data using the documented Igor binary format.
+
+    Args:
+        raw_bytes: The bytes/buffer to be read.
+
+    Returns:
+        The array read from the bytestream as an `xr.DataArray`.
+    """
+    return wave_to_xarray(read_wave_buffer(raw_bytes))
 
 
 def read_header(header_bytes: bytes):
@@ -160,7 +372,7 @@ def read_header(header_bytes: bytes):
     )
 
 
-def wave_to_xarray(wave: Wave) -> xr.DataArray:
+def wave_to_xarray(wave: IgorWave) -> xr.DataArray:
     """Converts a wave to an `xr.DataArray`.
 
     Units, if present on the wave, are used to furnish the dimension names.
@@ -168,7 +380,7 @@ def wave_to_xarray(wave: Wave) -> xr.DataArray:
     are used for each unitless dimension.
 
     Args:
-        wave: The input wave, an `igor.Wave` instance.
+        wave: The input wave, an `IgorWave` or `igor.Wave` instance.
 
     Returns:
         The converted `xr.DataArray` instance.
@@ -200,7 +412,7 @@ def wave_to_xarray(wave: Wave) -> xr.DataArray:
     )
 
 
-def read_experiment(reference_path: typing.Union[Path, str], **kwargs) -> xr.Dataset:
+def read_experiment(reference_path: typing.Union[Path, str]) -> xr.Dataset:
     """Reads an entire Igor experiment to a set of waves, as an `xr.Dataset`.
 
     Looks for waves inside the experiment and collates them into an xr.Dataset using their
@@ -212,58 +424,49 @@ def read_experiment(reference_path: typing.Union[Path, str], **kwargs) -> xr.Dat
     Returns:
         The loaded dataset with only waves retained..
     """
-    import igor.igorpy as igor
-
-    if isinstance(reference_path, Path):
-        reference_path = str(reference_path.absolute())
-
-    return igor.load(reference_path, **kwargs)
+    return xr.Dataset({w.name: wave_to_xarray(w) for w in read_packed_waves(reference_path)})
 
 
-def read_single_ibw(reference_path: typing.Union[Path, str]) -> Wave:
-    """Uses igor.igorpy to load an .ibw file."""
-    import igor.igorpy as igor
-
-    if isinstance(reference_path, Path):
-        reference_path = str(reference_path.absolute())
-    return igor.load(reference_path)
+def read_single_ibw(reference_path: typing.Union[Path, str]) -> IgorWave:
+    """Reads a single .ibw file, whose values are memory mapped."""
+    return read_wave_buffer(_map_file(reference_path))
 
 
 def read_single_pxt(
     reference_path: typing.Union[Path, str], byte_order=None, allow_multiple=False, raw=False
 ) -> xr.DataArray:
-    """Uses igor.igorpy to load a single .PXT or .PXP file."""
-    import igor.igorpy as igor
+    """Reads a single .PXT or .PXP file, or an .IBW file.
 
-    if isinstance(reference_path, Path):
-        reference_path = str(reference_path.absolute())
+    Args:
+        reference_path: The path to the file.
+        byte_order: The byte order of the records in the file, one of "<", ">", "=".
+          Detected from the file if None. Defaults to None.
+        allow_multiple: Whether to return all waves at the root of the experiment as an
+          `xr.Dataset`, instead of only the first as an `xr.DataArray`.
+        raw: Whether to return the waves as `IgorWave`s instead of converting them.
 
-    loaded = None
-    if byte_order is None:
-        for try_byte_order in [">", "=", "<"]:
-            try:
-                loaded = igor.load(reference_path, initial_byte_order=try_byte_order)
-                break
-            except Exception:  # pylint: disable=broad-except
-                # bad byte ordering probably
-                pass
+    Returns:
+        The wave, or waves, in the file.
+    """
+    if Path(reference_path).suffix.lower() == ".ibw":
+        waves = [read_single_ibw(reference_path)]
     else:
-        loaded = igor.load(reference_path, initial_byte_order=byte_order)
+        waves = [w for w in read_packed_waves(reference_path, byte_order) if not w.folder]
 
     if raw:
-        return loaded
+        return waves
 
-    children = [c for c in loaded.children if isinstance(c, igor.Wave)]
+    if not waves:
+        raise ValueError(f"Found no numeric waves in {reference_path}")
 
-    if len(children) == 0:
-        return wave_to_xarray(children[0])
+    if len(waves) == 1:
+        return wave_to_xarray(waves[0])
 
     if not allow_multiple:
-        warnings.warn(f"Igor PXT file contained {len(children)} waves. Ignoring all but first.")
-        return wave_to_xarray(children[0])
+        warnings.warn(f"Igor PXT file contained {len(waves)} waves. Ignoring all but first.")
+        return wave_to_xarray(waves[0])
 
-    children = {c.name: wave_to_xarray(c) for c in children}
-    return xr.Dataset({k: c for k, c in children.items()})
+    return xr.Dataset({w.name: wave_to_xarray(w) for w in waves})
 
 
 def find_ses_files_associated(reference_path: Path, separator: str = "S") -> List[Path]:
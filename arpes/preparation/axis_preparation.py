@@ -10,6 +10,7 @@ import xarray as xr
 from arpes.provenance import provenance, update_provenance
 from arpes.typing import DataType
 from arpes.utilities import lift_dataarray_to_generic
+from arpes.utilities.binning import apply_axis_weights, interpolation_weights
 from arpes.utilities.normalize import normalize_to_spectrum
 
 __all__ = (
@@ -142,8 +143,28 @@ def transform_dataarray_axis(
     prep_name,
     transform_spectra=None,
     remove_old=True,
+    axis_only=False,
 ):
-    """Applies a function onto a DataArray axis."""
+    """Applies a function onto a DataArray axis.
+
+    Args:
+        f: Maps a tuple of output pixel coordinates to input pixel coordinates, called with
+          the index of the transformed axis as `axis`, as for `scipy.ndimage.geometric_transform`
+        old_axis_name: The axis to transform
+        new_axis_name: The name of the transformed axis
+        new_axis: The coordinates of the transformed axis
+        dataset: The data to transform
+        prep_name: Gives the name of each transformed array from its original name
+        transform_spectra: The arrays to transform. Defaults to all with `old_axis_name`.
+        remove_old: Whether to remove the untransformed arrays
+        axis_only: Whether `f` only changes the coordinate along the transformed axis, and
+          depends on nothing else. If so, `f` is evaluated once on all pixels of the new axis
+          at once, and the data is interpolated linearly with a sparse matrix along the axis
+          instead of pixel by pixel.
+
+    Returns:
+        The dataset with transformed arrays.
+    """
     ds = dataset.copy()
     if transform_spectra is None:
         # transform *all* DataArrays in the dataset that have old_axis_name in their dimensions
@@ -161,8 +182,13 @@ def transform_dataarray_axis(
         new_dims = list(dr.dims)
         new_dims[old_axis] = new_axis_name
 
-        g = functools.partial(f, axis=old_axis)
-        output = geometric_transform(dr.values, g, output_shape=shape, output="f", order=1)
+        if axis_only:
+            positions = f((np.arange(len(new_axis)),), axis=0)[0]
+            weights = interpolation_weights(positions, dr.sizes[old_axis_name])
+            output = apply_axis_weights(dr.values, weights, old_axis).astype(np.float32)
+        else:
+            g = functools.partial(f, axis=old_axis)
+            output = geometric_transform(dr.values, g, output_shape=shape, output="f", order=1)
 
         new_coords = dict(dr.coords)
         new_coords.pop(old_axis_name)
@@ -1,10 +1,9 @@
 """Data prep routines for time-of-flight data."""
-import math
-
 import numpy as np
 
 import xarray as xr
 from arpes.provenance import update_provenance
+from arpes.utilities.binning import apply_axis_weights, bin_edges, overlap_weights
 
 from .axis_preparation import transform_dataarray_axis
 
@@ -31,6 +30,9 @@ def convert_to_kinetic_energy(dataarray, kinetic_energy_axis):
     3. Rebins a time spectrum into an energy spectrum, preserving the
        spectral weight, this requires a modicum of care around splitting
        counts at the edges of the new bins.
+
+    The rebinning weights are computed once, as a sparse matrix, and applied to all of the
+    spectra along the other axes at once.
     """
     # This should be simplified
     # c = (0.5) * (9.11e-31) * self.mstar * (self.length ** 2) / (1.6e-19) * (1e18)
@@ -51,38 +53,15 @@ def convert_to_kinetic_energy(dataarray, kinetic_energy_axis):
 
     timing = dataarray.coords["time"].values
     assert timing[1] > timing[0]
-    t_min, t_max = np.min(timing), np.max(timing)
-
-    # Prep arrays
-    d_energy = kinetic_energy_axis[1] - kinetic_energy_axis[0]
-    time_index = 0  # after transpose
-    new_shape = list(dataarray.data.shape)
-    new_shape[time_index] = len(kinetic_energy_axis)
-
-    new_data = np.zeros(tuple(new_shape))
 
-    def energy_to_time(conv, energy):
-        return math.sqrt(conv / energy)
+    # The energy bins are mapped to (decreasing) intervals of time of flight, and the counts
+    # in each timing bin are split between them according to their overlap
+    energy_edges = bin_edges(kinetic_energy_axis)
+    with np.errstate(divide="ignore"):
+        time_edges_for_energy = np.sqrt(c / np.clip(energy_edges, 0, None))
 
-    # Rebin data
-    old_data = dataarray.data
-    for i, E in enumerate(kinetic_energy_axis):
-        t_L = energy_to_time(c, E + d_energy / 2)
-        t_S = energy_to_time(c, E - d_energy / 2)
-
-        # clamp
-        t_L = t_L if t_L <= t_max else t_max
-        t_S = t_S if t_S > t_min else t_min
-
-        # with some math we could back calculate the index, but we don't need to
-        t_L_idx = np.searchsorted(timing, t_L)
-        t_S_idx = np.searchsorted(timing, t_S)
-
-        new_data[i] = (
-            np.sum(old_data[t_L_idx:t_S_idx], axis=0)
-            + ((timing[t_L_idx] - t_L) * old_data[t_L_idx])
-            + ((t_S - timing[t_S_idx - 1]) * old_data[t_S_idx - 1]) / d_energy
-        )
+    weights = overlap_weights(bin_edges(timing), time_edges_for_energy)
+    new_data = apply_axis_weights(dataarray.values, weights, axis=0)
 
     new_coords = dict(dataarray.coords)
     del new_coords["time"]
@@ -112,6 +91,8 @@ def build_KE_coords_to_time_pixel_coords(dataset: xr.Dataset, interpolation_axis
         These typically come off of a DLD.
         This is instead to the unitful values that we receive from the Spin-ToF DAQ.
 
+        The coordinates can be integers or, to convert many at once, integer arrays.
+
         Args:
             coords: tuple of coordinates
             axis: Which axis to use for the kinetic energy
@@ -121,7 +102,7 @@ def build_KE_coords_to_time_pixel_coords(dataset: xr.Dataset, interpolation_axis
         """
         kinetic_energy_pixel = coords[axis]
         kinetic_energy = interpolation_axis[kinetic_energy_pixel]
-        real_timing = math.sqrt(conv / kinetic_energy)
+        real_timing = np.sqrt(conv / kinetic_energy)
         pixel_timing = (real_timing - dataset.attrs["timing_offset"]) / time_res
         coords_list = list(coords)
         coords_list[axis] = pixel_timing
@@ -144,7 +125,7 @@ def build_KE_coords_to_time_coords(dataset: xr.Dataset, interpolation_axis):
         * (dataset.S.spectrometer["length"] ** 2)
         / 1.6
     )
-    timing = dataset.coords["time"]
+    timing = dataset.coords["time"].values
     photon_offset = dataset.attrs["laser_t0"] + dataset.S.spectrometer["length"] * (10 / 3)
     low_offset = np.min(timing)
     d_timing = timing[1] - timing[0]
@@ -155,7 +136,8 @@ def build_KE_coords_to_time_coords(dataset: xr.Dataset, interpolation_axis):
         As the name suggests, because of how scipy.ndimage interpolates, we require the inverse
         coordinate transform.
 
-        All coordinates except for the energy coordinate are left untouched.
+        All coordinates except for the energy coordinate are left untouched. The coordinates
+        can be integers or, to convert many at once, integer arrays.
 
         We do the same logic done implicitly in timeProcessX in order to get the part of the data that has time
         coordinate less than the nominal t0. This is necessary because the recorded times are the time between electron
@@ -169,7 +151,7 @@ def build_KE_coords_to_time_coords(dataset: xr.Dataset, interpolation_axis):
             new tuple of converted coordinates
         """
         kinetic_energy = interpolation_axis[coords[axis]]
-        real_timing = math.sqrt(conv / kinetic_energy)
+        real_timing = np.sqrt(conv / kinetic_energy)
         real_timing = photon_offset - real_timing
         coords_list = list(coords)
         coords_list[axis] = len(timing) - (real_timing - low_offset) / d_timing
@@ -216,7 +198,7 @@ def process_SToF(dataset: xr.Dataset):
     e_min = dataset.attrs.get("E_min", 1)
     e_max = dataset.attrs.get("E_max", 10)
     de = dataset.attrs.get("dE", 0.01)
-    ke_axis = np.linspace(e_min, e_max, (e_max - e_min) / de)
+    ke_axis = np.linspace(e_min, e_max, int((e_max - e_min) / de))
 
     dataset = transform_dataarray_axis(
         build_KE_coords_to_time_coords(dataset, ke_axis),
@@ -225,6 +207,7 @@ def process_SToF(dataset: xr.Dataset):
         ke_axis,
         dataset,
         lambda x: x,
+        axis_only=True,
     )
 
     dataset = dataset.rename({"t_up": "up", "t_down": "down"})
@@ -245,7 +228,7 @@ def process_DLD(dataset: xr.Dataset):
     """Converts delay line data to kinetic energy coordinates."""
     e_min = 1
     ke_axis = np.linspace(
-        e_min, dataset.attrs["E_max"], (dataset.attrs["E_max"] - e_min) / dataset.attrs["dE"]
+        e_min, dataset.attrs["E_max"], int((dataset.attrs["E_max"] - e_min) / dataset.attrs["dE"])
     )
     dataset = transform_dataarray_axis(
         build_KE_coords_to_time_pixel_coords(dataset, ke_axis),
@@ -254,6 +237,7 @@ def process_DLD(dataset: xr.Dataset):
         ke_axis,
         dataset,
         lambda x: "kinetic_spectrum",
+        axis_only=True,
     )
 
     return dataset
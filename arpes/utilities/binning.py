@@ -0,0 +1,171 @@
+"""Resampling of array axes with precomputed sparse weights.
+
+Rebinning or interpolating an array along one axis is linear in the data, so it can be
+written as a matrix from the old to the new samples, which has only a few nonzero entries
+per row. The weights are computed once, vectorized, as a `scipy.sparse.csr_matrix`, and
+then applied to any number of arrays sharing the axis, for all positions along the other
+axes at once in parallel.
+"""
+
+import numba
+import numpy as np
+from scipy import sparse
+
+__all__ = (
+    "bin_edges",
+    "overlap_weights",
+    "interpolation_weights",
+    "apply_axis_weights",
+    "element_offsets",
+)
+
+
+def bin_edges(centers: np.ndarray) -> np.ndarray:
+    """The edges of the bins centered on `centers`, halfway between neighboring centers.
+
+    The first and last bins are taken to be as wide as their neighbors.
+
+    Args:
+        centers: The monotonic bin centers, at least two of them
+
+    Returns:
+        The `len(centers) + 1` bin edges.
+    """
+    centers = np.asarray(centers, dtype=np.float64)
+    midpoints = (centers[1:] + centers[:-1]) / 2
+    return np.concatenate(
+        (
+            [centers[0] - (midpoints[0] - centers[0])],
+            midpoints,
+            [centers[-1] + (centers[-1] - midpoints[-1])],
+        )
+    )
+
+
+def overlap_weights(old_edges: np.ndarray, new_edges: np.ndarray) -> sparse.csr_matrix:
+    """The weights which rebin histograms from `old_edges` to `new_edges` conserving counts.
+
+    Each old bin contributes to each new bin in proportion to the fraction of the old bin
+    covered by the new bin, so that the counts in old bins lying entirely within the new bins
+    are conserved.
+
+    Args:
+        old_edges: The increasing edges of the old bins
+        new_edges: The monotonic edges of the new bins. They can be decreasing, as when
+          the new bins are the image of increasing energy bins in time of flight.
+
+    Returns:
+        The `(n_new_bins, n_old_bins)` rebinning matrix.
+    """
+    old_edges = np.asarray(old_edges, dtype=np.float64)
+    new_edges = np.asarray(new_edges, dtype=np.float64)
+    n_old, n_new = len(old_edges) - 1, len(new_edges) - 1
+
+    low = np.clip(np.minimum(new_edges[:-1], new_edges[1:]), old_edges[0], old_edges[-1])
+    high = np.clip(np.maximum(new_edges[:-1], new_edges[1:]), old_edges[0], old_edges[-1])
+
+    # the range of old bins overlapping each new bin
+    first = np.clip(np.searchsorted(old_edges, low, side="right") - 1, 0, n_old - 1)
+    last = np.clip(np.searchsorted(old_edges, high, side="left") - 1, 0, n_old - 1)
+    counts = np.where(high > low, last - first + 1, 0)
+
+    rows = np.repeat(np.arange(n_new), counts)
+    starts = np.cumsum(counts) - counts
+    columns = np.repeat(first - starts, counts) + np.arange(len(rows))
+
+    overlap = np.minimum(high[rows], old_edges[columns + 1]) - np.maximum(
+        low[rows], old_edges[columns]
+    )
+    weights = overlap / np.diff(old_edges)[columns]
+    keep = weights > 0
+
+    return sparse.csr_matrix((weights[keep], (rows[keep], columns[keep])), shape=(n_new, n_old))
+
+
+def interpolation_weights(positions: np.ndarray, n_samples: int) -> sparse.csr_matrix:
+    """The weights which linearly interpolate `n_samples` samples at fractional `positions`.
+
+    As with `scipy.ndimage` in "constant" mode with order 1, positions outside of the
+    samples are given the value zero.
+
+    Args:
+        positions: The fractional indices to interpolate at
+        n_samples: The number of samples interpolated between
+
+    Returns:
+        The `(len(positions), n_samples)` interpolation matrix.
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    rows = np.flatnonzero((positions >= 0) & (positions <= n_samples - 1))
+    lower = np.minimum(np.floor(positions[rows]).astype(np.int64), max(n_samples - 2, 0))
+    fraction = positions[rows] - lower
+
+    return sparse.csr_matrix(
+        (
+            np.concatenate((1 - fraction, fraction)),
+            (
+                np.concatenate((rows, rows)),
+                np.concatenate((lower, np.minimum(lower + 1, n_samples - 1))),
+            ),
+        ),
+        shape=(len(positions), n_samples),
+    )
+
+
+@numba.njit(parallel=True, cache=True)
+def _apply_csr_rows(indptr, indices, weights, data, output):
+    for row in numba.prange(data.shape[0]):
+        for i in range(len(indptr) - 1):
+            total = 0.0
+            for k in range(indptr[i], indptr[i + 1]):
+                total += weights[k] * data[row, indices[k]]
+
+            output[row, i] = total
+
+
+def apply_axis_weights(data: np.ndarray, weights: sparse.spmatrix, axis: int) -> np.ndarray:
+    """Resamples `data` along `axis` with the matrix `weights`.
+
+    The matrix is applied to every one dimensional slice of `data` along `axis`, in
+    parallel over the slices.
+
+    Args:
+        data: The array to resample
+        weights: A `(n_new, n_old)` matrix, where `n_old` is the length of `axis`
+        axis: The axis to resample
+
+    Returns:
+        The resampled array, whose `axis` has length `n_new`.
+    """
+    weights = sparse.csr_matrix(weights)
+    data = np.moveaxis(np.asarray(data, dtype=np.float64), axis, -1)
+    rest_shape = data.shape[:-1]
+
+    rows = np.ascontiguousarray(data.reshape(-1, data.shape[-1]))
+    output = np.empty((len(rows), weights.shape[0]))
+    _apply_csr_rows(
+        weights.indptr.astype(np.int64),
+        weights.indices.astype(np.int64),
+        weights.data.astype(np.float64),
+        rows,
+        output,
+    )
+
+    return np.moveaxis(output.reshape(rest_shape + (weights.shape[0],)), -1, axis)
+
+
+def element_offsets(strides, shape) -> np.ndarray:
+    """The offsets of all elements of an array of `shape` with `strides`, flattened in C order.
+
+    Args:
+        strides: The strides of each axis, in elements
+        shape: The length of each axis
+
+    Returns:
+        The offsets, in elements, of each element from the first.
+    """
+    offsets = np.zeros(1, dtype=np.int64)
+    for stride, size in zip(strides, shape):
+        offsets = np.add.outer(offsets, np.arange(size, dtype=np.int64) * stride).ravel()
+
+    return offsets
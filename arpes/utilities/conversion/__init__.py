@@ -1,5 +1,6 @@
 """Imports momentum conversion routines for forward and inverse (volumetric) conversion."""
 from .core import *
+from .plan import *
 from .remap_manipulator import *
 from .forward import *
 from .calibration import *
@@ -24,11 +24,13 @@ from arpes.utilities.conversion.grids import (
     determine_momentum_axes_from_measurement_axes,
     is_dimension_unconvertible,
 )
-from .fast_interp import Interpolator
+from .fast_interp import FAST_INTERPOLATION_METHODS, Interpolator
 
 from arpes.trace import traceable
 import collections
+import os
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import scipy.interpolate
@@ -36,10 +38,17 @@ import scipy.interpolate
 import xarray as xr
 from arpes.provenance import provenance, update_provenance
 from arpes.utilities import normalize_to_spectrum
-from typing import Callable, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 from .kx_ky_conversion import ConvertKxKy, ConvertKp
 from .kz_conversion import ConvertKpKz
+from .streaming import (
+    DESIRED_SLAB_SIZE,
+    ConversionTarget,
+    energy_slabs,
+    resolve_target,
+    source_window,
+)
 
 __all__ = ["convert_to_kspace", "slice_along_path"]
 
@@ -52,9 +61,11 @@ def grid_interpolator_from_dataarray(
     bounds_error=False,
     trace: Callable = None,
 ):
-    """Translates an xarray.DataArray contents into a scipy.interpolate.RegularGridInterpolator.
+    """Translates an xarray.DataArray contents into a gridded interpolator.
 
-    This is principally used for coordinate translations.
+    This is principally used for coordinate translations. Nearest neighbor, linear, and cubic
+    interpolation of one to four dimensional data use `fast_interp.Interpolator`, anything
+    else falls back to a scipy.interpolate.RegularGridInterpolator.
     """
     flip_axes = set()
     for d in arr.dims:
@@ -72,9 +83,9 @@ def grid_interpolator_from_dataarray(
     ]
     trace_size = [len(pts) for pts in interp_points]
 
-    if method == "linear":
+    if method in FAST_INTERPOLATION_METHODS and 1 <= len(interp_points) <= 4:
         trace(f"Using fast_interp.Interpolator: size {trace_size}")
-        return Interpolator.from_arrays(interp_points, values)
+        return Interpolator.from_arrays(interp_points, values, method=method, fill_value=fill_value)
 
     trace(f"Calling scipy.interpolate.RegularGridInterpolator: size {trace_size}")
     return scipy.interpolate.RegularGridInterpolator(
@@ -327,6 +338,9 @@ def convert_to_kspace(
     calibration=None,
     coords=None,
     allow_chunks: bool = False,
+    chunk_size: Optional[int] = None,
+    target: Union[None, str, os.PathLike, ConversionTarget] = None,
+    use_plan: bool = False,
     trace: Callable = None,
     **kwargs,
 ):
@@ -351,6 +365,16 @@ def convert_to_kspace(
     You can request a particular resolution for the new data with the `resolution=` parameter,
     or a specific set of bounds with the `bounds=`
 
+    Volumes which do not fit in memory can be converted in slabs along the energy axis with
+    `allow_chunks=True`. Only the window of the source covering each slab is read at a
+    time, so `arr` can be backed by dask or by a memory mapped file, and the converted slabs
+    can be written straight to a NetCDF file or Zarr store with `target=`. See
+    `arpes.utilities.conversion.streaming`.
+
+    When converting many spectra with identical geometry, such as a temperature or delay
+    series, pass `use_plan=True` to reuse the interpolation stencil between calls, see
+    `arpes.utilities.conversion.plan`.
+
     Examples:
         Convert a 2D cut with automatically inferred range and resolution.
 
@@ -372,7 +396,16 @@ def convert_to_kspace(
         resolution ([type], optional): [description]. Defaults to None.
         calibration ([type], optional): [description]. Defaults to None.
         coords ([type], optional): [description]. Defaults to None.
-        allow_chunks (bool, optional): [description]. Defaults to False.
+        allow_chunks (bool, optional): Whether to convert in slabs along the energy axis.
+          Defaults to False.
+        chunk_size (int, optional): The number of energies in each slab. By default, slabs
+          of about twenty million points are used.
+        target (optional): Where to write the converted slabs: a path to a ".nc" file or
+          ".zarr" store, or a `ConversionTarget`. Implies `allow_chunks`. Defaults to None,
+          in which case the result is assembled in memory.
+        use_plan (bool, optional): Whether to convert with a `KSpaceConversionPlan`, which
+          is cached and reused for data with the same geometry. Plans convert in memory, so
+          this cannot be combined with `allow_chunks` or `target`. Defaults to False.
         trace (Callable, optional): Controls whether to use execution tracing. Defaults to None.
           Pass `True` to enable.
 
@@ -400,60 +433,23 @@ def convert_to_kspace(
 
     has_eV = "eV" in arr.dims
 
-    # Chunking logic
-    if allow_chunks and has_eV and len(arr.eV) > 50:
-        DESIRED_CHUNK_SIZE = 1000 * 1000 * 20
-        n_chunks = np.prod(arr.shape) // DESIRED_CHUNK_SIZE
-        if n_chunks > 100:
-            warnings.warn("Input array is very large. Please consider resampling.")
-
-        chunk_thickness = max(len(arr.eV) // n_chunks, 1)
-
-        trace(f"Chunking along energy: {n_chunks}, thickness {chunk_thickness}")
-
-        finished = []
-        low_idx = 0
-        high_idx = chunk_thickness
-
-        while low_idx < len(arr.eV):
-            chunk = arr.isel(eV=slice(low_idx, high_idx))
+    if use_plan:
+        from .plan import plan_kspace_conversion
 
-            if len(chunk.eV) == 1:
-                chunk = chunk.squeeze("eV")
-
-            kchunk = convert_to_kspace(
-                chunk,
-                bounds=bounds,
-                resolution=resolution,
-                calibration=calibration,
-                coords=coords,
-                allow_chunks=False,
-                trace=trace,
-                **kwargs,
+        if target is not None or allow_chunks:
+            raise ValueError(
+                "Conversion plans are evaluated in memory, and cannot be combined with "
+                "`allow_chunks` or `target`."
             )
 
-            if "eV" not in kchunk.dims:
-                kchunk = kchunk.expand_dims("eV")
-
-            finished.append(kchunk)
-
-            low_idx = high_idx
-            high_idx = min(len(arr.eV), high_idx + chunk_thickness)
-
-        return xr.concat(finished, dim="eV")
-
-    # Chunking is finished here
+        trace("Converting with a cached plan")
+        return plan_kspace_conversion(
+            arr, bounds=bounds, resolution=resolution, calibration=calibration, coords=coords
+        )(arr)
 
     # TODO be smarter about the resolution inference
     trace("Determining dimensions and resolution")
-    removed = [d for d in arr.dims if is_dimension_unconvertible(d)]
-    old_dims = [d for d in arr.dims if not is_dimension_unconvertible(d)]
-
-    # Energy gets put at the front as a standardization
-    if "eV" in removed:
-        removed.remove("eV")
-
-    old_dims.sort()
+    old_dims, removed, converted_dims, convert_cls = _conversion_dims(arr)
 
     trace("Replacing dummy coordinates with index-like ones.")
     # temporarily reassign coordinates for dimensions we will not
@@ -465,20 +461,6 @@ def convert_to_kspace(
     if not old_dims:
         return arr  # no need to convert, might be XPS or similar
 
-    converted_dims = (
-        (["eV"] if has_eV else [])
-        + determine_momentum_axes_from_measurement_axes(old_dims)
-        + removed
-    )
-
-    convert_cls = {
-        ("phi",): ConvertKp,
-        ("beta", "phi"): ConvertKxKy,
-        ("phi", "theta"): ConvertKxKy,
-        ("phi", "psi"): ConvertKxKy,
-        # ('chi', 'phi',): ConvertKxKy,
-        ("hv", "phi"): ConvertKpKz,
-    }.get(tuple(old_dims))
     converter = convert_cls(arr, converted_dims, calibration=calibration)
 
     trace("Converting coordinates")
@@ -490,6 +472,20 @@ def convert_to_kspace(
 
     converted_coordinates.update(coords)
 
+    if target is not None or (allow_chunks and has_eV and len(arr.eV) > 1):
+        trace("Converting in slabs")
+        return _convert_in_slabs(
+            arr,
+            convert_cls,
+            converted_dims,
+            converted_coordinates,
+            restore_index_like_coordinates,
+            resolve_target(target),
+            calibration=calibration,
+            chunk_size=chunk_size,
+            trace=trace,
+        )
+
     trace("Calling convert_coordinates")
     result = convert_coordinates(
         arr,
@@ -506,6 +502,152 @@ def convert_to_kspace(
     return result
 
 
+def _conversion_dims(arr: xr.DataArray) -> Tuple[List[str], List[str], List[str], Optional[type]]:
+    """Determines how the dimensions of `arr` are converted.
+
+    Returns:
+        The dimensions converted to momentum, the dimensions passed through unconverted, the
+        dimensions of the converted data, and the converter class for the conversion.
+    """
+    removed = [d for d in arr.dims if is_dimension_unconvertible(d)]
+    old_dims = [d for d in arr.dims if not is_dimension_unconvertible(d)]
+
+    # Energy gets put at the front as a standardization
+    if "eV" in removed:
+        removed.remove("eV")
+
+    old_dims.sort()
+
+    converted_dims = (
+        (["eV"] if "eV" in arr.dims else [])
+        + (determine_momentum_axes_from_measurement_axes(old_dims) if old_dims else [])
+        + removed
+    )
+
+    convert_cls = {
+        ("phi",): ConvertKp,
+        ("beta", "phi"): ConvertKxKy,
+        ("phi", "theta"): ConvertKxKy,
+        ("phi", "psi"): ConvertKxKy,
+        # ('chi', 'phi',): ConvertKxKy,
+        ("hv", "phi"): ConvertKpKz,
+    }.get(tuple(old_dims))
+
+    return old_dims, removed, converted_dims, convert_cls
+
+
+def _convert_in_slabs(
+    arr: xr.DataArray,
+    convert_cls: type,
+    converted_dims: List[str],
+    converted_coordinates: Dict[str, Any],
+    restore_index_like_coordinates: Dict[str, np.ndarray],
+    target: ConversionTarget,
+    calibration=None,
+    chunk_size: Optional[int] = None,
+    trace: Callable = None,
+) -> xr.DataArray:
+    """Converts `arr` one slab of output energies at a time, handing each slab to `target`.
+
+    The momentum transforms are applied with a fresh converter for every slab, as converters
+    cache their coordinates, and the grid of target coordinates is only built for one slab
+    at a time. Reading the next window of the source and writing the previous slab happen
+    on background threads while the current slab is converted, which itself runs in parallel
+    in the compiled transforms and interpolator.
+    """
+    if "eV" in converted_dims:
+        energy = np.asarray(converted_coordinates["eV"])
+        source_energy = arr.coords["eV"].values
+    else:
+        # nothing to cut along, convert everything as a single slab
+        energy, source_energy = None, None
+
+    if energy is None:
+        slabs = [slice(None)]
+    else:
+        if chunk_size is None:
+            points_per_energy = int(
+                np.prod([len(converted_coordinates[d]) for d in converted_dims[1:]])
+            )
+            chunk_size = max(DESIRED_SLAB_SIZE // max(points_per_energy, 1), 1)
+
+        slabs = energy_slabs(len(energy), chunk_size)
+
+    trace(f"Converting in {len(slabs)} slabs")
+
+    def load(slab: slice) -> xr.DataArray:
+        window = arr if energy is None else arr.isel(eV=source_window(source_energy, energy[slab]))
+        return window.copy(data=np.array(window.values, dtype=np.float64))
+
+    def convert(slab: slice, window: xr.DataArray) -> xr.DataArray:
+        converter = convert_cls(window, converted_dims, calibration=calibration)
+        slab_coordinates = dict(converted_coordinates)
+        if energy is not None:
+            slab_coordinates["eV"] = energy[slab]
+
+        return convert_coordinates(
+            window,
+            slab_coordinates,
+            {
+                "dims": converted_dims,
+                "transforms": dict(
+                    zip(window.dims, [converter.conversion_for(d) for d in window.dims])
+                ),
+            },
+            trace=trace,
+        )
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        pending_load = pool.submit(load, slabs[0])
+        pending_write = None
+        for i, slab in enumerate(slabs):
+            window = pending_load.result()
+            if i + 1 < len(slabs):
+                pending_load = pool.submit(load, slabs[i + 1])
+
+            converted = convert(slab, window)
+            if i == 0:
+                template = converted.assign_coords(**restore_index_like_coordinates)
+                target.open(
+                    template,
+                    template.coords[template.dims[0]].values if energy is None else energy,
+                    converted.shape[0],
+                )
+
+            # slabs are written in order, one at a time
+            if pending_write is not None:
+                pending_write.result()
+            pending_write = pool.submit(target.write, slab, converted.values)
+
+        pending_write.result()
+
+    return target.close()
+
+
+@traceable
+def meshed_target_coordinates(
+    arr: xr.DataArray,
+    target_coordinates: Dict[str, Any],
+    dims: List[str],
+    trace: Callable = None,
+) -> List[np.ndarray]:
+    """The raveled grid of target coordinates, as passed to the coordinate transforms.
+
+    If `arr` has no energy axis, its (scalar) energy coordinate is passed first.
+    """
+    trace(f"Calling meshgrid: {[len(target_coordinates[d]) for d in dims]}")
+    meshed_coordinates = np.meshgrid(*[target_coordinates[dim] for dim in dims], indexing="ij")
+    meshed_coordinates = [meshed_coord.ravel() for meshed_coord in meshed_coordinates]
+
+    if "eV" not in arr.dims:
+        try:
+            meshed_coordinates = [arr.S.lookup_offset_coord("eV")] + meshed_coordinates
+        except ValueError:
+            pass
+
+    return meshed_coordinates
+
+
 @traceable
 def convert_coordinates(
     arr: xr.DataArray,
@@ -525,18 +667,9 @@ def convert_coordinates(
 
     # Skip the Jacobian correction for now
     # Convert the raw coordinate axes to a set of gridded points
-    trace(f"Calling meshgrid: {[len(target_coordinates[d]) for d in coordinate_transform['dims']]}")
-    meshed_coordinates = np.meshgrid(
-        *[target_coordinates[dim] for dim in coordinate_transform["dims"]], indexing="ij"
+    meshed_coordinates = meshed_target_coordinates(
+        arr, target_coordinates, coordinate_transform["dims"], trace=trace
     )
-    trace("Raveling coordinates")
-    meshed_coordinates = [meshed_coord.ravel() for meshed_coord in meshed_coordinates]
-
-    if "eV" not in arr.dims:
-        try:
-            meshed_coordinates = [arr.S.lookup_offset_coord("eV")] + meshed_coordinates
-        except ValueError:
-            pass
 
     old_coord_names = [dim for dim in arr.dims if dim not in target_coordinates]
     old_coordinate_transforms = [
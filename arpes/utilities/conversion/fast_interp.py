@@ -1,14 +1,21 @@
-"""Provides extremely fast 2D and 3D linear interpolation.
+"""Provides extremely fast gridded interpolation in one to four dimensions.
 
 This is used for momentum conversion in place of the scipy
-GridInterpolator where it is possible to do so. It is many many 
+GridInterpolator where it is possible to do so. It is many many
 times faster than the grid interpolator and together with other optimizations
 resulted in a 50x improvement in the momentum conversion time for
 ARPES data in PyARPES.
+
+Nearest neighbor, linear, and cubic (Keys cubic convolution) interpolation are supported on
+grids whose axes may each be uniform or nonuniform. Uniform axes locate points
+arithmetically, nonuniform ones by binary search. Single and double precision data are
+interpolated in their own precision, and data with leading "batch" axes is interpolated
+at the same points for every batch entry in a single pass.
 """
+import functools
 import numba
 from dataclasses import dataclass
-from typing import List, Union
+from typing import List, Optional, Sequence, Union
 import math
 import numpy as np
 
@@ -16,221 +23,270 @@ __all__ = [
     "Interpolator",
 ]
 
+# in units of grid cells
+EDGE_TOLERANCE = 1e-6
 
-@numba.njit
-def to_fractional_coordinate(coord, initial, delta):
-    return (coord - initial) / delta
-
-
-@numba.njit
-def _i1d(xd, c0, c1):
-    return c0 * (1 - xd) + c1 * xd
-
-
-@numba.njit
-def raw_lin_interpolate_1d(xd, c0, c1):
-    return _i1d(xd, c0, c1)
-
-
-@numba.njit
-def raw_lin_interpolate_2d(xd, yd, c00, c01, c10, c11):
-    # project to 1D
-    c0 = _i1d(xd, c00, c10)
-    c1 = _i1d(xd, c01, c11)
-
-    return _i1d(yd, c0, c1)
+# axes whose spacing deviates from uniform by less than this, in units of grid cells
+UNIFORM_TOLERANCE = 1e-6
 
+METHODS = {"nearest": 0, "linear": 1, "cubic": 2}
+FAST_INTERPOLATION_METHODS = tuple(METHODS)
 
-@numba.njit
-def raw_lin_interpolate_3d(xd, yd, zd, c000, c001, c010, c100, c011, c101, c110, c111):
-    # project to 2D
-    c00 = _i1d(xd, c000, c100)
-    c01 = _i1d(xd, c001, c101)
-    c10 = _i1d(xd, c010, c110)
-    c11 = _i1d(xd, c011, c111)
-
-    # project to 1D
-    c0 = _i1d(yd, c00, c10)
-    c1 = _i1d(yd, c01, c11)
-
-    return _i1d(zd, c0, c1)
+# the number of points each thread interpolates with one set of scratch buffers
+BLOCK_SIZE = 1024
 
 
 @numba.njit
-def lin_interpolate_3d(data, ix, iy, iz, ixp, iyp, izp, xd, yd, zd):
-    return raw_lin_interpolate_3d(
-        xd,
-        yd,
-        zd,
-        data[ix][iy][iz],
-        data[ix][iy][izp],
-        data[ix][iyp][iz],
-        data[ixp][iy][iz],
-        data[ix][iyp][izp],
-        data[ixp][iy][izp],
-        data[ixp][iyp][iz],
-        data[ixp][iyp][izp],
-    )
-
+def _cubic_weights(t, weights, row):
+    """Keys cubic convolution weights (a = -0.5) for the points at offsets -1, 0, 1, 2."""
+    t2 = t * t
+    t3 = t2 * t
+    weights[row, 0] = 0.5 * (-t3 + 2 * t2 - t)
+    weights[row, 1] = 0.5 * (3 * t3 - 5 * t2 + 2)
+    weights[row, 2] = 0.5 * (-3 * t3 + 4 * t2 + t)
+    weights[row, 3] = 0.5 * (t3 - t2)
+
+
+@functools.lru_cache(maxsize=None)
+def _interpolation_kernel(n_dims: int, method: int, all_uniform: bool):
+    """Compiles the interpolation kernel for grids of `n_dims` axes with `method`.
+
+    The number of axes, the stencil size, and whether any axis needs to be searched are
+    compile time constants of the kernel, so that the common case of uniform grids pays
+    nothing for the others. Kernels are compiled the first time they are used.
+    """
+    stencil = 1 if method == 0 else (2 if method == 1 else 4)
+    n_stencil = stencil**n_dims
 
-@numba.njit
-def lin_interpolate_2d(data, ix, iy, ixp, iyp, xd, yd):
-    return raw_lin_interpolate_2d(
-        xd,
-        yd,
-        data[ix][iy],
-        data[ix][iyp],
-        data[ixp][iy],
-        data[ixp][iyp],
-    )
-
-
-@numba.njit(parallel=True)
-def interpolate_3d(
-    data,
-    output,
-    lower_corner_x,
-    lower_corner_y,
-    lower_corner_z,
-    delta_x,
-    delta_y,
-    delta_z,
-    shape_x,
-    shape_y,
-    shape_z,
-    x,
-    y,
-    z,
-    fill_value=np.nan,
-):
-    for i in numba.prange(len(x)):
-        if np.isnan(x[i]) or np.isnan(y[i]) or np.isnan(z[i]):
-            output[i] = fill_value
-            continue
-
-        ix = to_fractional_coordinate(x[i], lower_corner_x, delta_x)
-        iy = to_fractional_coordinate(y[i], lower_corner_y, delta_y)
-        iz = to_fractional_coordinate(z[i], lower_corner_z, delta_z)
-
-        if ix < 0 or iy < 0 or iz < 0 or ix >= shape_x or iy >= shape_y or iz >= shape_z:
-            output[i] = fill_value
-            continue
-
-        iix, iiy, iiz = math.floor(ix), math.floor(iy), math.floor(iz)
-        iixp, iiyp, iizp = (
-            min(iix + 1, shape_x - 1),
-            min(iiy + 1, shape_y - 1),
-            min(iiz + 1, shape_z - 1),
-        )
-        xd, yd, zd = ix - iix, iy - iiy, iz - iiz
-
-        output[i] = lin_interpolate_3d(data, iix, iiy, iiz, iixp, iiyp, iizp, xd, yd, zd)
-
-
-@numba.njit(parallel=True)
-def interpolate_2d(
-    data,
-    output,
-    lower_corner_x,
-    lower_corner_y,
-    delta_x,
-    delta_y,
-    shape_x,
-    shape_y,
-    x,
-    y,
-    fill_value=np.nan,
-):
-    for i in numba.prange(len(x)):
-        if np.isnan(x[i]) or np.isnan(y[i]):
-            output[i] = fill_value
-            continue
-
-        ix = to_fractional_coordinate(x[i], lower_corner_x, delta_x)
-        iy = to_fractional_coordinate(y[i], lower_corner_y, delta_y)
-
-        if ix < 0 or iy < 0 or ix >= shape_x - 1 or iy >= shape_y - 1:
-            output[i] = fill_value
-            continue
-
-        iix, iiy = math.floor(ix), math.floor(iy)
-        iixp, iiyp = (
-            min(iix + 1, shape_x - 1),
-            min(iiy + 1, shape_y - 1),
-        )
-        xd, yd = ix - iix, iy - iiy
+    @numba.njit(parallel=True, error_model="numpy")
+    def interpolate(
+        data, shape, strides, lower_corner, delta, axes, uniform, fill_value, points, output
+    ):
+        """Interpolates each row of the flattened grids in `data` at `points`.
 
-        output[i] = lin_interpolate_2d(data, iix, iiy, iixp, iiyp, xd, yd)
+        Args:
+            data: The grid values with shape `[n_batch, prod(shape)]`
+            shape: The length of each grid axis
+            strides: The stride of each grid axis in `data`, in elements
+            lower_corner: The first coordinate along each axis
+            delta: The spacing of each uniform axis
+            axes: The coordinates of each axis, padded to a common length, used for
+              nonuniform axes
+            uniform: Whether each axis is uniform
+            fill_value: The value for points outside the grid
+            points: The coordinates to interpolate at, one flat array for each axis
+            output: The interpolated values, with shape `[n_batch, n_points]`
+        """
+        n_points = len(points[0])
+        n_batch = data.shape[0]
+
+        n_blocks = (n_points + BLOCK_SIZE - 1) // BLOCK_SIZE
+        for block in numba.prange(n_blocks):
+            offsets = np.empty((n_dims, 4), dtype=np.int64)
+            weights = np.empty((n_dims, 4), dtype=np.float64)
+            corner_offsets = np.empty(n_stencil, dtype=np.int64)
+            corners = np.empty(n_stencil, dtype=np.float64)
+
+            for i in range(block * BLOCK_SIZE, min((block + 1) * BLOCK_SIZE, n_points)):
+                outside = False
+                for k in range(n_dims):
+                    x = points[k][i]
+                    n = shape[k]
+                    if all_uniform or uniform[k]:
+                        position = (x - lower_corner[k]) / delta[k]
+                    else:
+                        cell = np.searchsorted(axes[k, :n], x, side="right") - 1
+                        cell = min(max(cell, 0), max(n - 2, 0))
+                        width = axes[k, cell + 1] - axes[k, cell] if n > 1 else 1.0
+                        position = cell + (x - axes[k, cell]) / width
+
+                    # NaN coordinates fail both comparisons
+                    if not (-EDGE_TOLERANCE <= position <= n - 1 + EDGE_TOLERANCE):
+                        outside = True
+                        break
+
+                    if stencil == 1:
+                        nearest = min(max(int(math.floor(position + 0.5)), 0), n - 1)
+                        offsets[k, 0] = nearest * strides[k]
+                        weights[k, 0] = 1.0
+                        continue
+
+                    base = min(max(int(math.floor(position)), 0), max(n - 2, 0))
+                    t = position - base
+                    if stencil == 2:
+                        offsets[k, 0] = base * strides[k]
+                        offsets[k, 1] = min(base + 1, n - 1) * strides[k]
+                        weights[k, 0] = 1 - t
+                        weights[k, 1] = t
+                    else:
+                        for s in range(4):
+                            offsets[k, s] = min(max(base + s - 1, 0), n - 1) * strides[k]
+                        _cubic_weights(t, weights, k)
+
+                if outside:
+                    for row in range(n_batch):
+                        output[row, i] = fill_value
+                    continue
+
+                # the offsets of every corner of the stencil, with the first axis varying fastest
+                corner_offsets[0] = 0
+                n_corners = 1
+                for k in range(n_dims):
+                    for s in range(stencil - 1, -1, -1):
+                        for c in range(n_corners):
+                            corner_offsets[s * n_corners + c] = corner_offsets[c] + offsets[k, s]
+                    n_corners *= stencil
+
+                # gather the corners and reduce them one axis at a time, the last axis first
+                for row in range(n_batch):
+                    for c in range(n_stencil):
+                        corners[c] = data[row, corner_offsets[c]]
+
+                    remaining = n_stencil
+                    for k in range(n_dims - 1, -1, -1):
+                        remaining //= stencil
+                        for c in range(remaining):
+                            reduced = 0.0
+                            for s in range(stencil):
+                                reduced += weights[k, s] * corners[s * remaining + c]
+                            corners[c] = reduced
+
+                    output[row, i] = corners[0]
+
+    return interpolate
+
+
+def _is_uniform(xi: np.ndarray) -> bool:
+    if len(xi) < 3:
+        return True
+
+    delta = xi[1] - xi[0]
+    expected = xi[0] + delta * np.arange(len(xi))
+    return bool(np.all(np.abs(xi - expected) <= UNIFORM_TOLERANCE * np.abs(delta)))
 
 
 @dataclass
 class Interpolator:
-    """Provides a Pythonic interface to fast gridded linear interpolation.
+    """Provides a Pythonic interface to fast gridded interpolation.
 
     More or less a drop-in replacement for scipy's RegularGridInterpolator,
     but much faster at the expense of not supporting any extrapolation.
+
+    The grid has one to four axes. If `data` has more axes than the grid, the leading axes
+    are batch axes, and each call interpolates every entry of the batch at the same points.
+
+    Args:
+        lower_corner: The first coordinate along each axis
+        delta: The spacing of each axis, used for uniform axes
+        shape: The length of each axis
+        data: The values on the grid, optionally with leading batch axes
+        axes: The coordinates of each axis, or None for uniform axes which are described
+          by `lower_corner` and `delta` alone
+        method: One of "nearest", "linear", or "cubic"
+        fill_value: The value for points outside of the grid
     """
 
     lower_corner: List[float]
     delta: List[float]
     shape: List[int]
     data: np.ndarray
+    axes: Optional[List[Optional[np.ndarray]]] = None
+    method: str = "linear"
+    fill_value: float = np.nan
 
     def __post_init__(self):
-        """Convert data to floating point representation.
+        """Validate the method and convert data to a floating point representation.
 
-        Because we do linear not nearest neighbor interpolation this should be safe
-        always.
+        Single precision data is kept in single precision.
         """
-        self.data = self.data.astype(np.float64, copy=False)
+        if self.method not in METHODS:
+            raise ValueError(
+                "Unknown interpolation method {}, expected one of {}.".format(
+                    self.method, ", ".join(METHODS)
+                )
+            )
+
+        if not 1 <= len(self.shape) <= 4:
+            raise ValueError("Interpolation is supported on grids of one to four dimensions.")
+
+        if self.data.dtype not in (np.float32, np.float64):
+            self.data = self.data.astype(np.float64)
 
     @classmethod
-    def from_arrays(cls, xyz: List[np.ndarray], data: np.ndarray):
+    def from_arrays(
+        cls,
+        xyz: Sequence[np.ndarray],
+        data: np.ndarray,
+        method: str = "linear",
+        fill_value: float = np.nan,
+    ):
         """Initializes the interpreter from a coordinate and data array.
 
         Args:
-            xyz: A list of the coordinate arrays. Should be length 2 or 3
-              because we provide 2D and 3D coordinate interpolation.
-            data: The value of the interpolated function at the coordinate in `xyz`
+            xyz: A list of the coordinate arrays, one to four of them. Axes which
+              are not uniformly spaced are supported, and must be monotonic.
+            data: The value of the interpolated function at the coordinate in `xyz`,
+              optionally with leading batch axes
+            method: One of "nearest", "linear", or "cubic"
+            fill_value: The value for points outside of the grid
         """
+        xyz = [np.asarray(xi, dtype=np.float64) for xi in xyz]
+        n_batch_dims = data.ndim - len(xyz)
+
+        axes = []
+        for k, xi in enumerate(xyz):
+            if len(xi) > 1 and xi[-1] < xi[0]:
+                xyz[k] = xi = xi[::-1]
+                data = np.flip(data, n_batch_dims + k)
+
+            axes.append(None if _is_uniform(xi) else xi)
+
         lower_corner = [xi[0] for xi in xyz]
-        delta = [xi[1] - xi[0] for xi in xyz]
+        delta = [xi[1] - xi[0] if len(xi) > 1 else 1.0 for xi in xyz]
         shape = [len(xi) for xi in xyz]
-        return cls(lower_corner, delta, shape, data)
+        return cls(lower_corner, delta, shape, data, axes, method=method, fill_value=fill_value)
 
     def __call__(self, xi: Union[np.ndarray, List[np.ndarray]]) -> np.ndarray:
-        """Performs linear interpolation at the coordinates given by `xi`.
-
-        Whether 2D or 3D interpolation is used depends on the dimensionality of `xi` and
-        `self.data` but of course they must match one another.
+        """Performs interpolation at the coordinates given by `xi`.
 
         Args:
             xi: A list or stacked array of the coordinates. Provides a [d, k] array
               of k points each with d dimensions/indices.
 
         Returns:
-            The interpolated values f(x_i) at each point x_i, as a length k scalar array.
+            The interpolated values f(x_i) at each point x_i, with the shape of the
+            coordinates, preceded by the batch axes of the data if it has any.
         """
+        n_dims = len(self.shape)
         if isinstance(xi, np.ndarray):
-            xi = xi.astype(np.float64, copy=False)
-            xi = [xi[:, i] for i in range(self.data.ndim)]
-        else:
-            xi = [xii.astype(np.float64, copy=False) for xii in xi]
-
-        output = np.zeros_like(xi[0])
-
-        interpolator = {
-            3: interpolate_3d,
-            2: interpolate_2d,
-        }[self.data.ndim]
-
-        interpolator(
-            self.data,
+            xi = [xi[:, i] for i in range(n_dims)]
+
+        coordinates = np.broadcast_arrays(*[np.asarray(x, dtype=np.float64) for x in xi])
+        points_shape = coordinates[0].shape
+        points = tuple(np.ravel(c) for c in coordinates)
+
+        batch_shape = self.data.shape[: self.data.ndim - n_dims]
+        data = np.ascontiguousarray(self.data).reshape((-1,) + tuple(self.shape))
+        strides = np.array([s // data.itemsize for s in data.strides[1:]], dtype=np.int64)
+
+        axes = self.axes if self.axes is not None else [None] * n_dims
+        padded_axes = np.zeros((n_dims, max(self.shape)))
+        for k, axis in enumerate(axes):
+            if axis is not None:
+                padded_axes[k, : len(axis)] = axis
+
+        output = np.empty((len(data), len(points[0])), dtype=data.dtype)
+        _interpolation_kernel(n_dims, METHODS[self.method], all(a is None for a in axes))(
+            data.reshape(len(data), -1),
+            np.array(self.shape, dtype=np.int64),
+            strides,
+            np.array(self.lower_corner, dtype=np.float64),
+            np.array(self.delta, dtype=np.float64),
+            padded_axes,
+            np.array([axis is None for axis in axes]),
+            self.fill_value,
+            points,
             output,
-            *self.lower_corner,
-            *self.delta,
-            *self.shape,
-            *xi,
         )
 
-        return output
+        return output.reshape(batch_shape + points_shape)
@@ -0,0 +1,343 @@
+"""Reusable interpolation plans for converting many spectra with the same geometry.
+
+Converting a spectrum to momentum builds a converter, infers the momentum grid, and
+evaluates the inverse coordinate transforms on every point of that grid before finally
+interpolating. Only the last step depends on the data. When converting many spectra taken
+with identical geometry, such as a temperature or delay series, everything else is the same
+for every spectrum.
+
+A `KSpaceConversionPlan` does the geometric work once and records, for every point of the
+output, the cell of the source grid it falls in and its fractional position in that cell.
+Applying the plan to data is then a single gather and multilinear interpolation, and
+any dimensions which are not converted (e.g. `temperature` or `delay`) are converted together
+in the same pass.
+
+`plan_kspace_conversion` keeps the most recently used plans, keyed by the geometry of the
+data, so that repeated calls with the same geometry reuse a plan.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numba
+import numpy as np
+import xarray as xr
+
+from .core import _conversion_dims, meshed_target_coordinates
+from .fast_interp import EDGE_TOLERANCE, _is_uniform
+
+__all__ = (
+    "KSpaceConversionPlan",
+    "plan_kspace_conversion",
+)
+
+# the most recently used plans are kept, up to this many
+PLAN_CACHE_SIZE = 16
+
+# coordinates which enter the angle to momentum transforms, either directly or through offsets
+GEOMETRY_COORDS = ("eV", "hv", "phi", "theta", "psi", "beta", "chi", "alpha")
+
+
+@numba.njit(parallel=True)
+def _gather_lerp(data, strides, index, fraction, output):
+    """Multilinear interpolation at precomputed cells, for each row of `data`.
+
+    `data` has one flattened source volume per row, `strides` are the strides of the source
+    axes in elements, and `index` and `fraction` give the lower corner of the cell and
+    position inside it along each axis for every output point. Points outside the source
+    have a negative index.
+    """
+    n_dims, n_points = index.shape
+    for i in numba.prange(n_points):
+        if index[0, i] < 0:
+            for row in range(data.shape[0]):
+                output[row, i] = np.nan
+            continue
+
+        for row in range(data.shape[0]):
+            output[row, i] = 0.0
+
+        for corner in range(1 << n_dims):
+            weight = 1.0
+            offset = 0
+            for axis in range(n_dims):
+                if (corner >> axis) & 1:
+                    weight *= fraction[axis, i]
+                    offset += (index[axis, i] + 1) * strides[axis]
+                else:
+                    weight *= 1.0 - fraction[axis, i]
+                    offset += index[axis, i] * strides[axis]
+
+            for row in range(data.shape[0]):
+                output[row, i] += weight * data[row, offset]
+
+
+def _freeze(value: Any) -> Hashable:
+    """A hashable version of coordinate values and conversion options.
+
+    Raises:
+        TypeError: If `value` cannot be made hashable.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+
+    if isinstance(value, (np.ndarray, xr.DataArray)):
+        value = np.ascontiguousarray(value)
+        if value.ndim == 0:
+            return value.item()
+
+        return (value.dtype.str, value.shape, value.tobytes())
+
+    hash(value)
+    return value
+
+
+def _geometry_key(arr: xr.DataArray) -> Hashable:
+    """Everything about `arr` which determines a plan, other than the conversion options."""
+    _, removed, _, convert_cls = _conversion_dims(arr)
+    source_dims = [d for d in arr.dims if d not in removed]
+
+    key = [convert_cls, tuple(source_dims)]
+    key += [_freeze(arr.coords[d].values) for d in source_dims]
+
+    for name in GEOMETRY_COORDS:
+        key.append(_freeze(arr.S.lookup_offset(name)))
+        if name not in arr.dims:
+            try:
+                key.append(_freeze(arr.S.lookup_offset_coord(name)))
+            except ValueError:
+                key.append(None)
+
+    key += [
+        _freeze(arr.S.work_function),
+        _freeze(arr.S.inner_potential),
+        arr.attrs.get("location"),
+    ]
+    return tuple(key)
+
+
+class KSpaceConversionPlan:
+    """A precomputed momentum conversion for data with a particular geometry.
+
+    Build plans with `plan_kspace_conversion`, which caches them. The plan is applied to
+    data by calling it, and gives the same result as `convert_to_kspace` with the same
+    options.
+
+    Args:
+        source_dims: The converted dimensions of the source, in the order the plan expects
+        target_dims: The dimensions of the converted output, excluding those passed through
+        target_coords: The coordinates of the output along `target_dims`
+        index: For each source dimension and output point, the lower corner of the cell of
+          the source grid the point falls in, or -1 for points outside of the source
+        fraction: The position of each output point in its cell along each source dimension
+        flip_axes: Source axes with decreasing coordinates, which are reversed before use
+        key: The geometry and options the plan was built for, used to check that data has
+          the same geometry before converting it
+    """
+
+    def __init__(
+        self,
+        source_dims: List[str],
+        target_dims: List[str],
+        target_coords: Dict[str, np.ndarray],
+        index: np.ndarray,
+        fraction: np.ndarray,
+        flip_axes: Tuple[int, ...],
+        key: Optional[Hashable] = None,
+    ):
+        """Records a plan, see `build` for how to create one from data."""
+        self.source_dims = list(source_dims)
+        self.target_dims = list(target_dims)
+        self.target_coords = target_coords
+        self.index = index
+        self.fraction = fraction
+        self.flip_axes = tuple(flip_axes)
+        self.key = key
+
+    @property
+    def target_shape(self) -> Tuple[int, ...]:
+        """The shape of the output along `target_dims`."""
+        return tuple(len(self.target_coords[d]) for d in self.target_dims)
+
+    @classmethod
+    def build(
+        cls,
+        arr: xr.DataArray,
+        bounds=None,
+        resolution=None,
+        calibration=None,
+        coords=None,
+        key: Optional[Hashable] = None,
+    ) -> "KSpaceConversionPlan":
+        """Evaluates the inverse transforms for the geometry of `arr`.
+
+        Arguments are as for `convert_to_kspace`. Only the coordinates and attributes of
+        `arr` are used, not its values.
+        """
+        coords = {} if coords is None else coords
+        old_dims, removed, converted_dims, convert_cls = _conversion_dims(arr)
+        if convert_cls is None:
+            raise ValueError("No momentum conversion for dimensions {}.".format(old_dims))
+
+        # passthrough dimensions are handled when applying the plan
+        geometry = arr.isel({r: 0 for r in removed}, drop=True)
+        target_dims = [d for d in converted_dims if d not in removed]
+
+        converter = convert_cls(geometry, target_dims, calibration=calibration)
+        target_coordinates = converter.get_coordinates(resolution=resolution, bounds=bounds)
+        if not set(coords.keys()).issubset(target_coordinates.keys()):
+            extra = set(coords.keys()).difference(target_coordinates.keys())
+            raise ValueError("Unexpected passed coordinates: {}".format(extra))
+
+        target_coordinates.update(coords)
+        target_coords = {d: np.asarray(target_coordinates[d]) for d in target_dims}
+
+        meshed_coordinates = meshed_target_coordinates(geometry, target_coords, target_dims)
+        source_dims = list(geometry.dims)
+        n_points = int(np.prod([len(target_coords[d]) for d in target_dims]))
+
+        index = np.empty((len(source_dims), n_points), dtype=np.int64)
+        fraction = np.empty((len(source_dims), n_points), dtype=np.float64)
+        inside = np.ones(n_points, dtype=bool)
+        flip_axes = []
+        for axis, dim in enumerate(source_dims):
+            source = converter.conversion_for(dim)(*meshed_coordinates)
+            source = np.broadcast_to(np.asarray(source, dtype=np.float64), (n_points,))
+
+            values = geometry.coords[dim].values
+            if len(values) > 1 and values[1] - values[0] < 0:
+                values = values[::-1]
+                flip_axes.append(axis)
+
+            # matches `fast_interp.Interpolator`, including for unevenly spaced axes
+            if len(values) == 1:
+                position = source - values[0]
+            elif _is_uniform(values):
+                position = (source - values[0]) / (values[1] - values[0])
+            else:
+                cell = np.searchsorted(values, source, side="right") - 1
+                cell = np.clip(cell, 0, len(values) - 2)
+                position = cell + (source - values[cell]) / (values[cell + 1] - values[cell])
+
+            with np.errstate(invalid="ignore"):
+                inside &= (position >= -EDGE_TOLERANCE) & (
+                    position <= len(values) - 1 + EDGE_TOLERANCE
+                )
+
+            lower = np.clip(np.floor(np.nan_to_num(position)), 0, max(len(values) - 2, 0))
+            index[axis] = lower
+            fraction[axis] = position - lower
+
+        index[0, ~inside] = -1
+        fraction[:, ~inside] = 0
+
+        return cls(source_dims, target_dims, target_coords, index, fraction, flip_axes, key)
+
+    def __call__(self, arr: xr.DataArray) -> xr.DataArray:
+        """Converts `arr`, which must have the geometry the plan was built for.
+
+        Dimensions of `arr` which the plan does not convert are passed through, as they are
+        by `convert_to_kspace`, and are converted together in a single pass.
+        """
+        missing = set(self.source_dims).difference(arr.dims)
+        if missing:
+            raise ValueError("Data is missing the planned dimensions {}.".format(missing))
+
+        removed = [d for d in arr.dims if d not in self.source_dims]
+        if self.key is not None and self.key[0] != _geometry_key(arr):
+            raise ValueError("Data does not have the geometry this plan was built for.")
+
+        values = arr.transpose(*removed, *self.source_dims).values
+        removed_shape = values.shape[: len(removed)]
+        values = values.reshape((-1,) + values.shape[len(removed) :])
+        values = np.flip(values, [axis + 1 for axis in self.flip_axes])
+        values = np.ascontiguousarray(values, dtype=np.float64)
+
+        strides = np.array([s // values.itemsize for s in values.strides[1:]], dtype=np.int64)
+
+        # cells of length one axes have no upper corner, which has zero weight in any case
+        strides[np.array(values.shape[1:]) == 1] = 0
+        output = np.empty((len(values), self.index.shape[1]))
+        _gather_lerp(values.reshape(len(values), -1), strides, self.index, self.fraction, output)
+
+        # passthrough dimensions go last, as in `convert_to_kspace`
+        output = output.reshape(removed_shape + self.target_shape)
+        output = np.moveaxis(output, list(range(len(removed))), list(range(-len(removed), 0)))
+
+        converted_coords = dict(self.target_coords)
+        converted_coords.update({d: arr.coords[d].values for d in removed})
+        converted_coords.update(
+            {
+                k: v
+                for k, v in arr.coords.items()
+                if k not in arr.dims and set(v.dims).issubset(removed)
+            }
+        )
+
+        return xr.DataArray(
+            output,
+            coords=converted_coords,
+            dims=self.target_dims + removed,
+            attrs=arr.attrs,
+        )
+
+
+_plans: "OrderedDict[Hashable, KSpaceConversionPlan]" = OrderedDict()
+
+
+def plan_kspace_conversion(
+    arr: xr.DataArray,
+    bounds=None,
+    resolution=None,
+    calibration=None,
+    coords=None,
+    **kwargs: Any,
+) -> KSpaceConversionPlan:
+    """Builds a plan converting data with the geometry of `arr`, or reuses a cached one.
+
+    Plans are cached by the converted coordinates of `arr`, its angular and energy
+    offsets, photon energy, work function, and inner potential, together with the
+    conversion options. The most recently used `PLAN_CACHE_SIZE` plans are kept.
+
+    Example:
+        Convert a temperature series with a single plan
+
+        >>> plan = plan_kspace_conversion(series, kp=np.linspace(-1, 1, 500))  # doctest: +SKIP
+        >>> converted = plan(series)  # doctest: +SKIP
+
+    Args:
+        arr: Data with the geometry to convert, only its coordinates and attributes are used
+        bounds: As for `convert_to_kspace`
+        resolution: As for `convert_to_kspace`
+        calibration: As for `convert_to_kspace`
+        coords: As for `convert_to_kspace`, passed momentum coordinates
+        kwargs: Also taken as momentum coordinates, as in `convert_to_kspace`
+
+    Returns:
+        The plan, which is applied to data by calling it.
+    """
+    coords = dict(coords or {}, **kwargs)
+    options = dict(bounds=bounds, resolution=resolution, calibration=calibration, coords=coords)
+
+    try:
+        key = (_geometry_key(arr), _freeze(options))
+    except TypeError:
+        key = None
+
+    if key is not None and key in _plans:
+        _plans.move_to_end(key)
+        return _plans[key]
+
+    plan = KSpaceConversionPlan.build(
+        arr, bounds=bounds, resolution=resolution, calibration=calibration, coords=coords, key=key
+    )
+
+    if key is not None:
+        _plans[key] = plan
+        if len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+
+    return plan
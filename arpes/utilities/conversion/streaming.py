@@ -0,0 +1,290 @@
+"""Streaming momentum conversion for volumes which do not fit in memory.
+
+Energy is converted by the identity in every momentum conversion, so a conversion can be
+split into slabs of the output along `eV`, each of which only depends on the slab of the
+source covering the same energies. `convert_to_kspace` uses this to convert large volumes
+one slab at a time: the coordinate grid is only ever built for one slab, and only the
+matching window of the source is read, so that dask-backed or memory mapped data is never
+loaded in full.
+
+Converted slabs are handed to a `ConversionTarget`. By default they are collected into a
+single preallocated array in memory, but they can also be written straight to a NetCDF
+or Zarr store on disk, so that the converted volume does not need to fit in memory either.
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import xarray as xr
+
+__all__ = (
+    "ConversionTarget",
+    "MemoryTarget",
+    "NetCDFTarget",
+    "ZarrTarget",
+    "resolve_target",
+)
+
+# the number of output points converted at once when the slab thickness is inferred
+DESIRED_SLAB_SIZE = 1000 * 1000 * 20
+
+
+def energy_slabs(n_energies: int, thickness: int) -> List[slice]:
+    """Cuts `n_energies` output energies into contiguous slabs of (at most) `thickness`."""
+    thickness = max(int(thickness), 1)
+    return [slice(low, min(low + thickness, n_energies)) for low in range(0, n_energies, thickness)]
+
+
+def source_window(source_energy: np.ndarray, target_energy: np.ndarray) -> slice:
+    """The smallest window of the source energies from which `target_energy` is interpolated.
+
+    The window extends one point past the requested energies on either side, and always
+    contains at least two points, so that linear interpolation in the window is identical
+    to interpolation in the full source.
+    """
+    n_source = len(source_energy)
+    descending = n_source > 1 and source_energy[1] < source_energy[0]
+    ascending_energy = source_energy[::-1] if descending else source_energy
+
+    low = np.searchsorted(ascending_energy, np.min(target_energy), side="right") - 1
+    high = np.searchsorted(ascending_energy, np.max(target_energy), side="left") + 1
+    low, high = max(low - 1, 0), min(high + 1, n_source)
+    if high - low < 2:
+        low, high = max(min(low, n_source - 2), 0), min(max(high, low + 2), n_source)
+
+    if descending:
+        low, high = n_source - high, n_source - low
+
+    return slice(int(low), int(high))
+
+
+def _storable_attrs(attrs: Dict[str, Any]) -> Dict[str, Any]:
+    """The attributes which can be stored in NetCDF and Zarr metadata, others are dropped."""
+    storable = {}
+    for k, v in attrs.items():
+        if isinstance(v, (bool, np.bool_)):
+            storable[k] = int(v)
+        elif isinstance(v, (str, int, float)):
+            storable[k] = v
+        elif isinstance(v, np.number):
+            storable[k] = v.item()
+
+    return storable
+
+
+def _target_coords(template: xr.DataArray, dim: str, values: np.ndarray) -> Dict[str, Any]:
+    """The coordinates of the full output, from those of a single slab along `dim`."""
+    coords = {
+        k: v
+        for k, v in template.coords.items()
+        if k != dim and dim not in v.dims and k not in template.dims
+    }
+    coords.update({d: template.coords[d].values for d in template.dims if d != dim})
+    coords[dim] = values
+    return coords
+
+
+class ConversionTarget:
+    """Receives converted slabs along the first (energy) axis of the output.
+
+    Subclasses allocate their storage in `open`, receive each slab in `write`, and return
+    the converted volume from `close`. Slabs are written in order, from a single thread.
+    """
+
+    def open(self, template: xr.DataArray, energy: np.ndarray, slab_thickness: int) -> None:
+        """Allocates storage for the output.
+
+        Args:
+            template: The first converted slab, which provides the dimensions,
+              coordinates and attributes of the output
+            energy: The energy coordinate of the full output, along the first dimension
+            slab_thickness: The number of energies in each slab, for chunked storage
+        """
+        raise NotImplementedError
+
+    def write(self, region: slice, values: np.ndarray) -> None:
+        """Stores the slab `values` at `region` along the first dimension."""
+        raise NotImplementedError
+
+    def close(self) -> xr.DataArray:
+        """Finishes writing and returns the converted volume."""
+        raise NotImplementedError
+
+
+class MemoryTarget(ConversionTarget):
+    """Collects the slabs into a single preallocated array in memory."""
+
+    def __init__(self):
+        """Storage is allocated on `open`."""
+        self.data: Optional[xr.DataArray] = None
+
+    def open(self, template: xr.DataArray, energy: np.ndarray, slab_thickness: int) -> None:
+        """Allocates the output array."""
+        shape = (len(energy),) + template.shape[1:]
+        self.data = xr.DataArray(
+            np.empty(shape, dtype=template.dtype),
+            coords=_target_coords(template, template.dims[0], energy),
+            dims=template.dims,
+            attrs=template.attrs,
+        )
+
+    def write(self, region: slice, values: np.ndarray) -> None:
+        """Copies a slab into the output."""
+        self.data.values[region] = values
+
+    def close(self) -> xr.DataArray:
+        """Returns the output array."""
+        return self.data
+
+
+class NetCDFTarget(ConversionTarget):
+    """Writes the slabs to a NetCDF4 file, which is reopened lazily on `close`.
+
+    Only attributes which can be stored in NetCDF (strings and numbers) are kept.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], name: str = "spectrum"):
+        """Records where to write the output."""
+        try:
+            import netCDF4  # noqa: F401
+        except ImportError as e:
+            raise ImportError(
+                "You need to install `netCDF4` in order to convert to a NetCDF file."
+            ) from e
+
+        self.path = str(path)
+        self.name = name
+        self._dataset = None
+        self._variable = None
+
+    def open(self, template: xr.DataArray, energy: np.ndarray, slab_thickness: int) -> None:
+        """Creates the file, its dimensions and coordinates, and the output variable."""
+        import netCDF4
+
+        coords = _target_coords(template, template.dims[0], energy)
+        shape = (len(energy),) + template.shape[1:]
+
+        self._dataset = netCDF4.Dataset(self.path, "w", format="NETCDF4")
+        scalars = []
+        for dim, size in zip(template.dims, shape):
+            self._dataset.createDimension(dim, size)
+
+        for k, v in coords.items():
+            v = np.asarray(v)
+            if k in template.dims:
+                self._dataset.createVariable(k, v.dtype, (k,))[:] = v
+            elif v.ndim == 0 and v.dtype.kind in "iuf":
+                self._dataset.createVariable(k, v.dtype, ())[...] = v
+                scalars.append(k)
+
+        self._variable = self._dataset.createVariable(
+            self.name,
+            template.dtype,
+            template.dims,
+            chunksizes=(min(slab_thickness, shape[0]),) + shape[1:],
+            fill_value=np.nan,
+        )
+        self._variable.setncatts(_storable_attrs(template.attrs))
+        if scalars:
+            self._variable.coordinates = " ".join(scalars)
+
+    def write(self, region: slice, values: np.ndarray) -> None:
+        """Writes a slab to the file."""
+        self._variable[region] = values
+
+    def close(self) -> xr.DataArray:
+        """Closes the file, and opens the output from it without loading its values."""
+        self._dataset.close()
+        return xr.open_dataarray(self.path)
+
+
+class ZarrTarget(ConversionTarget):
+    """Writes the slabs to a Zarr store, with one Zarr chunk per slab.
+
+    The store follows the conventions xarray uses for Zarr, and is reopened lazily on
+    `close`. Only attributes which can be stored in Zarr (strings and numbers) are kept.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], name: str = "spectrum"):
+        """Records where to write the output."""
+        try:
+            import zarr  # noqa: F401
+        except ImportError as e:
+            raise ImportError(
+                "You need to install `zarr` in order to convert to a Zarr store."
+            ) from e
+
+        self.path = str(path)
+        self.name = name
+        self._array = None
+
+    def open(self, template: xr.DataArray, energy: np.ndarray, slab_thickness: int) -> None:
+        """Creates the store, its coordinates, and the output array."""
+        import zarr
+
+        coords = _target_coords(template, template.dims[0], energy)
+        shape = (len(energy),) + template.shape[1:]
+
+        group = zarr.open_group(self.path, mode="w")
+        scalars = []
+        for k, v in coords.items():
+            v = np.asarray(v)
+            if k in template.dims:
+                group.array(k, v).attrs["_ARRAY_DIMENSIONS"] = [k]
+            elif v.ndim == 0 and v.dtype.kind in "iuf":
+                group.array(k, v).attrs["_ARRAY_DIMENSIONS"] = []
+                scalars.append(k)
+
+        self._array = group.create(
+            self.name,
+            shape=shape,
+            chunks=(min(slab_thickness, shape[0]),) + shape[1:],
+            dtype=template.dtype,
+            fill_value=np.nan,
+        )
+        self._array.attrs.update(_storable_attrs(template.attrs))
+        self._array.attrs["_ARRAY_DIMENSIONS"] = list(template.dims)
+        if scalars:
+            self._array.attrs["coordinates"] = " ".join(scalars)
+
+    def write(self, region: slice, values: np.ndarray) -> None:
+        """Writes a slab to the store."""
+        self._array[region] = values
+
+    def close(self) -> xr.DataArray:
+        """Opens the output from the store without loading its values."""
+        import zarr
+
+        zarr.consolidate_metadata(self.path)
+        return xr.open_dataset(self.path, engine="zarr", chunks=None)[self.name]
+
+
+def resolve_target(target: Union[None, str, os.PathLike, ConversionTarget]) -> ConversionTarget:
+    """Resolves the `target=` argument of `convert_to_kspace` to a `ConversionTarget`.
+
+    Args:
+        target: A `ConversionTarget`, a path to a NetCDF file (".nc", ".nc4", ".h5") or Zarr
+          store (".zarr"), or None to collect the output in memory
+
+    Returns:
+        The target to write converted slabs to.
+    """
+    if target is None:
+        return MemoryTarget()
+
+    if isinstance(target, ConversionTarget):
+        return target
+
+    extension = os.path.splitext(str(target).rstrip("/"))[1].lower()
+    if extension == ".zarr":
+        return ZarrTarget(target)
+
+    if extension in {".nc", ".nc4", ".h5", ".netcdf"}:
+        return NetCDFTarget(target)
+
+    raise ValueError(
+        "Unknown conversion target {}, expected a .nc or .zarr path or a ConversionTarget.".format(
+            target
+        )
+    )
@@ -1,9 +1,8 @@
 """Math snippets used elsewhere in PyARPES."""
-import collections
-import itertools
 
+import numba
 import numpy as np
-import scipy.ndimage.interpolation
+import scipy.ndimage
 
 import arpes.constants
 import xarray as xr
@@ -46,27 +45,113 @@ def propagate_statistical_error(f):
     return compute_propagated_error
 
 
-def shift_by(arr, value, axis=0, by_axis=0, **kwargs):
-    """Shifts slices of `arr` perpendicular to `by_axis` by `value`."""
-    assert axis != by_axis
-    arr_copy = arr.copy()
-
+@numba.njit(parallel=True, cache=True)
+def _shift_rows(rows, shifts, order, cval, out):
+    """Shifts each row of `rows` by the corresponding entry of `shifts`.
+
+    As for `scipy.ndimage.shift` in "constant" mode, positions outside of a row are given
+    the value `cval`. For `order=3`, the rows are the cubic B-spline coefficients, which
+    are extended by mirroring.
+    """
+    n = rows.shape[1]
+    for r in numba.prange(rows.shape[0]):
+        row = rows[r].copy()
+        for i in range(n):
+            x = i - shifts[r]
+            if not (x >= 0 and x <= n - 1):
+                out[r, i] = cval
+            elif n == 1:
+                out[r, i] = row[0]
+            elif order == 1:
+                lower = min(int(np.floor(x)), n - 2)
+                fraction = x - lower
+                out[r, i] = row[lower] * (1 - fraction) + row[lower + 1] * fraction
+            else:
+                lower = int(np.floor(x))
+                t = x - lower
+                weights = (
+                    (1 - t) ** 3 / 6,
+                    (4 - 6 * t**2 + 3 * t**3) / 6,
+                    (1 + 3 * t + 3 * t**2 - 3 * t**3) / 6,
+                    t**3 / 6,
+                )
+                value = 0.0
+                for k in range(4):
+                    j = abs(lower - 1 + k)
+                    if j > n - 1:
+                        j = 2 * (n - 1) - j
+                    value += weights[k] * row[j]
+                out[r, i] = value
+
+
+def shift_by(arr, value, axis=0, by_axis=0, order=3, cval=0.0, out=None, **kwargs):
+    """Shifts slices of `arr` along `axis` by `value`.
+
+    `value` is either a number, a one dimensional array of shifts for the slices along
+    `by_axis`, or a shift field with the dimensions of `arr` without `axis`, which
+    broadcasts against them. All slices are interpolated in a single parallel pass, with the
+    same result as `scipy.ndimage.shift` in "constant" mode.
+
+    Args:
+        arr: The data to shift
+        value: The shifts, in units of samples along `axis`
+        axis: The axis to shift along
+        by_axis: The axis indexing a one dimensional `value`
+        order: The order of the interpolation, 1 (linear) or 3 (cubic spline)
+        cval: The value of the data outside of its extent
+        out: An optional array to write the result to, which can be `arr` itself
+        kwargs: Other arguments for `scipy.ndimage.shift`. For modes other than "constant",
+          it is used to shift each slice in turn instead.
+
+    Returns:
+        The shifted data.
+    """
     if isinstance(value, xr.DataArray):
         value = value.values
 
-    if not isinstance(value, collections.Iterable):
-        value = list(itertools.repeat(value, times=arr.shape[by_axis]))
-
-    for axis_idx in range(arr.shape[by_axis]):
-        slc = (slice(None),) * by_axis + (axis_idx,) + (slice(None),) * (arr.ndim - by_axis - 1)
-        shift_amount = (0,) * axis + (value[axis_idx],) + (0,) * (arr.ndim - axis - 1)
-
-        if axis > by_axis:
-            shift_amount = shift_amount[1:]
-        else:
-            shift_amount = shift_amount[:-1]
-
-        arr_copy[slc] = scipy.ndimage.interpolation.shift(arr[slc], shift_amount, **kwargs)
+    value = np.asarray(value, dtype=np.float64)
+    if value.ndim == 0:
+        value = value.reshape([1] * arr.ndim)
+    elif value.ndim == 1 and arr.ndim > 1:
+        assert axis != by_axis
+        value = value.reshape([len(value) if i == by_axis else 1 for i in range(arr.ndim)])
+    else:
+        value = np.expand_dims(value, axis) if value.ndim == arr.ndim - 1 else value
+
+    fast = kwargs.get("mode", "constant") == "constant" and kwargs.get("prefilter", True)
+    if not fast or order not in (1, 3) or set(kwargs).difference(["mode", "prefilter"]):
+        shifted = _shift_by_slices(arr, value, axis, order=order, cval=cval, **kwargs)
+    else:
+        rows = np.moveaxis(np.asarray(arr, dtype=np.float64), axis, -1)
+        shape = rows.shape
+        if order == 3:
+            rows = scipy.ndimage.spline_filter1d(rows, order=3, axis=-1, mode="mirror")
+        rows = np.ascontiguousarray(rows).reshape(-1, shape[-1])
+        shifts = np.broadcast_to(np.moveaxis(value, axis, -1), shape[:-1] + (1,)).ravel()
+
+        # rows are buffered in the kernel, so that they can be written back in place
+        target = None if out is None else np.moveaxis(out, axis, -1)
+        if target is None or target.dtype != np.float64 or not target.flags.c_contiguous:
+            target = np.empty(shape)
+
+        _shift_rows(rows, shifts, order, float(cval), target.reshape(rows.shape))
+        shifted = np.moveaxis(target, -1, axis)
+
+    if out is None:
+        return shifted.astype(np.result_type(arr.dtype, np.float32), copy=False)
+
+    if not np.may_share_memory(shifted, out):
+        out[...] = shifted
+    return out
+
+
+def _shift_by_slices(arr, value, axis, **kwargs):
+    """Shifts `arr` along `axis` with `scipy.ndimage.shift`, one slice at a time."""
+    arr_copy = np.array(arr, dtype=np.result_type(arr.dtype, np.float32))
+    shifts = np.broadcast_to(value, arr.shape[:axis] + (1,) + arr.shape[axis + 1 :])
+    for index in np.ndindex(*shifts.shape[:axis], *shifts.shape[axis + 1 :]):
+        slc = index[:axis] + (slice(None),) + index[axis:]
+        arr_copy[slc] = scipy.ndimage.shift(arr[slc], shifts[slc][0], **kwargs)
 
     return arr_copy
 
@@ -1,18 +1,27 @@
 """This package contains utilities related to taking more complicated shaped selections around data.
 
-Currently it houses just utilities for forming disk and annular selections out of data.
+It houses utilities for forming disk and annular selections out of data, and for integrating
+rectangular or elliptical windows around many points at once.
 """
 
-from typing import Dict, Optional, Tuple, Union
+from typing import Any, Dict, Optional, Tuple, Union
 
+import numba
 import numpy as np
 import xarray as xr
 
 from arpes.typing import DataType
 from arpes.utilities import normalize_to_spectrum
+from arpes.utilities.binning import element_offsets
 from arpes.utilities.xarray import unwrap_xarray_dict
 
-__all__ = ("select_disk", "select_disk_mask", "unravel_from_mask", "ravel_from_mask")
+__all__ = (
+    "select_disk",
+    "select_disk_mask",
+    "unravel_from_mask",
+    "ravel_from_mask",
+    "select_around_points",
+)
 
 
 def ravel_from_mask(data, mask):
@@ -172,3 +181,198 @@ def select_disk(
 
     masked_coords = {d: cs[mask] for d, cs in raveled.items()}
     return masked_coords, masked_coords["data"], dist[mask]
+
+
+def _index_windows(coords: np.ndarray, low: np.ndarray, high: np.ndarray):
+    """The index ranges [start, stop) of the coordinates lying within [low, high].
+
+    Coordinates can be increasing or decreasing.
+    """
+    if len(coords) > 1 and coords[0] > coords[-1]:
+        start, stop = _index_windows(coords[::-1], low, high)
+        return len(coords) - stop, len(coords) - start
+
+    return np.searchsorted(coords, low, side="left"), np.searchsorted(coords, high, side="right")
+
+
+@numba.njit(parallel=True, cache=True)
+def _reduce_windows(
+    data,
+    point_offsets,
+    rest_offsets,
+    starts,
+    stops,
+    strides,
+    coords,
+    coord_offsets,
+    centers,
+    inv_radii,
+    elliptical,
+    mean,
+    out,
+):
+    """Sums or averages the data in a window around each point, ignoring NaNs.
+
+    `data` is the flattened data, which is indexed by the offsets of the points, of the
+    other unselected elements, and of the selected dimensions with `strides`. Windows are the
+    boxes [starts, stops) along the selected dimensions, or the parts of them within the
+    ellipse with the inverse radii `inv_radii` if `elliptical`.
+    """
+    n_dims = starts.shape[1]
+    n_rest = len(rest_offsets)
+    for p in numba.prange(len(point_offsets)):
+        total = np.zeros(n_rest)
+        count = np.zeros(n_rest)
+
+        n_window = 1
+        for d in range(n_dims):
+            n_window *= max(stops[p, d] - starts[p, d], 0)
+
+        for w in range(n_window):
+            remainder = w
+            offset = point_offsets[p]
+            distance = 0.0
+            for d in range(n_dims - 1, -1, -1):
+                size = stops[p, d] - starts[p, d]
+                j = starts[p, d] + remainder % size
+                remainder //= size
+                offset += j * strides[d]
+                x = (coords[coord_offsets[d] + j] - centers[p, d]) * inv_radii[d]
+                distance += x * x
+
+            if elliptical and distance > 1:
+                continue
+
+            for r in range(n_rest):
+                value = data[offset + rest_offsets[r]]
+                if not np.isnan(value):
+                    total[r] += value
+                    count[r] += 1
+
+        for r in range(n_rest):
+            if not mean:
+                out[p, r] = total[r]
+            elif count[r] > 0:
+                out[p, r] = total[r] / count[r]
+            else:
+                out[p, r] = np.nan
+
+
+def select_around_points(
+    data: xr.DataArray,
+    points: Dict[str, Any],
+    radius: Dict[str, float],
+    fast: bool = False,
+    safe: bool = True,
+    mode: str = "sum",
+) -> xr.DataArray:
+    """Integrates the data in a window around each of a collection of points.
+
+    The coordinates of the points along the selected dimensions are given as DataArrays
+    over other dimensions of `data`, such as the Fermi momentum as a function of temperature.
+    For each point, the window is taken from the cut of `data` at the point's coordinates
+    along these other dimensions.
+
+    All windows are converted to index ranges at once, and reduced in parallel over the
+    points in a single pass.
+
+    Args:
+        data: The data to select from
+        points: The coordinates of the points along each selected dimension, as DataArrays
+          or scalars
+        radius: The radius of the window along each selected dimension
+        fast: If true, uses the rectangular window within `radius` of the point along each
+          dimension, otherwise the elliptical window inscribed in it.
+        safe: If true, a dimension whose radius is smaller than the spacing of the data is
+          selected at the nearest coordinate instead of integrated.
+        mode: How the window is reduced, one of "sum" or "mean". NaNs are ignored.
+
+    Returns:
+        The reduced data, with the dimensions of `data` which are not selected, followed by
+        the dimensions of the points.
+    """
+    selected_dims = list(points.keys())
+    points = dict(
+        zip(
+            selected_dims,
+            xr.broadcast(
+                *[p if isinstance(p, xr.DataArray) else xr.DataArray(p) for p in points.values()]
+            ),
+        )
+    )
+    along_dims = list(points[selected_dims[0]].dims)
+    along_coords = {d: data.coords[d].values for d in along_dims}
+    points = {
+        d: p.sel({a: c for a, c in along_coords.items() if a in p.coords}).transpose(*along_dims)
+        for d, p in points.items()
+    }
+
+    rest_dims = [d for d in data.dims if d not in along_dims and d not in selected_dims]
+    n_points = int(np.prod([data.sizes[d] for d in along_dims]))
+    n_rest = int(np.prod([data.sizes[d] for d in rest_dims]))
+
+    # the data is indexed in place, by the strides of each dimension in elements
+    values = np.asarray(data.values, dtype=np.float64)
+    if not (values.flags.c_contiguous or values.flags.f_contiguous):
+        values = np.ascontiguousarray(values)
+    element_strides = dict(zip(data.dims, np.array(values.strides) // values.itemsize))
+
+    centers = np.stack(
+        [
+            np.broadcast_to(points[d].values, [data.sizes[a] for a in along_dims]).ravel()
+            for d in selected_dims
+        ],
+        axis=1,
+    ).astype(np.float64)
+    starts = np.empty((n_points, len(selected_dims)), dtype=np.int64)
+    stops = np.empty_like(starts)
+    inv_radii = np.empty(len(selected_dims))
+    for i, d in enumerate(selected_dims):
+        coords = data.coords[d].values.astype(np.float64)
+        stride = coords[1] - coords[0] if len(coords) > 1 else np.inf
+        if safe and radius[d] < abs(stride):
+            nearest = np.argmin(np.abs(coords[None, :] - centers[:, i, None]), axis=1)
+            starts[:, i], stops[:, i] = nearest, nearest + 1
+            inv_radii[i] = 0
+        else:
+            starts[:, i], stops[:, i] = _index_windows(
+                coords, centers[:, i] - radius[d], centers[:, i] + radius[d]
+            )
+            inv_radii[i] = 1 / radius[d] if radius[d] > 0 else 0
+
+    out = np.empty((n_points, n_rest))
+    _reduce_windows(
+        values.ravel(order="K"),
+        element_offsets(
+            [element_strides[d] for d in along_dims], [data.sizes[d] for d in along_dims]
+        ),
+        element_offsets(
+            [element_strides[d] for d in rest_dims], [data.sizes[d] for d in rest_dims]
+        ),
+        starts,
+        stops,
+        np.array([element_strides[d] for d in selected_dims], dtype=np.int64),
+        np.concatenate([data.coords[d].values.astype(np.float64) for d in selected_dims]),
+        np.cumsum([0] + [data.sizes[d] for d in selected_dims[:-1]]).astype(np.int64),
+        centers,
+        inv_radii,
+        not fast,
+        mode == "mean",
+        out,
+    )
+
+    template = data.transpose(*rest_dims, *selected_dims, *along_dims).isel(
+        {d: 0 for d in selected_dims}
+    )
+    template = template.drop_vars(
+        [
+            k
+            for k, v in data.coords.items()
+            if set(v.dims).intersection(selected_dims) or k in selected_dims
+        ]
+    )
+    result = out.T.reshape(template.shape)
+    if mode == "sum" and np.issubdtype(data.dtype, np.integer):
+        result = result.astype(np.int64)
+
+    return template.copy(data=result)
@@ -0,0 +1,60 @@
+"""Setup shared by the worker processes which run analysis in parallel.
+
+Worker pools for curve fitting and for bootstraps are started the same way: not forked where
+it can be avoided, since forking after numba has started its threads is unsafe, and with
+each worker limited in the number of threads it uses.
+"""
+
+import os
+import sys
+from multiprocessing import get_all_start_methods
+from typing import Optional, Sequence
+
+__all__ = (
+    "default_start_method",
+    "initialize_worker",
+)
+
+
+def default_start_method() -> Optional[str]:
+    """The start method for worker processes, "forkserver" where available.
+
+    Returns:
+        "forkserver", or None to use the platform default where it is unavailable.
+    """
+    if "forkserver" in get_all_start_methods():
+        return "forkserver"
+
+    return None
+
+
+def initialize_worker(affinity: Optional[Sequence[int]], threads_per_worker: Optional[int]):
+    """Pins a worker process to CPUs and limits the threads used by numerical libraries.
+
+    Without the thread limit, every worker process would also start one thread per CPU in
+    numba and in the BLAS, oversubscribing the machine.
+
+    Args:
+        affinity: The CPUs to run the worker on, or None to leave it unpinned
+        threads_per_worker: The number of threads numerical libraries may use in the worker,
+          or None to leave them unlimited
+    """
+    if affinity is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, affinity)
+
+    if threads_per_worker is not None:
+        for variable in (
+            "OMP_NUM_THREADS",
+            "OPENBLAS_NUM_THREADS",
+            "MKL_NUM_THREADS",
+            "NUMBA_NUM_THREADS",
+        ):
+            os.environ[variable] = str(threads_per_worker)
+
+        if "numba" in sys.modules:
+            import numba
+
+            numba.set_num_threads(min(threads_per_worker, numba.config.NUMBA_NUM_THREADS))
+
+    # workers which were not forked have yet to register the xarray accessors
+    import arpes.xarray_extensions  # pylint: disable=unused-import
@@ -46,6 +46,7 @@ import copy
 import itertools
 import warnings
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
 
 import matplotlib.pyplot as plt
@@ -68,6 +69,7 @@ from arpes.utilities.collections import MappableDict
 from arpes.utilities.conversion import slice_along_path
 import arpes.utilities.math
 from arpes.utilities.region import DesignatedRegions, normalize_region
+from arpes.utilities.selections import select_around_points
 from arpes.utilities.xarray import unwrap_xarray_item, unwrap_xarray_dict
 
 
@@ -345,8 +347,7 @@ class ARPESAccessorBase:
             points: The set of points where the selection should be performed.
             radius: The radius of the selection in each coordinate. If dimensions are omitted, a standard sized
                     selection will be made as a compromise.
-            fast: If true, uses a rectangular rather than a circular region for selectioIf true, uses a
-                  rectangular rather than a circular region for selection.
+            fast: If true, uses a rectangular rather than an elliptical region for selection.
             safe: If true, infills radii with default values. Defaults to `True`.
             mode: How the reduction should be performed, one of "sum" or "mean". Defaults to "sum"
             kwargs: Can be used to pass radii parameters by keyword with `_r` postfix.
@@ -403,50 +404,7 @@ class ARPESAccessorBase:
         assert isinstance(radius, dict)
         radius = {d: radius.get(d, default_radii.get(d, unspecified)) for d in points.keys()}
 
-        along_dims = list(points.values())[0].dims
-        selected_dims = list(points.keys())
-
-        stride = self._obj.G.stride(generic_dim_names=False)
-
-        new_dim_order = [d for d in self._obj.dims if d not in along_dims] + list(along_dims)
-
-        data_for = self._obj.transpose(*new_dim_order)
-        new_data = data_for.sum(selected_dims, keep_attrs=True)
-        for coord, value in data_for.G.iterate_axis(along_dims):
-            nearest_sel_params = {}
-            if safe:
-                for d, v in radius.items():
-                    if v < stride[d]:
-                        nearest_sel_params[d] = points[d].sel(**coord)
-
-                radius = {d: v for d, v in radius.items() if d not in nearest_sel_params}
-
-            if fast:
-                selection_slices = {
-                    d: slice(
-                        points[d].sel(**coord) - radius[d],
-                        points[d].sel(**coord) + radius[d],
-                    )
-                    for d in points.keys()
-                    if d in radius
-                }
-                selected = value.sel(**selection_slices)
-            else:
-                raise NotImplementedError
-
-            if nearest_sel_params:
-                selected = selected.sel(**nearest_sel_params, method="nearest")
-
-            for d in nearest_sel_params:
-                # need to remove the extra dims from coords
-                del selected.coords[d]
-
-            if mode == "sum":
-                new_data.loc[coord] = selected.sum(list(radius.keys())).values
-            elif mode == "mean":
-                new_data.loc[coord] = selected.mean(list(radius.keys())).values
-
-        return new_data
+        return select_around_points(self._obj, points, radius, fast=fast, safe=safe, mode=mode)
 
     def select_around(
         self,
@@ -472,8 +430,7 @@ class ARPESAccessorBase:
             point: The points where the selection should be performed.
             radius: The radius of the selection in each coordinate. If dimensions are omitted, a standard sized
                     selection will be made as a compromise.
-            fast: If true, uses a rectangular rather than a circular region for selectioIf true, uses a
-                  rectangular rather than a circular region for selection.
+            fast: If true, uses a rectangular rather than an elliptical region for selection.
             safe: If true, infills radii with default values. Defaults to `True`.
             mode: How the reduction should be performed, one of "sum" or "mean". Defaults to "sum"
             kwargs: Can be used to pass radii parameters by keyword with `_r` postfix.
@@ -529,6 +486,9 @@ class ARPESAccessorBase:
         assert isinstance(radius, dict)
         radius = {d: radius.get(d, default_radii.get(d, unspecified)) for d in point.keys()}
 
+        if not fast:
+            return select_around_points(self._obj, point, radius, fast=False, safe=safe, mode=mode)
+
         # make sure we are taking at least one pixel along each
         nearest_sel_params = {}
         if safe:
@@ -539,16 +499,12 @@ class ARPESAccessorBase:
 
             radius = {d: v for d, v in radius.items() if d not in nearest_sel_params}
 
-        if fast:
-            selection_slices = {
-                d: slice(point[d] - radius[d], point[d] + radius[d])
-                for d in point.keys()
-                if d in radius
-            }
-            selected = self._obj.sel(**selection_slices)
-        else:
-            # selected = self._obj
-            raise NotImplementedError
+        selection_slices = {
+            d: slice(point[d] - radius[d], point[d] + radius[d])
+            for d in point.keys()
+            if d in radius
+        }
+        selected = self._obj.sel(**selection_slices)
 
         if nearest_sel_params:
             selected = selected.sel(**nearest_sel_params, method="nearest")
@@ -2178,44 +2134,116 @@ class GenericAccessorTools:
         )
         return self._obj.isel(**dict([[coordinate_name, mask]]))
 
-    def iterate_axis(self, axis_name_or_axes):
+    @staticmethod
+    def _normalize_axes(obj: DataType, axis_name_or_axes) -> List[str]:
         if isinstance(axis_name_or_axes, int):
-            axis_name_or_axes = self._obj.dims[axis_name_or_axes]
+            axis_name_or_axes = obj.dims[axis_name_or_axes]
 
         if isinstance(axis_name_or_axes, str):
             axis_name_or_axes = [axis_name_or_axes]
 
-        coord_iterators = [self._obj.coords[d].values for d in axis_name_or_axes]
+        return list(axis_name_or_axes)
+
+    def _iterate_cuts(
+        self, axes: List[str]
+    ) -> Iterator[Tuple[Dict[str, int], Dict[str, Any], DataType]]:
+        """Yields the integer indices, the coordinates, and the cut at every point along `axes`."""
+        coord_iterators = [self._obj.coords[d].values for d in axes]
         for indices in itertools.product(*[range(len(c)) for c in coord_iterators]):
-            cut_coords = [cs[index] for cs, index in zip(coord_iterators, indices)]
-            coords_dict = dict(zip(axis_name_or_axes, cut_coords))
-            yield coords_dict, self._obj.sel(method="nearest", **coords_dict)
+            index_dict = dict(zip(axes, indices))
+            coords_dict = {d: cs[index] for d, cs, index in zip(axes, coord_iterators, indices)}
+            yield index_dict, coords_dict, self._obj.isel(index_dict)
+
+    def _map_cuts(self, axes: List[str], fn: Callable, workers: Optional[int] = None):
+        """Yields the integer indices along `axes` and `fn(coords, cut)` at every point.
 
-    def map_axes(self, axes, fn, dtype=None, **kwargs):
+        With `workers`, `fn` is called from a pool of that many threads.
+        """
+
+        def apply(item):
+            index_dict, coords_dict, cut = item
+            return index_dict, fn(coords_dict, cut)
+
+        if workers is None or workers == 1:
+            yield from map(apply, self._iterate_cuts(axes))
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                yield from executor.map(apply, self._iterate_cuts(axes))
+
+    def _apply_batched(self, axes: List[str], fn: Callable, workers: Optional[int] = None):
+        """Calls `fn(chunk, coords)` on the whole array, the iterated `axes` included.
+
+        `coords` holds the coordinates along `axes` as DataArrays, so that `fn` broadcasts
+        over them. With `workers`, the array is split into as many chunks along the first of
+        `axes`, which are processed in a pool of threads.
+        """
+
+        def apply(chunk):
+            return fn(chunk, {d: chunk.coords[d] for d in axes})
+
+        if workers is None or workers == 1:
+            return apply(self._obj)
+
+        splits = np.array_split(np.arange(self._obj.sizes[axes[0]]), workers)
+        chunks = [self._obj.isel({axes[0]: slice(s[0], s[-1] + 1)}) for s in splits if len(s)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return xr.concat(list(executor.map(apply, chunks)), dim=axes[0])
+
+    def iterate_axis(self, axis_name_or_axes):
+        axes = self._normalize_axes(self._obj, axis_name_or_axes)
+        for _, coords_dict, cut in self._iterate_cuts(axes):
+            yield coords_dict, cut
+
+    def map_axes(self, axes, fn, dtype=None, vectorized=False, workers=None, **kwargs):
+        """Applies `fn` to the cuts of the data at every point along `axes`.
+
+        Each cut is replaced by `fn(cut, coords)`, which has the same shape as the cut.
+
+        If `fn` broadcasts over the iterated axes, it can instead be applied to all cuts in a
+        single call with `vectorized=True`. It then receives the whole array, the iterated
+        axes included, and the coordinates along `axes` as DataArrays.
+
+        Args:
+            axes: Dimension/axis or set of dimensions to iterate over
+            fn: The function applied to each cut and its coordinates
+            dtype: An optional dtype for the result. Defaults to that returned by `fn`.
+            vectorized: Whether `fn` broadcasts over the iterated axes
+            workers: If set, the number of threads `fn` is called from
+
+        Raises:
+            TypeError: When the underying object is an `xr.Dataset` instead of an `xr.DataArray`.
+
+        Returns:
+            The data with each cut replaced.
+        """
         if isinstance(self._obj, xr.Dataset):
             raise TypeError(
                 "map_axes can only work on xr.DataArrays for now because of "
                 "how the type inference works"
             )
-        obj = self._obj.copy(deep=True)
+        axes = self._normalize_axes(self._obj, axes)
 
-        if dtype is not None:
-            obj.values = np.ndarray(shape=obj.values.shape, dtype=dtype)
+        if vectorized:
+            mapped = self._apply_batched(axes, fn, workers)
+            values = np.asarray(getattr(mapped, "values", mapped))
+            if isinstance(mapped, xr.DataArray):
+                values = mapped.transpose(*self._obj.dims).values
 
-        type_assigned = False
-        for coord, value in self.iterate_axis(axes):
-            new_value = fn(value, coord)
+            return self._obj.copy(data=values.astype(dtype, copy=False) if dtype else values)
 
-            if dtype is None:
-                if not type_assigned:
-                    obj.values = np.ndarray(shape=obj.values.shape, dtype=new_value.data.dtype)
-                    type_assigned = True
+        axis_positions = [self._obj.dims.index(d) for d in axes]
+        values = None
+        for index_dict, new_value in self._map_cuts(axes, lambda c, v: fn(v, c), workers):
+            new_value = np.asarray(getattr(new_value, "values", new_value))
+            if values is None:
+                values = np.empty(self._obj.shape, dtype=dtype or new_value.dtype)
 
-                obj.loc[coord] = new_value.values
-            else:
-                obj.loc[coord] = new_value
+            index = [slice(None)] * len(self._obj.dims)
+            for d, position in zip(axes, axis_positions):
+                index[position] = index_dict[d]
+            values[tuple(index)] = new_value
 
-        return obj
+        return self._obj.copy(data=values)
 
     def transform(
         self,
@@ -2223,6 +2251,8 @@ class GenericAccessorTools:
         transform_fn: Callable,
         dtype: DTypeLike = None,
         *args,
+        vectorized: bool = False,
+        workers: Optional[int] = None,
         **kwargs,
     ):
         """Applies a vectorized operation across a subset of array axes.
@@ -2249,13 +2279,18 @@ class GenericAccessorTools:
         are iterated over and cannot therefore be modified.
 
         The transform function `transform_fn` must accept the coordinate of the
-        marginal at the currently iterated point.
+        marginal at the currently iterated point. If it broadcasts over the iterated axes, it
+        can instead be applied to all marginals in a single call with `vectorized=True`. It
+        then receives the whole array, the iterated axes included, and the coordinates along
+        `axes` as DataArrays, and must keep the iterated axes as dimensions of its result.
 
          Args:
             axes: Dimension/axis or set of dimensions to iterate over
             transform_fn: Transformation function that takes a DataArray into a new DataArray
             dtype: An optional type hint for the transformed data. Defaults to None.
             args: args to pass into transform_fn
+            vectorized: Whether `transform_fn` broadcasts over the iterated axes
+            workers: If set, the number of threads `transform_fn` is called from
             kwargs: kwargs to pass into transform_fn
 
         Raises:
@@ -2272,34 +2307,39 @@ class GenericAccessorTools:
                 "transform can only work on xr.DataArrays for now because of "
                 "how the type inference works"
             )
-
-        dest = None
-        for coord, value in self.iterate_axis(axes):
-            new_value = transform_fn(value, coord, *args, **kwargs)
-
-            if dest is None:
-                new_value = transform_fn(value, coord, *args, **kwargs)
-
-                original_dims = [d for d in self._obj.dims if d not in value.dims]
-                original_shape = [self._obj.shape[self._obj.dims.index(d)] for d in original_dims]
-                original_coords = {k: v for k, v in self._obj.coords.items() if k not in value.dims}
-
-                full_shape = original_shape + list(new_value.shape)
+        axes = self._normalize_axes(self._obj, axes)
+        original_dims = [d for d in self._obj.dims if d in axes]
+
+        if vectorized:
+            dest = self._apply_batched(
+                axes, lambda chunk, coords: transform_fn(chunk, coords, *args, **kwargs), workers
+            ).transpose(*original_dims, ...)
+            return dest.astype(dtype) if dtype is not None else dest
+
+        values = None
+        for index_dict, new_value in self._map_cuts(
+            axes, lambda c, v: transform_fn(v, c, *args, **kwargs), workers
+        ):
+            if values is None:
+                original_shape = [self._obj.sizes[d] for d in original_dims]
+                original_coords = {
+                    k: v
+                    for k, v in self._obj.coords.items()
+                    if k not in self._obj.dims or k in original_dims
+                }
 
                 new_coords = original_coords
                 new_coords.update(
                     {k: v for k, v in new_value.coords.items() if k not in original_coords}
                 )
                 new_dims = original_dims + list(new_value.dims)
-                dest = xr.DataArray(
-                    np.zeros(full_shape, dtype=dtype or new_value.data.dtype),
-                    coords=new_coords,
-                    dims=new_dims,
+                values = np.zeros(
+                    original_shape + list(new_value.shape), dtype=dtype or new_value.data.dtype
                 )
 
-            dest.loc[coord] = new_value
+            values[tuple(index_dict[d] for d in original_dims)] = new_value.values
 
-        return dest
+        return xr.DataArray(values, coords=new_coords, dims=new_dims)
 
     def map(self, fn, **kwargs):
         return apply_dataarray(self._obj, np.vectorize(fn, **kwargs))
@@ -2350,33 +2390,52 @@ class GenericAccessorTools:
 
         return result
 
-    def shift_by(self, other: xr.DataArray, shift_axis=None, zero_nans=True, shift_coords=False):
-        # for now we only support shifting by a one dimensional array
+    def shift_by(
+        self, other: xr.DataArray, shift_axis=None, zero_nans=True, shift_coords=False, order=1
+    ):
+        """Shifts the data along `shift_axis` by the coordinate offsets in `other`.
 
-        data = self._obj.copy(deep=True)
+        `other` can have any of the other dimensions of the data, such as a one dimensional
+        Fermi edge position along "phi", or a two dimensional one along ("phi", "hv"). It is
+        broadcast against the data, and all cuts are shifted together in one pass.
+
+        Args:
+            other: The shifts, in units of the coordinate along `shift_axis`
+            shift_axis: The dimension to shift along. Defaults to the only dimension of the
+              data which is not one of the dimensions of `other`.
+            zero_nans: Whether to replace NaN values after shifting with zero
+            shift_coords: Whether to shift the coordinates of `shift_axis` by the mean shift,
+              and the data only by the deviation from it
+            order: The order of the interpolation, 1 (linear) or 3 (cubic spline)
+
+        Returns:
+            The shifted data.
+        """
+        data = self._obj
 
-        by_axis = other.dims[0]
-        assert len(other.dims) == 1
-        assert len(other.coords[by_axis]) == len(data.coords[by_axis])
+        assert all(len(other.coords[d]) == len(data.coords[d]) for d in other.dims)
 
         if shift_coords:
             mean_shift = np.mean(other.values)
-            other -= mean_shift
+            other = other - mean_shift
 
         if shift_axis is None:
-            option_dims = list(data.dims)
-            option_dims.remove(by_axis)
+            option_dims = [d for d in data.dims if d not in other.dims]
             assert len(option_dims) == 1
             shift_axis = option_dims[0]
 
-        shift_amount = -other.values / data.G.stride(generic_dim_names=False)[shift_axis]
+        assert shift_axis not in other.dims
+
+        # broadcast the shifts against the data, with length one along the shifted axis
+        field = other.transpose(*[d for d in data.dims if d in other.dims]).values
+        field = field.reshape([len(data.coords[d]) if d in other.dims else 1 for d in data.dims])
+        shift_amount = -field / data.G.stride(generic_dim_names=False)[shift_axis]
 
         shifted_data = arpes.utilities.math.shift_by(
             data.values,
             shift_amount,
             axis=list(data.dims).index(shift_axis),
-            by_axis=list(data.dims).index(by_axis),
-            order=1,
+            order=order,
         )
 
         if zero_nans:
@@ -2594,6 +2653,61 @@ class ARPESFitToolsAccessor:
         """
         self._obj = xarray_obj
 
+    def _fit_result_array(self) -> Tuple[Any, Optional[np.ndarray]]:
+        """Finds the columnar store backing these results, if there is one.
+
+        Returns:
+            A tuple of the `FitResultArray` (or None if the results are plain
+            `lmfit.ModelResult` instances) and the index of each result in the store.
+            The indices are None if the results are laid out exactly as in the store,
+            in which case parameters can be read without a gather. A selection of the
+            results which includes failed (`None`) fits cannot be gathered and is treated
+            as an array of plain results.
+        """
+        from arpes.fits.result_array import FitResultView
+
+        flat = self._obj.values.ravel()
+        first = next((r for r in flat if r is not None), None)
+        if not isinstance(first, FitResultView):
+            return None, None
+
+        store = first.store
+        if self._obj.values is store.objects:
+            return store, None
+
+        if not all(isinstance(r, FitResultView) and r.store is store for r in flat):
+            return None, None
+
+        indices = np.fromiter((r.index for r in flat), dtype=np.int64, count=len(flat))
+        return store, indices.reshape(self._obj.shape)
+
+    def _from_fit_result_array(self, getter: Callable[[Any], np.ndarray]) -> Optional[xr.DataArray]:
+        """Reads a per-fit quantity from the columnar store, if there is one."""
+        store, indices = self._fit_result_array()
+        if store is None:
+            return None
+
+        values = getter(store)
+        values = values.reshape(self._obj.shape) if indices is None else values[indices]
+        return xr.DataArray(values, coords=self._obj.coords, dims=self._obj.dims)
+
+    def to_dataset(self) -> xr.Dataset:
+        """Converts columnar fit results into a dataset of plain arrays, suitable for NetCDF.
+
+        See `arpes.fits.result_array.FitResultArray.to_dataset`, and `.from_dataset` for the
+        reverse direction.
+        """
+        store, indices = self._fit_result_array()
+        if store is None:
+            raise ValueError(
+                "Only columnar fit results, as from `broadcast_model`, can be converted."
+            )
+
+        if indices is not None:
+            store = store.take(indices.ravel())
+
+        return store.to_dataset(self._obj)
+
     def plot_param(self, param_name: str, **kwargs):
         """Creates a scatter plot of a parameter from a multidimensional curve fit.
 
@@ -2641,12 +2755,15 @@ class ARPESFitToolsAccessor:
         Producing a scalar metric of the error for all model result instances in
         the collection.
         """
+        from_store = self._from_fit_result_array(lambda store: store.mean_square_error())
+        if from_store is not None:
+            return from_store
 
         def safe_error(model_result_instance: Optional[lmfit.model.ModelResult]) -> float:
             if model_result_instance is None:
                 return np.nan
 
-            return (model_result_instance.residual ** 2).mean()
+            return (model_result_instance.residual**2).mean()
 
         return self._obj.G.map(safe_error)
 
@@ -2687,7 +2804,11 @@ class ARPESFitToolsAccessor:
             The output array is infilled with `np.nan` if the fit did not converge/
             the fit result is `None`.
         """
-        return self._obj.G.map(param_getter(param_name), otypes=[np.float])
+        from_store = self._from_fit_result_array(lambda store: store.param(param_name))
+        if from_store is not None:
+            return from_store
+
+        return self._obj.G.map(param_getter(param_name), otypes=[float])
 
     def s(self, param_name: str) -> xr.DataArray:
         """Collects the standard deviation of a parameter from fitting.
@@ -2704,7 +2825,11 @@ class ARPESFitToolsAccessor:
             The output array is infilled with `np.nan` if the fit did not converge/
             the fit result is `None`.
         """
-        return self._obj.G.map(param_stderr_getter(param_name), otypes=[np.float])
+        from_store = self._from_fit_result_array(lambda store: store.param_stderr(param_name))
+        if from_store is not None:
+            return from_store
+
+        return self._obj.G.map(param_stderr_getter(param_name), otypes=[float])
 
     @property
     def bands(self) -> Dict[str, MultifitBand]:
@@ -2732,6 +2857,10 @@ class ARPESFitToolsAccessor:
             For instance, if the param name `"a_center"`, the return value
             would contain `"a_"`.
         """
+        store, _ = self._fit_result_array()
+        if store is not None:
+            return {k[:-6] for k in store.param_names if "center" in k}
+
         collected_band_names = set()
 
         for item in self._obj.values.ravel():
@@ -2754,6 +2883,10 @@ class ARPESFitToolsAccessor:
         Returns:
             A set of all the parameter names used in a curve fit.
         """
+        store, _ = self._fit_result_array()
+        if store is not None:
+            return set(store.param_names)
+
         collected_parameter_names = set()
 
         for item in self._obj.values.ravel():
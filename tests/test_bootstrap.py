@@ -0,0 +1,73 @@
+import numpy as np
+import xarray as xr
+
+from arpes.bootstrap import (
+    OnlineMoments,
+    OnlineQuantiles,
+    bootstrap_counts,
+    bootstrap_intensity_polarization,
+)
+
+
+def make_spin_spectrum():
+    rng = np.random.default_rng(0)
+    return xr.Dataset(
+        {
+            "up": xr.DataArray(rng.poisson(50, (20, 15)).astype(float), dims=("eV", "phi")),
+            "down": xr.DataArray(rng.poisson(40, (20, 15)).astype(float), dims=("eV", "phi")),
+        }
+    )
+
+
+def test_online_statistics():
+    rng = np.random.default_rng(1)
+    samples = rng.normal(2, 3, (3000, 8))
+
+    moments = OnlineMoments()
+    quantiles = OnlineQuantiles([0.25, 0.5, 0.75])
+    for batch in np.array_split(samples, 7):
+        moments.update(batch)
+        quantiles.update(batch)
+
+    np.testing.assert_allclose(moments.mean, samples.mean(axis=0))
+    np.testing.assert_allclose(moments.std, samples.std(axis=0))
+    np.testing.assert_allclose(
+        quantiles.values, np.quantile(samples, [0.25, 0.5, 0.75], axis=0), atol=0.2
+    )
+
+    # quantiles of fewer than five samples are exact
+    few = OnlineQuantiles([0.5]).update(samples[:3])
+    np.testing.assert_allclose(few.values, np.quantile(samples[:3], [0.5], axis=0))
+
+
+def test_bootstrap_counts():
+    counts = make_spin_spectrum().up.rename("up")
+
+    bootstrapped = bootstrap_counts(counts, N=500, seed=2, batch_size=64, progress=False)
+    assert set(bootstrapped.data_vars) == {"up", "up_std"}
+    np.testing.assert_allclose(bootstrapped.up, counts, rtol=0.1)
+    np.testing.assert_allclose(bootstrapped.up_std.mean(), np.sqrt(counts).mean(), rtol=0.05)
+
+    # samples are drawn from independent streams per batch, seeded reproducibly
+    again = bootstrap_counts(counts, N=500, seed=2, batch_size=64, progress=False)
+    xr.testing.assert_identical(bootstrapped, again)
+
+    # without a seed, draws follow the global numpy random state
+    np.random.seed(5)
+    unseeded = bootstrap_counts(counts, N=20, batch_size=64, progress=False)
+    np.random.seed(5)
+    xr.testing.assert_identical(
+        unseeded, bootstrap_counts(counts, N=20, batch_size=64, progress=False)
+    )
+
+
+def test_bootstrap_reduce():
+    spin = make_spin_spectrum()
+    kwargs = dict(N=24, seed=3, batch_size=5, progress=False)
+
+    samples = bootstrap_intensity_polarization(spin, **kwargs)
+    reduced = bootstrap_intensity_polarization(spin, reduce=True, quantiles=[0.5], **kwargs)
+    assert samples.dims["bootstrap"] == 24
+    assert reduced.polarization_quantiles.dims == ("quantile", "eV", "phi")
+    np.testing.assert_allclose(reduced.intensity, samples.intensity.mean("bootstrap"))
+    np.testing.assert_allclose(reduced.polarization_std, samples.polarization.std("bootstrap"))
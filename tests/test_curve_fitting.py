@@ -1,9 +1,20 @@
 import pytest
+import lmfit as lf
 import numpy as np
+import xarray as xr
 from arpes.io import example_data
 from arpes.analysis.general import rebin
+from arpes.fits.executors import (
+    FitExecutor,
+    LokyExecutor,
+    ProcessExecutor,
+    SerialExecutor,
+    ThreadExecutor,
+)
+from arpes.fits.result_array import FitResultArray, FitResultView
+from arpes.fits.strategies import WarmStart, grid_neighbors, hilbert_order, snake_order
 from arpes.fits.utilities import broadcast_model
-from arpes.fits.fit_models import AffineBroadenedFD
+from arpes.fits.fit_models import AffineBroadenedFD, LinearModel, LorentzianModel, VoigtModel
 
 
 @pytest.mark.skip
@@ -15,3 +26,305 @@ def test_broadcast_fitting():
     fit_results = broadcast_model([AffineBroadenedFD], near_ef, "phi")
 
     assert np.abs(fit_results.F.p("a_fd_center").values.mean() + 0.00287) < 1e-4
+
+
+def _lorentzian_map(n_fits=25, seed=0):
+    rng = np.random.default_rng(seed)
+    eV = np.linspace(-0.5, 0.5, 120)
+    phi = np.linspace(-0.2, 0.2, n_fits)
+    centers = 0.5 * phi
+
+    model = LorentzianModel() + LinearModel()
+    values = np.stack(
+        [
+            model.eval(x=eV, amplitude=0.2, center=c, sigma=0.05, slope=0.2, intercept=0.5)
+            for c in centers
+        ]
+    )
+    values += rng.normal(0, 0.02, values.shape)
+
+    return xr.DataArray(values, coords={"phi": phi, "eV": eV}, dims=["phi", "eV"]), centers
+
+
+def _edge_map(n_fits=20, seed=1):
+    rng = np.random.default_rng(seed)
+    eV = np.linspace(-0.1, 0.1, 120)
+    phi = np.linspace(-0.2, 0.2, n_fits)
+
+    model = AffineBroadenedFD()
+    values = np.stack(
+        [
+            model.eval(
+                x=eV,
+                fd_center=c,
+                fd_width=0.004,
+                conv_width=0.01,
+                const_bkg=1,
+                lin_bkg=0.5,
+                offset=0.1,
+            )
+            for c in rng.uniform(-0.01, 0.01, n_fits)
+        ]
+    )
+    values += rng.normal(0, 0.01, values.shape)
+
+    return xr.DataArray(values, coords={"phi": phi, "eV": eV}, dims=["phi", "eV"])
+
+
+def _assert_fits_agree(batched, serial, names):
+    for name in names:
+        stderr = serial.F.s(name).values
+        np.testing.assert_allclose(
+            batched.F.p(name).values, serial.F.p(name).values, atol=1e-3 * stderr.max()
+        )
+        np.testing.assert_allclose(batched.F.s(name).values, stderr, rtol=1e-3)
+
+
+def test_batched_fitting_matches_serial():
+    data, _ = _lorentzian_map()
+    kwargs = dict(progress=False, parallelize=False)
+
+    batched = broadcast_model([LorentzianModel, LinearModel], data, "phi", batched=True, **kwargs)
+    serial = broadcast_model([LorentzianModel, LinearModel], data, "phi", **kwargs)
+
+    assert isinstance(batched.results.values[0], FitResultView)
+    _assert_fits_agree(batched, serial, ["a_center", "a_sigma", "a_fwhm", "b_slope"])
+    np.testing.assert_allclose(batched.residual.values, serial.residual.values, atol=1e-6)
+
+
+def test_batched_fitting_affine_broadened_fd_matches_serial():
+    data = _edge_map()
+    params = {"fd_width": {"value": 0.004, "vary": False}}
+    kwargs = dict(params=params, progress=False, parallelize=False)
+
+    batched = broadcast_model(AffineBroadenedFD, data, "phi", batched=True, **kwargs)
+    serial = broadcast_model(AffineBroadenedFD, data, "phi", **kwargs)
+
+    _assert_fits_agree(batched, serial, ["fd_center", "conv_width", "const_bkg"])
+
+    # fixed parameters have zero uncertainty, as they do in lmfit
+    assert (batched.F.s("fd_width").values == 0).all()
+    assert (batched.F.p("fd_width").values == 0.004).all()
+
+
+def test_batched_fitting_masks_nan():
+    data, centers = _lorentzian_map()
+    data.values[3, 10:30] = np.nan
+    data.values[7, -5:] = np.nan
+    kwargs = dict(progress=False, parallelize=False)
+
+    batched = broadcast_model([LorentzianModel, LinearModel], data, "phi", batched=True, **kwargs)
+    serial = broadcast_model([LorentzianModel, LinearModel], data, "phi", safe=True, **kwargs)
+
+    assert batched.results.values[3].success
+    assert np.isnan(batched.residual.values[3, 10:30]).all()
+    assert np.isfinite(batched.residual.values[3, 30:]).all()
+    _assert_fits_agree(batched, serial, ["a_center", "a_sigma"])
+
+
+def test_batched_fitting_per_fit_hints():
+    data, centers = _lorentzian_map()
+    hint = xr.DataArray(centers, coords={"phi": data.phi.values}, dims=["phi"])
+    params = {"a_center": {"value": hint, "vary": False}}
+
+    batched = broadcast_model(
+        [LorentzianModel, LinearModel], data, "phi", params=params, batched=True, progress=False
+    )
+
+    np.testing.assert_allclose(batched.F.p("a_center").values, centers)
+    assert (batched.F.s("a_center").values == 0).all()
+    assert np.isfinite(batched.F.s("a_sigma").values).all()
+
+
+def test_batched_results_behave_like_model_results():
+    data, _ = _lorentzian_map(n_fits=3)
+    result = broadcast_model(
+        [LorentzianModel, LinearModel], data, "phi", batched=True, progress=False
+    ).results.values[0]
+
+    assert result.data.shape == result.init_fit.shape == (120,)
+    assert isinstance(result.as_model_result(), lf.model.ModelResult)
+    assert "a_center" in result.fit_report()
+
+
+def test_batched_fitting_rejects_unsupported_models():
+    data, _ = _lorentzian_map(n_fits=3)
+
+    with pytest.raises(ValueError):
+        broadcast_model(VoigtModel, data, "phi", batched=True, progress=False)
+
+    with pytest.raises(ValueError):
+        broadcast_model(
+            LorentzianModel,
+            data,
+            "phi",
+            params={"sigma": {"expr": "2 * amplitude"}},
+            batched=True,
+            progress=False,
+        )
+
+
+def test_fit_results_are_columnar():
+    data, _ = _lorentzian_map(n_fits=10)
+    fit = broadcast_model([LorentzianModel, LinearModel], data, "phi", progress=False)
+    results = fit.results
+
+    assert all(isinstance(r, FitResultView) for r in results.values)
+
+    centers = results.F.p("a_center")
+    walked = [r.params["a_center"].value for r in results.values]
+    np.testing.assert_array_equal(centers.values, walked)
+    np.testing.assert_array_equal(
+        results.isel(phi=slice(None, None, -1)).F.p("a_center"), walked[::-1]
+    )
+    assert np.isnan(results.F.p("not_a_param").values).all()
+
+    mse = [(r.residual**2).mean() for r in results.values]
+    np.testing.assert_allclose(results.F.mean_square_error().values, mse)
+    assert results.F.parameter_names == set(results.values[0].params)
+    assert results.F.band_names == {"a_"}
+
+
+def test_failed_fits_are_none():
+    data, _ = _lorentzian_map(n_fits=10)
+    data[{"phi": 3}] = np.nan
+    results = broadcast_model([LorentzianModel, LinearModel], data, "phi", progress=False).results
+
+    assert [r is None for r in results.values] == [i == 3 for i in range(10)]
+    assert np.isnan(results.F.p("a_center").values[3])
+    assert np.isnan(results.isel(phi=slice(2, 5)).F.p("a_center").values[1])
+    assert np.isfinite(results.F.p("a_center").values[[0, 1, 2, 4]]).all()
+
+
+def test_fit_results_netcdf_roundtrip(tmp_path):
+    data, _ = _lorentzian_map(n_fits=10)
+    results = broadcast_model([LorentzianModel, LinearModel], data, "phi", progress=False).results
+
+    results.F.to_dataset().to_netcdf(tmp_path / "fit.nc")
+    loaded = xr.open_dataset(tmp_path / "fit.nc").load()
+
+    restored = FitResultArray.from_dataset(loaded, results.values[0].model).to_dataarray(
+        loaded.redchi
+    )
+    for name in ["a_center", "a_fwhm", "b_slope"]:
+        np.testing.assert_allclose(restored.F.p(name).values, results.F.p(name).values)
+        np.testing.assert_allclose(restored.F.s(name).values, results.F.s(name).values)
+
+    np.testing.assert_allclose(restored.values[3].eval(), results.values[3].eval())
+
+
+def test_parallel_fitting_through_shared_memory():
+    data, centers = _lorentzian_map(n_fits=30)
+    data.values[4, :10] = np.nan
+    hint = xr.DataArray(centers, coords={"phi": data.phi.values}, dims=["phi"])
+    kwargs = dict(params={"a_center": {"value": hint}}, safe=True, progress=False)
+
+    parallel = broadcast_model(
+        [LorentzianModel, LinearModel], data, "phi", parallelize=True, **kwargs
+    )
+    serial = broadcast_model(
+        [LorentzianModel, LinearModel], data, "phi", parallelize=False, **kwargs
+    )
+
+    assert isinstance(parallel.results.values[0], FitResultView)
+    for name in ["a_center", "a_sigma", "b_slope"]:
+        np.testing.assert_allclose(parallel.F.p(name).values, serial.F.p(name).values)
+        np.testing.assert_allclose(parallel.F.s(name).values, serial.F.s(name).values)
+
+    assert np.isnan(parallel.residual.values[4, :10]).all()
+
+
+def test_fitting_executors_agree():
+    data, _ = _lorentzian_map(n_fits=12)
+    serial = broadcast_model(
+        [LorentzianModel, LinearModel], data, "phi", executor="serial", progress=False
+    )
+
+    for executor in ["thread", ThreadExecutor(threads=2), ProcessExecutor(processes=2)]:
+        fit = broadcast_model(
+            [LorentzianModel, LinearModel],
+            data,
+            "phi",
+            parallelize=True,
+            executor=executor,
+            progress=False,
+        )
+        np.testing.assert_allclose(fit.F.p("a_center").values, serial.F.p("a_center").values)
+
+        if isinstance(executor, FitExecutor):
+            executor.shutdown()
+
+
+def test_executor_chunk_size():
+    executor = ThreadExecutor(threads=4)
+
+    # cheap fits are grouped until each task is worthwhile, but every worker still gets work
+    assert executor.chunk_size(10000, seconds_per_task=1e-4) == 625
+    assert executor.chunk_size(100000, seconds_per_task=1e-4) == 2000
+    assert executor.chunk_size(10000, seconds_per_task=10) == 1
+    assert SerialExecutor().chunk_size(10) == 3
+
+    # shutting down an unused pool starts nothing, and so does not need `loky`
+    LokyExecutor().shutdown()
+
+
+def test_fit_traversal_orders():
+    shape = (3, 4, 5)
+    order = snake_order(shape)
+    assert sorted(order) == list(range(60))
+    for a, b in zip(order[:-1], order[1:]):
+        assert b in grid_neighbors(a, shape)
+
+    assert sorted(hilbert_order((5, 7))) == list(range(35))
+    strips = WarmStart(path="hilbert").strips((5, 7), n_workers=3)
+    assert len(strips) == 3
+    assert sorted(np.concatenate(strips)) == list(range(35))
+
+
+def test_warm_start_fitting():
+    data, centers = _lorentzian_map(n_fits=12)
+    grid = xr.concat([data, data.assign_coords(eV=data.eV - 0.05)], "theta").assign_coords(
+        theta=[0, 1]
+    )
+    grid = grid.interp(eV=data.eV.values)
+    kwargs = dict(progress=False, parallelize=False)
+
+    independent = broadcast_model([LorentzianModel, LinearModel], grid, ["theta", "phi"], **kwargs)
+    for strategy in ["warm_start", WarmStart(path="hilbert", n_strips=2)]:
+        warm = broadcast_model(
+            [LorentzianModel, LinearModel], grid, ["theta", "phi"], strategy=strategy, **kwargs
+        )
+        assert warm.results.shape == (2, 12)
+        np.testing.assert_allclose(
+            warm.F.p("a_center").values, independent.F.p("a_center").values, atol=1e-4
+        )
+
+    threaded = broadcast_model(
+        [LorentzianModel, LinearModel],
+        grid,
+        ["theta", "phi"],
+        strategy="warm_start",
+        executor=ThreadExecutor(threads=2),
+        progress=False,
+    )
+    np.testing.assert_allclose(
+        threaded.F.p("a_center").values, independent.F.p("a_center").values, atol=1e-4
+    )
+
+    with pytest.raises(ValueError):
+        broadcast_model(LorentzianModel, data, "phi", strategy="sideways", **kwargs)
+
+
+def test_warm_start_reduces_function_evaluations():
+    data = _edge_map(seed=1)
+    kwargs = dict(progress=False, parallelize=False)
+
+    independent = broadcast_model(AffineBroadenedFD, data, "phi", **kwargs).results.values[0]
+    warm = broadcast_model(AffineBroadenedFD, data, "phi", strategy="warm_start", **kwargs)
+    warm = warm.results.values[0]
+
+    assert warm.store.success.all()
+    assert warm.store.nfev.sum() < independent.store.nfev.sum()
+    np.testing.assert_allclose(
+        warm.store.param("fd_center"), independent.store.param("fd_center"), atol=1e-3
+    )
@@ -0,0 +1,55 @@
+import numpy as np
+import scipy.ndimage
+import xarray as xr
+
+from arpes.analysis.deconvolution import deconvolve_rl, make_psf, make_psf1d
+
+
+def richardson_lucy_reference(arr, psf, n_iterations, mode="reflect"):
+    u = arr
+    for _ in range(n_iterations):
+        c = scipy.ndimage.convolve(u, psf, mode=mode)
+        u = u * scipy.ndimage.convolve(arr / c, np.flip(psf), mode=mode)
+
+    return u
+
+
+def test_deconvolve_rl():
+    rng = np.random.default_rng(0)
+    data = xr.DataArray(
+        rng.random((4, 5, 40)) + 1,
+        coords={
+            "x": np.arange(4.0),
+            "phi": np.linspace(-0.2, 0.2, 5),
+            "eV": np.linspace(-1, 0, 40),
+        },
+        dims=("x", "phi", "eV"),
+    )
+
+    # every cut along eV is deconvolved at once
+    deconvolved = deconvolve_rl(data, axis="eV", sigma=0.05, n_iterations=5, progress=False)
+    psf = make_psf1d(data, "eV", 0.05).values
+    assert deconvolved.dims == data.dims
+    for x in range(4):
+        for phi in range(5):
+            np.testing.assert_allclose(
+                deconvolved.values[x, phi],
+                richardson_lucy_reference(data.values[x, phi], psf, 5),
+                rtol=1e-10,
+            )
+
+    # separable gaussians, over the whole data
+    sigmas = {"phi": 0.1, "eV": 0.05}
+    psf = make_psf(data, sigmas)
+    assert psf.dims == ("phi", "eV")
+    deconvolved = deconvolve_rl(data, sigma=sigmas, n_iterations=5, mode="nearest", progress=False)
+    for x in range(4):
+        np.testing.assert_allclose(
+            deconvolved.values[x],
+            richardson_lucy_reference(data.values[x], psf.values, 5, mode="nearest"),
+            rtol=1e-10,
+        )
+
+    stopped = deconvolve_rl(data, psf=psf, n_iterations=1000, tol=1e-2, progress=False)
+    longer = deconvolve_rl(data, psf=psf, n_iterations=1000, tol=1e-3, progress=False)
+    assert np.abs(stopped.values - longer.values).max() > 0
@@ -1,7 +1,9 @@
 from pathlib import Path
 
+import pytest
 import xarray as xr
 import numpy as np
+import arpes.config
 from arpes.io import load_example_data, load_data
 from arpes.endstations.plugin.ALG_main import ALGMainChamber
 
@@ -35,3 +37,346 @@ def test_load_example_data(sandbox_configuration):
 
     assert isinstance(data, xr.Dataset)
     assert data.spectrum.shape == (240, 240)
+
+
+def test_load_cache_key(sandbox_configuration, tmp_path):
+    from arpes.endstations.cache import cache_key
+
+    test_data_location = tmp_path / "main_chamber_cut_0.fits"
+    test_data_location.write_bytes(
+        (
+            Path(__file__).parent / "resources" / "datasets" / "basic" / "main_chamber_cut_0.fits"
+        ).read_bytes()
+    )
+    files, desc = [str(test_data_location)], {"file": str(test_data_location)}
+
+    key = cache_key(ALGMainChamber, files, desc, {})
+    assert key == cache_key(ALGMainChamber, files, desc, {})
+    assert key != cache_key(ALGMainChamber, files, desc, {"robust_dimension_labels": True})
+    assert cache_key(ALGMainChamber, files, desc, {"callback": object()}) is None
+
+    with open(test_data_location, "ab") as f:
+        f.write(b" ")
+    assert key != cache_key(ALGMainChamber, files, desc, {})
+
+
+def test_load_cache_attrs_are_json():
+    import datetime
+    import json
+
+    from arpes.endstations.cache import _decode_attrs, _encode_attrs
+
+    attrs = {
+        "hv": np.float32(5.93),
+        "angles": (0.1, -0.2),
+        "grid": np.arange(6).reshape(2, 3),
+        "time": datetime.datetime(2021, 3, 4, 5, 6),
+        "scan": {1: {"note": None}},
+    }
+    encoded = _encode_attrs(attrs)
+    json.loads(encoded)
+
+    decoded = _decode_attrs(encoded)
+    assert decoded["hv"].dtype == np.float32 and decoded["angles"] == (0.1, -0.2)
+    np.testing.assert_array_equal(decoded["grid"], attrs["grid"])
+    assert decoded["time"] == attrs["time"] and decoded["scan"] == attrs["scan"]
+
+    with pytest.raises(TypeError):
+        _encode_attrs({"callback": object()})
+
+
+def test_load_data_from_cache(sandbox_configuration, tmp_path, monkeypatch):
+    pytest.importorskip("netCDF4")
+    monkeypatch.setitem(
+        arpes.config.SETTINGS,
+        "load_cache",
+        {"enabled": False, "path": tmp_path, "max_size": 2**40},
+    )
+    test_data_location = (
+        Path(__file__).parent / "resources" / "datasets" / "basic" / "main_chamber_cut_0.fits"
+    )
+
+    data = load_data(file=test_data_location, location="ALG-MC", cache=True)
+    assert len(list(tmp_path.glob("*.nc"))) == 1
+
+    cached = load_data(file=test_data_location, location="ALG-MC", cache=True)
+    assert np.all(data.spectrum.values == cached.spectrum.values)
+    assert data.spectrum.attrs.keys() == cached.spectrum.attrs.keys()
+    assert cached.S.spectrum_type == data.S.spectrum_type
+
+    arpes.config.SETTINGS["load_cache"]["max_size"] = 0
+    load_data(file=test_data_location, location="ALG-MC", cache=True, robust_dimension_labels=True)
+    assert len(list(tmp_path.glob("*.nc"))) == 0
+
+
+def test_lazy_hdf5_loading(sandbox_configuration, tmp_path):
+    import h5py
+
+    raw = np.arange(512 * 512, dtype=">f4").reshape(512, 512)
+    test_data_location = tmp_path / "dld.h5"
+    with h5py.File(test_data_location, "w") as f:
+        f.create_dataset("PRIMARY/DATA", data=raw, chunks=(64, 512))
+        f["PRIMARY"].attrs["run"] = 3
+
+    data = load_data(file=test_data_location, location="ALG-SToF-DLD")
+    lazy = load_data(file=test_data_location, location="ALG-SToF-DLD", lazy=True)
+
+    assert isinstance(data.raw.variable._data, np.ndarray)
+    assert not isinstance(lazy.raw.variable._data, np.ndarray)
+    assert lazy.raw.dtype.isnative and lazy.raw.attrs["run"] == 3
+
+    np.testing.assert_array_equal(data.raw.values, raw[:, ::-1])
+    np.testing.assert_array_equal(data.raw.t_pixels.values, np.linspace(0, 511, 512))
+    np.testing.assert_array_equal(
+        lazy.raw.sel(x_pixels=slice(10, 20), t_pixels=5).values, raw[10:21, 506]
+    )
+
+
+def test_parallel_multi_frame_loading(sandbox_configuration, monkeypatch):
+    import threading
+
+    from arpes.endstations import EndstationBase
+
+    rng = np.random.default_rng(0)
+    frames = {
+        f"frame_{i}": xr.Dataset(
+            {"spectrum": (("eV", "phi"), rng.random((5, 4)))},
+            coords={"eV": np.linspace(-1, 0, 5), "phi": np.linspace(-0.1, 0.1, 4)},
+            attrs={"theta": 0.1 * ((i * 7) % 12), "x": float(i % 3)},
+        )
+        for i in range(12)
+    }
+
+    class MultiFrameEndstation(EndstationBase):
+        def resolve_frame_locations(self, scan_desc=None):
+            return list(frames)
+
+        def load_single_frame(self, frame_path=None, scan_desc=None, **kwargs):
+            threads.add(threading.get_ident())
+            return frames[frame_path].copy()
+
+    # by default, a small number of threads load frames
+    threads = set()
+    monkeypatch.setitem(arpes.config.SETTINGS, "frame_workers", 2)
+    MultiFrameEndstation().load({})
+    assert 1 <= len(threads) <= 2
+
+    serial = MultiFrameEndstation().load({}, frame_workers=1)
+    parallel = MultiFrameEndstation().load({}, frame_workers=4)
+    expected = xr.concat(
+        sorted(
+            [f.assign_coords(theta=f.attrs["theta"]) for f in frames.values()],
+            key=lambda f: f.theta.item(),
+        ),
+        "theta",
+    )
+
+    assert parallel.spectrum.dims == ("theta", "eV", "phi")
+    assert serial.identical(parallel)
+    np.testing.assert_array_equal(parallel.spectrum.values, expected.spectrum.values)
+    np.testing.assert_array_equal(parallel.theta.values, expected.theta.values)
+
+
+def test_file_index(sandbox_configuration, tmp_path, monkeypatch):
+    import os
+
+    from arpes.endstations import file_index
+
+    monkeypatch.setitem(
+        arpes.config.SETTINGS, "file_index", {"enabled": True, "path": tmp_path / "index"}
+    )
+    data_dir = tmp_path / "workspace" / "data"
+    data_dir.mkdir(parents=True)
+    for name in ["scan_001.fits", "scan_002.fits", "notes.md"]:
+        (data_dir / name).write_bytes(b"")
+
+    # directories which were just modified are not indexed
+    os.utime(data_dir, (1e9, 1e9))
+    arpes.config.CONFIG["WORKSPACE"] = {"path": str(tmp_path / "workspace"), "name": "workspace"}
+
+    listings = []
+    files_for_search = ALGMainChamber.files_for_search.__func__
+    monkeypatch.setattr(
+        ALGMainChamber,
+        "files_for_search",
+        classmethod(lambda cls, d: listings.append(d) or files_for_search(cls, d)),
+    )
+
+    assert ALGMainChamber.find_first_file(2, {}) == str(data_dir / "scan_002.fits")
+    assert len(listings) == 1
+    assert len(list((tmp_path / "index").glob("*.json"))) == 1
+
+    # found again from the persisted index, without listing or matching files, and lookups
+    # do not rewrite the index
+    file_index._indices.clear()
+    (index_file,) = (tmp_path / "index").glob("*.json")
+    os.utime(index_file, (1e9, 1e9))
+    with monkeypatch.context() as patched:
+        patched.setattr(ALGMainChamber, "match_file", None)
+        assert ALGMainChamber.find_first_file(2, {}) == str(data_dir / "scan_002.fits")
+        assert ALGMainChamber.find_first_file(1, {}) == str(data_dir / "scan_001.fits")
+    assert len(listings) == 1
+    assert index_file.stat().st_mtime == 1e9
+
+    # new files invalidate the index
+    (data_dir / "scan_003.fits").write_bytes(b"")
+    os.utime(data_dir, (1e9 + 1, 1e9 + 1))
+    assert ALGMainChamber.find_first_file(3, {}) == str(data_dir / "scan_003.fits")
+    assert len(listings) == 2
+
+
+def test_native_igor_reader(tmp_path):
+    from arpes.load_pxt import (
+        bin_header_dtypes,
+        packed_record_header_dtype,
+        read_single_pxt,
+        wave_header5_dtype,
+    )
+
+    values = np.arange(12, dtype=np.float32).reshape(3, 4)
+    note = b"Sample=LaSb\rhv=110"
+
+    def binary_wave(byte_order, name, units):
+        bin_header = np.zeros(1, bin_header_dtypes[5].newbyteorder(byte_order))
+        wave_header = np.zeros(1, wave_header5_dtype.newbyteorder(byte_order))
+        data = values.astype(byte_order + "f4").tobytes(order="F")
+        bin_header["version"] = 5
+        bin_header["wfm_size"] = wave_header.itemsize + len(data)
+        bin_header["note_size"] = len(note)
+        bin_header["dim_e_units_size"][0, 0] = len(units)
+        wave_header["type"] = 2
+        wave_header["n_points"] = values.size
+        wave_header["wave_name"] = name
+        wave_header["dim_sizes"][0, :2] = values.shape
+        wave_header["dim_scales"][0, :2] = [0.5, -1]
+        wave_header["dim_offsets"][0, :2] = [-1, 2]
+        wave_header["dim_units"][0, 1] = b"deg"
+        return bin_header.tobytes() + wave_header.tobytes() + data + note + units
+
+    def record(byte_order, record_type, contents):
+        header = np.zeros(1, packed_record_header_dtype.newbyteorder(byte_order))
+        header["record_type"] = record_type
+        header["n_data_bytes"] = len(contents)
+        return header.tobytes() + contents
+
+    for byte_order in "<>":
+        ibw = tmp_path / f"wave{byte_order == '>'}.ibw"
+        ibw.write_bytes(binary_wave(byte_order, b"cut", b"eV"))
+        data = read_single_pxt(ibw)
+
+        assert data.dims == ("eV", "phi") and data.attrs["hv"] == 110
+        assert data.dtype.isnative
+        np.testing.assert_array_equal(data.values, values)
+        np.testing.assert_array_equal(data.eV.values, [-1, -0.5, 0])
+        np.testing.assert_array_equal(data.phi.values, [2, 1, 0, -1])
+
+        pxp = tmp_path / f"experiment{byte_order == '>'}.pxp"
+        pxp.write_bytes(
+            record(byte_order, 1, b"\0" * 12)
+            + record(byte_order, 3, binary_wave(byte_order, b"first", b"eV"))
+            + record(byte_order, 9, b"folder".ljust(32, b"\0"))
+            + record(byte_order, 3, binary_wave(byte_order, b"nested", b"eV"))
+            + record(byte_order, 10, b"")
+            + record(byte_order, 3, binary_wave(byte_order, b"second", b""))
+        )
+        waves = read_single_pxt(pxp, raw=True)
+        experiment = read_single_pxt(pxp, allow_multiple=True)
+
+        assert [w.name for w in waves] == ["first", "second"]
+        assert experiment.second.dims == ("W", "phi") and experiment.second.dtype.isnative
+        np.testing.assert_array_equal(experiment.first.values, values)
+
+
+def test_direct_fits_reader(sandbox_configuration, tmp_path):
+    from astropy.io import fits
+
+    from arpes.endstations import FITSEndstation
+    from arpes.endstations.fits_reader import read_fits_table
+
+    resources = Path(__file__).parent / "resources" / "datasets" / "basic"
+    for name in ["main_chamber_cut_0.fits", "MAESTRO_12.fits", "MAESTRO_16.fits"]:
+        header, table = read_fits_table(resources / name)
+        expected_header, expected_table = FITSEndstation().read_fits_with_astropy(resources / name)
+
+        assert table.columns.names == expected_table.columns.names
+        assert header == {k: v for k, v in expected_header.items() if k not in {"COMMENT", ""}}
+        for column in table.columns.names:
+            np.testing.assert_array_equal(
+                table.data.field(column), expected_table.data.field(column)
+            )
+
+    # delay scans have their delays in picoseconds, also when the header has no unit for them
+    delay = tmp_path / "delay.fits"
+    columns = [fits.Column(n, "E", array=np.arange(3, dtype=np.float32)) for n in ["a", "Delay"]]
+    fits.HDUList([fits.PrimaryHDU(), fits.BinTableHDU.from_columns(columns)]).writeto(delay)
+    _, expected_table = FITSEndstation().read_fits_with_astropy(delay)
+    assert read_fits_table(delay)[1].header["TUNIT2"] == expected_table.header["TUNIT2"] == "ps"
+
+    # scaled columns are left to astropy
+    scaled = tmp_path / "scaled.fits"
+    fits.HDUList(
+        [fits.PrimaryHDU(), fits.BinTableHDU.from_columns([fits.Column("c", "J", bzero=2**31)])]
+    ).writeto(scaled)
+    with pytest.raises(ValueError):
+        read_fits_table(scaled)
+
+
+def test_event_mode_loading(sandbox_configuration, tmp_path):
+    import h5py
+
+    from arpes.endstations.events import histogram_events, iterate_event_chunks, rebin_histogram
+
+    rng = np.random.default_rng(0)
+    n_events = 10000
+    events = np.zeros(
+        n_events, dtype=[("x", "<u2"), ("y", "<u2"), ("t", "<u2"), ("spin", "u1"), ("cycle", "<u4")]
+    )
+    events["x"] = rng.integers(0, 512, n_events)
+    events["t"] = rng.integers(0, 512, n_events)
+    events["spin"] = rng.integers(0, 2, n_events)
+    image = np.zeros((512, 512))
+    np.add.at(image, (events["x"], events["t"]), 1)
+
+    test_data_location = tmp_path / "dld_events.h5"
+    with h5py.File(test_data_location, "w") as f:
+        f.create_dataset("EVENTS", data=events)
+        f.create_dataset("PRIMARY/DATA", data=image)
+        f["PRIMARY"].attrs["run"] = 3
+
+    columns_location = tmp_path / "dld_event_columns.h5"
+    with h5py.File(columns_location, "w") as f:
+        for name in ["x", "t"]:
+            f.create_dataset(f"EVENTS/{name}", data=events[name])
+
+    # events are histogrammed as the image the DAQ would have recorded
+    data = load_data(file=test_data_location, location="ALG-SToF-DLD", chunk_size=999)
+    from_columns = load_data(file=columns_location, location="ALG-SToF-DLD")
+    assert data.raw.dims == ("x_pixels", "t_pixels", "spin") and data.raw.attrs["run"] == 3
+    np.testing.assert_array_equal(data.raw.sum("spin").values, image[:, ::-1])
+    np.testing.assert_array_equal(from_columns.raw.values, image[:, ::-1])
+    np.testing.assert_array_equal(data.raw.t_pixels.values, np.linspace(0, 511, 512))
+
+    with pytest.raises(ValueError):
+        load_data(file=test_data_location, location="ALG-SToF-DLD", lazy=True)
+
+    # directly to physical coordinates, with nonuniform bins
+    with h5py.File(test_data_location, "r") as f:
+        energy_edges = np.geomspace(1, 10, 41)
+        histogram = histogram_events(
+            iterate_event_chunks(f["EVENTS"], ["t", "x"], chunk_size=4096),
+            bins={"eV": energy_edges, "x_pixels": (-0.5, 511.5, 64)},
+            transform=lambda e: {"eV": 1e5 / (e["t"] + 100.0) ** 2, "x_pixels": e["x"]},
+        )
+        expected, *_ = np.histogram2d(
+            1e5 / (events["t"] + 100.0) ** 2,
+            events["x"],
+            bins=[energy_edges, np.linspace(-0.5, 511.5, 65)],
+        )
+        np.testing.assert_array_equal(histogram.values, expected)
+
+    rebinned = rebin_histogram(data.raw, t_pixels=(-0.5, 511.5, 16))
+    assert rebinned.shape == (512, 16, 2)
+    np.testing.assert_allclose(rebinned.sum().item(), n_events)
+    np.testing.assert_allclose(
+        rebinned.values[..., 3, :], data.raw.values[..., 96:128, :].sum(axis=1)
+    )
@@ -1,3 +1,21 @@
+import copy
+
+import numpy as np
+import pytest
+from scipy.ndimage import gaussian_filter
+
+from arpes.fits.broadcast_common import compile_model
+from arpes.fits.fit_models import (
+    AffineBroadenedFD,
+    BandEdgeBModel,
+    LinearModel,
+    LorentzianModel,
+    TwoLorModel,
+)
+from arpes.fits.kernels import fuse_model
+from arpes.fits.utilities import parse_model
+
+
 def test_xmodel_mixin():
     pass
 
@@ -44,7 +62,118 @@ def test_fermi_dirac_model():
 
 
 def test_affine_broadened_fd():
-    pass
+    x = np.linspace(-0.1, 0.1, 200)
+    conv_width = np.array([[0.0], [0.001], [0.005], [0.02], [0.05]])
+
+    batched = AffineBroadenedFD.batched_func(
+        x, fd_center=0.01, fd_width=0.003, conv_width=conv_width, lin_bkg=0.3, offset=0.1
+    )
+
+    for row, width in zip(batched, conv_width[:, 0]):
+        dx = x - 0.01
+        fermi = 1 / (np.exp(dx / 0.003) + 1)
+        expected = gaussian_filter((1 + 0.3 * dx) * fermi, sigma=width / (x[1] - x[0])) + 0.1
+        np.testing.assert_allclose(row, expected, rtol=1e-12)
+
+
+def test_affine_broadened_fd_runaway_width():
+    # a diverging conv_width during a batched fit must not allocate a kernel larger than the axis
+    x = np.linspace(-0.1, 0.1, 200)
+    conv_width = np.full((5000, 1), 1e300)
+    conv_width[0] = 0.01
+
+    batched = AffineBroadenedFD.batched_func(x, conv_width=conv_width)
+
+    assert batched.shape == (5000, 200)
+    assert np.isfinite(batched).all()
+
+
+def test_batched_guesses():
+    x = np.linspace(1, -1, 200)
+    model = LorentzianModel() + LinearModel()
+    data = np.stack(
+        [
+            model.eval(x=x, amplitude=1, center=c, sigma=0.1, slope=0, intercept=0)
+            for c in (-0.2, 0.3)
+        ]
+    )
+
+    guessed = model.guess_batched(data, x=x)
+
+    assert set(guessed) == {"amplitude", "center", "sigma", "slope", "intercept"}
+    assert (guessed["sigma"] > 0).all()
+    np.testing.assert_allclose(guessed["center"], [-0.2, 0.3], atol=0.02)
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        "AffineBackgroundModel + LorentzianModel * FermiDiracModel",
+        "GaussianModel / ConstantModel - LinearModel",
+        BandEdgeBModel,
+        TwoLorModel,
+    ],
+)
+def test_fused_kernels(spec):
+    model = compile_model(parse_model(spec))
+    kernel = fuse_model(model)
+    assert kernel is not None
+
+    x = np.linspace(-0.3, 0.2, 50)
+    rng = np.random.default_rng(0)
+    params = model.make_params()
+    for name in kernel.param_names:
+        params[name].set(value=rng.uniform(0.05, 0.5), min=-np.inf, max=np.inf)
+
+    np.testing.assert_allclose(kernel.evaluate(params, x), model.eval(params, x=x), rtol=1e-12)
+
+    # analytic derivatives against central differences of the lmfit model
+    jacobian = kernel.jacobian(params, None, None, x=x)
+    for j, name in enumerate(kernel.param_names):
+        step = 1e-6 * max(1, abs(params[name].value))
+        up, down = copy.deepcopy(params), copy.deepcopy(params)
+        up[name].value += step
+        down[name].value -= step
+        numerical = (model.eval(up, x=x) - model.eval(down, x=x)) / (2 * step)
+        np.testing.assert_allclose(jacobian[:, j], numerical, rtol=1e-5, atol=1e-7)
+
+
+def test_compiled_models_are_cached_copies():
+    spec = parse_model("LorentzianModel + LinearModel")
+    first, second = compile_model(spec), compile_model(spec)
+
+    assert first is not second
+    assert first.kernel.source == second.kernel.source
+    first.set_param_hint("a_sigma", min=1)
+    assert second.make_params()["a_sigma"].min != 1
+    assert compile_model(AffineBroadenedFD).kernel is None
+
+
+def test_fused_kernel_fits_match_lmfit():
+    x = np.linspace(-0.5, 0.5, 120)
+    model = compile_model([LorentzianModel, LinearModel])
+    data = model.eval(x=x, a_amplitude=0.2, a_center=0.1, a_sigma=0.05, b_slope=0.2, b_intercept=1)
+    data = data + np.random.default_rng(0).normal(0, 0.01, len(x))
+
+    fused = model.guess_fit(data, x=x)
+    model.kernel = None
+    plain = model.guess_fit(data, x=x)
+
+    assert fused.nfev < plain.nfev
+    for name in ["a_center", "a_sigma", "a_fwhm", "b_slope"]:
+        np.testing.assert_allclose(
+            fused.params[name].value, plain.params[name].value, rtol=1e-6, atol=1e-9
+        )
+        np.testing.assert_allclose(fused.params[name].stderr, plain.params[name].stderr, rtol=1e-3)
+
+    # the fused residual follows lmfit's nan_policy for NaNs in the model
+    model = compile_model([LorentzianModel, LinearModel])
+    params = model.make_params(a_amplitude=0.2, a_center=0, a_sigma=0.05, b_intercept=1)
+    params["b_slope"].set(value=np.nan)
+    assert np.isnan(model._residual(params, data, None, x=x)).all()
+    model.nan_policy = "raise"
+    with pytest.raises(ValueError):
+        model._residual(params, data, None, x=x)
 
 
 def test_log_renormalization_model():
@@ -30,3 +30,26 @@ def test_deep_equals(destination, source, expected_equal):
 )
 def test_deep_update(destination, source, expected):
     assert deep_equals(deep_update(destination, source), expected)
+
+
+def test_sparse_axis_resampling():
+    import numpy as np
+    from scipy.ndimage import shift
+
+    from arpes.utilities.binning import (
+        apply_axis_weights,
+        interpolation_weights,
+        overlap_weights,
+    )
+
+    data = np.random.default_rng(0).random((4, 30, 5))
+
+    # conserves counts, in either direction
+    weights = overlap_weights(np.linspace(0, 30, 31), np.linspace(30, 0, 7))
+    rebinned = apply_axis_weights(data, weights, axis=1)
+    assert rebinned.shape == (4, 6, 5)
+    np.testing.assert_allclose(rebinned.sum(axis=1), data.sum(axis=1))
+    np.testing.assert_allclose(rebinned[:, -1], data[:, :5].sum(axis=1))
+
+    interpolated = apply_axis_weights(data, interpolation_weights(np.arange(30) - 2.5, 30), 1)
+    np.testing.assert_allclose(interpolated, shift(data, (0, 2.5, 0), order=1, mode="constant"))
@@ -0,0 +1,67 @@
+import numpy as np
+import xarray as xr
+from matplotlib.path import Path
+
+from arpes.analysis.mask import apply_mask, apply_mask_to_coords, polys_to_mask
+
+
+def make_map():
+    rng = np.random.default_rng(0)
+    return xr.DataArray(
+        rng.random((60, 40, 3)),
+        coords={"phi": np.linspace(-0.3, 0.3, 60), "eV": np.linspace(-1, 0.1, 40), "T": [1, 2, 3]},
+        dims=("phi", "eV", "T"),
+    )
+
+
+def matplotlib_mask(polys, shape, radius=0):
+    i, j = np.meshgrid(*[np.arange(s) for s in shape], indexing="ij")
+    points = np.stack([i.ravel(), j.ravel()], axis=-1)
+    inside = [Path(p).contains_points(points, radius=radius).reshape(shape) for p in polys]
+    return np.logical_or.reduce(inside)
+
+
+def test_polys_to_mask():
+    data = make_map()
+    rng = np.random.default_rng(1)
+
+    for _ in range(10):
+        polys = [[[rng.uniform(-0.4, 0.4), rng.uniform(-1.1, 0.2)] for _ in range(6)]]
+        index_polys = [
+            [[np.searchsorted(data.phi, p[0]), np.searchsorted(data.eV, p[1])] for p in poly]
+            for poly in polys
+        ]
+        mask_dict = {"dims": ["phi", "eV"], "polys": polys}
+        for radius in [None, 1.5]:
+            mask = polys_to_mask(mask_dict, data.coords, (60, 40), radius=radius)
+            np.testing.assert_array_equal(
+                mask, matplotlib_mask(index_polys, (60, 40), radius=radius or 0)
+            )
+
+    # specialized masks are cached
+    assert polys_to_mask(mask_dict, data.coords, (60, 40)) is polys_to_mask(
+        mask_dict, data.coords, (60, 40)
+    )
+
+
+def test_apply_mask():
+    data = make_map()
+    mask_dict = {"dims": ["phi", "eV"], "polys": [[[-0.2, -0.9], [0.25, -0.8], [0.1, 0.05]]]}
+    mask = polys_to_mask(mask_dict, data.coords, (60, 40))
+
+    # the mask applies along the unmasked dimensions, wherever they are
+    masked = apply_mask(data.transpose("T", "eV", "phi"), mask_dict, replace=0)
+    np.testing.assert_array_equal(masked.values, np.where(mask.T, 0, data.values.T))
+    assert not np.any(data.values == 0)
+
+    rng = np.random.default_rng(2)
+    coords = xr.Dataset(
+        {"kx": (("a", "b"), rng.uniform(-1, 1, (30, 20))), "ky": ("b", rng.uniform(-1, 1, 20))}
+    )
+    poly = [[-0.5, -0.5], [0.7, -0.2], [0.1, 0.8]]
+    kx, ky = xr.broadcast(coords.kx, coords.ky)
+    expected = Path(poly).contains_points(np.stack([kx.values.ravel(), ky.values.ravel()], -1))
+    np.testing.assert_array_equal(
+        apply_mask_to_coords(coords, {"poly": poly}, ["kx", "ky"], invert=False),
+        expected.reshape(30, 20),
+    )
@@ -1,11 +1,14 @@
 import numpy as np
 import pytest
+import xarray as xr
 
 from arpes.io import example_data
 from arpes.fits.utilities import broadcast_model
 from arpes.fits.fit_models import AffineBroadenedFD, QuadraticModel
-from arpes.utilities.conversion import convert_to_kspace
+from arpes.utilities.conversion import convert_to_kspace, plan_kspace_conversion
+from arpes.utilities.conversion.fast_interp import Interpolator
 from arpes.utilities.conversion.forward import convert_through_angular_point
+from arpes.utilities.conversion.streaming import MemoryTarget, resolve_target
 import arpes.xarray_extensions
 
 
@@ -78,6 +81,107 @@ def test_fermi_surface_conversion():
     assert kdata.fillna(0).mean().item() == pytest.approx(415.7048189)
 
 
+def test_chunked_conversion_matches_in_memory():
+    """Validates that converting in energy slabs is identical to converting all at once."""
+    cut = example_data.cut.spectrum
+    kp = np.linspace(-0.12, 0.12, 600)
+    kdata = convert_to_kspace(cut, kp=kp)
+
+    for chunk_size in [1, 7]:
+        chunked = convert_to_kspace(cut, kp=kp, allow_chunks=True, chunk_size=chunk_size)
+        assert chunked.dims == kdata.dims
+        np.testing.assert_allclose(chunked.values, kdata.values, atol=1e-9)
+
+
+def test_chunked_conversion_from_memory_mapped_data(tmp_path):
+    """Validates slab conversion of a memory mapped volume into a target."""
+    cut = example_data.cut.spectrum
+    volume = xr.concat([cut.assign_coords(psi=p) for p in np.linspace(-0.1, 0.1, 9)], "psi")
+    kdata = convert_to_kspace(volume)
+
+    mapped = np.lib.format.open_memmap(
+        tmp_path / "volume.npy", mode="w+", dtype=volume.dtype, shape=volume.shape
+    )
+    mapped[...] = volume.values
+    chunked = convert_to_kspace(volume.copy(data=mapped), target=MemoryTarget(), chunk_size=13)
+
+    assert chunked.dims == ("eV", "kx", "ky")
+    np.testing.assert_allclose(chunked.values, kdata.values, atol=1e-9)
+
+    with pytest.raises(ValueError):
+        resolve_target(tmp_path / "converted.txt")
+
+
+def test_conversion_plans():
+    """Validates that cached conversion plans match direct conversion."""
+    cut = example_data.cut.spectrum
+    kp = np.linspace(-0.12, 0.12, 600)
+
+    plan = plan_kspace_conversion(cut, kp=kp)
+    assert plan_kspace_conversion(cut, kp=kp) is plan
+    np.testing.assert_allclose(plan(cut).values, convert_to_kspace(cut, kp=kp).values, atol=1e-9)
+
+    series = xr.concat([cut * (1 + t) for t in range(4)], "temperature")
+    series = series.assign_coords(temperature=[10.0, 20.0, 30.0, 40.0])
+    series.attrs = cut.attrs
+
+    converted = convert_to_kspace(series, kp=kp, use_plan=True)
+    assert converted.dims == ("eV", "kp", "temperature")
+    np.testing.assert_allclose(converted.values, convert_to_kspace(series, kp=kp).values, atol=1e-9)
+
+    with pytest.raises(ValueError):
+        plan(cut.assign_attrs(phi_offset=cut.S.phi_offset + 0.05))
+
+    # unevenly spaced and length one source axes are located as in `convert_to_kspace`
+    rng = np.random.default_rng(0)
+    uneven = cut.isel(eV=np.sort(rng.choice(len(cut.eV), len(cut.eV) // 2, replace=False)))
+    for partial in [uneven, cut.isel(eV=[200])]:
+        np.testing.assert_allclose(
+            plan_kspace_conversion(partial, kp=kp)(partial).values,
+            convert_to_kspace(partial, kp=kp).values,
+            atol=1e-9,
+        )
+
+    # plans are evaluated in memory, and are not silently used instead of streaming
+    with pytest.raises(ValueError):
+        convert_to_kspace(cut, kp=kp, use_plan=True, target=MemoryTarget())
+
+
+def test_fast_interpolation_matches_scipy():
+    """Validates the fast interpolator against scipy on uniform and nonuniform grids."""
+    from scipy.interpolate import RegularGridInterpolator
+
+    rng = np.random.default_rng(0)
+    for n_dims in range(1, 5):
+        axes = [np.linspace(0, 1, 6 + i) for i in range(n_dims)]
+        axes[0] = np.concatenate([[0], np.sort(rng.uniform(0, 1, 7)), [1]])
+        data = rng.normal(size=[len(a) for a in axes])
+        points = rng.uniform(-0.05, 1.05, (500, n_dims))
+
+        for method in ("nearest", "linear"):
+            expected = RegularGridInterpolator(
+                axes, data, method=method, bounds_error=False, fill_value=np.nan
+            )(points)
+            interpolated = Interpolator.from_arrays(axes, data, method=method)(points)
+            np.testing.assert_allclose(interpolated, expected, atol=1e-12)
+
+    # cubic convolution is exact for quadratics away from the edges, also for descending axes
+    x = np.linspace(1, 0, 21)
+    points = np.linspace(0.1, 0.9, 50)
+    cubic = Interpolator.from_arrays([x], x**2, method="cubic")([points])
+    np.testing.assert_allclose(cubic, points**2, atol=1e-12)
+
+    # single precision data stays single precision, and batches share query points
+    data = rng.normal(size=(3, 20, 30)).astype(np.float32)
+    axes = [np.linspace(0, 1, 20), np.linspace(0, 1, 30)]
+    points = rng.uniform(0, 1, (100, 2))
+    batched = Interpolator.from_arrays(axes, data)(points)
+    assert batched.dtype == np.float32 and batched.shape == (3, 100)
+    np.testing.assert_allclose(
+        batched[1], Interpolator.from_arrays(axes, data[1].astype(np.float64))(points), rtol=1e-5
+    )
+
+
 @pytest.mark.skip
 def test_conversion_with_passthrough_axis():
     """Validates that passthrough is equivalent to individual slice conversion."""
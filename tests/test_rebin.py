@@ -0,0 +1,68 @@
+import numpy as np
+import xarray as xr
+
+from arpes.analysis.general import rebin
+
+
+def make_map():
+    rng = np.random.default_rng(0)
+    return xr.DataArray(
+        rng.random((12, 10, 7)),
+        coords={"phi": np.linspace(-0.3, 0.3, 12), "eV": np.linspace(-1, 0, 10), "T": np.arange(7)},
+        dims=("phi", "eV", "T"),
+    )
+
+
+def test_rebin_integer_factors():
+    data = make_map()
+
+    rebinned = rebin(data, phi=3, eV=2)
+    assert rebinned.dims == data.dims
+    np.testing.assert_allclose(
+        rebinned.values, data.values.reshape(4, 3, 5, 2, 7).mean(axis=(1, 3))
+    )
+    np.testing.assert_array_equal(rebinned.phi.values, data.phi.values[::3])
+
+    # the reduction is the same for data which is not contiguous in memory
+    transposed = rebin(data.transpose("eV", "T", "phi"), phi=3, eV=2)
+    np.testing.assert_allclose(transposed.transpose(*data.dims).values, rebinned.values)
+
+
+def test_rebin_fractional_overlaps():
+    data = make_map()
+
+    # 10 energies into 4 bins of 2.5, where bins share the old bins they split
+    rebinned = rebin(data, shape={"eV": 4})
+    expected = np.stack(
+        [
+            data.values[:, 0:2].sum(axis=1) + 0.5 * data.values[:, 2],
+            0.5 * data.values[:, 2] + data.values[:, 3:5].sum(axis=1),
+            data.values[:, 5:7].sum(axis=1) + 0.5 * data.values[:, 7],
+            0.5 * data.values[:, 7] + data.values[:, 8:10].sum(axis=1),
+        ],
+        axis=1,
+    )
+    np.testing.assert_allclose(rebinned.values, expected / 2.5)
+    np.testing.assert_allclose(rebinned.sum("eV") * 2.5, data.sum("eV"))
+    np.testing.assert_allclose(rebinned.eV.values, [-1, -1 + 2.5 / 9, -1 + 5 / 9, -1 + 7.5 / 9])
+
+    # reductions keep whole bins, and the remainder of the dimension makes a last bin
+    reduced = rebin(data, reduction={"phi": 5})
+    np.testing.assert_allclose(
+        reduced.values,
+        np.stack([data.values[i : i + 5].mean(axis=0) for i in (0, 5, 10)]),
+    )
+    np.testing.assert_array_equal(reduced.phi.values, data.phi.values[::5])
+
+    interpolated = rebin(data, shape={"eV": 4}, interpolate=True)
+    np.testing.assert_allclose(interpolated.values, data.interp(eV=interpolated.eV).values)
+
+
+def test_rebin_dataset():
+    data = make_map()
+    dataset = xr.Dataset({"spectrum": data, "edc": data.sum("phi"), "t": data.coords["T"] * 2})
+
+    rebinned = rebin(dataset, phi=3, eV=2)
+    xr.testing.assert_allclose(rebinned.spectrum, rebin(data, phi=3, eV=2))
+    xr.testing.assert_allclose(rebinned.edc, rebin(data.sum("phi"), eV=2))
+    xr.testing.assert_identical(rebinned.t, dataset.t)
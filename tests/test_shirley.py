@@ -0,0 +1,34 @@
+import numpy as np
+import xarray as xr
+
+from arpes.analysis.shirley import (
+    _calculate_shirley_background_full_range,
+    calculate_shirley_background,
+)
+
+
+def test_shirley_background_per_spectrum_convergence():
+    rng = np.random.default_rng(0)
+    eV = np.linspace(-10, 0, 200)
+    centers = rng.normal(-5, 0.5, (3, 4))
+    xps = xr.DataArray(
+        10 / (1 + ((eV - centers[..., None]) / 0.5) ** 2) + 1 + 2 * (eV < centers[..., None]),
+        coords={"x": np.arange(3), "y": np.arange(4), "eV": eV},
+        dims=("x", "y", "eV"),
+    )
+
+    background = calculate_shirley_background(xps, energy_range=slice(-9, -1))
+    serial = calculate_shirley_background(xps, energy_range=slice(-9, -1), parallel=False)
+    assert background.dims == xps.dims
+    np.testing.assert_array_equal(background.values, serial.values)
+
+    # every spectrum converges as if it were calculated alone
+    for x in range(3):
+        for y in range(4):
+            spectrum = xps.isel(x=x, y=y)
+            alone = _calculate_shirley_background_full_range(spectrum.sel(eV=slice(-9, -1)).values)
+            np.testing.assert_allclose(
+                background.isel(x=x, y=y).sel(eV=slice(-9, -1)).values, alone, rtol=1e-12
+            )
+            np.testing.assert_allclose(background.isel(x=x, y=y).values[:10], alone[0])
+            np.testing.assert_allclose(background.isel(x=x, y=y).values[-10:], alone[-1])
@@ -0,0 +1,57 @@
+import numpy as np
+import xarray as xr
+
+import arpes.constants
+import arpes.xarray_extensions
+from arpes.preparation import build_KE_coords_to_time_pixel_coords, process_DLD
+from arpes.preparation.axis_preparation import transform_dataarray_axis
+from arpes.preparation.tof_preparation import convert_to_kinetic_energy
+
+CONVERSION = 0.5 * 9.11e6 * 0.5 * arpes.constants.SPIN_TOF_LENGTH**2 / 1.6
+
+
+def test_process_DLD_matches_geometric_transform():
+    data = xr.Dataset(
+        {"raw": (("x_pixels", "t_pixels"), np.random.default_rng(0).random((20, 512)))},
+        coords={"x_pixels": np.arange(20.0), "t_pixels": np.arange(512.0)},
+        attrs={
+            "spectrometer_name": "SToF",
+            "E_max": 10,
+            "dE": 0.01,
+            "timing_offset": np.sqrt(CONVERSION / 10) - 20,
+        },
+    )
+    ke_axis = np.linspace(1, 10, 900)
+
+    converted = process_DLD(data)
+    expected = transform_dataarray_axis(
+        build_KE_coords_to_time_pixel_coords(data, ke_axis),
+        "t_pixels",
+        "kinetic",
+        ke_axis,
+        data,
+        lambda x: "kinetic_spectrum",
+    )
+
+    assert converted.kinetic_spectrum.dims == ("x_pixels", "kinetic")
+    assert converted.kinetic_spectrum.any()
+    np.testing.assert_allclose(
+        converted.kinetic_spectrum.values, expected.kinetic_spectrum.values, atol=1e-6
+    )
+
+
+def test_convert_to_kinetic_energy_conserves_counts():
+    counts = np.random.default_rng(0).poisson(5, (300, 4)).astype(float)
+    data = xr.DataArray(
+        counts,
+        coords={"time": np.linspace(50, 350, 300), "phi": np.arange(4.0)},
+        dims=("time", "phi"),
+        attrs={"spectrometer_name": "SToF"},
+    )
+
+    # energies covering all times, with bins outside of the recorded times
+    ke_axis = np.linspace(CONVERSION / 400**2, CONVERSION / 40**2, 2000)
+    converted = convert_to_kinetic_energy(data, ke_axis)
+
+    assert converted.dims == ("eV", "phi")
+    np.testing.assert_allclose(converted.sum("eV").values, counts.sum(axis=0))
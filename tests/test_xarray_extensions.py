@@ -1,4 +1,20 @@
+import numpy as np
 import pytest
+import scipy.ndimage
+import xarray as xr
+
+import arpes.xarray_extensions
+from arpes.utilities.math import shift_by
+
+
+def make_map():
+    rng = np.random.default_rng(0)
+    return xr.DataArray(
+        rng.random((5, 4, 3)),
+        coords={"T": np.linspace(10, 50, 5), "phi": np.linspace(-0.1, 0.1, 4), "eV": [-1, -1, 0]},
+        dims=("T", "phi", "eV"),
+        attrs={"id": 1},
+    )
 
 
 def test_experimental_conditions():
@@ -57,12 +73,58 @@ def test_transposition():
     pass
 
 
+def make_cuts():
+    rng = np.random.default_rng(0)
+    T = np.linspace(10, 100, 6)
+    data = xr.DataArray(
+        rng.random((30, 20, 6)),
+        coords={"eV": np.linspace(-1, 0, 30), "kp": np.linspace(-0.5, 0.5, 20), "T": T},
+        dims=("eV", "kp", "T"),
+        attrs={"id": 1},
+    )
+    kf = xr.DataArray(np.linspace(-0.2, 0.2, 6), coords={"T": T}, dims=["T"])
+    return data, kf
+
+
 def test_select_around_data():
-    pass
+    data, kf = make_cuts()
+
+    edcs = data.S.select_around_data({"kp": kf}, radius={"kp": 0.1}, fast=True)
+    means = data.S.select_around_data({"kp": kf}, radius={"kp": 0.1}, fast=True, mode="mean")
+    assert edcs.dims == ("eV", "T") and edcs.attrs == data.attrs
+    for T, k in zip(kf.coords["T"].values, kf.values):
+        window = data.sel(T=T, kp=slice(k - 0.1, k + 0.1))
+        np.testing.assert_allclose(edcs.sel(T=T).values, window.sum("kp").values)
+        np.testing.assert_allclose(means.sel(T=T).values, window.mean("kp").values)
+
+    # elliptical windows, and radii below the spacing select the nearest coordinate
+    points = {"kp": kf, "eV": xr.DataArray(np.linspace(-0.8, -0.2, 6), coords=kf.coords)}
+    integrated = data.S.select_around_data(points, radius={"kp": 0.2, "eV": 0.3}, fast=False)
+    nearest = data.S.select_around_data(points, radius={"kp": 0.2, "eV": 0.01}, fast=True)
+    assert integrated.dims == ("T",) == nearest.dims
+    for i, T in enumerate(kf.coords["T"].values):
+        k, e = points["kp"].values[i], points["eV"].values[i]
+        cut = data.sel(T=T)
+        in_ellipse = ((cut.kp - k) / 0.2) ** 2 + ((cut.eV - e) / 0.3) ** 2 <= 1
+        np.testing.assert_allclose(integrated.values[i], cut.where(in_ellipse).sum().item())
+        np.testing.assert_allclose(
+            nearest.values[i], cut.sel(eV=e, method="nearest").sel(kp=slice(k - 0.2, k + 0.2)).sum()
+        )
 
 
 def test_select_around():
-    pass
+    data, _ = make_cuts()
+    cut = data.isel(T=0)
+
+    rectangle = cut.S.select_around(
+        {"kp": 0.1, "eV": -0.5}, radius={"kp": 0.2, "eV": 0.3}, fast=True
+    )
+    ellipse = cut.S.select_around({"kp": 0.1, "eV": -0.5}, radius={"kp": 0.2, "eV": 0.3})
+    in_ellipse = ((cut.kp - 0.1) / 0.2) ** 2 + ((cut.eV + 0.5) / 0.3) ** 2 <= 1
+    np.testing.assert_allclose(
+        rectangle.item(), cut.sel(kp=slice(-0.1, 0.3), eV=slice(-0.8, -0.2)).sum().item()
+    )
+    np.testing.assert_allclose(ellipse.item(), cut.where(in_ellipse).sum().item())
 
 
 def test_shape():
@@ -166,15 +228,54 @@ def test_to_arrays():
 
 # Functional programming utilities
 def test_iterate_axis():
-    pass
+    data = make_map()
+
+    # cuts are taken by index, even where coordinates repeat
+    cuts = list(data.G.iterate_axis(["T", "eV"]))
+    assert len(cuts) == 15
+    assert cuts[4][0] == {"T": 20, "eV": -1}
+    np.testing.assert_array_equal(cuts[4][1].values, data.values[1, :, 1])
 
 
 def test_fp_mapping():
     """
-    Tests `map_axes` and `map`
+    Tests `map_axes` and `transform`
     :return:
     """
-    pass
+    data = make_map()
+    expected = (
+        data.values * data["T"].values[:, None, None] + data.values.sum(axis=(1, 2))[:, None, None]
+    )
+
+    mapped = data.G.map_axes("T", lambda v, c: v * c["T"] + v.sum())
+    threaded = data.G.map_axes("T", lambda v, c: v * c["T"] + v.sum(), workers=3)
+    vectorized = data.G.map_axes(
+        "T", lambda v, c: v * c["T"] + v.sum(["phi", "eV"]), vectorized=True, workers=2
+    )
+    for result in [mapped, threaded, vectorized]:
+        assert result.dims == data.dims and result.attrs == data.attrs
+        np.testing.assert_allclose(result.values, expected)
+
+    calls = []
+
+    def moments(v, c):
+        calls.append(c)
+        return xr.DataArray(
+            [v.mean().item(), v.var().item()], coords={"stat": ["m", "v"]}, dims=["stat"]
+        )
+
+    transformed = data.G.transform(["eV", "T"], moments)
+    vectorized = data.G.transform(
+        ["eV", "T"],
+        lambda v, c: xr.concat([v.mean("phi"), v.var("phi")], "stat").assign_coords(
+            stat=["m", "v"]
+        ),
+        vectorized=True,
+    )
+    assert len(calls) == 15
+    assert transformed.dims == ("T", "eV", "stat") == vectorized.dims
+    np.testing.assert_allclose(transformed.sel(stat="m").values, data.mean("phi").values)
+    np.testing.assert_allclose(vectorized.values, transformed.values)
 
 
 def test_enumerate_iter_coords():
@@ -195,7 +296,35 @@ def test_stride():
 
 # shifting
 def test_shift_by():
-    pass
+    data, kf = make_cuts()
+    stride = 1 / 29
+
+    # one dimensional shifts agree with shifting each cut in turn
+    shifted = data.G.shift_by(kf, shift_axis="eV", order=3)
+    for i, k in enumerate(kf.values):
+        np.testing.assert_allclose(
+            shifted.values[:, :, i], scipy.ndimage.shift(data.values[:, :, i], (-k / stride, 0))
+        )
+
+    # as do shift fields along several dimensions, in any order
+    field = xr.DataArray(
+        np.linspace(-0.1, 0.1, 120).reshape(6, 20),
+        coords={"T": kf.coords["T"], "kp": data.coords["kp"]},
+        dims=["T", "kp"],
+    )
+    shifted = data.G.shift_by(field, zero_nans=False)
+    assert shifted.dims == data.dims
+    for i, j in [(0, 0), (3, 7), (5, 19)]:
+        np.testing.assert_allclose(
+            shifted.values[:, j, i],
+            scipy.ndimage.shift(data.values[:, j, i], -field.values[i, j] / stride, order=1),
+        )
+
+    # and scalar shifts shift every slice
+    np.testing.assert_allclose(
+        shift_by(data.values, 2.3, axis=0, by_axis=1),
+        scipy.ndimage.shift(data.values, (2.3, 0, 0)),
+    )
 
 
 def test_shift_coords():